@@ -32,10 +32,10 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", os.getenv("DJANGO_SETTINGS_MODUL
 django_asgi_app = get_asgi_application()
 
 # ── Import WebSocket routing after Django setup ──
-try:
-    from dashboard.routing import websocket_urlpatterns
-except ImportError:
-    websocket_urlpatterns = []
+from dashboard.routing import websocket_urlpatterns as dashboard_websocket_urlpatterns
+from generate.routing import websocket_urlpatterns as generate_websocket_urlpatterns
+
+websocket_urlpatterns = dashboard_websocket_urlpatterns + generate_websocket_urlpatterns
 
 # ── Create ASGI application with WebSocket support ──
 application = ProtocolTypeRouter({
@@ -7,7 +7,8 @@ import ipaddress
 from datetime import timedelta
 
 from django.conf import settings
-from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject, cached_property
+from ai_gallery.services import ratelimit
 from django.http import HttpResponseRedirect
 from django.contrib.sessions.exceptions import SessionInterrupted
 
@@ -304,91 +305,127 @@ class LanguagePrefixRedirectMiddleware:
 
 # ───────────── Новое: устройство/отпечаток и стойкие cookie ─────────────
 
+class DeviceIdentity:
+    """
+    Идентификаторы устройства одного запроса.
+    Из cookie/заголовков читается сразу (дёшево); хэши и session_key
+    считаются при первом обращении — сессия создаётся (запись в БД)
+    только когда view действительно нужна гостевая идентичность.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        cookie_gid = (request.COOKIES.get(_cookie_name_gid()) or "").strip()
+        self.gid = cookie_gid or secrets.token_urlsafe(22)
+        self.gid_is_new = not cookie_gid
+
+        # клиентский fingerprint: cookie, затем заголовок
+        client_fp = ""
+        fp_cookie_name = _cookie_name_fp()
+        if fp_cookie_name:
+            client_fp = (request.COOKIES.get(fp_cookie_name) or "").strip()
+        if not client_fp:
+            fp_header = getattr(settings, "FP_HEADER_NAME", "X-Device-Fingerprint")
+            client_fp = (request.META.get(f"HTTP_{fp_header.upper().replace('-', '_')}", "") or "").strip()
+        self.client_fp = client_fp
+
+    @cached_property
+    def ua_hash(self) -> str:
+        return _ua_hash(self._request)
+
+    @cached_property
+    def ip_hash(self) -> str:
+        return _ip_hash(self._request)
+
+    @cached_property
+    def server_fp(self) -> str:
+        return _sha256(f"{self.ua_hash}|{self.ip_hash}|{settings.SECRET_KEY}")
+
+    @property
+    def fp(self) -> str:
+        """Основной FP: клиентский, иначе серверный."""
+        return self.client_fp or self.server_fp
+
+    @cached_property
+    def session_key(self) -> str:
+        return _ensure_session_key(self._request)
+
+
 class DeviceFingerprintMiddleware:
     """
     УЛУЧШЕННАЯ СИСТЕМА FINGERPRINT:
     • Приоритет клиентскому fingerprint (canvas+WebGL)
     • Серверный FP используется как fallback
-    • Гарантирует session_key
     • Ставит стойкий cookie 'gid' (HttpOnly)
-    • Вычисляет:
+    • Кладёт в request.device объект DeviceIdentity:
         client_fp = от браузера (cookie/заголовок)
         ua_hash = H(UA|Accept-Language)
         ip_hash = H(IP|SECRET_KEY)
         server_fp = H(ua_hash|ip_hash|SECRET_KEY) - только fallback
-    • Кладёт значения в request:
-        request.device_gid, request.device_fp (client_fp),
-        request.device_client_fp, request.device_server_fp,
-        request.device_ip_hash, request.device_ua_hash, request.device_session_key
+        session_key — сессия создаётся при первом обращении
+    • Для совместимости — те же значения в атрибутах request
+      (request.device_gid, request.device_fp, request.fp, request.device_client_fp,
+      request.device_server_fp, request.device_ip_hash, request.device_ua_hash,
+      request.device_session_key); вычисляемые — ленивые.
+    • Пути из DEVICE_FP_SKIP_PREFIXES (статика, health, sitemap) пропускает целиком.
     • НЕ перезаписывает клиентский cookie!
+
+    Анонимный просмотр страниц не пишет в БД: сессия появляется, только когда
+    её ключ нужен view (сабмит, лайк, поиск гранта).
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
 
-    def __call__(self, request):
-        # session_key должен быть до обработки view
-        sess = _ensure_session_key(request)
-
-        # читаем/создаём gid
-        gid_cookie_name = _cookie_name_gid()
-        gid = (request.COOKIES.get(gid_cookie_name) or "").strip()
-        if not gid:
-            gid = secrets.token_urlsafe(22)
-
-        # вычисляем серверные отпечатки
-        ua_h = _ua_hash(request)
-        ip_h = _ip_hash(request)
-        server_fp = _hard_fp(request)
-
-        # ПРИОРИТЕТ: клиентский fingerprint из браузера
-        fp_cookie_name = _cookie_name_fp()
-        client_fp = ""
-
-        # 1) Проверяем cookie от клиента
-        if fp_cookie_name:
-            client_fp = (request.COOKIES.get(fp_cookie_name) or "").strip()
+        static_url = getattr(settings, "STATIC_URL", "/static/") or "/static/"
+        media_url = getattr(settings, "MEDIA_URL", "/media/") or "/media/"
+        self.skip_prefixes = tuple(
+            p if p.startswith("/") else "/" + p
+            for p in (static_url, media_url, *getattr(settings, "DEVICE_FP_SKIP_PREFIXES", ()))
+        )
+        self.debug_headers = bool(getattr(settings, "DEVICE_FP_DEBUG_HEADERS", False))
 
-        # 2) Проверяем заголовок (если фронт его шлёт)
-        if not client_fp:
-            fp_header = getattr(settings, "FP_HEADER_NAME", "X-Device-Fingerprint")
-            client_fp = (request.META.get(f"HTTP_{fp_header.upper().replace('-', '_')}", "") or "").strip()
+    def __call__(self, request):
+        if (request.path_info or "/").startswith(self.skip_prefixes):
+            return self.get_response(request)
 
-        # 3) Fallback на серверный FP (только если клиент не предоставил)
-        primary_fp = client_fp if client_fp else server_fp
+        device = DeviceIdentity(request)
 
         # прокинем в request
-        request.device_gid = gid
-        request.device_fp = primary_fp  # основной FP (клиентский или серверный)
-        request.fp = primary_fp  # совместимость со старым кодом
-        request.device_client_fp = client_fp  # клиентский FP (может быть пустым)
-        request.device_server_fp = server_fp  # серверный FP (всегда есть)
-        request.device_ip_hash = ip_h
-        request.device_ua_hash = ua_h
-        request.device_session_key = sess
+        request.device = device
+        request.device_gid = device.gid
+        request.device_client_fp = device.client_fp  # клиентский FP (может быть пустым)
+        request.device_fp = SimpleLazyObject(lambda: device.fp)  # основной FP (клиентский или серверный)
+        request.fp = request.device_fp  # совместимость со старым кодом
+        request.device_server_fp = SimpleLazyObject(lambda: device.server_fp)
+        request.device_ip_hash = SimpleLazyObject(lambda: device.ip_hash)
+        request.device_ua_hash = SimpleLazyObject(lambda: device.ua_hash)
+        request.device_session_key = SimpleLazyObject(lambda: device.session_key)
 
         # пропускаем дальше
         response = self.get_response(request)
 
         # гарантируем наличие cookie gid (HttpOnly)
-        if request.COOKIES.get(gid_cookie_name) != gid:
-            _set_cookie(response, gid_cookie_name, gid, years=5, http_only=True)
+        if device.gid_is_new:
+            _set_cookie(response, _cookie_name_gid(), device.gid, years=5, http_only=True)
 
         # ВАЖНО: НЕ перезаписываем клиентский fp_cookie!
         # Клиент сам управляет этим cookie через JavaScript
         # Мы только ставим его при первом заходе, если его нет
+        fp_cookie_name = _cookie_name_fp()
         if fp_cookie_name and not request.COOKIES.get(fp_cookie_name):
             # Только если cookie полностью отсутствует - ставим server_fp как fallback
-            _set_cookie(response, fp_cookie_name, server_fp, years=3, http_only=False)
+            _set_cookie(response, fp_cookie_name, device.server_fp, years=3, http_only=False)
 
-        # диагностические заголовки
-        try:
-            response["X-Device-Fingerprint"] = primary_fp[:32]
-            response["X-Device-Client-FP"] = (client_fp[:32] if client_fp else "none")
-            response["X-Device-Server-FP"] = server_fp[:32]
-            response["X-Device-GID"] = gid
-        except Exception:
-            pass
+        # диагностические заголовки (DEVICE_FP_DEBUG_HEADERS)
+        if self.debug_headers:
+            try:
+                response["X-Device-Fingerprint"] = device.fp[:32]
+                response["X-Device-Client-FP"] = (device.client_fp[:32] if device.client_fp else "none")
+                response["X-Device-Server-FP"] = device.server_fp[:32]
+                response["X-Device-GID"] = device.gid
+            except Exception:
+                pass
 
         return response
 
@@ -399,40 +436,16 @@ class AntiAbuseShieldMiddleware:
     """
     Лёгкая преграда до API генерации.
     Реальное ограничение гостя делает FreeGrant/кошелёк.
-    Здесь ведём счётчик попыток (скользящее окно) для fp|gid|ip_hash.
+    Здесь считаем попытки сабмита (GCRA, services.ratelimit) по fp|gid|ip_hash.
     """
 
     # Пути, которые проверяем жёстче (ендпоинт сабмита)
     WATCH_PATHS = ("/generate/api/submit/",)
 
-    # Лимит попыток за окно
-    WINDOW_SECONDS = 60 * 10  # 10 минут
-    WINDOW_LIMIT = 12         # попыток сабмита за окно на один ключ (fp/gid/ip_hash)
-
     def __init__(self, get_response):
         self.get_response = get_response
         self.enabled = bool(getattr(settings, "ENABLE_ANTIABUSE", False))
 
-    def _bump_counter(self, key: str) -> int:
-        """Инкремент счётчика в кэше с TTL. Возвращает новое значение."""
-        if not key:
-            return 0
-        ttl = self.WINDOW_SECONDS
-
-        try:
-            cache.add(key, 0, ttl)
-            return cache.incr(key)
-        except ValueError:
-            try:
-                cur = int(cache.get(key) or 0)
-                val = cur + 1
-                cache.set(key, val, ttl)
-                return val
-            except Exception:
-                return 0
-        except Exception:
-            return 0
-
     def __call__(self, request):
         request.abuse_soft_block = False
 
@@ -444,26 +457,11 @@ class AntiAbuseShieldMiddleware:
         if request.method != "POST" or not any(path.startswith(p) for p in self.WATCH_PATHS):
             return self.get_response(request)
 
-        # соберём ключи
-        gid = getattr(request, "device_gid", None) or (request.COOKIES.get(_cookie_name_gid()) or "")
-        fp = getattr(request, "device_fp", None) or _hard_fp(request)
-        ip_h = getattr(request, "device_ip_hash", None) or _ip_hash(request)
-
-        keys = []
-        if fp and len(fp) <= 64:
-            keys.append(f"abuse:w:{fp}")
-        if gid and len(gid) <= 64:
-            keys.append(f"abuse:w_gid:{gid}")
-        if ip_h and len(ip_h) <= 64:
-            keys.append(f"abuse:w_ip:{ip_h}")
-
-        exceeded = False
-        for k in keys:
-            val = self._bump_counter(k)
-            if val > self.WINDOW_LIMIT:
-                exceeded = True
-
-        request.abuse_soft_block = exceeded
+        # лимит попыток сабмита — политика "submit" (ключи fp/gid/ip) в settings.RATE_LIMITS
+        decision = ratelimit.hit("submit", request)
+        request.abuse_soft_block = not decision
+        if not decision and ratelimit.policy("submit").enforce:
+            return ratelimit.too_many(decision)
         return self.get_response(request)
 
 
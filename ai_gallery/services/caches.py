@@ -0,0 +1,184 @@
+"""
+Именованные уровни кэша (см. CACHES в settings).
+
+    ratelimit() — счётчики и лимиты, общие для всех воркеров
+    pages()     — кэш страниц/фрагментов
+    provider()  — состояние интеграций (локи, версии ключей)
+    get_tiered() — L1 в памяти процесса (CACHE_L1_TTL) поверх общего уровня
+    Journal     — журнал изменённых id для write-behind счётчиков
+
+Если алиас не настроен (старые настройки/тесты), используется default.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, InvalidCacheBackendError
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def get(alias: str) -> BaseCache:
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def ratelimit() -> BaseCache:
+    return get("ratelimit")
+
+
+def pages() -> BaseCache:
+    return get("pages")
+
+
+def provider() -> BaseCache:
+    return get("provider")
+
+
+def local() -> BaseCache:
+    return get("local")
+
+
+def incr(cache: BaseCache, key: str, ttl: int) -> int:
+    """Атомарный счётчик с TTL окна (add + incr). Возвращает новое значение, 0 — при сбое кэша."""
+    try:
+        cache.add(key, 0, ttl)
+        return cache.incr(key)
+    except ValueError:
+        # ключ истёк между add и incr
+        try:
+            cache.set(key, 1, ttl)
+            return 1
+        except Exception:
+            return 0
+    except Exception as e:
+        log.warning("caches.incr(%s) failed: %s", key, e)
+        return 0
+
+
+def get_tiered(
+    key: str,
+    loader: Callable[[], Any],
+    *,
+    timeout: Optional[int] = None,
+    alias: str = "default",
+    l1_timeout: Optional[int] = None,
+) -> Any:
+    """
+    Значение из L1 → общего уровня → loader().
+    L1 живёт CACHE_L1_TTL секунд, поэтому после delete_tiered() другие процессы
+    увидят изменение не позже чем через этот интервал.
+    """
+    l1 = local()
+    l1_ttl = int(getattr(settings, "CACHE_L1_TTL", 5)) if l1_timeout is None else l1_timeout
+    l1_key = f"{alias}:{key}"
+
+    value = l1.get(l1_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    shared = get(alias)
+    try:
+        value = shared.get(key, _MISSING)
+    except Exception as e:
+        log.warning("caches: shared tier %s unavailable: %s", alias, e)
+        value = _MISSING
+
+    if value is _MISSING:
+        value = loader()
+        try:
+            shared.set(key, value, timeout)
+        except Exception as e:
+            log.warning("caches: cannot store %s in %s: %s", key, alias, e)
+
+    if l1_ttl > 0:
+        l1.set(l1_key, value, l1_ttl)
+    return value
+
+
+def delete_tiered(key: str, *, alias: str = "default") -> None:
+    local().delete(f"{alias}:{key}")
+    try:
+        get(alias).delete(key)
+    except Exception as e:
+        log.warning("caches: cannot delete %s from %s: %s", key, alias, e)
+
+
+class Journal:
+    """
+    Журнал изменённых id в кэше для write-behind счётчиков (значения лежат в
+    кэше, в БД их переносит периодическая задача).
+
+    append(pk) — записать, что у pk есть что переносить; drain(apply) — разобрать
+    новые записи пачками по chunk и передать apply(ids) уникальные id. Если apply
+    бросил исключение, курсор не двигается: те же записи разберутся в следующий раз.
+
+    key — шаблон с {part}: "guest:{part}" → guest:seq, guest:log:{n},
+    guest:cursor, guest:gap.
+    """
+
+    def __init__(self, cache: BaseCache, key: str, *, ttl: int = 24 * 60 * 60):
+        self.cache = cache
+        self.ttl = ttl
+        self._key = key
+
+    def _k(self, part: str) -> str:
+        return self._key.format(part=part)
+
+    def _log_key(self, n: int) -> str:
+        return f"{self._k('log')}:{n}"
+
+    def append(self, pk: int) -> None:
+        seq = incr(self.cache, self._k("seq"), None)
+        if not seq:
+            return
+        try:
+            self.cache.set(self._log_key(seq), pk, self.ttl)
+        except Exception as e:
+            log.warning("caches.Journal: cannot log %s in %s: %s", pk, self._k("log"), e)
+
+    def drain(self, apply: Callable[[List[int]], int], *, chunk: int = 500) -> int:
+        """Разбирает журнал до текущего конца. → сумма значений apply()."""
+        cache = self.cache
+        chunk = max(1, int(chunk))
+        cursor_key, gap_key = self._k("cursor"), self._k("gap")
+        cursor = int(cache.get(cursor_key) or 0)
+        seq = int(cache.get(self._k("seq")) or 0)
+        if seq < cursor:
+            # счётчик журнала истёк/сброшен — начинаем заново
+            cursor = 0
+
+        # Номер выдаётся раньше, чем пишется сама запись: пропуск может быть ещё
+        # «в полёте». На таком пропуске останавливаемся один раз; если к следующему
+        # разбору запись так и не появилась — пропускаем её.
+        known_gap = int(cache.get(gap_key) or 0)
+
+        total = 0
+        while cursor < seq:
+            upto = min(seq, cursor + chunk)
+            numbers = range(cursor + 1, upto + 1)
+            entries = cache.get_many([self._log_key(n) for n in numbers])
+            present = []
+            for n in numbers:
+                if self._log_key(n) in entries:
+                    present.append(n)
+                elif n != known_gap:
+                    cache.set(gap_key, n, None)
+                    upto = n - 1
+                    break
+            ids = list(dict.fromkeys(int(entries[self._log_key(n)]) for n in present))
+            total += apply(ids) if ids else 0
+            cache.delete_many([self._log_key(n) for n in range(cursor + 1, upto + 1)])
+            stopped = upto < min(seq, cursor + chunk)
+            cursor = upto
+            cache.set(cursor_key, cursor, None)
+            if stopped:
+                break
+        return total
@@ -0,0 +1,112 @@
+"""
+Кэш API-ключа Runware в памяти процесса.
+
+Раньше каждый запрос к провайдеру делал load_dotenv(override=True) — чтение .env
+и мутацию os.environ. Теперь ключ читается один раз и перечитывается только если:
+  • изменился mtime файла .env (проверка не чаще RUNWARE_KEY_RECHECK_SEC);
+  • кто-то вызвал request_reload() (manage.py reload_runware_key) — версия
+    хранится в общем кэше, поэтому перечитают все воркеры;
+  • явно вызван reload() в текущем процессе.
+Так сохраняется ротация ключа без перезапуска, но без дискового I/O на горячем пути.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from ai_gallery.services import caches
+
+log = logging.getLogger(__name__)
+
+ENV_VAR = "RUNWARE_API_KEY"
+VERSION_CACHE_KEY = "credentials:runware:version"
+
+_lock = threading.Lock()
+_state = {
+    "key": None,        # Optional[str]
+    "mtime": None,      # Optional[float]
+    "version": None,    # Optional[int]
+    "checked_at": 0.0,
+}
+
+
+def _env_file() -> Path:
+    custom = getattr(settings, "RUNWARE_ENV_FILE", "") or ""
+    if custom:
+        return Path(custom)
+    return Path(getattr(settings, "BASE_DIR", ".")) / ".env"
+
+
+def _env_mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def _shared_version() -> Optional[int]:
+    try:
+        return caches.provider().get(VERSION_CACHE_KEY)
+    except Exception:
+        return None
+
+
+def _read_key(path: Path) -> str:
+    """Значение из .env приоритетнее окружения процесса (как было с override=True)."""
+    key = ""
+    if path.exists():
+        try:
+            from dotenv import dotenv_values
+            key = (dotenv_values(path).get(ENV_VAR) or "").strip()
+        except Exception as e:
+            log.warning("credentials: failed to parse %s: %s", path, e)
+    if not key:
+        key = (os.getenv(ENV_VAR) or getattr(settings, ENV_VAR, "") or "").strip()
+    return key
+
+
+def _load(mtime: Optional[float], version: Optional[int]) -> str:
+    path = _env_file()
+    key = _read_key(path)
+    if key and _state["key"] and key != _state["key"]:
+        log.info("credentials: Runware API key rotated")
+    _state.update(key=key, mtime=mtime, version=version, checked_at=time.monotonic())
+    return key
+
+
+def get_runware_api_key() -> str:
+    """Текущий ключ Runware (пустая строка, если не задан)."""
+    now = time.monotonic()
+    recheck = float(getattr(settings, "RUNWARE_KEY_RECHECK_SEC", 5))
+    if _state["key"] is not None and now - _state["checked_at"] < recheck:
+        return _state["key"]
+
+    with _lock:
+        if _state["key"] is not None and time.monotonic() - _state["checked_at"] < recheck:
+            return _state["key"]
+        mtime = _env_mtime(_env_file())
+        version = _shared_version()
+        if _state["key"] is None or mtime != _state["mtime"] or version != _state["version"]:
+            return _load(mtime, version)
+        _state["checked_at"] = time.monotonic()
+        return _state["key"]
+
+
+def reload() -> str:
+    """Принудительно перечитать ключ в текущем процессе."""
+    with _lock:
+        return _load(_env_mtime(_env_file()), _shared_version())
+
+
+def request_reload() -> int:
+    """Попросить все процессы перечитать ключ при следующем обращении."""
+    version = int(time.time() * 1000)
+    caches.provider().set(VERSION_CACHE_KEY, version, timeout=None)
+    reload()
+    return version
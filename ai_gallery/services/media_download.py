@@ -0,0 +1,152 @@
+"""
+Потоковое скачивание внешних медиа (видео с CDN провайдера) в storage.
+
+Файл никогда не собирается в памяти целиком:
+  • чанки пишутся в SpooledTemporaryFile (в RAM только до MEDIA_DOWNLOAD_SPOOL_BYTES,
+    дальше — на диск) или в переданный файловый объект;
+  • лимит размера (MEDIA_DOWNLOAD_MAX_BYTES) проверяется и по Content-Length, и по факту;
+  • Content-Type проверяется до чтения тела (HTML-страница ошибки CDN не сохранится как .mp4);
+  • при обрыве следующая попытка докачивает с места остановки (Range), если сервер это умеет;
+  • по ходу считается sha256 — для логов и сверки.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+
+from ai_gallery.services import provider_http
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+VIDEO_CONTENT_TYPES = ("video/", "application/octet-stream", "binary/octet-stream")
+
+
+class DownloadError(Exception):
+    pass
+
+
+@dataclass
+class DownloadResult:
+    name: str           # имя в storage (может отличаться от запрошенного)
+    url: str            # storage.url(name)
+    size: int
+    sha256: str
+    content_type: str
+
+
+def _max_bytes() -> int:
+    return int(getattr(settings, "MEDIA_DOWNLOAD_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+def _content_type_ok(ctype: str, allowed: Optional[Iterable[str]]) -> bool:
+    if not allowed or not ctype:
+        return True
+    ctype = ctype.split(";", 1)[0].strip().lower()
+    return any(ctype.startswith(a) for a in allowed)
+
+
+def download_to_file(
+    url: str,
+    fileobj: BinaryIO,
+    *,
+    max_bytes: Optional[int] = None,
+    allowed_types: Optional[Iterable[str]] = VIDEO_CONTENT_TYPES,
+    attempts: int = 3,
+    headers: Optional[dict] = None,
+    endpoint: str = "download",
+) -> tuple[int, str, str]:
+    """
+    Скачивает url в fileobj (открыт на запись в бинарном режиме, позиция 0).
+    Возвращает (размер, sha256, content-type). Бросает DownloadError.
+    """
+    limit = _max_bytes() if max_bytes is None else max_bytes
+    base_headers = {"User-Agent": "AI-Gallery/1.0", "Accept": "video/*,*/*;q=0.8"}
+    base_headers.update(headers or {})
+
+    digest = hashlib.sha256()
+    written = 0
+    ctype = ""
+    last_err: Optional[Exception] = None
+
+    for attempt in range(attempts):
+        req_headers = dict(base_headers)
+        if written:
+            req_headers["Range"] = f"bytes={written}-"
+        try:
+            with provider_http.get(url, endpoint=endpoint, headers=req_headers,
+                                   allow_redirects=True, stream=True) as r:
+                if written and r.status_code != 206:
+                    # сервер не умеет Range — начинаем заново
+                    fileobj.seek(0)
+                    fileobj.truncate()
+                    digest = hashlib.sha256()
+                    written = 0
+                r.raise_for_status()
+
+                ctype = r.headers.get("Content-Type", "") or ctype
+                if not _content_type_ok(ctype, allowed_types):
+                    raise DownloadError(f"unexpected content-type {ctype!r}")
+
+                length = r.headers.get("Content-Length")
+                if length and length.isdigit() and written + int(length) > limit:
+                    raise DownloadError(f"file too large: {written + int(length)} > {limit}")
+
+                start = written
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    written += len(chunk)
+                    if written > limit:
+                        raise DownloadError(f"file too large: > {limit}")
+                    fileobj.write(chunk)
+                    digest.update(chunk)
+
+                if length and length.isdigit() and written - start != int(length):
+                    raise IOError(f"incomplete body: {written - start} of {length}")
+            if not written:
+                raise DownloadError("empty body")
+            return written, digest.hexdigest(), ctype
+        except DownloadError:
+            raise
+        except Exception as e:
+            last_err = e
+            log.warning("media_download: attempt %d/%d for %s failed at %d bytes: %s",
+                        attempt + 1, attempts, url, written, e)
+            if attempt < attempts - 1:
+                time.sleep(1.5 * (attempt + 1))
+
+    raise DownloadError(f"download failed after {attempts} attempts: {last_err}")
+
+
+def download_to_storage(
+    url: str,
+    rel_path: str,
+    *,
+    storage: Storage = default_storage,
+    max_bytes: Optional[int] = None,
+    allowed_types: Optional[Iterable[str]] = VIDEO_CONTENT_TYPES,
+    attempts: int = 3,
+) -> DownloadResult:
+    """Скачивает url и сохраняет в storage под rel_path без загрузки файла в память целиком."""
+    spool = int(getattr(settings, "MEDIA_DOWNLOAD_SPOOL_BYTES", 8 * 1024 * 1024))
+    with tempfile.SpooledTemporaryFile(max_size=spool) as tmp:
+        size, sha, ctype = download_to_file(
+            url, tmp, max_bytes=max_bytes, allowed_types=allowed_types, attempts=attempts)
+        tmp.seek(0)
+        name = storage.save(rel_path, File(tmp, name=rel_path))
+    return DownloadResult(name=name, url=storage.url(name), size=size, sha256=sha, content_type=ctype)
+
+
+def save_file_to_storage(path: str, rel_path: str, *, storage: Storage = default_storage) -> str:
+    """Сохраняет локальный файл в storage потоково. Возвращает имя в storage."""
+    with open(path, "rb") as f:
+        return storage.save(rel_path, File(f, name=rel_path))
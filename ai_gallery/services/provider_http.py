@@ -0,0 +1,133 @@
+"""
+Общий HTTP-клиент для внешних провайдеров (Runware, CDN результатов).
+
+Один пул соединений на процесс: keep-alive, настраиваемый размер пула,
+ограниченные повторы с джиттером и таймауты по типу эндпоинта.
+После fork (Celery prefork) сессия пересоздаётся, чтобы дочерние процессы
+не делили сокеты родителя.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+log = logging.getLogger(__name__)
+
+Timeout = Union[float, Tuple[float, float]]
+
+# Таймауты (connect, read) по типу запроса; переопределяются RUNWARE_HTTP_TIMEOUTS
+DEFAULT_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    "submit": (15, 180),      # sync-генерация (ждём результат в ответе)
+    "submit_async": (15, 60),  # async-сабмит, ответ — только taskUUID
+    "status": (10, 30),       # getResponse
+    "upload": (15, 60),       # imageUpload / mediaStorage
+    "download": (15, 300),    # скачивание готовых файлов с CDN
+    "translate": (5, 10),     # DeepL (generate/services/translator.py)
+    "default": (10, 60),
+}
+
+_lock = threading.Lock()
+_sessions: Dict[str, Tuple[int, requests.Session]] = {}
+
+
+def _retry_policy() -> Retry:
+    """
+    Повторяем только то, что безопасно:
+      • ошибки соединения — для любых методов (запрос ещё не ушёл);
+      • 429/502/503/504 и обрывы чтения — только для идемпотентных методов.
+    POST к Runware создаёт задачи, поэтому его статус-коды отдаются вызывающему коду как есть.
+    """
+    total = int(getattr(settings, "RUNWARE_HTTP_MAX_RETRIES", 3))
+    kwargs = dict(
+        total=total,
+        connect=total,
+        read=total,
+        status=total,
+        backoff_factor=float(getattr(settings, "RUNWARE_HTTP_BACKOFF", 0.5)),
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    jitter = float(getattr(settings, "RUNWARE_HTTP_BACKOFF_JITTER", 0.5))
+    try:
+        return Retry(backoff_jitter=jitter, backoff_max=30, **kwargs)
+    except TypeError:
+        # urllib3 < 2.0 не знает backoff_jitter/backoff_max
+        return Retry(**kwargs)
+
+
+def _build_session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=int(getattr(settings, "RUNWARE_HTTP_POOL_CONNECTIONS", 10)),
+        pool_maxsize=int(getattr(settings, "RUNWARE_HTTP_POOL_MAXSIZE", 32)),
+        max_retries=_retry_policy(),
+        pool_block=False,
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"User-Agent": "AI-Gallery/1.0"})
+    return s
+
+
+def get_session(name: str = "runware") -> requests.Session:
+    """Возвращает общую для процесса сессию с пулом соединений."""
+    pid = os.getpid()
+    entry = _sessions.get(name)
+    if entry is not None and entry[0] == pid:
+        return entry[1]
+    with _lock:
+        entry = _sessions.get(name)
+        if entry is None or entry[0] != pid:
+            entry = (pid, _build_session())
+            _sessions[name] = entry
+            log.debug("provider_http: new session %r for pid %s", name, pid)
+    return entry[1]
+
+
+def reset_sessions() -> None:
+    """Закрывает все сессии (например, после смены настроек пула)."""
+    with _lock:
+        for _pid, s in _sessions.values():
+            try:
+                s.close()
+            except Exception:
+                pass
+        _sessions.clear()
+
+
+def timeout_for(endpoint: str) -> Tuple[float, float]:
+    overrides = getattr(settings, "RUNWARE_HTTP_TIMEOUTS", None) or {}
+    t = overrides.get(endpoint) or DEFAULT_TIMEOUTS.get(endpoint) or DEFAULT_TIMEOUTS["default"]
+    return tuple(t)  # type: ignore[return-value]
+
+
+def request(
+    method: str,
+    url: str,
+    *,
+    endpoint: str = "default",
+    timeout: Optional[Timeout] = None,
+    session: str = "runware",
+    **kwargs,
+) -> requests.Response:
+    """Тонкая обёртка над Session.request с таймаутом по типу эндпоинта."""
+    return get_session(session).request(
+        method, url, timeout=timeout if timeout is not None else timeout_for(endpoint), **kwargs
+    )
+
+
+def post(url: str, *, endpoint: str = "default", **kwargs) -> requests.Response:
+    return request("POST", url, endpoint=endpoint, **kwargs)
+
+
+def get(url: str, *, endpoint: str = "default", **kwargs) -> requests.Response:
+    return request("GET", url, endpoint=endpoint, **kwargs)
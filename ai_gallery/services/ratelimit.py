@@ -0,0 +1,268 @@
+"""
+Единый rate limiter: политики из settings.RATE_LIMITS, алгоритм GCRA.
+
+Политика — лимит «N за окно» и набор ключей, по каждому из которых лимит
+считается отдельно (запрос отклоняется, если превышен любой):
+
+    user   — id пользователя (только для авторизованных)
+    fp     — основной fingerprint (request.device из DeviceFingerprintMiddleware)
+    gid    — стойкий cookie gid
+    ip     — хэш IP клиента (X-Original-Forwarded-For / X-Forwarded-For, как в middleware)
+    actor  — user, а для гостя — ip
+
+    RATE_LIMITS = {
+        "like": {"rate": "1/2s", "keys": ["actor"]},
+        "submit": {"rate": "12/10m", "keys": ["fp", "gid", "ip"], "enforce": False},
+    }
+
+GCRA хранит на ключ одно число — «теоретическое время прибытия» (TAT):
+допускает всплеск до N запросов и дальше равномерно N за окно, без
+ступенек фиксированных корзин. На Redis (алиас ratelimit) проверка и запись —
+один Lua-скрипт по времени сервера Redis, там же счётчики allowed/denied
+политики. Без Redis или при его сбое — тот же алгоритм в памяти процесса
+(лимит становится «на воркер»).
+
+stats() — накопленные allowed/denied по политикам (для мониторинга; считаются
+проверки ключей, запрос по трём ключам даёт три отметки).
+"""
+from __future__ import annotations
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache.backends.redis import RedisCache
+
+from ai_gallery.services import caches
+
+log = logging.getLogger(__name__)
+
+KEY_KINDS = ("user", "fp", "gid", "ip", "actor")
+
+_UNITS = {
+    "s": 1, "sec": 1, "second": 1,
+    "m": 60, "min": 60, "minute": 60,
+    "h": 3600, "hour": 3600,
+    "d": 86400, "day": 86400,
+}
+_RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*$")
+
+# KEYS[1] — TAT, KEYS[2]/KEYS[3] — счётчики allowed/denied политики
+# ARGV: интервал между запросами и окно (мс). → {allowed, retry_after_ms, remaining}
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - now > window then
+    redis.call('INCR', KEYS[3])
+    return {0, new_tat - now - window, 0}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+redis.call('INCR', KEYS[2])
+return {1, 0, math.floor((window - (new_tat - now)) / interval)}
+"""
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    limit: int
+    window: float          # сек
+    keys: Tuple[str, ...]
+    enforce: bool = True   # False — только пометить запрос, не отклонять
+
+    @property
+    def interval(self) -> float:
+        return self.window / self.limit
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0   # сек до следующей попытки (если отклонён)
+    remaining: int = 0         # сколько ещё запросов допускается сразу
+    key: str = ""              # ключ, по которому отклонён
+
+    def __bool__(self) -> bool:
+        return self.allowed
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """'60/min', '12/10m', '1/2s' → (лимит, окно в секундах)."""
+    m = _RATE_RE.match((rate or "").lower())
+    if not m or m.group(3) not in _UNITS:
+        raise ValueError(f"Некорректный лимит: {rate!r}")
+    limit = int(m.group(1))
+    window = int(m.group(2) or 1) * _UNITS[m.group(3)]
+    if limit <= 0:
+        raise ValueError(f"Некорректный лимит: {rate!r}")
+    return limit, float(window)
+
+
+def policy(name: str) -> Policy:
+    conf = (getattr(settings, "RATE_LIMITS", {}) or {}).get(name)
+    if conf is None:
+        raise KeyError(f"Неизвестная политика rate limit: {name}")
+    limit, window = parse_rate(conf["rate"])
+    keys = tuple(conf.get("keys") or ("actor",))
+    unknown = set(keys) - set(KEY_KINDS)
+    if unknown:
+        raise ValueError(f"Политика {name}: неизвестные ключи {sorted(unknown)}")
+    return Policy(name, limit, window, keys, bool(conf.get("enforce", True)))
+
+
+# ── Ключи клиента ────────────────────────────────────────────────────────────
+
+
+def _key_values(request, kinds: Iterable[str]) -> List[Tuple[str, str]]:
+    from ai_gallery.middleware import _cookie_name_gid, _hard_fp, _ip_hash
+
+    request = getattr(request, "_request", request)   # DRF Request
+    device = getattr(request, "device", None)
+    user = getattr(request, "user", None)
+    user_id = user.id if user is not None and user.is_authenticated else None
+
+    out = []
+    for kind in kinds:
+        if kind == "user":
+            value = str(user_id) if user_id else ""
+        elif kind == "fp":
+            value = device.fp if device is not None else _hard_fp(request)
+        elif kind == "gid":
+            value = device.gid if device is not None else (request.COOKIES.get(_cookie_name_gid()) or "")
+        elif kind == "ip":
+            value = device.ip_hash if device is not None else _ip_hash(request)
+        else:  # actor
+            value = f"u{user_id}" if user_id else (device.ip_hash if device is not None else _ip_hash(request))
+        value = (value or "").strip()
+        if value and len(value) <= 128:
+            out.append((kind, value))
+    return out
+
+
+# ── Хранилища ────────────────────────────────────────────────────────────────
+
+
+_script = None   # redis.commands.core.Script: EVALSHA, при NOSCRIPT — EVAL
+
+
+def _redis_check(cache: RedisCache, p: Policy, key: str) -> Decision:
+    global _script
+    client = cache._cache.get_client(key, write=True)
+    if _script is None:
+        _script = client.register_script(_GCRA_LUA)
+    allowed, retry_ms, remaining = _script(
+        keys=[cache.make_key(key), cache.make_key(_stat_key(p.name, "allowed")),
+              cache.make_key(_stat_key(p.name, "denied"))],
+        args=[max(1, int(p.interval * 1000)), int(p.window * 1000)],
+        client=client,
+    )
+    return Decision(bool(allowed), retry_after=int(retry_ms) / 1000, remaining=int(remaining))
+
+
+class _LocalStore:
+    """GCRA в памяти процесса: запасной путь без Redis."""
+
+    MAX_KEYS = 10_000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        self.counters: Dict[Tuple[str, str], int] = {}
+
+    def check(self, p: Policy, key: str) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            new_tat = tat + p.interval
+            if new_tat - now > p.window:
+                self._count(p.name, "denied")
+                return Decision(False, retry_after=new_tat - now - p.window)
+            self._tat[key] = new_tat
+            self._tat.move_to_end(key)
+            while len(self._tat) > self.MAX_KEYS:
+                self._tat.popitem(last=False)
+            self._count(p.name, "allowed")
+            return Decision(True, remaining=int((p.window - (new_tat - now)) // p.interval))
+
+    def _count(self, name: str, outcome: str) -> None:
+        self.counters[(name, outcome)] = self.counters.get((name, outcome), 0) + 1
+
+
+_local = _LocalStore()
+
+
+def _stat_key(name: str, outcome: str) -> str:
+    return f"rl:stats:{name}:{outcome}"
+
+
+def _check(p: Policy, key: str) -> Decision:
+    cache = caches.ratelimit()
+    if isinstance(cache, RedisCache):
+        try:
+            return _redis_check(cache, p, key)
+        except Exception as e:
+            log.warning("ratelimit: redis check %s failed, local fallback: %s", key, e)
+    return _local.check(p, key)
+
+
+# ── Публичное API ───────────────────────────────────────────────────────────
+
+
+def hit(name: str, request, *, scope: str = "") -> Decision:
+    """
+    Учитывает запрос по политике name для всех её ключей.
+    scope — доп. часть ключа (например, id объекта: лимит на лайк одной публикации).
+    """
+    p = policy(name)
+    denied: Optional[Decision] = None
+    remaining = p.limit
+    for kind, value in _key_values(request, p.keys):
+        key = f"rl:{p.name}:{scope}:{kind}:{value}" if scope else f"rl:{p.name}:{kind}:{value}"
+        decision = _check(p, key)
+        remaining = min(remaining, decision.remaining)
+        if not decision.allowed and (denied is None or decision.retry_after > denied.retry_after):
+            denied = Decision(False, decision.retry_after, 0, kind)
+    if denied is not None:
+        log.info("ratelimit: %s exceeded by %s (retry in %.1fs)", p.name, denied.key, denied.retry_after)
+        return denied
+    return Decision(True, remaining=remaining)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """{политика: {"allowed": n, "denied": n}} — общие счётчики Redis, иначе этого процесса."""
+    names = list((getattr(settings, "RATE_LIMITS", {}) or {}).keys())
+    out = {name: {"allowed": 0, "denied": 0} for name in names}
+    cache = caches.ratelimit()
+    if isinstance(cache, RedisCache):
+        try:
+            client = cache._cache.get_client()
+            keys = [(n, o) for n in names for o in ("allowed", "denied")]
+            values = client.mget([cache.make_key(_stat_key(n, o)) for n, o in keys])
+            for (n, o), v in zip(keys, values):
+                out[n][o] = int(v or 0)
+            return out
+        except Exception as e:
+            log.warning("ratelimit: cannot read stats: %s", e)
+    for (n, o), v in _local.counters.items():
+        out.setdefault(n, {"allowed": 0, "denied": 0})[o] = v
+    return out
+
+
+def too_many(decision: Decision):
+    """Стандартный ответ 429 (JSON) с Retry-After."""
+    from django.http import JsonResponse
+
+    response = JsonResponse({"ok": False, "error": "Too many requests"}, status=429)
+    response["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+    return response
@@ -0,0 +1,203 @@
+"""
+Хранилище байтов результатов генерации вне Django-кэша.
+
+Раньше готовые изображения клались целиком в cache (LocMemCache, TTL 30 дней):
+каждый воркер держал у себя мегабайты, недоступные другим процессам.
+Теперь байты лежат на диске в content-addressed виде (sha256 → файл),
+а в кэше остаётся только маленькая запись-указатель:
+
+    genblob:<job_id> → {"sha": "...", "ctype": "image/jpeg", "size": 123456}
+
+Каталог общий для web и celery (RESULT_BLOB_DIR), объём ограничен
+RESULT_BLOB_MAX_BYTES: при превышении удаляются давно не читанные файлы (LRU по mtime).
+Чтение обновляет mtime не чаще раза в RESULT_BLOB_TOUCH_INTERVAL — LRU грубее,
+зато горячий путь чтения не пишет в файловую систему на каждый запрос.
+Внешний URL (если CDN не отдал файл) хранится отдельным ключом genimgurl:<job_id>.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+META_TTL = 60 * 60 * 24 * 30  # 30 дней — как раньше у байтов в кэше
+
+_evict_lock = threading.Lock()
+_last_evict = {"at": 0.0}
+
+
+def meta_key(job_id: int) -> str:
+    return f"genblob:{job_id}"
+
+
+def url_key(job_id: int) -> str:
+    return f"genimgurl:{job_id}"
+
+
+def _root() -> Path:
+    custom = getattr(settings, "RESULT_BLOB_DIR", "") or ""
+    return Path(custom) if custom else Path(settings.BASE_DIR) / "var" / "result_blobs"
+
+
+def _path(sha: str) -> Path:
+    return _root() / sha[:2] / sha
+
+
+def _max_bytes() -> int:
+    return int(getattr(settings, "RESULT_BLOB_MAX_BYTES", 512 * 1024 * 1024))
+
+
+def _touch(path: Path) -> bool:
+    """Отметка чтения для LRU (utime, только если mtime старше интервала). False — файла нет."""
+    try:
+        mtime = path.stat().st_mtime
+        if time.time() - mtime >= int(getattr(settings, "RESULT_BLOB_TOUCH_INTERVAL", 3600)):
+            os.utime(path, None)
+    except OSError:
+        return False
+    return True
+
+
+def put(job_id: int, content: bytes, content_type: str = "image/jpeg", *, timeout: int = META_TTL) -> str:
+    """Сохраняет байты результата и указатель на них. Возвращает sha256."""
+    sha = hashlib.sha256(content).hexdigest()
+    path = _path(sha)
+    try:
+        if path.exists():
+            os.utime(path, None)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # атомарная запись: временный файл в том же каталоге + rename
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+    except OSError as e:
+        log.warning("result_blobs: cannot write %s: %s", path, e)
+        return sha
+
+    cache.set(meta_key(job_id), {"sha": sha, "ctype": content_type, "size": len(content)}, timeout=timeout)
+    _maybe_evict()
+    return sha
+
+
+def get_meta(job_id: int) -> Optional[dict]:
+    meta = cache.get(meta_key(job_id))
+    return meta if isinstance(meta, dict) and meta.get("sha") else None
+
+
+def locate(job_id: int) -> Optional[Tuple[Path, dict]]:
+    """
+    Путь к файлу результата и его метаданные — без чтения байтов
+    (для условных ответов и X-Accel-Redirect). sha256 из meta годится как ETag.
+    """
+    meta = get_meta(job_id)
+    if not meta:
+        return None
+    path = _path(meta["sha"])
+    if not _touch(path):  # заодно проверка, что файл на месте
+        cache.delete(meta_key(job_id))
+        return None
+    return path, meta
+
+
+def relpath(sha: str) -> str:
+    """Путь файла относительно RESULT_BLOB_DIR (для internal-location nginx)."""
+    return f"{sha[:2]}/{sha}"
+
+
+def get(job_id: int) -> Optional[Tuple[bytes, str]]:
+    """(байты, content-type) или None, если указателя/файла нет."""
+    meta = get_meta(job_id)
+    if not meta:
+        return None
+    path = _path(meta["sha"])
+    try:
+        content = path.read_bytes()
+    except OSError:
+        cache.delete(meta_key(job_id))
+        return None
+    _touch(path)
+    return content, meta.get("ctype") or "image/jpeg"
+
+
+def set_url(job_id: int, url: str, *, timeout: int = META_TTL) -> None:
+    cache.set(url_key(job_id), url, timeout=timeout)
+
+
+def get_url(job_id: int) -> Optional[str]:
+    return cache.get(url_key(job_id))
+
+
+def delete(job_id: int) -> None:
+    """
+    Удаляет указатели задачи. Сам файл не трогаем: он может быть общим
+    для нескольких задач (одинаковые байты) и уйдёт при LRU-вытеснении.
+    """
+    cache.delete_many([meta_key(job_id), url_key(job_id)])
+
+
+def delete_many(job_ids) -> None:
+    """delete() для пачки задач одним запросом к кэшу."""
+    keys = [k for job_id in job_ids for k in (meta_key(job_id), url_key(job_id))]
+    if keys:
+        cache.delete_many(keys)
+
+
+def _maybe_evict() -> None:
+    interval = float(getattr(settings, "RESULT_BLOB_EVICT_INTERVAL", 60))
+    now = time.monotonic()
+    if now - _last_evict["at"] < interval or not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        _last_evict["at"] = now
+        evict()
+    finally:
+        _evict_lock.release()
+
+
+def evict(max_bytes: Optional[int] = None) -> int:
+    """Удаляет самые давно использованные файлы, пока объём > лимита. Возвращает число удалённых."""
+    limit = _max_bytes() if max_bytes is None else max_bytes
+    root = _root()
+    if not root.exists():
+        return 0
+
+    files = []
+    total = 0
+    for sub in os.scandir(root):
+        if not sub.is_dir():
+            continue
+        for entry in os.scandir(sub.path):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+
+    if total <= limit:
+        return 0
+
+    removed = 0
+    for _mtime, size, p in sorted(files):
+        try:
+            os.remove(p)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        if total <= limit:
+            break
+    log.info("result_blobs: evicted %d files, %d bytes left", removed, total)
+    return removed
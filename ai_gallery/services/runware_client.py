@@ -2,12 +2,12 @@
 import uuid
 import logging
 import base64
-import os
 import json
 from urllib.parse import quote
 from typing import Optional, Dict, Any, List
 from django.conf import settings
-from dotenv import load_dotenv
+
+from ai_gallery.services import credentials, provider_http
 
 logger = logging.getLogger(__name__)
 
@@ -19,10 +19,9 @@ def send_debug_log(message: str, data: dict = None):
 
 def _get_api_key() -> str:
     """
-    Динамически загружает API ключ из .env файла.
+    API ключ из кэша процесса (перечитывается при изменении .env, см. credentials).
     """
-    load_dotenv(override=True)
-    key = os.getenv("RUNWARE_API_KEY", "")
+    key = credentials.get_runware_api_key()
     if not key:
         raise RunwareError("RUNWARE_API_KEY не задан")
     return key
@@ -61,14 +60,14 @@ def generate_image_via_rest(prompt: str, model_id: str | None, width=1024, heigh
         "outputType": "URL",
         "checkNSFW": bool(settings.RUNWARE_CHECK_NSFW),
     }]
-    r = requests.post(
+    r = provider_http.post(
         settings.RUNWARE_API_URL,
         json=payload,
         headers={
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         },
-        timeout=60,
+        endpoint="submit",
     )
     r.raise_for_status()
     data = r.json()
@@ -651,15 +650,14 @@ def generate_video_via_rest(
                 payload = _sanitize_default_duration(payload)
             except Exception:
                 pass
-        r = requests.post(
+        r = provider_http.post(
             settings.RUNWARE_API_URL,
             json=payload,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
             },
-            # Connect timeout 15s, Read timeout 180s (3 минуты)
-            timeout=(15, 180),
+            endpoint="submit",
         )
 
         # Логируем статус код
@@ -709,14 +707,14 @@ def generate_video_via_rest(
                 payload_async = [dict(payload[0])]
                 payload_async[0]["deliveryMethod"] = "async"
                 # Post again as async
-                r2 = requests.post(
+                r2 = provider_http.post(
                     settings.RUNWARE_API_URL,
                     json=payload_async,
                     headers={
                         "Authorization": f"Bearer {api_key}",
                         "Content-Type": "application/json",
                     },
-                    timeout=(15, 60),
+                    endpoint="submit_async",
                 )
                 try:
                     data2 = r2.json()
@@ -791,14 +789,14 @@ def generate_video_via_rest(
         try:
             payload_async = [dict(payload[0])]
             payload_async[0]["deliveryMethod"] = "async"
-            r2 = requests.post(
+            r2 = provider_http.post(
                 settings.RUNWARE_API_URL,
                 json=payload_async,
                 headers={
                     "Authorization": f"Bearer {api_key}",
                     "Content-Type": "application/json",
                 },
-                timeout=(15, 60),
+                endpoint="submit_async",
             )
             try:
                 data2 = r2.json()
@@ -863,14 +861,14 @@ def _upload_image_to_runware(image_bytes: bytes) -> str:
             payload_item["file"] = data_uri  # на некоторых аккаунтах требуется 'file'
         payload = [payload_item]
         logger.info(f"Загрузка изображения в Runware через taskType='{task_type}' ...")
-        r = requests.post(
+        r = provider_http.post(
             settings.RUNWARE_API_URL,
             json=payload,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
             },
-            timeout=(15, 60),
+            endpoint="upload",
         )
         logger.info(f"Upload '{task_type}' status: {r.status_code}")
         try:
@@ -979,14 +977,14 @@ def _upload_audio_to_runware(audio_bytes: bytes, filename: str = "audio.mp3") ->
     logger.info(f"Загрузка аудио файла в Runware: {filename} ({len(audio_bytes)} bytes)")
 
     try:
-        r = requests.post(
+        r = provider_http.post(
             settings.RUNWARE_API_URL,
             json=payload,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
             },
-            timeout=(15, 60),
+            endpoint="upload",
         )
 
         logger.info(f"Audio upload status: {r.status_code}")
@@ -1120,7 +1118,7 @@ def generate_video_from_image(
         # Всегда пытаемся конвертировать внешний URL в предыдущую загрузку (UUID),
         # чтобы поведение совпадало с Face Retouch и работало одинаково на локалке/проде.
         try:
-            r = requests.get(image_url, timeout=20)
+            r = provider_http.get(image_url, endpoint="download", timeout=20)
             if r.ok and r.content:
                 try:
                     b = r.content
@@ -1420,15 +1418,14 @@ def generate_video_from_image(
             payload = _sanitize_default_duration(payload)
         except Exception:
             pass
-        r = requests.post(
+        r = provider_http.post(
             settings.RUNWARE_API_URL,
             json=payload,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
             },
-            # Connect 15s, Read 180s для синхронного ожидания
-            timeout=(15, 180),
+            endpoint="submit",
         )
 
         # Логируем статус код
@@ -1471,14 +1468,14 @@ def generate_video_from_image(
                     logger.warning("I2V: frameImages rejected (%s). Retrying with data URI fallback...", code or '400')
                     payload_retry = [dict(payload[0])]
                     payload_retry[0]["frameImages"] = _normalize_frame_images([data_uri_fallback])
-                    r_retry = requests.post(
+                    r_retry = provider_http.post(
                         settings.RUNWARE_API_URL,
                         json=payload_retry,
                         headers={
                             "Authorization": f"Bearer {api_key}",
                             "Content-Type": "application/json",
                         },
-                        timeout=(15, 180),
+                        endpoint="submit",
                     )
                     logger.info(f"I2V retry with data URI status: {r_retry.status_code}")
                     try:
@@ -1521,14 +1518,14 @@ def generate_video_from_image(
             try:
                 payload_async = [dict(payload[0])]
                 payload_async[0]["deliveryMethod"] = "async"
-                r2 = requests.post(
+                r2 = provider_http.post(
                     settings.RUNWARE_API_URL,
                     json=payload_async,
                     headers={
                         "Authorization": f"Bearer {api_key}",
                         "Content-Type": "application/json",
                     },
-                    timeout=(15, 60),
+                    endpoint="submit_async",
                 )
                 try:
                     data2 = r2.json()
@@ -1592,14 +1589,14 @@ def generate_video_from_image(
         try:
             payload_async = [dict(payload[0])]
             payload_async[0]["deliveryMethod"] = "async"
-            r2 = requests.post(
+            r2 = provider_http.post(
                 settings.RUNWARE_API_URL,
                 json=payload_async,
                 headers={
                     "Authorization": f"Bearer {api_key}",
                     "Content-Type": "application/json",
                 },
-                timeout=(15, 60),
+                endpoint="submit_async",
             )
             try:
                 data2 = r2.json()
@@ -1646,62 +1643,131 @@ def check_video_status(task_uuid: str) -> Dict[str, Any]:
           - data: [ { taskUUID, status, videoURL|url|videos, ... } ] или []
           - status: "success"/"succeeded"/"completed"/"processing"/"failed"/...
     """
+    return check_video_statuses([task_uuid]).get(str(task_uuid), {'data': [], 'status': ''})
+
+
+def check_video_statuses(task_uuids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Пакетная проверка статусов: один getResponse-запрос на пачку задач
+    (RUNWARE_MAX_TASKS_PER_REQUEST штук). Возвращает {taskUUID: <формат check_video_status>}.
+    Любая временная ошибка оставляет задачи в статусе processing.
+
+    Пачку, отклонённую целиком (HTTP 400), перепроверяем по одной задаче:
+    ошибка провайдера по конкретному taskUUID ('errors') переводит в failed
+    только эту задачу, остальные опрашиваются как обычно.
+    """
+    uuids = [str(u) for u in task_uuids if u]
+    out: Dict[str, Dict[str, Any]] = {u: {'data': [], 'status': 'processing'} for u in uuids}
+    if not uuids:
+        return out
+
     api_key = _get_api_key()
+    size = max(1, int(getattr(settings, "RUNWARE_MAX_TASKS_PER_REQUEST", 10)))
 
-    payload = [{
-        "taskType": "getResponse",
-        "taskUUID": str(task_uuid),
-    }]
+    for i in range(0, len(uuids), size):
+        _check_video_chunk(uuids[i:i + size], out, api_key)
+    return out
+
+
+# Ошибки getResponse, означающие «результата ещё нет», а не провал задачи
+_PENDING_ERROR_HINTS = ("processing", "pending", "progress", "not ready", "not yet")
 
+
+def is_pending_error(err: Any) -> bool:
+    """Ошибка getResponse (dict из errors или текст) — «ещё не готово», а не провал."""
+    if isinstance(err, dict):
+        err = err.get('message') or err.get('code') or ''
+    text = str(err or '').lower()
+    return any(h in text for h in _PENDING_ERROR_HINTS)
+
+
+def _video_task_errors(data: Any, chunk: List[str]) -> Dict[str, str]:
+    """{taskUUID: текст ошибки} из поля errors; ошибки «ещё не готово» пропускаем."""
+    out: Dict[str, str] = {}
+    errors = data.get('errors') if isinstance(data, dict) else None
+    for err in errors if isinstance(errors, list) else []:
+        if not isinstance(err, dict):
+            continue
+        tu = str(err.get('taskUUID') or (chunk[0] if len(chunk) == 1 else ''))
+        msg = str(err.get('message') or err.get('code') or 'provider error')
+        if tu in chunk and not is_pending_error(msg):
+            out[tu] = msg[:300]
+    return out
+
+
+def _check_video_chunk(chunk: List[str], out: Dict[str, Dict[str, Any]], api_key: str) -> None:
+    payload = [{"taskType": "getResponse", "taskUUID": u} for u in chunk]
     try:
-        r = requests.post(
+        r = provider_http.post(
             settings.RUNWARE_API_URL,
             json=payload,
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
             },
-            timeout=30,
+            endpoint="status",
         )
-        logger.info(f"Status check(getResponse) for {task_uuid}: HTTP {r.status_code}")
+        logger.info(f"Status check(getResponse) for {len(chunk)} task(s): HTTP {r.status_code}")
 
         # 401 — неправильный ключ
         if r.status_code == 401:
             raise RunwareError("Unauthorized - check API key")
 
-        # 400 у некоторых провайдеров (например, ByteDance) означает «пока нет результата»
+        # 400 на пачку — возможно, из-за одной задачи: проверяем каждую отдельно.
+        # У одиночной задачи 400 у некоторых провайдеров (например, ByteDance)
+        # означает «пока нет результата», поэтому провал — только по её errors.
         if r.status_code == 400:
-            return {'data': [], 'status': 'processing'}
+            if len(chunk) > 1:
+                for tu in chunk:
+                    _check_video_chunk([tu], out, api_key)
+                return
+            try:
+                body = r.json()
+            except ValueError:
+                body = None
+            for tu, msg in _video_task_errors(body, chunk).items():
+                out[tu] = {'data': [], 'status': 'failed', 'error': msg}
+            return
 
         # 5xx — временная ошибка сервера: считаем, что всё ещё обрабатывается
         if r.status_code >= 500:
             logger.warning(f"Runware server error {r.status_code} on getResponse")
-            return {'data': [], 'status': 'processing'}
+            return
 
         # Парсим JSON
         try:
             data = r.json()
         except ValueError:
             logger.error(f"Status parse error: {r.text[:300]}")
-            return {'data': [], 'status': 'processing'}
-
-        # Нормализуем формат
-        if isinstance(data, dict) and 'data' in data:
-            items = data.get('data') or []
-            if isinstance(items, list) and items:
-                item = items[0] if isinstance(items[0], dict) else {}
-                st = (item.get('status') or data.get('status') or 'processing')
-                return {'data': items, 'status': st}
-            return {'data': [], 'status': data.get('status', 'processing')}
-
-        return {'data': [], 'status': 'processing'}
-
+            return
+
+        if not isinstance(data, dict):
+            return
+        for tu, msg in _video_task_errors(data, chunk).items():
+            out[tu] = {'data': [], 'status': 'failed', 'error': msg}
+        if 'data' not in data:
+            return
+
+        # Раскладываем ответы по taskUUID; если пачка из одной задачи — элементы без taskUUID тоже её
+        items = data.get('data') or []
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            tu = str(item.get('taskUUID') or (chunk[0] if len(chunk) == 1 else ''))
+            if tu in out:
+                grouped.setdefault(tu, []).append(item)
+        for tu, its in grouped.items():
+            st = (its[0].get('status') or data.get('status') or 'processing')
+            out[tu] = {'data': its, 'status': st}
+        if len(chunk) == 1 and not grouped and out[chunk[0]]['status'] != 'failed':
+            out[chunk[0]] = {'data': [], 'status': data.get('status', 'processing')}
+
+    except RunwareError:
+        raise
     except requests.exceptions.Timeout:
-        logger.warning(f"Timeout checking status for {task_uuid}")
-        return {'data': [], 'status': 'processing'}
+        logger.warning(f"Timeout checking status for {len(chunk)} task(s)")
     except requests.exceptions.RequestException as e:
         logger.warning(f"Request error checking status: {e}")
-        return {'data': [], 'status': 'processing'}
     except Exception as e:
         logger.error(f"Unexpected error checking status: {e}", exc_info=True)
-        return {'data': [], 'status': 'processing'}
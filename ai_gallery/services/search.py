@@ -0,0 +1,228 @@
+"""
+Поиск по пользователям, публикациям галереи и статьям блога.
+
+PostgreSQL (production):
+  • подстрока/префикс по коротким полям — обычные icontains/istartswith:
+    Django строит UPPER(col::text) LIKE UPPER(%s), и под это выражение есть
+    триграммные GIN-индексы pg_trgm (миграции dashboard 0011, gallery 0033,
+    blog 0006), так что поиск по подстроке не сканирует таблицу;
+  • статьи — полнотекстовый tsvector по title/excerpt/body (конфигурация
+    simple: без стемминга, одинаково для ru/en), каждое слово запроса —
+    префикс (слово:*), что даёт «поиск по мере набора». Выражение совпадает
+    с индексным blog_post_search_tsv.
+SQLite (dev): те же icontains без индексов, для статей — по title/excerpt/body.
+
+Ранжирование: совпадение с начала поля выше, затем популярность
+(Profile.followers_count, likes_count), затем новизна.
+
+search() — сводная выдача для /api/search/, кэшируется на SEARCH_CACHE_TTL
+(L1 процесса + алиас pages): набор текста порождает одни и те же префиксы.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Dict, Iterable, List, Sequence
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import BooleanField, Case, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.translation import get_language
+
+from ai_gallery.services import caches
+
+TYPES = ("users", "photos", "videos", "posts")
+MIN_QUERY = 2
+MAX_QUERY = 64
+MAX_WORDS = 8
+
+TS_CONFIG = "simple"   # менять вместе с индексом blog_post_search_tsv
+
+
+def normalize(q) -> str:
+    return " ".join(str(q or "").split())[:MAX_QUERY]
+
+
+def is_postgres(qs) -> bool:
+    return connections[qs.db].vendor == "postgresql"
+
+
+def _contains(fields: Iterable[str], q: str) -> Q:
+    cond = Q()
+    for field in fields:
+        cond |= Q(**{f"{field}__icontains": q})
+    return cond
+
+
+def _prefix_rank(fields: Iterable[str], q: str) -> Case:
+    """0 — поле начинается с запроса, 1 — совпадение в середине."""
+    cond = Q()
+    for field in fields:
+        cond |= Q(**{f"{field}__istartswith": q})
+    return Case(When(cond, then=Value(0)), default=Value(1), output_field=IntegerField())
+
+
+def filter_text(qs, fields: Sequence[str], q):
+    """Подстрока в любом из полей (на PostgreSQL — по триграммным индексам)."""
+    q = normalize(q)
+    if not q:
+        return qs
+    return qs.filter(_contains(fields, q))
+
+
+# ── Статьи: tsvector ─────────────────────────────────────────────────────────
+
+
+def _ts_prefix_query(q: str) -> str:
+    """'нейросеть пор' → 'нейросеть:* & пор:*' (только \\w — безопасно для to_tsquery)."""
+    words = re.findall(r"\w+", q.lower())[:MAX_WORDS]
+    return " & ".join(f"{w}:*" for w in words)
+
+
+def _post_tsv(table: str) -> str:
+    text = " || ' ' || ".join(f'"{table}"."{c}"' for c in ("title", "excerpt", "body"))
+    return f"to_tsvector('{TS_CONFIG}'::regconfig, {text})"
+
+
+def filter_posts(qs, q):
+    """Статьи по заголовку, анонсу и тексту; на PostgreSQL — полнотекстовый индекс."""
+    q = normalize(q)
+    if not q:
+        return qs
+    tsq = _ts_prefix_query(q)
+    if is_postgres(qs) and tsq:
+        sql = f"{_post_tsv(qs.model._meta.db_table)} @@ to_tsquery('{TS_CONFIG}', %s)"
+        return qs.filter(RawSQL(sql, (tsq,), output_field=BooleanField()))
+    return qs.filter(_contains(("title", "excerpt", "body"), q))
+
+
+def _rank_posts(qs, q):
+    tsq = _ts_prefix_query(q)
+    if is_postgres(qs) and tsq:
+        sql = f"ts_rank({_post_tsv(qs.model._meta.db_table)}, to_tsquery('{TS_CONFIG}', %s))"
+        return qs.annotate(rank=RawSQL(sql, (tsq,), output_field=FloatField())).order_by(
+            "-rank", "-published_at", "-id"
+        )
+    return qs.annotate(prefix_rank=_prefix_rank(("title",), q)).order_by("prefix_rank", "-published_at", "-id")
+
+
+# ── Выборки по типам ─────────────────────────────────────────────────────────
+
+
+def users(q="", *, exclude=None):
+    """Пользователи по username/имени/фамилии; популярные (по подписчикам) выше."""
+    qs = get_user_model().objects.select_related("profile")
+    if exclude:
+        qs = qs.exclude(pk=exclude)
+    order = [F("profile__followers_count").desc(nulls_last=True), "username"]
+    q = normalize(q)
+    if q:
+        qs = qs.filter(_contains(("username", "first_name", "last_name"), q)).annotate(
+            prefix_rank=_prefix_rank(("username", "first_name"), q)
+        )
+        order.insert(0, "prefix_rank")
+    return qs.order_by(*order)
+
+
+def photos(q):
+    from gallery.models import PublicPhoto
+
+    q = normalize(q)
+    return (
+        PublicPhoto.objects.filter(is_active=True, hidden=False)
+        .filter(_contains(("title", "caption"), q))
+        .annotate(prefix_rank=_prefix_rank(("title",), q))
+        .select_related("category")
+        .order_by("prefix_rank", "-likes_count", "-created_at")
+    )
+
+
+def videos(q):
+    from gallery.models import PublicVideo
+
+    q = normalize(q)
+    return (
+        PublicVideo.objects.filter(is_active=True, hidden=False)
+        .filter(_contains(("title", "caption"), q))
+        .annotate(prefix_rank=_prefix_rank(("title",), q))
+        .select_related("category", "source_job")
+        .order_by("prefix_rank", "-likes_count", "-created_at")
+    )
+
+
+def posts(q):
+    from blog.models import Post
+
+    q = normalize(q)
+    return _rank_posts(filter_posts(Post.objects.published().defer("body"), q), q)
+
+
+# ── Сводная выдача ───────────────────────────────────────────────────────────
+
+
+def _file_url(f) -> str:
+    try:
+        return f.url if f else ""
+    except Exception:
+        return ""
+
+
+def _user_item(u) -> dict:
+    from django.urls import reverse
+
+    prof = getattr(u, "profile", None)
+    return {
+        "username": u.username,
+        "name": (u.first_name or "")[:64],
+        "avatar_url": _file_url(prof.avatar) if prof else "",
+        "followers": prof.followers_count if prof else 0,
+        "url": reverse("profile_short", args=[u.username]),
+    }
+
+
+def _photo_item(p) -> dict:
+    return {"id": p.pk, "title": p.title, "thumb": _file_url(p.image),
+            "likes": p.likes_count, "url": p.get_absolute_url()}
+
+
+def _video_item(v) -> dict:
+    return {"id": v.pk, "title": v.title, "thumb": _file_url(v.thumbnail),
+            "likes": v.likes_count, "url": v.get_absolute_url()}
+
+
+def _post_item(p) -> dict:
+    return {"id": p.pk, "title": p.title, "excerpt": (p.excerpt or "")[:160],
+            "cover": _file_url(p.cover), "url": p.get_absolute_url()}
+
+
+_SOURCES = {
+    "users": (users, _user_item),
+    "photos": (photos, _photo_item),
+    "videos": (videos, _video_item),
+    "posts": (posts, _post_item),
+}
+
+
+def _collect(q: str, types: Sequence[str], limit: int) -> Dict[str, List[dict]]:
+    out = {}
+    for t in types:
+        select, item = _SOURCES[t]
+        out[t] = [item(obj) for obj in select(q)[:limit]]
+    return out
+
+
+def search(q, types: Sequence[str] = TYPES, limit: int = 5) -> Dict[str, List[dict]]:
+    """{тип: [элементы]} по запросу; короче MIN_QUERY символов — пустые списки."""
+    q = normalize(q).lower()
+    types = [t for t in types if t in _SOURCES]
+    if len(q) < MIN_QUERY:
+        return {t: [] for t in types}
+    digest = hashlib.sha1(f"{q}|{','.join(types)}|{limit}|{get_language()}".encode("utf-8")).hexdigest()
+    return caches.get_tiered(
+        f"search:{digest}",
+        lambda: _collect(q, types, limit),
+        timeout=int(getattr(settings, "SEARCH_CACHE_TTL", 30)),
+        alias="pages",
+    )
@@ -0,0 +1,138 @@
+"""
+Отдача файлов с условными ответами без чтения содержимого.
+
+ETag / Last-Modified берутся из метаданных (size + mtime файла или sha256 из
+result_blobs), поэтому 304 на If-None-Match / If-Modified-Since не стоит ни
+одного read(). Тело ответа:
+
+  • SENDFILE_BACKEND = "nginx" — пустой ответ с X-Accel-Redirect на internal-location
+    (см. nginx/conf.d: /_protected/media/, /_protected/blobs/): воркер только
+    авторизует запрос, байты и Range отдаёт nginx;
+  • иначе — FileResponse из Python, один диапазон Range → 206, диапазон за
+    концом файла → 416.
+"""
+from __future__ import annotations
+
+import os
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def accel_enabled() -> bool:
+    return (getattr(settings, "SENDFILE_BACKEND", "") or "").lower() == "nginx"
+
+
+def stat_validators(path: str) -> Optional[Tuple[str, float, int]]:
+    """(etag, mtime, size) по stat() файла или None, если файла нет."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"', st.st_mtime, st.st_size
+
+
+def not_modified(request: HttpRequest, etag: str, last_modified: Optional[float]) -> Optional[HttpResponse]:
+    """304/412 по заголовкам запроса или None — тогда отдаём тело."""
+    resp = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified) if last_modified else None)
+    if resp is not None:
+        _set_validators(resp, etag, last_modified)
+    return resp
+
+
+def _set_validators(resp: HttpResponse, etag: str, last_modified: Optional[float], cache_control: str = IMMUTABLE) -> None:
+    resp["ETag"] = etag
+    if last_modified:
+        resp["Last-Modified"] = http_date(last_modified)
+    resp["Cache-Control"] = cache_control
+
+
+# диапазон синтаксически верный, но целиком за концом файла → 416
+UNSATISFIABLE = (-1, -1)
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Один диапазон bytes=a-b / a- / -n → (start, end); UNSATISFIABLE, если
+    начало за концом файла (или -0); None — заголовок не разобран (отдаём целиком).
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[6:].split(",")[0].strip()
+    start_s, _, end_s = spec.partition("-")
+    try:
+        if start_s == "":
+            length = int(end_s)
+            if length <= 0 or size <= 0:
+                return UNSATISFIABLE
+            return max(0, size - length), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end < start):
+        return None
+    if start >= size:
+        return UNSATISFIABLE
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def serve_file(
+    request: HttpRequest,
+    path: str,
+    *,
+    accel_uri: str,
+    content_type: str,
+    etag: str,
+    last_modified: Optional[float],
+    size: int,
+    cache_control: str = IMMUTABLE,
+) -> HttpResponse:
+    """Файл с диска: через nginx (X-Accel-Redirect) или FileResponse с Range."""
+    if accel_enabled():
+        resp = HttpResponse(content_type=content_type)
+        resp["X-Accel-Redirect"] = quote(accel_uri)
+        _set_validators(resp, etag, last_modified, cache_control)
+        return resp
+
+    rng = None
+    if request.method == "GET" and "HTTP_RANGE" in request.META:
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if not if_range or if_range == etag:
+            rng = _parse_range(request.META["HTTP_RANGE"], size)
+
+    if rng == UNSATISFIABLE:
+        resp = HttpResponse(status=416)
+        resp["Content-Range"] = f"bytes */{size}"
+        resp["Accept-Ranges"] = "bytes"
+        return resp
+
+    f = open(path, "rb")
+    if rng is None:
+        resp = FileResponse(f, content_type=content_type)
+    else:
+        start, end = rng
+        f.seek(start)
+        resp = HttpResponse(f.read(end - start + 1), content_type=content_type, status=206)
+        f.close()
+        resp["Content-Range"] = f"bytes {start}-{end}/{size}"
+    resp["Accept-Ranges"] = "bytes"
+    _set_validators(resp, etag, last_modified, cache_control)
+    return resp
+
+
+def media_accel_uri(name: str) -> str:
+    prefix = getattr(settings, "SENDFILE_MEDIA_PREFIX", "/_protected/media/")
+    return prefix.rstrip("/") + "/" + name.lstrip("/")
+
+
+def blob_accel_uri(rel: str) -> str:
+    prefix = getattr(settings, "SENDFILE_BLOB_PREFIX", "/_protected/blobs/")
+    return prefix.rstrip("/") + "/" + rel.lstrip("/")
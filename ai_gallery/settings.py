@@ -2,6 +2,7 @@
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from kombu import Queue
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext_lazy as _
 
@@ -67,6 +68,11 @@ LANGUAGE_COOKIE_SECURE = not DEBUG
 # ── feature flags ─────────────────────────────────────────────────────────────
 FREE_FOR_STAFF = env_bool("FREE_FOR_STAFF", True)
 ENABLE_DEVICE_FP = env_bool("ENABLE_DEVICE_FP", True)   # ВКЛЮЧЕНО
+# Пути, которые DeviceFingerprintMiddleware пропускает целиком (STATIC_URL и MEDIA_URL — всегда)
+DEVICE_FP_SKIP_PREFIXES = ["/health/", "/sitemap.xml", "/robots.txt", "/favicon.ico",
+                           *env_list("DEVICE_FP_SKIP_PREFIXES")]
+# X-Device-* в ответах — только для отладки
+DEVICE_FP_DEBUG_HEADERS = env_bool("DEVICE_FP_DEBUG_HEADERS", DEBUG)
 ENABLE_ANTIABUSE = env_bool("ENABLE_ANTIABUSE", True)   # ВКЛЮЧЕНО
 ENABLE_DRF_THROTTLE = env_bool("ENABLE_DRF_THROTTLE", True)
 AGE_GATE_ENABLED = env_bool("AGE_GATE_ENABLED", False)
@@ -177,11 +183,38 @@ WSGI_APPLICATION = "ai_gallery.wsgi.application"
 ASGI_APPLICATION = "ai_gallery.asgi.application"
 
 # ── Channels (WebSocket) ──────────────────────────────────────────────────────
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# Слой каналов общий для всех процессов (web/asgi/celery) только через Redis:
+# уведомления и статусы задач шлются из воркеров, а сокеты держит ASGI-сервис.
+# Без CHANNEL_LAYER_URL/REDIS_CACHE_URL (локальная разработка) — InMemory, в пределах процесса.
+#   CHANNEL_LAYER_CAPACITY      — сообщений в очереди канала до ChannelFull
+#   CHANNEL_LAYER_EXPIRY        — сек, сколько неполученное сообщение ждёт клиента
+#   CHANNEL_LAYER_GROUP_EXPIRY  — сек, членство в группе без переподключения
+#   CHANNEL_LAYER_MAX_CONNECTIONS — размер пула соединений к Redis на процесс/loop
+CHANNEL_LAYER_URL = os.getenv("CHANNEL_LAYER_URL", "") or os.getenv("REDIS_CACHE_URL", "")
+if CHANNEL_LAYER_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [{
+                    "address": CHANNEL_LAYER_URL,
+                    "max_connections": env_int("CHANNEL_LAYER_MAX_CONNECTIONS", 100),
+                    "socket_connect_timeout": 2,
+                    "health_check_interval": 30,
+                }],
+                "prefix": os.getenv("CHANNEL_LAYER_PREFIX", "aig:ws"),
+                "capacity": env_int("CHANNEL_LAYER_CAPACITY", 500),
+                "expiry": env_int("CHANNEL_LAYER_EXPIRY", 30),
+                "group_expiry": env_int("CHANNEL_LAYER_GROUP_EXPIRY", 24 * 60 * 60),
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
     }
-}
 
 # ── database (PostgreSQL в продакшн, SQLite в dev) ──────────────────────────
 if DEBUG:
@@ -294,6 +327,24 @@ WHITENOISE_MAX_AGE = 31536000
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Байты результатов генерации (content-addressed, LRU по размеру) — вне Django-кэша.
+# Каталог должен быть общим для web и celery и не раздаваться nginx.
+RESULT_BLOB_DIR = os.getenv("RESULT_BLOB_DIR", str(BASE_DIR / "var" / "result_blobs"))
+RESULT_BLOB_MAX_BYTES = env_int("RESULT_BLOB_MAX_BYTES", 512 * 1024 * 1024)
+RESULT_BLOB_EVICT_INTERVAL = env_int("RESULT_BLOB_EVICT_INTERVAL", 60)
+# чтение обновляет mtime (LRU) не чаще раза в интервал, сек
+RESULT_BLOB_TOUCH_INTERVAL = env_int("RESULT_BLOB_TOUCH_INTERVAL", 3600)
+
+# Отдача файлов через nginx (X-Accel-Redirect): "nginx" или "" — байты отдаёт Django.
+# Префиксы — internal-location из nginx/conf.d/pixera-ssl.conf.
+SENDFILE_BACKEND = os.getenv("SENDFILE_BACKEND", "")
+SENDFILE_MEDIA_PREFIX = os.getenv("SENDFILE_MEDIA_PREFIX", "/_protected/media/")
+SENDFILE_BLOB_PREFIX = os.getenv("SENDFILE_BLOB_PREFIX", "/_protected/blobs/")
+
+# Потоковое скачивание видео с CDN провайдера (ai_gallery.services.media_download)
+MEDIA_DOWNLOAD_MAX_BYTES = env_int("MEDIA_DOWNLOAD_MAX_BYTES", 1024 * 1024 * 1024)
+MEDIA_DOWNLOAD_SPOOL_BYTES = env_int("MEDIA_DOWNLOAD_SPOOL_BYTES", 8 * 1024 * 1024)
+
 # Video tools
 # Path to ffmpeg binary for video compression. Override via env if needed.
 FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
@@ -311,14 +362,57 @@ USE_X_FORWARDED_HOST = True
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
 # ── caching ───────────────────────────────────────────────────────────────────
-CACHES = {
-    "default": {
+# Общий уровень — Redis (счётчики, лимиты, страницы видны всем воркерам).
+# Без REDIS_CACHE_URL (локальная разработка) все алиасы — LocMemCache.
+# Алиасы:
+#   default   — общий кэш приложения
+#   ratelimit — счётчики анти-абуза и rate limit (короткие TTL)
+#   pages     — кэш страниц/фрагментов
+#   provider  — состояние интеграций (Runware: локи поллера, версии ключей)
+#   local     — L1 в памяти процесса с коротким TTL поверх общего уровня
+# CACHE_KEY_VERSION — общий сброс всех ключей (увеличить при несовместимом формате).
+REDIS_CACHE_URL = os.getenv("REDIS_CACHE_URL", "")
+CACHE_KEY_VERSION = env_int("CACHE_KEY_VERSION", 1)
+CACHE_L1_TTL = env_int("CACHE_L1_TTL", 5)
+CACHE_TTLS = {
+    "default": env_int("CACHE_TTL_DEFAULT", 60 * 60),
+    "ratelimit": env_int("CACHE_TTL_RATELIMIT", 60),
+    "pages": env_int("CACHE_TTL_PAGES", 5 * 60),
+    "provider": env_int("CACHE_TTL_PROVIDER", 60 * 60),
+}
+
+
+def _cache_alias(namespace: str) -> dict:
+    if REDIS_CACHE_URL:
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+            "TIMEOUT": CACHE_TTLS[namespace],
+            "KEY_PREFIX": f"aig:{namespace}",
+            "VERSION": CACHE_KEY_VERSION,
+            "OPTIONS": {"socket_connect_timeout": 2, "socket_timeout": 2},
+        }
+    return {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "ai-gallery-cache",
-        "TIMEOUT": 60 * 60,
+        "LOCATION": f"ai-gallery-{namespace}",
+        "TIMEOUT": CACHE_TTLS[namespace],
+        "VERSION": CACHE_KEY_VERSION,
     }
+
+
+CACHES = {name: _cache_alias(name) for name in CACHE_TTLS}
+CACHES["local"] = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "ai-gallery-l1",
+    "TIMEOUT": CACHE_L1_TTL,
+    "VERSION": CACHE_KEY_VERSION,
+    "OPTIONS": {"MAX_ENTRIES": env_int("CACHE_L1_MAX_ENTRIES", 1000)},
 }
 
+# Сводка пользователя для шаблонов (баланс, аватар, подписки) — dashboard.services.viewer;
+# сбрасывается сигналами, TTL — страховка от пропущенных событий.
+VIEWER_SUMMARY_TTL = env_int("VIEWER_SUMMARY_TTL", 10 * 60)
+
 # ── DRF ───────────────────────────────────────────────────────────────────────
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
@@ -330,16 +424,33 @@ if ENABLE_DRF_THROTTLE:
     REST_FRAMEWORK.update(
         {
             "DEFAULT_THROTTLE_CLASSES": [
-                "rest_framework.throttling.AnonRateThrottle",
-                "rest_framework.throttling.UserRateThrottle",
+                "ai_gallery.throttling.AnonPolicyThrottle",
+                "ai_gallery.throttling.UserPolicyThrottle",
             ],
-            "DEFAULT_THROTTLE_RATES": {
-                "anon": os.getenv("DRF_THROTTLE_ANON", "60/min"),
-                "user": os.getenv("DRF_THROTTLE_USER", "120/min"),
-            },
         }
     )
 
+# ── Rate limit (ai_gallery.services.ratelimit) ───────────────────────────────
+# Политика: "rate" — "N/окно" (60/min, 12/10m, 1/2s), "keys" — по чему считать
+# (user, fp, gid, ip, actor = user или ip гостя), "enforce": False — только
+# пометить запрос (request.abuse_soft_block), не отклонять.
+RATE_LIMITS = {
+    "submit": {
+        "rate": os.getenv("RATE_LIMIT_SUBMIT", "12/10m"),
+        "keys": ["fp", "gid", "ip"],
+        "enforce": env_bool("RATE_LIMIT_SUBMIT_ENFORCE", False),
+    },
+    "like": {"rate": os.getenv("RATE_LIMIT_LIKE", "1/2s"), "keys": ["actor"]},
+    "api_anon": {"rate": os.getenv("DRF_THROTTLE_ANON", "60/min"), "keys": ["ip"]},
+    "api_user": {"rate": os.getenv("DRF_THROTTLE_USER", "120/min"), "keys": ["user"]},
+    "search": {"rate": os.getenv("RATE_LIMIT_SEARCH", "30/10s"), "keys": ["actor"]},
+}
+# Поиск (/api/search/): кэш выдачи по запросу, сек
+SEARCH_CACHE_TTL = env_int("SEARCH_CACHE_TTL", 30)
+
+# Токен для /health/ratelimit/ (заголовок X-Metrics-Token); без него — только staff
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 # ── Email ─────────────────────────────────────────────────────────────────────
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "Pixera <no-reply@pixera.com>")
@@ -356,6 +467,15 @@ X_FRAME_OPTIONS = "DENY"
 
 SESSION_COOKIE_AGE = env_int("SESSION_COOKIE_AGE", 60 * 60 * 24 * 60)  # 60 дней
 SESSION_SAVE_EVERY_REQUEST = env_bool("SESSION_SAVE_EVERY_REQUEST", False)
+# SESSION_BACKEND: db (по умолчанию) | cached_db (чтение из кэша, запись в БД) | cache (только кэш).
+# signed_cookies не подходит: session_key гостя хранится в полях max_length=40.
+_SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+}
+SESSION_ENGINE = _SESSION_ENGINES[os.getenv("SESSION_BACKEND", "db")]
+SESSION_CACHE_ALIAS = os.getenv("SESSION_CACHE_ALIAS", "default")
 
 # ── Logging ───────────────────────────────────────────────────────────────────
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -398,26 +518,91 @@ CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
 CELERY_BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": 3600, "max_connections": 5000}
 
 CELERY_QUEUE_SUBMIT = os.getenv("CELERY_QUEUE_SUBMIT", "runware_submit")
+# Фоновые/периодические задачи (outbox уведомлений, сбросы счётчиков, уборка)
+CELERY_QUEUE_BACKGROUND = os.getenv("CELERY_QUEUE_BACKGROUND", "default")
 CELERY_TASK_DEFAULT_QUEUE = CELERY_QUEUE_SUBMIT
+# Worker без -Q слушает все очереди отсюда; с -Q — перечислите обе
+CELERY_TASK_QUEUES = (
+    Queue(CELERY_QUEUE_SUBMIT, routing_key=CELERY_QUEUE_SUBMIT),
+    Queue(CELERY_QUEUE_BACKGROUND, routing_key=CELERY_QUEUE_BACKGROUND),
+)
 CELERY_TASK_ROUTES = {
+    "dashboard.tasks.deliver_notifications": {"queue": CELERY_QUEUE_BACKGROUND},
+    "dashboard.tasks.sweep_notifications": {"queue": CELERY_QUEUE_BACKGROUND},
+    "gallery.tasks.refresh_trending": {"queue": CELERY_QUEUE_BACKGROUND},
+    "gallery.tasks.flush_view_counters": {"queue": CELERY_QUEUE_BACKGROUND},
+    "generate.tasks.reap_jobs": {"queue": CELERY_QUEUE_BACKGROUND},
+    "generate.tasks.delete_old_unpublished_jobs": {"queue": CELERY_QUEUE_BACKGROUND},
+    "generate.tasks.reconcile_guest_quota": {"queue": CELERY_QUEUE_BACKGROUND},
     "generate.tasks.run_generation_async": {"queue": CELERY_QUEUE_SUBMIT},
     "generate.tasks.poll_runware_result": {"queue": CELERY_QUEUE_SUBMIT},
     "generate.tasks.process_video_generation_async": {"queue": CELERY_QUEUE_SUBMIT},
     "generate.tasks.poll_video_result": {"queue": CELERY_QUEUE_SUBMIT},
+    "generate.tasks.poll_runware_batch": {"queue": CELERY_QUEUE_SUBMIT},
+    "generate.tasks.run_generation_batch_async": {"queue": CELERY_QUEUE_SUBMIT},
+    "generate.tasks.image_stuck_fallback_async": {"queue": CELERY_QUEUE_SUBMIT},
 }
 
 # Celery Beat расписание для периодических задач
-from celery.schedules import crontab
 CELERY_BEAT_SCHEDULE = {
-    'delete-old-unpublished-jobs': {
-        'task': 'generate.tasks.delete_old_unpublished_jobs',
-        'schedule': crontab(hour=3, minute=0),  # Каждый день в 3:00 ночи
+    # Уборка неподтверждённых (24 ч) и неопубликованных (30 дней) задач — пачками
+    'reap-generation-jobs': {
+        'task': 'generate.tasks.reap_jobs',
+        'schedule': float(env_int("REAPER_INTERVAL", 300)),
+        'options': {'expires': 240},
+    },
+    # Пакетный опрос Runware по всем активным задачам (fallback к webhook)
+    'poll-runware-batch': {
+        'task': 'generate.tasks.poll_runware_batch',
+        'schedule': float(env_int("RUNWARE_POLL_BATCH_INTERVAL", 5)),
+        'options': {'expires': 30},
+    },
+    # Общие рейтинги трендов (gallery.services.trending)
+    'refresh-trending': {
+        'task': 'gallery.tasks.refresh_trending',
+        'schedule': float(env_int("TRENDING_REFRESH_INTERVAL", 300)),
+        'options': {'expires': 120},
+    },
+    # Страховка outbox уведомлений (dashboard.services.notify)
+    'sweep-notifications': {
+        'task': 'dashboard.tasks.sweep_notifications',
+        'schedule': float(env_int("NOTIFY_SWEEP_INTERVAL", 60)),
+        'options': {'expires': 50},
+    },
+    # Перенос буфера просмотров в БД (gallery.services.view_counter)
+    'flush-view-counters': {
+        'task': 'gallery.tasks.flush_view_counters',
+        'schedule': float(env_int("VIEW_FLUSH_INTERVAL", 30)),
+        'options': {'expires': 25},
+    },
+    # Перенос расхода гостевых грантов в БД (generate.services.guest_ledger)
+    'reconcile-guest-quota': {
+        'task': 'generate.tasks.reconcile_guest_quota',
+        'schedule': float(env_int("GUEST_LEDGER_FLUSH_INTERVAL", 30)),
+        'options': {'expires': 25},
     },
 }
 
+# Уборщик задач (generate.services.reaper)
+REAPER_UNPERSISTED_HOURS = env_int("REAPER_UNPERSISTED_HOURS", 24)
+REAPER_UNPUBLISHED_DAYS = env_int("REAPER_UNPUBLISHED_DAYS", 30)
+REAPER_CHUNK = env_int("REAPER_CHUNK", 500)
+REAPER_TIME_BUDGET = env_int("REAPER_TIME_BUDGET", 40)
+REAPER_DELETE_WORKERS = env_int("REAPER_DELETE_WORKERS", 8)
+
 # ── Runware ───────────────────────────────────────────────────────────────────
 RUNWARE_API_URL = os.getenv("RUNWARE_API_URL", "https://api.runware.ai/v1")
 RUNWARE_API_KEY = os.getenv("RUNWARE_API_KEY", "")
+# Ключ кэшируется в процессе (ai_gallery/services/credentials.py); .env проверяется на изменения
+# не чаще, чем раз в RUNWARE_KEY_RECHECK_SEC. Принудительно: manage.py reload_runware_key
+RUNWARE_ENV_FILE = os.getenv("RUNWARE_ENV_FILE", "")
+RUNWARE_KEY_RECHECK_SEC = env_int("RUNWARE_KEY_RECHECK_SEC", 5)
+# Каталог моделей/соотношений сторон в памяти процесса (generate/services/model_catalog.py):
+# версия в общем кэше проверяется не чаще MODEL_CATALOG_RECHECK_SEC, полный пересбор — раз в MAX_AGE
+MODEL_CATALOG_RECHECK_SEC = env_int("MODEL_CATALOG_RECHECK_SEC", 5)
+MODEL_CATALOG_MAX_AGE = env_int("MODEL_CATALOG_MAX_AGE", 300)
+# Ответы API библиотеки промптов (generate/services/prompt_library.py), сек; версия поднимается при правках
+PROMPT_LIBRARY_TTL = env_int("PROMPT_LIBRARY_TTL", 3600)
 RUNWARE_DEFAULT_MODEL = os.getenv("RUNWARE_DEFAULT_MODEL", "runware:101@1")
 
 _allowed_models_raw = os.getenv("RUNWARE_ALLOWED_MODELS", RUNWARE_DEFAULT_MODEL)
@@ -430,12 +615,37 @@ RUNWARE_CONNECT_TIMEOUT = env_int("RUNWARE_CONNECT_TIMEOUT", 15)
 RUNWARE_READ_TIMEOUT = env_int("RUNWARE_READ_TIMEOUT", 300)
 RUNWARE_DOWNLOAD_TIMEOUT = env_int("RUNWARE_DOWNLOAD_TIMEOUT", 300)
 
+# Общий пул HTTP-соединений к провайдеру (ai_gallery/services/provider_http.py)
+RUNWARE_HTTP_POOL_CONNECTIONS = env_int("RUNWARE_HTTP_POOL_CONNECTIONS", 10)  # число хостов в пуле
+RUNWARE_HTTP_POOL_MAXSIZE = env_int("RUNWARE_HTTP_POOL_MAXSIZE", 32)          # keep-alive соединений на хост
+RUNWARE_HTTP_MAX_RETRIES = env_int("RUNWARE_HTTP_MAX_RETRIES", 3)
+RUNWARE_HTTP_BACKOFF = float(os.getenv("RUNWARE_HTTP_BACKOFF", "0.5"))
+RUNWARE_HTTP_BACKOFF_JITTER = float(os.getenv("RUNWARE_HTTP_BACKOFF_JITTER", "0.5"))
+RUNWARE_HTTP_TIMEOUTS = {
+    "submit": (RUNWARE_CONNECT_TIMEOUT, env_int("RUNWARE_SUBMIT_READ_TIMEOUT", 180)),
+    "submit_async": (RUNWARE_CONNECT_TIMEOUT, env_int("RUNWARE_SUBMIT_ASYNC_READ_TIMEOUT", 60)),
+    "status": (env_int("RUNWARE_STATUS_CONNECT_TIMEOUT", 10), env_int("RUNWARE_STATUS_READ_TIMEOUT", 30)),
+    "upload": (RUNWARE_CONNECT_TIMEOUT, env_int("RUNWARE_UPLOAD_READ_TIMEOUT", 60)),
+    "download": (RUNWARE_CONNECT_TIMEOUT, RUNWARE_DOWNLOAD_TIMEOUT),
+}
+
 RUNWARE_FORCE_SYNC = env_bool("RUNWARE_FORCE_SYNC", True)
 RUNWARE_FIRST_POLL_DELAY = env_int("RUNWARE_FIRST_POLL_DELAY", 5)
 RUNWARE_STUCK_TIMEOUT_SEC = env_int("RUNWARE_STUCK_TIMEOUT_SEC", 90)
 RUNWARE_FALLBACK_WIDTH = env_int("RUNWARE_FALLBACK_WIDTH", 768)
 RUNWARE_FALLBACK_HEIGHT = env_int("RUNWARE_FALLBACK_HEIGHT", 768)
 
+# Пакетирование: сколько задач в одном POST (сабмит вариантов и getResponse)
+RUNWARE_MAX_TASKS_PER_REQUEST = env_int("RUNWARE_MAX_TASKS_PER_REQUEST", 10)
+# Пакетный поллер (Celery Beat) вместо цепочки poll-тасков на каждую задачу
+RUNWARE_BATCH_POLLING = env_bool("RUNWARE_BATCH_POLLING", True)
+RUNWARE_POLL_BATCH_MAX_JOBS = env_int("RUNWARE_POLL_BATCH_MAX_JOBS", 200)
+RUNWARE_POLL_MIN_INTERVAL = env_int("RUNWARE_POLL_MIN_INTERVAL", 5)
+RUNWARE_VIDEO_POLL_TIMEOUT_SEC = env_int("RUNWARE_VIDEO_POLL_TIMEOUT_SEC", 15 * 60)
+# Адаптивный опрос видео (generate.services.video_poll): потолок паузы и потоки локального планировщика
+VIDEO_POLL_MAX_INTERVAL = env_int("VIDEO_POLL_MAX_INTERVAL", 60)
+VIDEO_POLL_WORKERS = env_int("VIDEO_POLL_WORKERS", 2)
+
 PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "")
 RUNWARE_WEBHOOK_TOKEN = os.getenv("RUNWARE_WEBHOOK_TOKEN", "dev_local_webhook_token")
 RUNWARE_DEMO_IF_UNAUTHORIZED = env_bool("RUNWARE_DEMO_IF_UNAUTHORIZED", True)
@@ -458,5 +668,47 @@ FP_PARAM_NAME  = os.getenv("FP_PARAM_NAME",  "fp")
 SUPPORT_TELEGRAM_URL = os.getenv("SUPPORT_TELEGRAM_URL", "https://t.me/your_support")
 TELEGRAM_SUPPORT_URL = os.getenv("TELEGRAM_SUPPORT_URL", "https://t.me/your_support_handle")
 
+# Лента главной (gallery.services.feed): размер страницы и кэшируемого окна
+GALLERY_FEED_PAGE_SIZE = env_int("GALLERY_FEED_PAGE_SIZE", 60)
+GALLERY_FEED_WINDOW = env_int("GALLERY_FEED_WINDOW", 1000)
+
+# Тренды (gallery.services.trending): пересчёт по Beat, затухание score по возрасту
+TRENDING_REFRESH_INTERVAL = env_int("TRENDING_REFRESH_INTERVAL", 300)
+TRENDING_SIZE = env_int("TRENDING_SIZE", 500)
+TRENDING_CANDIDATES = env_int("TRENDING_CANDIDATES", 5000)
+TRENDING_NEW_DAYS = env_int("TRENDING_NEW_DAYS", 10)
+TRENDING_GRAVITY = float(os.getenv("TRENDING_GRAVITY", "0.5"))
+
+# Просмотры (gallery.services.view_counter): прирост копится в кэше и сбрасывается
+# в БД по Beat. Нужен общий с воркером кэш (Redis): в LocMem веб-процесса прирост
+# не увидит flush_view_counters. Без REDIS_CACHE_URL или без воркера (синхронный
+# Celery) буфер по умолчанию выключен.
+VIEW_COUNTER_BUFFER = env_bool("VIEW_COUNTER_BUFFER", bool(REDIS_CACHE_URL) and not CELERY_TASK_ALWAYS_EAGER)
+VIEW_FLUSH_INTERVAL = env_int("VIEW_FLUSH_INTERVAL", 30)
+VIEW_FLUSH_CHUNK = env_int("VIEW_FLUSH_CHUNK", 500)
+# один просмотр на сессию за окно (сек); 0 — без дедупликации
+VIEW_DEDUP_TTL = env_int("VIEW_DEDUP_TTL", 0)
+
+# Гостевые гранты (generate.services.guest_ledger): расход — атомарный счётчик в общем
+# кэше с переносом в FreeGrant.consumed по Beat. Нужен общий кэш (Redis): с LocMem
+# у каждого процесса был бы свой счётчик, поэтому без REDIS_CACHE_URL — выключено.
+GUEST_LEDGER = env_bool("GUEST_LEDGER", bool(REDIS_CACHE_URL))
+GUEST_LEDGER_FLUSH_INTERVAL = env_int("GUEST_LEDGER_FLUSH_INTERVAL", 30)
+GUEST_LEDGER_FLUSH_CHUNK = env_int("GUEST_LEDGER_FLUSH_CHUNK", 500)
+# сколько помнить разобранный набор идентификаторов гостя (сек)
+GUEST_RESOLVE_TTL = env_int("GUEST_RESOLVE_TTL", 600)
+
+# Уведомления (dashboard.services.notify): доставка в WebSocket из outbox.
+# Окно (сек) — задержка перед отправкой, в нём пачки лайков/подписок схлопываются.
+NOTIFY_COALESCE_WINDOW = env_int("NOTIFY_COALESCE_WINDOW", 3)
+NOTIFY_DELIVER_BATCH = env_int("NOTIFY_DELIVER_BATCH", 200)
+NOTIFY_STALE_MINUTES = env_int("NOTIFY_STALE_MINUTES", 30)
+# кэш счётчика непрочитанных (сек); сдвигается сигналами, TTL — страховка от дрейфа
+NOTIFY_UNREAD_TTL = env_int("NOTIFY_UNREAD_TTL", 600)
+
 # ── DeepL Translate ───────────────────────────────────────────────────────────
 DEEPL_API_KEY = os.getenv("DEEPL_API_KEY", "")
+# Переводы промптов кэшируются по хэшу нормализованного текста (сек); одинаковые
+# промпты «в полёте» ждут чужой перевод до TRANSLATION_COALESCE_WAIT сек
+TRANSLATION_CACHE_TTL = env_int("TRANSLATION_CACHE_TTL", 30 * 24 * 60 * 60)
+TRANSLATION_COALESCE_WAIT = env_int("TRANSLATION_COALESCE_WAIT", 3)
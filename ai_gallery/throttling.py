@@ -0,0 +1,45 @@
+"""
+DRF-троттлинг поверх общего rate limiter (ai_gallery.services.ratelimit).
+
+Политики api_anon / api_user задаются в settings.RATE_LIMITS, как и остальные;
+хранилище, алгоритм и счётчики для мониторинга — общие с middleware и views.
+"""
+from rest_framework.throttling import BaseThrottle
+
+from ai_gallery.services import ratelimit
+
+
+class _PolicyThrottle(BaseThrottle):
+    policy_name = ""
+
+    def applies(self, request) -> bool:
+        return True
+
+    def allow_request(self, request, view):
+        self.decision = None
+        if not self.applies(request):
+            return True
+        self.decision = ratelimit.hit(self.policy_name, request)
+        return self.decision.allowed
+
+    def wait(self):
+        decision = getattr(self, "decision", None)
+        return decision.retry_after if decision is not None else None
+
+
+class AnonPolicyThrottle(_PolicyThrottle):
+    """Гости: политика api_anon (по хэшу IP клиента)."""
+
+    policy_name = "api_anon"
+
+    def applies(self, request) -> bool:
+        return not (request.user and request.user.is_authenticated)
+
+
+class UserPolicyThrottle(_PolicyThrottle):
+    """Авторизованные: политика api_user (по id пользователя)."""
+
+    policy_name = "api_user"
+
+    def applies(self, request) -> bool:
+        return bool(request.user and request.user.is_authenticated)
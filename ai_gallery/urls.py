@@ -5,13 +5,16 @@ from django.urls import include, path
 from django.views.generic import TemplateView
 from django.conf.urls.i18n import set_language, i18n_patterns
 from dashboard import views as dashboard_views
-from pages.health import HealthCheckView
+from pages.health import HealthCheckView, RateLimitStatsView
 
 from ai_gallery.views_auth import InstantSignupView
+from ai_gallery.views_search import search_api
 
 # Без языкового префикса
 urlpatterns = [
     path("health/", HealthCheckView.as_view(), name="health_check"),
+    path("health/ratelimit/", RateLimitStatsView.as_view(), name="ratelimit_stats"),
+    path("api/search/", search_api, name="search_api"),
     path("i18n/setlang/", set_language, name="set_language"),
     path("i18n/", include("django.conf.urls.i18n")),
     path("admin/", admin.site.urls),
@@ -0,0 +1,32 @@
+# ai_gallery/views_search.py
+from __future__ import annotations
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from ai_gallery.services import ratelimit, search
+
+
+@require_GET
+def search_api(request):
+    """
+    Сводный поиск (подсказки по мере набора).
+    GET params:
+      - q: строка поиска (от 2 символов)
+      - types: users,photos,videos,posts (через запятую, по умолч. все)
+      - limit: на тип (по умолч. 5, максимум 20)
+    Out JSON: { ok: true, q, results: {users: [...], photos: [...], videos: [...], posts: [...]} }
+    """
+    decision = ratelimit.hit("search", request)
+    if not decision:
+        return ratelimit.too_many(decision)
+
+    q = search.normalize(request.GET.get("q"))
+    types = [t for t in (request.GET.get("types") or "").split(",") if t in search.TYPES] or list(search.TYPES)
+    try:
+        limit = int(request.GET.get("limit") or "5")
+    except ValueError:
+        limit = 5
+    limit = max(1, min(limit, 20))
+
+    return JsonResponse({"ok": True, "q": q, "results": search.search(q, types, limit)})
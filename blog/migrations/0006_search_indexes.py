@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:40
+
+from django.db import migrations
+
+# Полнотекстовый поиск статей (ai_gallery.services.search.filter_posts): выражение
+# должно совпадать с тем, что строит сервис, иначе индекс не используется.
+POST_TSV = "to_tsvector('simple'::regconfig, title || ' ' || excerpt || ' ' || body)"
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(f'CREATE INDEX IF NOT EXISTS blog_post_search_tsv ON "blog_post" USING gin ({POST_TSV})')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS blog_post_title_trgm ON "blog_post" USING gin (UPPER("title"::text) gin_trgm_ops)'
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS blog_post_search_tsv")
+    schema_editor.execute("DROP INDEX IF EXISTS blog_post_title_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_update_existing_slugs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, reverse_code=drop_search_indexes),
+    ]
@@ -9,11 +9,13 @@ from django.utils.text import slugify
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db.models import Count
 from django.http import Http404, HttpRequest, HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 
+from ai_gallery.services import search
+
 from .forms import PostForm
 from .models import Post, Tag
 
@@ -31,11 +33,8 @@ def index(request: HttpRequest) -> HttpResponse:
     qs = Post.objects.filter(is_published=True, published_at__lte=timezone.now())
 
     if q:
-        qs = qs.filter(
-            Q(title__icontains=q) |
-            Q(excerpt__icontains=q) |
-            Q(body__icontains=q)
-        )
+        # полнотекстовый индекс на PostgreSQL, icontains — в dev (ai_gallery.services.search)
+        qs = search.filter_posts(qs, q)
 
     active_tag = None
     if tag_slug:
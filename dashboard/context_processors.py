@@ -3,7 +3,9 @@ from __future__ import annotations
 
 import hashlib
 from django.conf import settings
-from dashboard.models import Wallet
+from django.utils.functional import SimpleLazyObject
+
+from dashboard.services import viewer
 
 # будем лениво подтягивать FreeGrant, чтобы избежать циклических импортов при старте
 def _ensure_free_grant_for(request):
@@ -46,21 +48,21 @@ def _price_for_user(user) -> int:
 def wallet_context(request):
     """
     Добавляет в контекст:
-      - wallet (объект кошелька)
+      - wallet (объект кошелька, только для чтения)
       - wallet_leftover (баланс в токенах)
       - is_free_for_staff (флаг безлимита для стаффа)
       - price_per_gen (стоимость одной генерации)
       - gens_left (сколько генераций доступно по текущей цене)
     И *однократно за сессию* переносит остаток гостевой квоты в кошелёк.
+
+    Баланс берётся из ленивой сводки dashboard.services.viewer: запросов нет,
+    пока шаблон не обратится к wallet / wallet_leftover / gens_left.
     """
     # Проверяем наличие user (может отсутствовать в обработчиках ошибок)
     if not hasattr(request, 'user') or not request.user.is_authenticated:
         return {}
 
-    # 1) гарантируем кошелёк
-    wallet, _ = Wallet.objects.get_or_create(user=request.user)
-
-    # 2) один раз за сессию переносим остаток гостя
+    # 1) один раз за сессию переносим остаток гостя
     try:
         session_key = f"grant_merged_once_{request.user.id}"
         if not request.session.get(session_key):
@@ -80,58 +82,37 @@ def wallet_context(request):
     except Exception:
         pass
 
-    # 3) расчёт стоимости и оставшихся генераций
+    # 2) расчёт стоимости (без БД); кошелёк и остаток — лениво из сводки
     price = _price_for_user(request.user)
-    gens_left = 0 if price == 0 else (int(wallet.balance or 0) // max(1, price))
-    is_free_for_staff = (price == 0)
 
+    # callables шаблон вызывает сам при обращении к переменной
     return {
-        "wallet": wallet,
-        "wallet_leftover": wallet.balance,
-        "is_free_for_staff": is_free_for_staff,
+        "wallet": SimpleLazyObject(lambda: viewer.summary(request).wallet),
+        "wallet_leftover": lambda: viewer.summary(request).balance,
+        "is_free_for_staff": price == 0,
         "price_per_gen": price,
-        "gens_left": gens_left,
+        "gens_left": lambda: viewer.summary(request).gens_left(price),
     }
 
 
 def user_profile(request):
     """
-    Гарантированно добавляет в контекст профиль пользователя (для аватарки).
-    Безопасно создаёт профиль при первом обращении.
+    Добавляет в контекст профиль пользователя (для аватарки) — лениво, из сводки.
+    Профиль создаётся при первом расчёте сводки.
     """
     user = getattr(request, "user", None)
     if not user or not user.is_authenticated:
         return {"user_profile": None}
-    try:
-        from .models import Profile
-        profile, _ = Profile.objects.get_or_create(user=user)
-    except Exception:
-        profile = None
-    return {"user_profile": profile}
+    return {"user_profile": SimpleLazyObject(lambda: viewer.summary(request).profile)}
 
 
 def follow_stats(request):
     """
     Добавляет в контекст счётчики подписчиков/подписок/публикаций для текущего пользователя.
     Публикации считаем как все завершенные работы (GenerationJob.DONE).
+    Значения — из ленивой сводки dashboard.services.viewer.
     """
     user = getattr(request, "user", None)
     if not user or not user.is_authenticated:
         return {}
-
-    try:
-        from .models import Follow
-        followers = Follow.objects.filter(following=user).count()
-        following = Follow.objects.filter(follower=user).count()
-    except Exception:
-        followers = 0
-        following = 0
-
-    posts = 0
-    try:
-        from generate.models import GenerationJob
-        posts = GenerationJob.objects.filter(user=user, status=GenerationJob.Status.DONE).filter(persisted=True).count()
-    except Exception:
-        pass
-
-    return {"follow_stats": {"followers": followers, "following": following, "posts": posts}}
+    return {"follow_stats": SimpleLazyObject(lambda: viewer.summary(request).follow_stats)}
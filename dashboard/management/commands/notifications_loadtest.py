@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+# id тестовых получателей — далеко за пределами реальных пользователей
+_UID_BASE = 900_000_000
+
+
+def _with_fake_user(app):
+    """Пользователь из ?uid= вместо сессии (AuthMiddlewareStack в тесте не нужен)."""
+    async def asgi(scope, receive, send):
+        uid = int(parse_qs(scope.get("query_string", b"").decode()).get("uid", ["0"])[0])
+        scope = dict(scope, user=SimpleNamespace(id=uid, is_authenticated=True))
+        return await app(scope, receive, send)
+    return asgi
+
+
+def _pct(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест realtime-уведомлений: N сокетов NotificationConsumer через настоящий "
+        "слой каналов (Redis), group_send в группу каждого и замер задержки доставки. "
+        "Запускать против локального Redis (--redis), не против продового."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=1000)
+        parser.add_argument("--messages", type=int, default=1, help="сообщений на сокет")
+        parser.add_argument("--concurrency", type=int, default=200, help="одновременных подключений")
+        parser.add_argument("--timeout", type=float, default=10.0, help="ожидание одного сообщения, сек")
+        parser.add_argument("--redis", default="", help="redis://… (по умолчанию — CHANNEL_LAYER_URL)")
+
+    def handle(self, *args, **options):
+        url = options["redis"] or getattr(settings, "CHANNEL_LAYER_URL", "")
+        if not url:
+            raise CommandError("Нужен Redis: --redis redis://localhost:6379/3 или CHANNEL_LAYER_URL")
+
+        layers = {
+            "default": {
+                "BACKEND": "channels_redis.core.RedisChannelLayer",
+                "CONFIG": dict(settings.CHANNEL_LAYERS["default"].get("CONFIG", {})),
+            }
+        }
+        config = layers["default"]["CONFIG"]
+        host = dict((config.get("hosts") or [{}])[0], address=url)
+        config.update(hosts=[host], prefix="aig:ws-loadtest")
+
+        with override_settings(CHANNEL_LAYERS=layers):
+            stats = asyncio.run(self._run(**options))
+
+        w = self.stdout.write
+        w(f"sockets: {stats['connected']}/{options['sockets']} connected, {stats['connect_failed']} failed")
+        w("connect ms: p50={:.1f} p95={:.1f} max={:.1f}".format(
+            _pct(stats["connect"], .5) * 1e3, _pct(stats["connect"], .95) * 1e3, max(stats["connect"] or [0]) * 1e3))
+        w(f"messages: {stats['received']}/{stats['sent']} delivered, {stats['lost']} lost")
+        w("delivery ms: p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f} mean={:.1f}".format(
+            _pct(stats["latency"], .5) * 1e3, _pct(stats["latency"], .95) * 1e3,
+            _pct(stats["latency"], .99) * 1e3, max(stats["latency"] or [0]) * 1e3,
+            (statistics.mean(stats["latency"]) if stats["latency"] else 0) * 1e3))
+        w(f"publish: {stats['sent'] / max(stats['publish_seconds'], 1e-9):.0f} msg/s")
+
+    async def _run(self, *, sockets: int, messages: int, concurrency: int, timeout: float, **_):
+        from channels.layers import get_channel_layer
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from dashboard.routing import websocket_urlpatterns
+        from dashboard.services.notify import group_name
+
+        app = _with_fake_user(URLRouter(websocket_urlpatterns))
+        layer = get_channel_layer()
+        gate = asyncio.Semaphore(max(1, concurrency))
+        stats = {"connect": [], "latency": [], "connect_failed": 0, "sent": 0, "received": 0}
+
+        async def open_socket(i: int):
+            async with gate:
+                started = time.perf_counter()
+                comm = WebsocketCommunicator(app, f"/ws/notifications/?uid={_UID_BASE + i}")
+                try:
+                    connected, _ = await comm.connect(timeout=timeout)
+                    if connected:
+                        await comm.receive_json_from(timeout=timeout)  # connection_established
+                except Exception:
+                    connected = False
+                if not connected:
+                    stats["connect_failed"] += 1
+                    return None
+                stats["connect"].append(time.perf_counter() - started)
+                return comm
+
+        opened = await asyncio.gather(*(open_socket(i) for i in range(sockets)))
+        comms = {i: c for i, c in enumerate(opened) if c is not None}
+        stats["connected"] = len(comms)
+
+        async def listen(comm):
+            for _ in range(messages):
+                try:
+                    data = await comm.receive_json_from(timeout=timeout)
+                except Exception:
+                    return
+                stats["latency"].append(time.perf_counter() - data["notification"]["sent_at"])
+                stats["received"] += 1
+
+        listeners = [asyncio.ensure_future(listen(c)) for c in comms.values()]
+
+        started = time.perf_counter()
+        for n in range(messages):
+            for i in comms:
+                await layer.group_send(group_name(_UID_BASE + i), {
+                    "type": "notification_message",
+                    "notification": {"id": n, "sent_at": time.perf_counter()},
+                })
+                stats["sent"] += 1
+        stats["publish_seconds"] = time.perf_counter() - started
+
+        await asyncio.gather(*listeners)
+        stats["lost"] = stats["sent"] - stats["received"]
+        for comm in comms.values():
+            await comm.disconnect()
+        await layer.flush()
+        return stats
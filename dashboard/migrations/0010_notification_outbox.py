@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:06
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_delivered(apps, schema_editor):
+    """Старые уведомления не должны уйти в WebSocket при первом проходе outbox."""
+    Notification = apps.get_model("dashboard", "Notification")
+    Notification.objects.filter(delivered_at__isnull=True).update(delivered_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_rename_notif_rec_read_created_dashboard_n_recipie_91720a_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_delivered, reverse_code=migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('delivered_at__isnull', True)), fields=['recipient', 'id'], name='notif_outbox_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Поиск пользователей (ai_gallery.services.search): icontains/istartswith на
+# PostgreSQL — UPPER(col::text) LIKE ..., под это выражение триграммные GIN-индексы.
+TRGM_INDEXES = (
+    ("auth_user_username_trgm", "auth_user", "username"),
+    ("auth_user_first_name_trgm", "auth_user", "first_name"),
+    ("auth_user_last_name_trgm", "auth_user", "last_name"),
+)
+
+
+def create_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _table, _column in TRGM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def backfill_follow_counts(apps, schema_editor):
+    Profile = apps.get_model("dashboard", "Profile")
+    Follow = apps.get_model("dashboard", "Follow")
+
+    def count(field):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{field: OuterRef("user_id")})
+            .order_by()
+            .values(field)
+            .annotate(c=Count("pk"))
+            .values("c")
+        ), 0)
+
+    Profile.objects.update(followers_count=count("following_id"), following_count=count("follower_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('dashboard', '0010_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_follow_counts, reverse_code=migrations.RunPython.noop),
+        migrations.RunPython(create_trgm_indexes, reverse_code=drop_trgm_indexes),
+    ]
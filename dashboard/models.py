@@ -46,6 +46,9 @@ class Profile(models.Model):
         default=True,
         help_text="Если True, другие видят только опубликованные работы. Если False - все завершенные работы."
     )
+    # денормализованные счётчики подписок (ведут сигналы dashboard.signals по Follow)
+    followers_count = models.PositiveIntegerField(default=0, db_index=True)
+    following_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -136,12 +139,16 @@ class Notification(models.Model):
     payload = models.JSONField(default=dict, blank=True)
     is_read = models.BooleanField(default=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # outbox: когда отправлено в WebSocket (dashboard.services.notify); NULL — ещё в очереди
+    delivered_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ("-created_at",)
         indexes = [
             models.Index(fields=["recipient", "is_read", "-created_at"]),
             models.Index(fields=["recipient", "type", "-created_at"]),
+            models.Index(fields=["recipient", "id"], condition=models.Q(delivered_at__isnull=True),
+                         name="notif_outbox_idx"),
         ]
         verbose_name = "Уведомление"
         verbose_name_plural = "Уведомления"
@@ -0,0 +1,210 @@
+"""
+Превью и ссылки для уведомлений — пачкой.
+
+Из payload всей страницы собираются id фото, видео, задач и комментариев,
+каждая модель грузится одним запросом id__in, превью собираются из словарей.
+Страница из N уведомлений — не больше шести запросов вместо нескольких на каждое.
+
+resolve(notifications, viewer_id) → {notification.id: preview}, где preview:
+    kind, image_url, video_url, poster_url, text, link, is_deleted
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote
+
+from django.urls import reverse
+from django.utils.text import slugify
+
+PHOTO_TYPES = ("like_photo", "comment_photo", "reply_photo", "comment_like_photo")
+VIDEO_TYPES = ("like_video", "comment_video", "reply_video", "comment_like_video")
+JOB_TYPES = ("like_job", "comment_job", "reply_job", "comment_like_job")
+
+DELETED_LINK = "/dashboard/publication-deleted"
+
+_VIDEO_PLACEHOLDER = "data:image/svg+xml;utf8," + quote(
+    '<svg xmlns="http://www.w3.org/2000/svg" width="120" height="150" viewBox="0 0 120 150">'
+    '<rect width="120" height="150" rx="12" fill="#0f0f12"/><circle cx="60" cy="75" r="26" fill="#000" opacity="0.4"/>'
+    '<polygon points="54,62 54,88 78,75" fill="#fff"/></svg>'
+)
+_JOB_VIDEO_PLACEHOLDER = "data:image/svg+xml;utf8," + quote(
+    '<svg xmlns="http://www.w3.org/2000/svg" width="120" height="150" viewBox="0 0 120 150">'
+    '<rect width="120" height="150" rx="12" fill="#1a1a1a"/><circle cx="60" cy="75" r="26" fill="#000" opacity="0.4"/>'
+    '<polygon points="54,62 54,88 78,75" fill="#fff"/></svg>'
+)
+
+
+def _int(payload: dict, key: str) -> int:
+    try:
+        return int(payload.get(key) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _texts(model, ids) -> Dict[int, str]:
+    ids = [i for i in set(ids) if i]
+    if not ids:
+        return {}
+    return {pk: (text or "")[:140] for pk, text in model.objects.filter(id__in=ids).values_list("id", "text")}
+
+
+def _job_slug(job) -> str:
+    return slugify((getattr(job, "prompt", "") or "job"), allow_unicode=True) or "job"
+
+
+def _safe_url(fieldfile) -> str:
+    try:
+        return fieldfile.url if fieldfile else ""
+    except Exception:
+        return ""
+
+
+def _load(notifications: list):
+    from gallery.models import JobComment, PhotoComment, PublicPhoto, PublicVideo, VideoComment
+    from generate.models import GenerationJob
+
+    photo_ids, video_ids, job_ids = set(), set(), set()
+    photo_cids, video_cids, job_cids = set(), set(), set()
+    for n in notifications:
+        p = n.payload or {}
+        anchor = _int(p, "reply_id") or _int(p, "comment_id")
+        if n.type in PHOTO_TYPES:
+            photo_ids.add(_int(p, "photo_id"))
+            if not p.get("comment_text"):
+                photo_cids.add(anchor)
+        elif n.type in VIDEO_TYPES:
+            video_ids.add(_int(p, "video_id"))
+            if not p.get("comment_text"):
+                video_cids.add(anchor)
+        elif n.type in JOB_TYPES:
+            job_ids.add(_int(p, "job_id"))
+            job_cids.add(anchor)
+    photo_ids.discard(0)
+    video_ids.discard(0)
+    job_ids.discard(0)
+
+    photos = {
+        o.pk: o for o in PublicPhoto.objects.filter(id__in=photo_ids, is_active=True)
+        .select_related("category").only("id", "image", "title", "slug", "category__slug")
+    } if photo_ids else {}
+    videos = {
+        o.pk: o for o in PublicVideo.objects.filter(id__in=video_ids, is_active=True)
+        .select_related("category", "source_job")
+    } if video_ids else {}
+    jobs = {
+        o.pk: o for o in GenerationJob.objects.filter(id__in=job_ids).only(
+            "id", "user_id", "prompt", "result_image", "persisted", "generation_type", "result_video_url")
+    } if job_ids else {}
+    return (
+        photos, videos, jobs,
+        _texts(PhotoComment, photo_cids), _texts(VideoComment, video_cids), _texts(JobComment, job_cids),
+    )
+
+
+def _video_urls(v) -> tuple[str, str]:
+    """(poster_url, video_url) опубликованного видео."""
+    poster = _safe_url(getattr(v, "thumbnail", None))
+    video_url = str(getattr(v, "video_url", "") or "")
+    if not video_url:
+        try:
+            video_url = reverse("gallery:video_stream", args=[v.pk])
+        except Exception:
+            video_url = f"/gallery/video/{v.pk}/stream"
+    return poster, video_url
+
+
+def resolve(notifications: Iterable, viewer_id: Optional[int]) -> Dict[int, dict]:
+    notifications = list(notifications)
+    photos, videos, jobs, photo_texts, video_texts, job_texts = _load(notifications)
+    out: Dict[int, dict] = {}
+
+    for n in notifications:
+        payload = n.payload or {}
+        kind = None
+        image_url = video_url = poster_url = text = ""
+        link = n.link or ""
+        is_deleted = False
+        cid, rid = _int(payload, "comment_id"), _int(payload, "reply_id")
+        anchor = rid or cid
+
+        if n.type in PHOTO_TYPES:
+            pid = _int(payload, "photo_id")
+            p = photos.get(pid)
+            if pid:
+                if p and getattr(p, "image", None):
+                    image_url = _safe_url(p.image)
+                    kind = "photo"
+                else:
+                    is_deleted = True
+                    kind = "photo_deleted"
+                if is_deleted:
+                    link = DELETED_LINK
+                elif not link:
+                    try:
+                        link = p.get_absolute_url()
+                    except Exception:
+                        link = f"/gallery/photo/{pid}"
+            if anchor and not is_deleted:
+                text = payload.get("comment_text", "") or photo_texts.get(anchor, "")
+                link = f"{link}#c{anchor}" if link else link
+
+        elif n.type in VIDEO_TYPES:
+            vid = _int(payload, "video_id")
+            v = videos.get(vid)
+            if vid:
+                if v:
+                    poster_url, video_url = _video_urls(v)
+                    image_url = poster_url or _VIDEO_PLACEHOLDER
+                    kind = "video"
+                else:
+                    is_deleted = True
+                    kind = "video_deleted"
+                if is_deleted:
+                    link = DELETED_LINK
+                elif not link:
+                    try:
+                        link = v.get_absolute_url()
+                    except Exception:
+                        link = f"/gallery/video/{vid}"
+            if anchor and not is_deleted:
+                text = payload.get("comment_text", "") or video_texts.get(anchor, "")
+                link = f"{link}#c{anchor}" if link else link
+
+        elif n.type in JOB_TYPES:
+            jid = _int(payload, "job_id")
+            if jid:
+                j = jobs.get(jid)
+                gen_type = getattr(j, "generation_type", None) or payload.get("generation_type", "image")
+                if not j or not getattr(j, "persisted", True):
+                    is_deleted = True
+                    kind = "video_deleted" if gen_type == "video" else "photo_deleted"
+                # превью только владельцу (job_image требует owner)
+                elif j.user_id == viewer_id:
+                    if gen_type == "video":
+                        kind = "video"
+                        video_url = getattr(j, "result_video_url", "") or ""
+                        poster_url = image_url = _JOB_VIDEO_PLACEHOLDER
+                    else:
+                        kind = "photo"
+                        image_url = _safe_url(j.result_image) or reverse("generate:job_image", args=[j.id, _job_slug(j)])
+                if is_deleted:
+                    link = DELETED_LINK
+                elif not link:
+                    try:
+                        link = reverse("generate:job_detail", args=[jid, _job_slug(j)])
+                    except Exception:
+                        link = f"/generate/job/{jid}"
+                if anchor and not is_deleted:
+                    link = f"{link}#c{anchor}"
+                    text = job_texts.get(anchor, "")
+
+        out[n.id] = {
+            "kind": kind,
+            "image_url": image_url,
+            "video_url": video_url,
+            "poster_url": poster_url,
+            "text": text,
+            "link": link or (n.link or ""),
+            "is_deleted": is_deleted,
+        }
+    return out
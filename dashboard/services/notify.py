@@ -0,0 +1,267 @@
+"""
+Outbox уведомлений: строка Notification коммитится вместе с лайком/комментарием,
+а отправка в WebSocket идёт в фоне (dashboard.tasks.deliver_notifications).
+
+    post_save(Notification) → enqueue() → после коммита, не чаще раза в
+    NOTIFY_COALESCE_WINDOW сек на получателя, задача с countdown=окно
+    deliver(recipient_id)   → все неотправленные строки получателя одним
+                               запросом, пачки схлопываются, group_send на группу,
+                               delivered_at = now
+    sweep()                 → Beat-страховка: доставить «забытое» (брокер
+                               недоступен, воркер упал), старое — просто пометить
+
+Схлопывание: несколько лайков одного объекта (фото/видео/задачи/комментария)
+и несколько подписок за окно уходят одним сообщением с count и до трёх actors.
+Строки в БД не меняются — список уведомлений по-прежнему показывает каждую.
+
+Превью (картинка/текст комментария) собираются пачкой — notification_previews.
+Запрос, создавший уведомление, не ждёт ни channel layer, ни профилей акторов.
+
+Там же — кэшированный счётчик непрочитанных для опроса колокольчика: считается
+при промахе, дальше сдвигается на создание/удаление/прочтение.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ai_gallery.services import caches
+
+from . import notification_previews
+
+log = logging.getLogger(__name__)
+
+# тип → ключ payload, по которому схлопываются пачки
+_COALESCE_BY = {
+    "like_photo": "photo_id",
+    "like_video": "video_id",
+    "like_job": "job_id",
+    "comment_like_photo": "comment_id",
+    "comment_like_video": "comment_id",
+    "comment_like_job": "comment_id",
+    "follow": None,
+}
+_MAX_ACTORS = 3
+
+
+def _window() -> int:
+    return max(0, int(getattr(settings, "NOTIFY_COALESCE_WINDOW", 3)))
+
+
+def _scheduled_key(recipient_id: int) -> str:
+    return f"notify:scheduled:{recipient_id}"
+
+
+def group_name(recipient_id: int) -> str:
+    return f"notifications_{recipient_id}"
+
+
+def enqueue(notification) -> None:
+    """Запланировать доставку после коммита (идемпотентно в пределах окна)."""
+    recipient_id = notification.recipient_id
+    transaction.on_commit(lambda: _schedule(recipient_id))
+
+
+def _schedule(recipient_id: int) -> None:
+    window = _window()
+    try:
+        if not caches.ratelimit().add(_scheduled_key(recipient_id), 1, window + 30):
+            return  # задача на это окно уже стоит в очереди
+    except Exception:
+        pass
+    try:
+        from dashboard.tasks import deliver_notifications
+
+        deliver_notifications.apply_async((recipient_id,), countdown=window)
+    except Exception as e:
+        # брокер недоступен — доставит sweep()
+        log.warning("notify: cannot schedule delivery for u%s: %s", recipient_id, e)
+        try:
+            caches.ratelimit().delete(_scheduled_key(recipient_id))
+        except Exception:
+            pass
+
+
+def _actor_info(user) -> dict:
+    if not user:
+        return {"username": "", "avatar_url": ""}
+    try:
+        prof = getattr(user, "profile", None)
+        avatar_url = getattr(getattr(prof, "avatar", None), "url", "") if prof else ""
+    except Exception:
+        avatar_url = ""
+    return {"username": user.username, "avatar_url": avatar_url}
+
+
+def _coalesce_key(n) -> Optional[Tuple]:
+    if n.type not in _COALESCE_BY:
+        return None
+    field = _COALESCE_BY[n.type]
+    target = (n.payload or {}).get(field) if field else None
+    return n.type, target
+
+
+def _groups(rows: list) -> List[list]:
+    """Строки в порядке id → группы; схлопываемые объединяются по ключу."""
+    groups: List[list] = []
+    by_key: Dict[Tuple, list] = {}
+    for n in rows:
+        key = _coalesce_key(n)
+        if key is None:
+            groups.append([n])
+            continue
+        if key in by_key:
+            by_key[key].append(n)
+        else:
+            by_key[key] = [n]
+            groups.append(by_key[key])
+    return groups
+
+
+def _message(group: list, preview: Optional[dict] = None) -> dict:
+    last = group[-1]
+    actors, seen = [], set()
+    for n in reversed(group):
+        if n.actor_id and n.actor_id not in seen:
+            seen.add(n.actor_id)
+            actors.append(_actor_info(n.actor))
+    count = len(group)
+    message = last.message
+    if count > 1:
+        message = f"{last.message} (и ещё {count - 1})"
+    return {
+        "id": last.id,
+        "ids": [n.id for n in group],
+        "type": last.type,
+        "message": message,
+        "link": last.link,
+        "is_read": last.is_read,
+        "created_at": last.created_at.isoformat(),
+        "count": count,
+        "actor": actors[0] if actors else _actor_info(None),
+        "actors": actors[:_MAX_ACTORS],
+        "preview": {
+            key: (preview or {}).get(key) or ("" if key != "kind" else None)
+            for key in ("kind", "image_url", "video_url", "poster_url", "text")
+        },
+    }
+
+
+def _send(recipient_id: int, messages: List[dict]) -> None:
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    layer = get_channel_layer()
+    if not layer:
+        return
+    for data in messages:
+        async_to_sync(layer.group_send)(group_name(recipient_id), {
+            "type": "notification_message",
+            "notification": data,
+        })
+
+
+def deliver(recipient_id: int) -> int:
+    """Отправляет все неотправленные уведомления получателя. → число строк."""
+    from dashboard.models import Notification
+
+    # новые уведомления после этой точки запланируют следующую задачу
+    try:
+        caches.ratelimit().delete(_scheduled_key(recipient_id))
+    except Exception:
+        pass
+
+    limit = int(getattr(settings, "NOTIFY_DELIVER_BATCH", 200))
+    rows = list(
+        Notification.objects.filter(recipient_id=recipient_id, delivered_at__isnull=True)
+        .select_related("actor", "actor__profile")
+        .order_by("id")[:limit]
+    )
+    if not rows:
+        return 0
+
+    try:
+        groups = _groups(rows)
+        previews = notification_previews.resolve([g[-1] for g in groups], recipient_id)
+        _send(recipient_id, [_message(g, previews.get(g[-1].id)) for g in groups])
+    except Exception as e:
+        # не помечаем — повторит sweep()
+        log.error("notify: delivery to u%s failed: %s", recipient_id, e)
+        return 0
+
+    Notification.objects.filter(pk__in=[n.pk for n in rows]).update(delivered_at=timezone.now())
+    if len(rows) == limit:
+        _schedule(recipient_id)
+    return len(rows)
+
+
+def sweep(now=None) -> dict:
+    """Страховка по Beat: доставить зависшее, слишком старое пометить без отправки."""
+    from dashboard.models import Notification
+
+    now = now or timezone.now()
+    stale_before = now - timedelta(minutes=int(getattr(settings, "NOTIFY_STALE_MINUTES", 30)))
+    ready_before = now - timedelta(seconds=_window() + 30)
+
+    pending = Notification.objects.filter(delivered_at__isnull=True)
+    stale = pending.filter(created_at__lt=stale_before).update(delivered_at=now)
+
+    recipients = list(
+        pending.filter(created_at__lt=ready_before)
+        .order_by().values_list("recipient_id", flat=True).distinct()[:500]
+    )
+    delivered = sum(deliver(rid) for rid in recipients)
+    return {"stale": stale, "recipients": len(recipients), "delivered": delivered}
+
+
+# ── счётчик непрочитанных (опрос колокольчика) ──────────────────────────────
+
+def _unread_key(user_id: int) -> str:
+    return f"notify:unread:{user_id}"
+
+
+def unread_count(user_id: int) -> int:
+    """Из кэша; при промахе — COUNT и запись. Дальше поддерживается unread_changed()."""
+    from dashboard.models import Notification
+
+    cache = caches.pages()
+    try:
+        value = cache.get(_unread_key(user_id))
+    except Exception:
+        value = None
+    if value is None:
+        value = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        try:
+            cache.set(_unread_key(user_id), value, int(getattr(settings, "NOTIFY_UNREAD_TTL", 600)))
+        except Exception:
+            pass
+    return max(0, int(value))
+
+
+def unread_changed(user_id: int, delta: int) -> None:
+    """Сдвигает кэшированный счётчик после коммита; нет ключа — посчитается при чтении."""
+    if not delta:
+        return
+
+    def _apply():
+        cache = caches.pages()
+        try:
+            cache.incr(_unread_key(user_id), delta)
+        except ValueError:
+            pass  # ключа нет
+        except Exception:
+            unread_reset(user_id)
+
+    transaction.on_commit(_apply)
+
+
+def unread_reset(user_id: int) -> None:
+    try:
+        caches.pages().delete(_unread_key(user_id))
+    except Exception:
+        pass
@@ -0,0 +1,143 @@
+"""
+Сводка текущего пользователя для шаблонов (шапка, меню, профиль): баланс,
+аватар и приватность профиля, подписчики / подписки / публикации.
+
+Раньше каждый рендер делал Wallet.get_or_create, Profile.get_or_create и три
+COUNT из follow_stats. Теперь:
+  • context processors отдают ленивые значения — пока шаблон не обратился к
+    wallet / user_profile / follow_stats / gens_left, ни БД, ни кэш не трогаются;
+  • сводка считается не больше одного раза за запрос (request._viewer_summary)
+    и хранится в caches.pages() под "viewer:{user_id}" VIEWER_SUMMARY_TTL секунд;
+  • dashboard.signals сбрасывают ключ после коммита при изменении кошелька,
+    профиля, подписок и завершённых/сохранённых задач пользователя.
+
+wallet и profile сводки — экземпляры моделей, собранные из кэша без запроса:
+только для чтения в шаблонах, для изменений грузите объект из БД.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import asdict, dataclass
+from functools import cached_property
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from ai_gallery.services import caches
+
+log = logging.getLogger(__name__)
+
+
+def _key(user_id: int) -> str:
+    return f"viewer:{user_id}"
+
+
+@dataclass
+class ViewerSummary:
+    user_id: int
+    wallet_id: Optional[int]
+    balance: int
+    profile_id: Optional[int]
+    avatar: str
+    is_private: bool
+    followers: int
+    following: int
+    posts: int
+
+    @cached_property
+    def wallet(self):
+        from dashboard.models import Wallet
+
+        return Wallet(pk=self.wallet_id, user_id=self.user_id, balance=self.balance)
+
+    @cached_property
+    def profile(self):
+        from dashboard.models import Profile
+
+        if self.profile_id is None:
+            return None
+        return Profile(pk=self.profile_id, user_id=self.user_id, avatar=self.avatar or None, is_private=self.is_private)
+
+    @property
+    def follow_stats(self) -> dict:
+        return {"followers": self.followers, "following": self.following, "posts": self.posts}
+
+    def gens_left(self, price: int) -> int:
+        return 0 if price == 0 else self.balance // max(1, price)
+
+
+def _compute(user) -> dict:
+    from dashboard.models import Follow, Profile, Wallet
+    from generate.models import GenerationJob
+
+    wallet, _ = Wallet.objects.get_or_create(user=user)
+    try:
+        profile, _ = Profile.objects.get_or_create(user=user)
+    except Exception:
+        profile = None
+    try:
+        followers = Follow.objects.filter(following=user).count()
+        following = Follow.objects.filter(follower=user).count()
+    except Exception:
+        followers = following = 0
+    try:
+        posts = GenerationJob.objects.filter(user=user, status=GenerationJob.Status.DONE, persisted=True).count()
+    except Exception:
+        posts = 0
+    return asdict(ViewerSummary(
+        user_id=user.pk,
+        wallet_id=wallet.pk,
+        balance=int(wallet.balance or 0),
+        profile_id=getattr(profile, "pk", None),
+        avatar=(getattr(getattr(profile, "avatar", None), "name", "") or ""),
+        is_private=bool(getattr(profile, "is_private", True)),
+        followers=followers,
+        following=following,
+        posts=posts,
+    ))
+
+
+def summary(request) -> Optional[ViewerSummary]:
+    """Сводка для request.user (None для гостя): запрос → общий кэш → БД."""
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated:
+        return None
+    cached = getattr(request, "_viewer_summary", None)
+    if cached is not None:
+        return cached
+
+    cache = caches.pages()
+    data = None
+    try:
+        data = cache.get(_key(user.pk))
+    except Exception:
+        pass
+    if data is None:
+        data = _compute(user)
+        try:
+            cache.set(_key(user.pk), data, int(getattr(settings, "VIEWER_SUMMARY_TTL", 600)))
+        except Exception:
+            pass
+    try:
+        result = ViewerSummary(**data)
+    except TypeError:
+        # формат в кэше устарел (деплой с новым полем) — пересчитываем
+        result = ViewerSummary(**_compute(user))
+    request._viewer_summary = result
+    return result
+
+
+def invalidate(*user_ids) -> None:
+    """Сбрасывает сводки после коммита текущей транзакции (иначе — сразу)."""
+    keys = [_key(uid) for uid in dict.fromkeys(user_ids) if uid]
+    if not keys:
+        return
+
+    def _drop():
+        try:
+            caches.pages().delete_many(keys)
+        except Exception as e:
+            log.warning("viewer.invalidate(%s) failed: %s", keys, e)
+
+    transaction.on_commit(_drop)
@@ -1,68 +1,95 @@
 ﻿"""
-Signal handlers for sending real-time notifications
+Signal handlers: real-time notifications (outbox), viewer summary invalidation
+and Profile.followers_count / following_count
 """
-from django.db.models.signals import post_save
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from .models import Notification
+from generate.models import GenerationJob
+from .models import Follow, Notification, Profile, Wallet
+from .services import notify, viewer
 
 
 @receiver(post_save, sender=Notification)
 def send_notification_to_websocket(sender, instance, created, **kwargs):
     """
-    Send notification to user's WebSocket channel when a new notification is created
+    Новое уведомление — в outbox: отправка в WebSocket идёт после коммита
+    в фоне (dashboard.services.notify), запрос её не ждёт.
     """
-    if not created:
+    if created:
+        notify.enqueue(instance)
+        if not instance.is_read:
+            notify.unread_changed(instance.recipient_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        notify.unread_changed(instance.recipient_id, -1)
+
+
+# ── сброс сводки пользователя (dashboard.services.viewer) ─────────────────────
+
+# поля задачи, от которых зависит счётчик публикаций в сводке
+_JOB_POST_FIELDS = {"status", "persisted", "user"}
+
+
+@receiver(post_save, sender=Wallet)
+@receiver(post_delete, sender=Wallet)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def viewer_owner_changed(sender, instance, **kwargs):
+    viewer.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def viewer_follow_changed(sender, instance, **kwargs):
+    viewer.invalidate(instance.follower_id, instance.following_id)
+
+
+# ── счётчики подписок в Profile (ранжирование поиска, счётчики профиля) ───────
+
+def _bump_follows(user_id, field: str, delta: int) -> None:
+    updated = Profile.objects.filter(user_id=user_id).update(**{field: Greatest(F(field) + delta, Value(0))})
+    if updated or delta < 0:
+        # без профиля при удалении — пользователь удаляется целиком, создавать нечего
         return
+    profile, _ = Profile.objects.get_or_create(user_id=user_id)
+    Profile.objects.filter(pk=profile.pk).update(
+        followers_count=Follow.objects.filter(following_id=user_id).count(),
+        following_count=Follow.objects.filter(follower_id=user_id).count(),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(sender, instance, created, **kwargs):
+    if created:
+        _bump_follows(instance.following_id, "followers_count", 1)
+        _bump_follows(instance.follower_id, "following_count", 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, **kwargs):
+    _bump_follows(instance.following_id, "followers_count", -1)
+    _bump_follows(instance.follower_id, "following_count", -1)
+
+
+@receiver(post_save, sender=GenerationJob)
+def viewer_job_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields is not None and not _JOB_POST_FIELDS & set(update_fields):
+        return
+    if created and not _counts_as_post(instance):
+        return
+    viewer.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=GenerationJob)
+def viewer_job_deleted(sender, instance, **kwargs):
+    if _counts_as_post(instance):
+        viewer.invalidate(instance.user_id)
+
 
-    try:
-        channel_layer = get_channel_layer()
-        if not channel_layer:
-            return
-
-        # Get actor info
-        actor_info = {"username": "", "avatar_url": ""}
-        if instance.actor:
-            try:
-                prof = getattr(instance.actor, "profile", None)
-                avatar_url = getattr(getattr(prof, "avatar", None), "url", "") if prof else ""
-            except Exception:
-                avatar_url = ""
-            actor_info = {
-                "username": instance.actor.username,
-                "avatar_url": avatar_url
-            }
-
-        # Prepare notification data
-        notification_data = {
-            "id": instance.id,
-            "type": instance.type,
-            "message": instance.message,
-            "link": instance.link,
-            "is_read": instance.is_read,
-            "created_at": instance.created_at.isoformat(),
-            "actor": actor_info,
-            "preview": {
-                "kind": None,
-                "image_url": "",
-                "video_url": "",
-                "poster_url": "",
-                "text": "",
-            },
-        }
-
-        # Send to user's notification group
-        group_name = f"notifications_{instance.recipient_id}"
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                "type": "notification_message",
-                "notification": notification_data
-            }
-        )
-    except Exception as e:
-        # Don't break notification creation if WebSocket fails
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Failed to send notification to WebSocket: {e}")
+def _counts_as_post(job) -> bool:
+    return bool(job.persisted and job.status == GenerationJob.Status.DONE)
@@ -0,0 +1,27 @@
+# dashboard/tasks.py
+from __future__ import annotations
+
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from .services import notify
+
+log = logging.getLogger(__name__)
+
+BACKGROUND_QUEUE = getattr(settings, "CELERY_QUEUE_BACKGROUND", "default")
+
+
+# ── Уведомления: доставка из outbox в WebSocket ──────────────────────────────
+@shared_task(name="dashboard.tasks.deliver_notifications", queue=BACKGROUND_QUEUE, ignore_result=True)
+def deliver_notifications(recipient_id: int) -> int:
+    return notify.deliver(recipient_id)
+
+
+@shared_task(name="dashboard.tasks.sweep_notifications", queue=BACKGROUND_QUEUE, ignore_result=True)
+def sweep_notifications() -> dict:
+    stats = notify.sweep()
+    if stats["stale"] or stats["delivered"]:
+        log.info("notifications sweep: %s", stats)
+    return stats
@@ -18,6 +18,7 @@ from django.views.decorators.http import require_http_methods
 from .models import Wallet, Profile
 from generate.models import GenerationJob
 from gallery.models import PublicPhoto, PhotoLike, VideoLike, PhotoSave, VideoSave, JobSave
+from gallery.services import job_state
 
 # --- Константы стоимости/прав ---
 TOKEN_COST = int(getattr(settings, "TOKEN_COST_PER_GEN", 10))
@@ -265,7 +266,7 @@ def my_jobs(request):
     # Total published badge (photos + videos)
     published_total = int(published_photos_count) + int(published_videos_count)
     # Показываем все видео без ограничения
-    video_jobs = list(videos_qs)
+    video_jobs = list(job_state.with_viewer_state(videos_qs, request.user))
     pub_videos_by_job = {}
     if video_jobs:
         job_ids = [j.id for j in video_jobs]
@@ -291,6 +292,7 @@ def my_jobs(request):
                     "saves": int(getattr(p, "saves_count", 0) or 0),
                     "views": int(getattr(p, "view_count", 0) or 0),
                 },
+                **job_state.card_metrics(j),
             })
         elif p and not p.is_active:
             # На модерации
@@ -299,6 +301,7 @@ def my_jobs(request):
                 "is_published": False,
                 "pub": None,
                 "pending_moderation": True,
+                **job_state.card_metrics(j),
             })
         else:
             # Не опубликовано
@@ -307,9 +310,10 @@ def my_jobs(request):
                 "is_published": False,
                 "pub": None,
                 "pending_moderation": False,
+                **job_state.card_metrics(j),
             })
 
-    paginator = Paginator(photos_qs, 500)
+    paginator = Paginator(job_state.with_viewer_state(photos_qs, request.user), 500)
     page_obj = paginator.get_page(request.GET.get("page") or 1)
     jobs = list(page_obj.object_list)
 
@@ -331,31 +335,11 @@ def my_jobs(request):
         key_attr = f"{rel_name}_id"
         pub_by_job_id = {getattr(p, key_attr): p for p in published}
 
-    # Добавляем в карточки job-метрики (лайки/комменты) для всех работ
-    from gallery.models import Like, JobComment
-
+    # job-метрики (лайки/комменты/сохранения) — счётчики задачи + аннотации зрителя
     cards = []
     for j in jobs:
         p = pub_by_job_id.get(j.id)
-
-        # job-level metrics (для всех работ, включая неопубликованные)
-        try:
-            job_like_count = Like.objects.filter(job=j).count()
-        except Exception:
-            job_like_count = 0
-        try:
-            job_comment_count = JobComment.objects.filter(
-                job=j, is_visible=True).count()
-        except Exception:
-            job_comment_count = 0
-        try:
-            job_save_count = JobSave.objects.filter(job=j).count()
-        except Exception:
-            job_save_count = 0
-        try:
-            job_liked = Like.objects.filter(user=request.user, job=j).exists()
-        except Exception:
-            job_liked = False
+        metrics = job_state.card_metrics(j)
 
         if p and p.is_active:
             # Опубликовано в галерее
@@ -372,10 +356,7 @@ def my_jobs(request):
                     "detail_url_name": "gallery:photo_detail",
                 },
                 # job-level metrics (для отображения «как в галерее» на не/опубликованных)
-                "job_like_count": job_like_count,
-                "job_comment_count": job_comment_count,
-                "job_liked": job_liked,
-                "job_save_count": job_save_count,
+                **metrics,
             })
         elif p and not p.is_active:
             # На модерации
@@ -384,10 +365,7 @@ def my_jobs(request):
                 "is_published": False,
                 "pub": None,
                 "pending_moderation": True,
-                "job_like_count": job_like_count,
-                "job_comment_count": job_comment_count,
-                "job_liked": job_liked,
-                "job_save_count": job_save_count,
+                **metrics,
             })
         else:
             # Не отправлено на публикацию
@@ -396,10 +374,7 @@ def my_jobs(request):
                 "is_published": False,
                 "pub": None,
                 "pending_moderation": False,
-                "job_like_count": job_like_count,
-                "job_comment_count": job_comment_count,
-                "job_liked": job_liked,
-                "job_save_count": job_save_count,
+                **metrics,
             })
 
     # Liked sets for current viewer (initial like state on my-jobs grid)
@@ -481,69 +456,12 @@ def my_jobs(request):
     except Exception:
         saved_video_ids = set()
 
-    # Compute job-level likes and comments for ALL jobs (photos tab)
-    liked_job_ids = set()
-    job_like_counts = {}
-    job_comment_counts = {}
-    # Saves
-    saved_job_ids = set()
-    job_save_counts = {}
-
-    try:
-        job_ids_list = [j.id for j in jobs] if jobs else []
-        if job_ids_list:
-            from gallery.models import Like, JobComment
-            # liked state for current user
-            liked_job_ids = set(
-                Like.objects.filter(user=request.user, job_id__in=job_ids_list)
-                .values_list("job_id", flat=True)
-            )
-            # like counts
-            for row in Like.objects.filter(job_id__in=job_ids_list).values("job_id").annotate(c=Count("id")):
-                job_like_counts[row["job_id"]] = int(row["c"] or 0)
-            # comments counts (root + replies)
-            for row in JobComment.objects.filter(job_id__in=job_ids_list, is_visible=True).values("job_id").annotate(c=Count("id")):
-                job_comment_counts[row["job_id"]] = int(row["c"] or 0)
-            # save counts + initial saved set
-            for row in JobSave.objects.filter(job_id__in=job_ids_list).values("job_id").annotate(c=Count("id")):
-                job_save_counts[row["job_id"]] = int(row["c"] or 0)
-            if request.user.is_authenticated:
-                saved_job_ids = set(
-                    JobSave.objects.filter(
-                        user=request.user, job_id__in=job_ids_list)
-                    .values_list("job_id", flat=True)
-                )
-    except Exception:
-        liked_job_ids = set()
-        job_like_counts = {}
-        job_comment_counts = {}
-
-    # Compute job-level likes/comments for video tab
-    video_job_like_counts = {}
-    video_job_comment_counts = {}
-    video_job_save_counts = {}
-    video_saved_job_ids = set()
-    try:
-        video_job_ids_list = [j.id for j in video_jobs] if video_jobs else []
-        if video_job_ids_list:
-            from gallery.models import Like, JobComment
-            for row in Like.objects.filter(job_id__in=video_job_ids_list).values("job_id").annotate(c=Count("id")):
-                video_job_like_counts[row["job_id"]] = int(row["c"] or 0)
-            for row in JobComment.objects.filter(job_id__in=video_job_ids_list, is_visible=True).values("job_id").annotate(c=Count("id")):
-                video_job_comment_counts[row["job_id"]] = int(row["c"] or 0)
-            # saves for videos list (same JobSave model)
-            for row in JobSave.objects.filter(job_id__in=video_job_ids_list).values("job_id").annotate(c=Count("id")):
-                video_job_save_counts[row["job_id"]] = int(row["c"] or 0)
-            # user saved set
-            if request.user.is_authenticated:
-                video_saved_job_ids = set(
-                    JobSave.objects.filter(
-                        user=request.user, job_id__in=video_job_ids_list)
-                    .values_list("job_id", flat=True)
-                )
-    except Exception:
-        video_job_like_counts = {}
-        video_job_comment_counts = {}
+    # Job-level likes/comments/saves for both tabs — уже загружены вместе с задачами
+    job_like_counts, job_comment_counts, job_save_counts = job_state.counts(jobs)
+    liked_job_ids = {j.id for j in jobs if j.viewer_liked}
+    saved_job_ids = {j.id for j in jobs if j.viewer_saved}
+    video_job_like_counts, video_job_comment_counts, video_job_save_counts = job_state.counts(video_jobs)
+    video_saved_job_ids = {j.id for j in video_jobs if j.viewer_saved}
 
     # Hidden ids (owned by current user) for UI toggle on My Jobs
     try:
@@ -608,9 +526,6 @@ def saved(request: HttpRequest) -> HttpResponse:
         • фото-вкладка: все image-работы (не video)
         • видео-вкладка: все video-работы
     """
-    # Local imports for job-level interactions
-    from gallery.models import Like, JobComment
-
     # Query saved sets
     photo_saves = (
         PhotoSave.objects.filter(user=request.user)
@@ -650,23 +565,18 @@ def saved(request: HttpRequest) -> HttpResponse:
             VideoLike.objects.filter(
                 user=request.user, video_id__in=video_ids).values_list("video_id", flat=True)
         )
-    if job_ids:
-        liked_job_ids = set(
-            Like.objects.filter(user=request.user, job_id__in=job_ids).values_list(
-                "job_id", flat=True)
-        )
-
-    # Job metrics (likes/comments/saves) for saved jobs
+    # Job metrics (likes/comments/saves) for saved jobs — счётчики задачи, одним запросом с лайками
     job_like_counts: dict[int, int] = {}
     job_comment_counts: dict[int, int] = {}
     job_save_counts: dict[int, int] = {}
     if job_ids:
-        for row in Like.objects.filter(job_id__in=job_ids).values("job_id").annotate(c=Count("id")):
-            job_like_counts[row["job_id"]] = int(row["c"] or 0)
-        for row in JobComment.objects.filter(job_id__in=job_ids, is_visible=True).values("job_id").annotate(c=Count("id")):
-            job_comment_counts[row["job_id"]] = int(row["c"] or 0)
-        for row in JobSave.objects.filter(job_id__in=job_ids).values("job_id").annotate(c=Count("id")):
-            job_save_counts[row["job_id"]] = int(row["c"] or 0)
+        saved_jobs = list(job_state.with_viewer_state(
+            GenerationJob.objects.filter(pk__in=job_ids).only(
+                "id", "likes_count", "comments_count", "saves_count"),
+            request.user,
+        ))
+        job_like_counts, job_comment_counts, job_save_counts = job_state.counts(saved_jobs)
+        liked_job_ids = {j.id for j in saved_jobs if j.viewer_liked}
 
     # Totals for tabs
     photo_total = photo_saves.count() + job_photo_saves.count()
@@ -1081,7 +991,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
             )
             .exclude(generation_type='video')
             .order_by("-created_at")
-        )[:grid_limit]
+        )
     else:
         # ВСЕ завершенные работы
         photos_qs = (
@@ -1107,8 +1017,8 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
             except Exception:
                 pass
 
-        # Применяем лимит ПОСЛЕ фильтрации скрытых
-        photos_qs = photos_qs[:grid_limit]
+    # Применяем лимит ПОСЛЕ фильтрации скрытых; состояние зрителя — в том же запросе
+    photos_qs = list(job_state.with_viewer_state(photos_qs, request.user)[:grid_limit])
 
     pub_by_job_id = {}
     if photos_qs and rel_name:
@@ -1123,31 +1033,11 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
         key_attr = f"{rel_name}_id"
         pub_by_job_id = {getattr(p, key_attr): p for p in published}
 
-    # Job-level metrics for photos (to match my_jobs page)
-    liked_job_ids = set()
-    job_like_counts = {}
-    job_comment_counts = {}
-    try:
-        photo_job_ids_list = [j.id for j in photos_qs] if photos_qs else []
-        if photo_job_ids_list:
-            from gallery.models import Like, JobComment
-            liked_job_ids = set(
-                Like.objects.filter(user=request.user,
-                                    job_id__in=photo_job_ids_list)
-                .values_list("job_id", flat=True)
-            )
-            for row in Like.objects.filter(job_id__in=photo_job_ids_list).values("job_id").annotate(c=Count("id")):
-                job_like_counts[row["job_id"]] = int(row["c"] or 0)
-            for row in JobComment.objects.filter(job_id__in=photo_job_ids_list, is_visible=True).values("job_id").annotate(c=Count("id")):
-                job_comment_counts[row["job_id"]] = int(row["c"] or 0)
-    except Exception:
-        liked_job_ids = set()
-        job_like_counts = {}
-        job_comment_counts = {}
-
+    # Job-level metrics (to match my_jobs page): счётчики задачи + аннотации зрителя
     jobs_cards = []
     for j in photos_qs:
         p = pub_by_job_id.get(j.id)
+        metrics = job_state.card_metrics(j)
         if p and p.is_active:
             jobs_cards.append({
                 "obj": j,
@@ -1159,9 +1049,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
                     "saves": int(getattr(p, "saves_count", 0) or 0),
                     "views": int(getattr(p, "view_count", 0) or 0),
                 },
-                "job_like_count": job_like_counts.get(j.id, 0),
-                "job_comment_count": job_comment_counts.get(j.id, 0),
-                "job_liked": (j.id in liked_job_ids),
+                **metrics,
             })
         elif p and not p.is_active:
             jobs_cards.append({
@@ -1169,9 +1057,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
                 "is_published": False,
                 "pub": None,
                 "pending_moderation": True,
-                "job_like_count": job_like_counts.get(j.id, 0),
-                "job_comment_count": job_comment_counts.get(j.id, 0),
-                "job_liked": (j.id in liked_job_ids),
+                **metrics,
             })
         else:
             jobs_cards.append({
@@ -1179,9 +1065,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
                 "is_published": False,
                 "pub": None,
                 "pending_moderation": False,
-                "job_like_count": job_like_counts.get(j.id, 0),
-                "job_comment_count": job_comment_counts.get(j.id, 0),
-                "job_liked": (j.id in liked_job_ids),
+                **metrics,
             })
 
     # Видео карточки
@@ -1213,7 +1097,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
                             GenerationJob.Status.PENDING_MODERATION]
             )
             .order_by("-created_at")
-        )[:grid_limit]
+        )
     else:
         # ВСЕ завершенные работы
         videos_qs = (
@@ -1239,8 +1123,8 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
         except Exception:
             pass
 
-    # Применяем лимит ПОСЛЕ фильтрации скрытых
-    videos_qs = videos_qs[:grid_limit]
+    # Применяем лимит ПОСЛЕ фильтрации скрытых; состояние зрителя — в том же запросе
+    videos_qs = list(job_state.with_viewer_state(videos_qs, request.user)[:grid_limit])
 
     pub_videos_by_job = {}
     if videos_qs:
@@ -1251,31 +1135,11 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
         )
         pub_videos_by_job = {p.source_job_id: p for p in published_v}
 
-    from gallery.models import Like, JobComment
-
     videos_cards = []
     for j in videos_qs:
         p = pub_videos_by_job.get(j.id)
-
         # job-level metrics for ALL video jobs (published or not)
-        try:
-            v_job_like_count = Like.objects.filter(job=j).count()
-        except Exception:
-            v_job_like_count = 0
-        try:
-            v_job_comment_count = JobComment.objects.filter(
-                job=j, is_visible=True).count()
-        except Exception:
-            v_job_comment_count = 0
-        try:
-            v_job_save_count = JobSave.objects.filter(job=j).count()
-        except Exception:
-            v_job_save_count = 0
-        try:
-            v_job_liked = Like.objects.filter(
-                user=request.user, job=j).exists()
-        except Exception:
-            v_job_liked = False
+        metrics = job_state.card_metrics(j)
 
         if p and p.is_active:
             videos_cards.append({
@@ -1288,10 +1152,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
                     "saves": int(getattr(p, "saves_count", 0) or 0),
                     "views": int(getattr(p, "view_count", 0) or 0),
                 },
-                "job_like_count": v_job_like_count,
-                "job_comment_count": v_job_comment_count,
-                "job_liked": v_job_liked,
-                "job_save_count": v_job_save_count,
+                **metrics,
             })
         elif p and not p.is_active:
             videos_cards.append({
@@ -1299,10 +1160,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
                 "is_published": False,
                 "pub": None,
                 "pending_moderation": True,
-                "job_like_count": v_job_like_count,
-                "job_comment_count": v_job_comment_count,
-                "job_liked": v_job_liked,
-                "job_save_count": v_job_save_count,
+                **metrics,
             })
         else:
             videos_cards.append({
@@ -1310,10 +1168,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
                 "is_published": False,
                 "pub": None,
                 "pending_moderation": False,
-                "job_like_count": v_job_like_count,
-                "job_comment_count": v_job_comment_count,
-                "job_liked": v_job_liked,
-                "job_save_count": v_job_save_count,
+                **metrics,
             })
 
     # Published lists for not owner (render PublicPhoto/PublicVideo directly with actions)
@@ -1324,8 +1179,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
             from gallery.models import JobHide
             hidden_ids = list(JobHide.objects.filter(
                 user=target).values_list("job_id", flat=True))
-            pf_qs = PublicPhoto.objects.filter(uploaded_by=target, is_active=True).annotate(
-                saves_count=Count("saves", distinct=True))
+            pf_qs = PublicPhoto.objects.filter(uploaded_by=target, is_active=True)
             if hidden_ids:
                 pf_qs = pf_qs.exclude(source_job_id__in=hidden_ids)
             pub_photos = list(pf_qs.order_by("-created_at")[:grid_limit])
@@ -1335,8 +1189,7 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
             from gallery.models import JobHide
             hidden_ids = list(JobHide.objects.filter(
                 user=target).values_list("job_id", flat=True))
-            pv_qs = PublicVideo.objects.filter(uploaded_by=target, is_active=True).annotate(
-                saves_count=Count("saves", distinct=True))
+            pv_qs = PublicVideo.objects.filter(uploaded_by=target, is_active=True)
             if hidden_ids:
                 pv_qs = pv_qs.exclude(source_job_id__in=hidden_ids)
             pub_videos = list(pv_qs.order_by("-created_at")[:grid_limit])
@@ -1476,6 +1329,8 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
             "liked_video_ids": liked_video_ids,
             "saved_photo_ids": saved_photo_ids,
             "saved_video_ids": saved_video_ids,
+            "saved_job_ids": {j.id for j in photos_qs if j.viewer_saved},
+            "video_saved_job_ids": {j.id for j in videos_qs if j.viewer_saved},
             "hidden_job_ids": owner_hidden_ids,
 
             # Управление доступом — скрываем «Удалить/Поделиться» для чужих профилей
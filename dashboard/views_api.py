@@ -14,6 +14,7 @@ from .models import Wallet, Follow, Profile
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from django.db.models import Count, Q
+from ai_gallery.services import search
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 import re
@@ -376,7 +377,8 @@ def follow_toggle(request):
         except Exception:
             pass
 
-    followers_count = Follow.objects.filter(following=target).count()
+    # счётчик обновлён сигналом dashboard.signals в этом же запросе
+    followers_count = Profile.objects.filter(user=target).values_list("followers_count", flat=True).first() or 0
     return JsonResponse({"ok": True, "following": following, "followers_count": followers_count})
 
 
@@ -394,8 +396,9 @@ def follow_counters(request, username):
     if not target:
         return JsonResponse({"ok": False, "error": "user not found"}, status=404)
 
-    followers = Follow.objects.filter(following=target).count()
-    following = Follow.objects.filter(follower=target).count()
+    prof = Profile.objects.filter(user=target).only("followers_count", "following_count").first()
+    followers = prof.followers_count if prof else 0
+    following = prof.following_count if prof else 0
 
     # Публикации = только сохранённые пользователем завершенные работы (как в my-jobs)
     try:
@@ -426,47 +429,25 @@ def follow_search(request):
         limit = 10
     limit = max(1, min(limit, 50))
 
-    User = get_user_model()
-    qs = User.objects.exclude(id=request.user.id)
-
-    if q:
-        qs = qs.filter(
-            Q(username__icontains=q) |
-            Q(first_name__icontains=q) |
-            Q(last_name__icontains=q)
-        )
-
-    # Аннотируем количеством подписчиков
-    qs = qs.annotate(followers_count=Count("followers_relations", distinct=True)) \
-           .order_by("-followers_count", "username")[:limit]
+    # Совпадения с начала имени выше, затем по числу подписчиков
+    # (денормализованный Profile.followers_count, профиль — тем же запросом)
+    users = list(search.users(q, exclude=request.user.id)[:limit])
 
-    # Предзагрузка профилей
-    user_ids = [u.id for u in qs]
-    profiles = {p.user_id: p for p in Profile.objects.filter(
-        user_id__in=user_ids)}
     # Какие уже подписаны
+    user_ids = [u.id for u in users]
     already = set(Follow.objects.filter(follower=request.user,
                   following_id__in=user_ids).values_list("following_id", flat=True))
-    # Счётчики following
-    following_counts = dict(
-        Follow.objects.filter(follower_id__in=user_ids).values_list(
-            "follower_id").annotate(c=Count("id"))
-    )
-    followers_counts = dict(
-        Follow.objects.filter(following_id__in=user_ids).values_list(
-            "following_id").annotate(c=Count("id"))
-    )
 
     items = []
-    for u in qs:
-        prof = profiles.get(u.id)
+    for u in users:
+        prof = getattr(u, "profile", None)
         items.append({
             "username": u.username,
             "name": (u.first_name or "")[:64],
             "avatar_url": getattr(prof.avatar, "url", "") if prof and getattr(prof, "avatar", None) else "",
             "is_following": u.id in already,
-            "followers": int(followers_counts.get(u.id, 0)),
-            "following": int(following_counts.get(u.id, 0)),
+            "followers": prof.followers_count if prof else 0,
+            "following": prof.following_count if prof else 0,
         })
 
     return JsonResponse({"ok": True, "users": items})
@@ -518,38 +499,23 @@ def follow_recommendations(request):
         limit = 12
     limit = max(1, min(limit, 20))
 
-    User = get_user_model()
-
     # Уже подписаны
     already_ids = set(Follow.objects.filter(
         follower=request.user).values_list("following_id", flat=True))
 
-    qs = User.objects.exclude(id=request.user.id).exclude(id__in=already_ids) \
-        .annotate(followers_count=Count("followers_relations", distinct=True)) \
-        .order_by("-followers_count", "username")[:limit]
-
-    user_ids = [u.id for u in qs]
-    profiles = {p.user_id: p for p in Profile.objects.filter(
-        user_id__in=user_ids)}
-    following_counts = dict(
-        Follow.objects.filter(follower_id__in=user_ids).values_list(
-            "follower_id").annotate(c=Count("id"))
-    )
-    followers_counts = dict(
-        Follow.objects.filter(following_id__in=user_ids).values_list(
-            "following_id").annotate(c=Count("id"))
-    )
+    # Популярные — по денормализованному Profile.followers_count
+    users = search.users(exclude=request.user.id).exclude(id__in=already_ids)[:limit]
 
     recs = []
-    for u in qs:
-        prof = profiles.get(u.id)
+    for u in users:
+        prof = getattr(u, "profile", None)
         recs.append({
             "username": u.username,
             "name": (u.first_name or "")[:64],
             "avatar_url": getattr(prof.avatar, "url", "") if prof and getattr(prof, "avatar", None) else "",
             "is_following": False,
-            "followers": int(followers_counts.get(u.id, 0)),
-            "following": int(following_counts.get(u.id, 0)),
+            "followers": prof.followers_count if prof else 0,
+            "following": prof.following_count if prof else 0,
         })
 
     return JsonResponse({"ok": True, "users": recs})
@@ -4,3 +4,6 @@ class GalleryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gallery"
 
+    def ready(self):
+        # saves_count / hidden и версия ленты (gallery.services.feed)
+        from . import signals  # noqa: F401
@@ -1,4 +1,6 @@
 ﻿import django_filters
+
+from ai_gallery.services import search as search_service
 from .models import Image
 
 class ImageFilter(django_filters.FilterSet):
@@ -13,5 +15,6 @@ class ImageFilter(django_filters.FilterSet):
         v = (value or "").strip()
         if len(v) < 2:
             return queryset
-        return queryset.filter(title__icontains=v) | queryset.filter(description__icontains=v)
+        # у Image текст — только prompt (триграммный индекс на PostgreSQL)
+        return search_service.filter_text(queryset, ("prompt",), v)
 
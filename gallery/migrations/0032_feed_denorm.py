@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:53
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_feed_fields(apps, schema_editor):
+    """saves_count и hidden для уже существующих публикаций."""
+    JobHide = apps.get_model("gallery", "JobHide")
+    for model_name, save_model, fk in (
+        ("PublicPhoto", "PhotoSave", "photo"),
+        ("PublicVideo", "VideoSave", "video"),
+    ):
+        Model = apps.get_model("gallery", model_name)
+        Save = apps.get_model("gallery", save_model)
+        saves = (
+            Save.objects.filter(**{fk: OuterRef("pk")})
+            .order_by()
+            .values(fk)
+            .annotate(c=Count("pk"))
+            .values("c")
+        )
+        Model.objects.update(saves_count=Coalesce(Subquery(saves), 0))
+        Model.objects.filter(
+            Exists(JobHide.objects.filter(user_id=OuterRef("uploaded_by_id"), job_id=OuterRef("source_job_id")))
+        ).update(hidden=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0031_remove_like_guest_session_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publicphoto',
+            name='hidden',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='publicphoto',
+            name='saves_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='publicvideo',
+            name='hidden',
+            field=models.BooleanField(default=False, verbose_name='Скрыто владельцем'),
+        ),
+        migrations.AddField(
+            model_name='publicvideo',
+            name='saves_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сохранения'),
+        ),
+        migrations.AddIndex(
+            model_name='publicphoto',
+            index=models.Index(fields=['is_active', 'hidden', 'order', '-created_at', '-id'], name='photo_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='publicvideo',
+            index=models.Index(fields=['is_active', 'hidden', 'order', '-created_at', '-id'], name='video_feed_idx'),
+        ),
+        migrations.RunPython(backfill_feed_fields, reverse_code=migrations.RunPython.noop),
+    ]
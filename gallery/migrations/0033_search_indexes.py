@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:40
+
+from django.db import migrations
+
+# Поиск публикаций (ai_gallery.services.search): icontains/istartswith на
+# PostgreSQL — UPPER(col::text) LIKE ..., под это выражение триграммные GIN-индексы.
+TRGM_INDEXES = (
+    ("gallery_photo_title_trgm", "gallery_publicphoto", "title"),
+    ("gallery_photo_caption_trgm", "gallery_publicphoto", "caption"),
+    ("gallery_video_title_trgm", "gallery_publicvideo", "title"),
+    ("gallery_video_caption_trgm", "gallery_publicvideo", "caption"),
+    ("gallery_image_prompt_trgm", "gallery_image", "prompt"),
+)
+
+
+def create_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _table, _column in TRGM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gallery', '0032_feed_denorm'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, reverse_code=drop_trgm_indexes),
+    ]
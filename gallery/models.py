@@ -66,6 +66,7 @@ class PublicPhoto(models.Model):
     """
     Единственная валидная модель публикации в галерее.
     ВАЖНО: denorm-поля likes_count / comments_count поддерживаем атомарно во вьюхах через F().
+    saves_count и hidden ведут сигналы gallery.signals (PhotoSave / JobHide).
     """
     image = models.ImageField(upload_to="public/%Y/%m/")
     title = models.CharField(max_length=140, blank=True)
@@ -103,11 +104,19 @@ class PublicPhoto(models.Model):
     view_count = models.PositiveIntegerField(default=0, db_index=True)
     likes_count = models.PositiveIntegerField(default=0, db_index=True)
     comments_count = models.PositiveIntegerField(default=0, db_index=True)
+    saves_count = models.PositiveIntegerField(default=0)
+
+    # владелец скрыл исходную задачу (JobHide) — в общей ленте не показываем
+    hidden = models.BooleanField(default=False)
 
     class Meta:
         ordering = ("order", "-created_at")
         verbose_name = "Публичное фото"
         verbose_name_plural = "Публичные фото"
+        indexes = [
+            # лента: WHERE is_active AND NOT hidden ORDER BY order, -created_at, -id
+            models.Index(fields=["is_active", "hidden", "order", "-created_at", "-id"], name="photo_feed_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title or f"PublicPhoto #{self.pk}"
@@ -320,11 +329,18 @@ class PublicVideo(models.Model):
     view_count = models.PositiveIntegerField("Просмотры", default=0, db_index=True)
     likes_count = models.PositiveIntegerField("Лайки", default=0, db_index=True)
     comments_count = models.PositiveIntegerField("Комментарии", default=0, db_index=True)
+    saves_count = models.PositiveIntegerField("Сохранения", default=0)
+
+    # Владелец скрыл исходную задачу (JobHide) — в общей ленте не показываем
+    hidden = models.BooleanField("Скрыто владельцем", default=False)
 
     class Meta:
         ordering = ("order", "-created_at")
         verbose_name = "Публичное видео"
         verbose_name_plural = "Публичные видео"
+        indexes = [
+            models.Index(fields=["is_active", "hidden", "order", "-created_at", "-id"], name="video_feed_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title or f"PublicVideo #{self.pk}"
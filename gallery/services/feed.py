@@ -0,0 +1,244 @@
+"""
+Материализованная лента главной (PublicPhoto / PublicVideo).
+
+Вместо annotate(Count("saves")) + Exists(JobHide) + Paginator на 500 строк:
+  • saves_count и hidden — денормализованные поля, их ведут gallery.signals;
+  • «окно» ленты (GALLERY_FEED_WINDOW записей в порядке order, -created_at, -id)
+    читается одним range-запросом по photo_feed_idx/video_feed_idx и лежит
+    в caches.pages() — ключ содержит версию, её сдвигает bump() при изменении публикаций;
+  • страницы по GALLERY_FEED_PAGE_SIZE выдаются по курсору (keyset), без OFFSET.
+
+Для подписчиков лента делится на два сегмента — сначала авторы из подписок,
+потом остальные; внутри сегмента порядок тот же. Всё, что дальше окна, читается
+из БД тем же keyset-условием.
+
+Курсор — непрозрачная строка:
+    w.<seg>.<order>.<created_us>.<id>  — позиция внутри окна
+    t.<order>.<created_us>.<id>        — позиция в «хвосте» за окном
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+
+from ai_gallery.services import caches
+
+from . import view_counter
+
+log = logging.getLogger(__name__)
+
+KINDS = ("photo", "video")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_US = timedelta(microseconds=1)
+
+# (order, created_us, id, uploaded_by_id)
+Entry = Tuple[int, int, int, Optional[int]]
+
+
+@dataclass
+class FeedPage:
+    ids: List[int]
+    next_cursor: Optional[str]
+
+
+def _model(kind: str):
+    from gallery.models import PublicPhoto, PublicVideo
+
+    return PublicPhoto if kind == "photo" else PublicVideo
+
+
+def page_size() -> int:
+    return max(1, int(getattr(settings, "GALLERY_FEED_PAGE_SIZE", 60)))
+
+
+def _window_size() -> int:
+    return max(1, int(getattr(settings, "GALLERY_FEED_WINDOW", 1000)))
+
+
+def _to_us(dt: datetime) -> int:
+    return (dt - _EPOCH) // _US
+
+
+def _from_us(us: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=us)
+
+
+# ── Версия окна ──────────────────────────────────────────────────────────────
+
+
+def _version_key(kind: str) -> str:
+    return f"feed:ver:{kind}"
+
+
+def _version(kind: str) -> int:
+    try:
+        return int(caches.pages().get(_version_key(kind)) or 0)
+    except Exception:
+        return 0
+
+
+def bump(kind: str) -> None:
+    """Инвалидирует окна ленты данного типа (все категории разом)."""
+    try:
+        caches.pages().set(_version_key(kind), time.time_ns(), None)
+    except Exception as e:
+        log.warning("feed.bump(%s) failed: %s", kind, e)
+
+
+# ── Окно ─────────────────────────────────────────────────────────────────────
+
+
+def _base_qs(kind: str, category_id: Optional[int]):
+    qs = _model(kind).objects.filter(is_active=True)
+    if category_id:
+        qs = qs.filter(category_id=category_id)
+    return qs
+
+
+def _rows(qs, limit: int) -> List[Entry]:
+    rows = qs.order_by("order", "-created_at", "-id").values_list(
+        "order", "created_at", "id", "uploaded_by_id")[:limit]
+    return [(o, _to_us(c), pk, uid) for o, c, pk, uid in rows]
+
+
+def _window(kind: str, category_id: Optional[int]) -> Tuple[List[Entry], bool]:
+    """Первые GALLERY_FEED_WINDOW видимых записей + флаг «есть продолжение»."""
+    size = _window_size()
+    key = f"feed:{kind}:{category_id or 0}:{_version(kind)}"
+    cache = caches.pages()
+    try:
+        entries = cache.get(key)
+    except Exception:
+        entries = None
+    if entries is None:
+        entries = _rows(_base_qs(kind, category_id).filter(hidden=False), size + 1)
+        try:
+            cache.set(key, entries)
+        except Exception:
+            pass
+    return entries[:size], len(entries) > size
+
+
+def _base_key(e: Entry) -> tuple:
+    return (e[0], -e[1], -e[2])
+
+
+def _tail(kind: str, category_id: Optional[int], after: Entry, limit: int,
+          viewer_id: Optional[int]) -> List[Entry]:
+    order, us, pk = after[0], after[1], after[2]
+    created = _from_us(us)
+    visible = Q(hidden=False)
+    if viewer_id:
+        visible |= Q(uploaded_by_id=viewer_id)
+    qs = _base_qs(kind, category_id).filter(visible).filter(
+        Q(order__gt=order)
+        | Q(order=order, created_at__lt=created)
+        | Q(order=order, created_at=created, id__lt=pk)
+    )
+    return _rows(qs, limit)
+
+
+# ── Курсор ───────────────────────────────────────────────────────────────────
+
+
+def _encode(entry: Entry, seg: Optional[int] = None) -> str:
+    if seg is None:
+        return f"t.{entry[0]}.{entry[1]}.{entry[2]}"
+    return f"w.{seg}.{entry[0]}.{entry[1]}.{entry[2]}"
+
+
+def _decode(cursor: str):
+    """→ ("w", seg, entry) | ("t", None, entry) | None"""
+    try:
+        parts = (cursor or "").split(".")
+        if parts[0] == "w" and len(parts) == 5:
+            seg, order, us, pk = (int(p) for p in parts[1:])
+            return "w", seg, (order, us, pk, None)
+        if parts[0] == "t" and len(parts) == 4:
+            order, us, pk = (int(p) for p in parts[1:])
+            return "t", None, (order, us, pk, None)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+# ── Страница ─────────────────────────────────────────────────────────────────
+
+
+def page(
+    kind: str,
+    *,
+    cursor: str = "",
+    category_id: Optional[int] = None,
+    viewer_id: Optional[int] = None,
+    followed_ids: Iterable[int] = (),
+) -> FeedPage:
+    """
+    Страница ленты после cursor. viewer_id — автор видит и свои скрытые публикации
+    (как раньше через Exists(JobHide) | uploaded_by=user), followed_ids — подписки.
+    """
+    limit = page_size()
+    decoded = _decode(cursor)
+
+    if decoded and decoded[0] == "t":
+        rows = _tail(kind, category_id, decoded[2], limit + 1, viewer_id)
+        return FeedPage([e[2] for e in rows[:limit]], _encode(rows[limit - 1]) if len(rows) > limit else None)
+
+    entries, truncated = _window(kind, category_id)
+
+    if viewer_id:
+        # свои скрытые публикации: единицы строк, индекс по uploaded_by
+        own = _rows(_base_qs(kind, category_id).filter(hidden=True, uploaded_by_id=viewer_id), _window_size())
+        if truncated and entries:
+            last = _base_key(entries[-1])
+            own = [e for e in own if _base_key(e) <= last]
+        entries = entries + own
+
+    followed = set(followed_ids or ())
+
+    def seg(e: Entry) -> int:
+        return 0 if followed and e[3] in followed else 1
+
+    keyed = sorted(((seg(e),) + _base_key(e), e) for e in entries)
+    keys = [k for k, _ in keyed]
+
+    start = 0
+    if decoded:
+        _, s, e = decoded
+        start = bisect.bisect_right(keys, (s,) + _base_key(e))
+
+    chunk = keyed[start:start + limit]
+    ids = [e[2] for _, e in chunk]
+
+    if start + limit < len(keyed):
+        k, e = chunk[-1]
+        return FeedPage(ids, _encode(e, k[0]))
+    if not truncated or not entries:
+        return FeedPage(ids, None)
+
+    # окно закончилось — добираем из БД после последней записи окна
+    after = max(entries, key=_base_key)
+    rest = _tail(kind, category_id, after, limit - len(ids) + 1, viewer_id)
+    need = limit - len(ids)
+    ids += [e[2] for e in rest[:need]]
+    if len(rest) > need:
+        return FeedPage(ids, _encode(rest[need - 1] if need else after))
+    return FeedPage(ids, None)
+
+
+def load(kind: str, ids: List[int]) -> list:
+    """Объекты страницы в порядке ids."""
+    if not ids:
+        return []
+    objs = _model(kind).objects.filter(pk__in=ids).select_related("uploaded_by", "category")
+    by_id = {o.pk: o for o in objs}
+    view_counter.apply_pending(kind, by_id.values())
+    return [by_id[i] for i in ids if i in by_id]
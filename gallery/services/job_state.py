@@ -0,0 +1,63 @@
+"""
+Метрики и состояние зрителя для карточек GenerationJob (my_jobs, профиль, «Сохранённое»).
+
+Счётчики лежат на самой задаче (likes_count / comments_count / saves_count,
+их ведут сигналы gallery.signals), а «лайкнул/сохранил ли зритель» добавляется
+аннотацией Exists к тому же запросу, что выбирает задачи. Страница карточек —
+один запрос независимо от её размера.
+"""
+from __future__ import annotations
+
+from typing import Iterable, Set, Tuple
+
+from django.db.models import Exists, OuterRef, QuerySet, Value
+
+
+def with_viewer_state(qs: QuerySet, user) -> QuerySet:
+    """Аннотирует viewer_liked / viewer_saved для user (гость — всегда False)."""
+    from gallery.models import JobSave, Like
+
+    if not getattr(user, "is_authenticated", False):
+        return qs.annotate(viewer_liked=Value(False), viewer_saved=Value(False))
+    return qs.annotate(
+        viewer_liked=Exists(Like.objects.filter(job_id=OuterRef("pk"), user=user)),
+        viewer_saved=Exists(JobSave.objects.filter(job_id=OuterRef("pk"), user=user)),
+    )
+
+
+def viewer_state(user, job_ids: Iterable[int]) -> Tuple[Set[int], Set[int]]:
+    """(liked_ids, saved_ids) для уже выбранных задач — одним запросом."""
+    from generate.models import GenerationJob
+
+    ids = list(set(job_ids))
+    if not ids or not getattr(user, "is_authenticated", False):
+        return set(), set()
+    rows = with_viewer_state(GenerationJob.objects.filter(pk__in=ids), user).values_list(
+        "pk", "viewer_liked", "viewer_saved")
+    liked, saved = set(), set()
+    for pk, is_liked, is_saved in rows:
+        if is_liked:
+            liked.add(pk)
+        if is_saved:
+            saved.add(pk)
+    return liked, saved
+
+
+def card_metrics(job) -> dict:
+    """job_* ключи карточки my_jobs.html; viewer_* берутся из with_viewer_state."""
+    return {
+        "job_like_count": int(job.likes_count or 0),
+        "job_comment_count": int(job.comments_count or 0),
+        "job_save_count": int(job.saves_count or 0),
+        "job_liked": bool(getattr(job, "viewer_liked", False)),
+    }
+
+
+def counts(jobs: Iterable) -> Tuple[dict, dict, dict]:
+    """({id: лайки}, {id: комментарии}, {id: сохранения}) по загруженным задачам."""
+    likes, comments, saves = {}, {}, {}
+    for j in jobs:
+        likes[j.id] = int(j.likes_count or 0)
+        comments[j.id] = int(j.comments_count or 0)
+        saves[j.id] = int(j.saves_count or 0)
+    return likes, comments, saves
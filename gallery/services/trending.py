@@ -0,0 +1,159 @@
+"""
+Общие (не per-user) рейтинги трендов: ID-списки для views/likes/new, фото и видео.
+
+Считает gallery.tasks.refresh_trending по Celery Beat (TRENDING_REFRESH_INTERVAL)
+и кладёт в caches.pages(); вьюхи только читают готовые списки, грузят объекты
+одним pk__in и накладывают состояние пользователя (лайк/сохранение) для тех же id.
+Если списка в кэше нет (холодный старт, Beat не запущен) — считается на месте.
+
+Оценка с затуханием по возрасту (в днях):
+    score = metric / (age_days + 2) ** gravity
+    views — view_count, likes — likes_count + saves_count,
+    new   — публикации за TRENDING_NEW_DAYS дней, метрика 1 + likes + saves
+            с более сильным затуханием (свежие вверху, «залайканные» — выше равных по возрасту).
+Кандидаты — TRENDING_CANDIDATES лучших по «сырой» метрике, в списке — TRENDING_SIZE.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from ai_gallery.services import caches
+
+from . import view_counter
+
+log = logging.getLogger(__name__)
+
+KINDS = ("photo", "video")
+MODES = ("views", "likes", "new")
+# страница трендов во вьюхах (?page=); список целиком — TRENDING_SIZE
+PAGE_SIZE = 500
+
+
+def _model(kind: str):
+    from gallery.models import PublicPhoto, PublicVideo
+
+    return PublicPhoto if kind == "photo" else PublicVideo
+
+
+def _key(kind: str, mode: str) -> str:
+    return f"trending:{kind}:{mode}"
+
+
+def _size() -> int:
+    return int(getattr(settings, "TRENDING_SIZE", 500))
+
+
+def _timeout() -> int:
+    # переживает пару пропущенных запусков Beat
+    return int(getattr(settings, "TRENDING_REFRESH_INTERVAL", 300)) * 3
+
+
+def normalize_mode(mode: str, default: str = "views") -> str:
+    mode = (mode or "").lower()
+    return mode if mode in MODES else default
+
+
+def compute(kind: str, mode: str, now=None) -> List[int]:
+    now = now or timezone.now()
+    gravity = float(getattr(settings, "TRENDING_GRAVITY", 0.5))
+    candidates = int(getattr(settings, "TRENDING_CANDIDATES", 5000))
+
+    qs = _model(kind).objects.filter(is_active=True, hidden=False)
+    if mode == "new":
+        qs = qs.filter(created_at__gte=now - timedelta(days=int(getattr(settings, "TRENDING_NEW_DAYS", 10))))
+        qs = qs.order_by("-created_at")
+        gravity *= 3
+    elif mode == "likes":
+        qs = qs.order_by("-likes_count", "-view_count", "-created_at")
+    else:
+        qs = qs.order_by("-view_count", "-likes_count", "-created_at")
+
+    rows = qs.values_list("id", "view_count", "likes_count", "saves_count", "created_at")[:candidates]
+
+    def score(row) -> float:
+        _, views, likes, saves, created = row
+        if mode == "views":
+            metric = views
+        elif mode == "likes":
+            metric = likes + saves
+        else:
+            metric = 1 + likes + saves
+        age_days = max(0.0, (now - created).total_seconds() / 86400)
+        return metric / (age_days + 2) ** gravity
+
+    ranked = sorted(rows, key=lambda r: (score(r), r[4]), reverse=True)
+    return [r[0] for r in ranked[:_size()]]
+
+
+def refresh(now=None) -> Dict[str, int]:
+    """Пересчитывает все списки. Возвращает их размеры (для логов задачи)."""
+    now = now or timezone.now()
+    cache = caches.pages()
+    sizes: Dict[str, int] = {}
+    for kind in KINDS:
+        for mode in MODES:
+            ids = compute(kind, mode, now)
+            cache.set(_key(kind, mode), ids, _timeout())
+            sizes[f"{kind}:{mode}"] = len(ids)
+    return sizes
+
+
+def ranked_ids(kind: str, mode: str, limit: Optional[int] = None) -> List[int]:
+    mode = normalize_mode(mode)
+    cache = caches.pages()
+    try:
+        ids = cache.get(_key(kind, mode))
+    except Exception:
+        ids = None
+    if ids is None:
+        ids = compute(kind, mode)
+        try:
+            cache.set(_key(kind, mode), ids, _timeout())
+        except Exception:
+            pass
+    return ids[:limit] if limit else ids
+
+
+def load(kind: str, ids: List[int]) -> list:
+    """
+    Объекты в порядке ids. Публикация могла стать неактивной/скрытой после
+    пересчёта — такие отбрасываем.
+    """
+    if not ids:
+        return []
+    qs = _model(kind).objects.filter(pk__in=ids, is_active=True, hidden=False).select_related("category", "uploaded_by")
+    by_id = {o.pk: o for o in qs}
+    view_counter.apply_pending(kind, by_id.values())
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def load_modes(kind: str, limit: Optional[int] = None) -> Dict[str, list]:
+    """{mode: [объекты]} для всех режимов — одним запросом по объединению id."""
+    ids = {mode: ranked_ids(kind, mode, limit) for mode in MODES}
+    union = list(dict.fromkeys(i for mode in MODES for i in ids[mode]))
+    objs = {o.pk: o for o in load(kind, union)}
+    return {mode: [objs[i] for i in ids[mode] if i in objs] for mode in MODES}
+
+
+def viewer_state(user, session_key: str, kind: str, ids: Iterable[int]):
+    """(liked_ids, saved_ids) пользователя/гостя для переданных id — не больше двух запросов."""
+    from gallery.models import PhotoLike, PhotoSave, VideoLike, VideoSave
+
+    ids = list(set(ids))
+    if not ids:
+        return set(), set()
+    Like, Save, fk = (PhotoLike, PhotoSave, "photo_id") if kind == "photo" else (VideoLike, VideoSave, "video_id")
+    lookup = {f"{fk}__in": ids}
+    if user.is_authenticated:
+        liked = set(Like.objects.filter(user=user, **lookup).values_list(fk, flat=True))
+        saved = set(Save.objects.filter(user=user, **lookup).values_list(fk, flat=True))
+        return liked, saved
+    if not session_key:
+        return set(), set()
+    liked = set(Like.objects.filter(user__isnull=True, session_key=session_key, **lookup).values_list(fk, flat=True))
+    return liked, set()
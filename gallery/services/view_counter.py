@@ -0,0 +1,206 @@
+"""
+Буферизованные счётчики просмотров PublicPhoto / PublicVideo (write-behind).
+
+Просмотр не делает UPDATE по «горячей» строке: прирост копится в общем кэше
+(caches.get("default")), а gallery.tasks.flush_view_counters раз в
+VIEW_FLUSH_INTERVAL секунд переносит накопленное в БД одним UPDATE на пачку.
+
+Ключи:
+    views:n:{kind}:{pk}     — ещё не сброшенный прирост
+    views:seq:{kind}        — номер последней записи журнала «грязных» id
+    views:log:{kind}:{n}    — pk, у которого прирост стал ненулевым
+    views:cursor:{kind}     — до какой записи журнал уже разобран
+
+Запись в журнал делается при переходе прироста 0 → n, поэтому журнал растёт
+не быстрее числа разных просмотренных публикаций за интервал. При сбросе
+прирост снимается через decr на прочитанное значение; если после decr остался
+остаток (просмотры между get и decr), pk снова пишется в журнал — остаток
+уйдёт следующим сбросом.
+
+Дедупликация (VIEW_DEDUP_TTL > 0): один просмотр на зрителя за окно —
+маркер cache.add в caches.ratelimit(). Зритель — сессия, а у анонима без
+сессии (она создаётся лениво) — cookie gid, см. viewer_key().
+
+Чтение: pending()/apply_pending() добавляют несброшенный прирост к объектам,
+так что счётчик на страницах не отстаёт от реальности на интервал сброса.
+Без буфера (VIEW_COUNTER_BUFFER=False, по умолчанию без REDIS_CACHE_URL или при
+синхронном Celery) или при недоступном кэше — прежний UPDATE view_count = view_count + 1.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Value, When
+
+from ai_gallery.services import caches
+
+log = logging.getLogger(__name__)
+
+KINDS = ("photo", "video")
+# запись журнала живёт заметно дольше интервала сброса
+_LOG_TTL = 24 * 60 * 60
+
+
+def _model(kind: str):
+    from gallery.models import PublicPhoto, PublicVideo
+
+    return PublicPhoto if kind == "photo" else PublicVideo
+
+
+def _cache():
+    return caches.get("default")
+
+
+def _n_key(kind: str, pk: int) -> str:
+    return f"views:n:{kind}:{pk}"
+
+
+def _journal(cache, kind: str) -> caches.Journal:
+    return caches.Journal(cache, "views:{part}:" + kind, ttl=_LOG_TTL)
+
+
+def _buffered() -> bool:
+    return bool(getattr(settings, "VIEW_COUNTER_BUFFER", True))
+
+
+def _write_through(kind: str, pk: int, n: int = 1) -> None:
+    _model(kind).objects.filter(pk=pk).update(view_count=F("view_count") + n)
+
+
+def viewer_key(request) -> str:
+    """Ключ дедупликации: сессия, иначе стойкий cookie gid; сессию не создаёт."""
+    session_key = request.session.session_key
+    if session_key:
+        return session_key
+    gid = (request.COOKIES.get("gid") or "").strip()
+    return f"gid:{gid[:64]}" if gid else ""
+
+
+def _first_view(kind: str, pk: int, session_key: str) -> bool:
+    ttl = int(getattr(settings, "VIEW_DEDUP_TTL", 0))
+    if ttl <= 0 or not session_key:
+        return True
+    try:
+        return caches.ratelimit().add(f"views:seen:{kind}:{pk}:{session_key}", 1, ttl)
+    except Exception:
+        return True
+
+
+def hit(kind: str, pk: int, session_key: str = "") -> bool:
+    """Учитывает просмотр. False — просмотр отброшен дедупликацией."""
+    if not _first_view(kind, pk, session_key):
+        return False
+    if not _buffered():
+        _write_through(kind, pk)
+        return True
+
+    if not _add(_cache(), kind, pk, 1):
+        # кэш недоступен — пишем сразу
+        _write_through(kind, pk)
+    return True
+
+
+def _add(cache, kind: str, pk: int, n: int) -> bool:
+    """+n к приросту; при переходе 0 → n — запись в журнал. False — кэш недоступен."""
+    key = _n_key(kind, pk)
+    try:
+        cache.add(key, 0, _LOG_TTL)
+        value = cache.incr(key, n)
+    except ValueError:
+        # ключ истёк между add и incr
+        try:
+            cache.set(key, n, _LOG_TTL)
+            value = n
+        except Exception:
+            return False
+    except Exception as e:
+        log.warning("view_counter: incr %s failed: %s", key, e)
+        return False
+    if value == n:
+        _journal(cache, kind).append(pk)
+    return True
+
+
+def pending(kind: str, ids: Iterable[int]) -> Dict[int, int]:
+    """{pk: несброшенный прирост} — один get_many."""
+    ids = list(dict.fromkeys(ids))
+    if not ids or not _buffered():
+        return {}
+    try:
+        raw = _cache().get_many([_n_key(kind, pk) for pk in ids])
+    except Exception:
+        return {}
+    out = {}
+    for pk in ids:
+        n = int(raw.get(_n_key(kind, pk)) or 0)
+        if n > 0:
+            out[pk] = n
+    return out
+
+
+def apply_pending(kind: str, objs: Iterable) -> None:
+    """Прибавляет несброшенный прирост к obj.view_count (на месте)."""
+    objs = [o for o in objs if o is not None]
+    delta = pending(kind, [o.pk for o in objs])
+    for o in objs:
+        if o.pk in delta:
+            o.view_count = int(o.view_count or 0) + delta[o.pk]
+
+
+def _take(cache, kind: str, ids: List[int]) -> Dict[int, int]:
+    """Снимает прирост для ids: {pk: n}."""
+    raw = cache.get_many([_n_key(kind, pk) for pk in ids])
+    taken = {}
+    for pk in ids:
+        n = int(raw.get(_n_key(kind, pk)) or 0)
+        if n <= 0:
+            continue
+        try:
+            left = cache.decr(_n_key(kind, pk), n)
+            cache.touch(_n_key(kind, pk), _LOG_TTL)
+        except ValueError:
+            # ключ истёк между get и decr — прирост всё равно переносим
+            left = 0
+        if left > 0:
+            # просмотры между get_many и decr: переход 0 → n уже был, журнала
+            # у них нет — без новой записи этот pk больше не сбросится
+            _journal(cache, kind).append(pk)
+        taken[pk] = n
+    return taken
+
+
+def _apply(kind: str, deltas: Dict[int, int]) -> int:
+    if not deltas:
+        return 0
+    whens = [When(pk=pk, then=Value(n)) for pk, n in deltas.items()]
+    return _model(kind).objects.filter(pk__in=list(deltas)).update(
+        view_count=F("view_count") + Case(*whens, default=Value(0), output_field=IntegerField())
+    )
+
+
+def flush(kind: str) -> int:
+    """Переносит прирост одного вида в БД. → число просмотров."""
+    cache = _cache()
+
+    def apply(ids: List[int]) -> int:
+        deltas = _take(cache, kind, ids)
+        try:
+            _apply(kind, deltas)
+        except Exception:
+            # вернуть прирост в кэш, чтобы повторить в следующий раз
+            for pk, n in deltas.items():
+                _add(cache, kind, pk, n)
+            raise
+        return sum(deltas.values())
+
+    try:
+        return _journal(cache, kind).drain(apply, chunk=int(getattr(settings, "VIEW_FLUSH_CHUNK", 500)))
+    except Exception as e:
+        log.error("view_counter: flush %s failed: %s", kind, e)
+        return 0
+
+
+def flush_all() -> Dict[str, int]:
+    return {kind: flush(kind) for kind in KINDS}
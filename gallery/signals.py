@@ -0,0 +1,140 @@
+"""
+Поддержка денормализованных полей ленты (см. gallery.services.feed):
+  • PublicPhoto/PublicVideo.saves_count — по PhotoSave/VideoSave
+  • PublicPhoto/PublicVideo.hidden      — по JobHide владельца исходной задачи
+  • версия окна ленты — при изменении самих публикаций
+  • GenerationJob.likes_count / comments_count / saves_count — по Like,
+    JobComment (только видимые) и JobSave; обновление идёт в той же транзакции,
+    что и запись взаимодействия
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from generate.models import GenerationJob
+
+from .models import JobComment, JobHide, JobSave, Like, PhotoSave, PublicPhoto, PublicVideo, VideoSave
+from .services import feed
+
+# обновления только этих полей не меняют состав/порядок ленты
+_COUNTER_FIELDS = {"view_count", "likes_count", "comments_count", "saves_count"}
+
+
+def _bump_saves(model, pk, delta: int) -> None:
+    model.objects.filter(pk=pk).update(saves_count=Greatest(F("saves_count") + delta, Value(0)))
+
+
+@receiver(post_save, sender=PhotoSave)
+def photo_save_added(sender, instance, created, **kwargs):
+    if created:
+        _bump_saves(PublicPhoto, instance.photo_id, 1)
+
+
+@receiver(post_delete, sender=PhotoSave)
+def photo_save_removed(sender, instance, **kwargs):
+    _bump_saves(PublicPhoto, instance.photo_id, -1)
+
+
+@receiver(post_save, sender=VideoSave)
+def video_save_added(sender, instance, created, **kwargs):
+    if created:
+        _bump_saves(PublicVideo, instance.video_id, 1)
+
+
+@receiver(post_delete, sender=VideoSave)
+def video_save_removed(sender, instance, **kwargs):
+    _bump_saves(PublicVideo, instance.video_id, -1)
+
+
+def _bump_job(job_id, field: str, delta: int) -> None:
+    if job_id:
+        GenerationJob.objects.filter(pk=job_id).update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+@receiver(post_save, sender=Like)
+def job_like_added(sender, instance, created, **kwargs):
+    if created:
+        _bump_job(instance.job_id, "likes_count", 1)
+
+
+@receiver(post_delete, sender=Like)
+def job_like_removed(sender, instance, **kwargs):
+    _bump_job(instance.job_id, "likes_count", -1)
+
+
+@receiver(post_save, sender=JobSave)
+def job_save_added(sender, instance, created, **kwargs):
+    if created:
+        _bump_job(instance.job_id, "saves_count", 1)
+
+
+@receiver(post_delete, sender=JobSave)
+def job_save_removed(sender, instance, **kwargs):
+    _bump_job(instance.job_id, "saves_count", -1)
+
+
+@receiver(post_save, sender=JobComment)
+@receiver(post_delete, sender=JobComment)
+def job_comments_changed(sender, instance, **kwargs):
+    """
+    Пересчёт, а не дельта: видимость комментария меняется модерацией
+    (и из админки), а при удалении ветки каскадом уходят и ответы.
+    """
+    visible = (
+        JobComment.objects.filter(job_id=OuterRef("pk"), is_visible=True)
+        .order_by().values("job_id").annotate(c=Count("pk")).values("c")
+    )
+    GenerationJob.objects.filter(pk=instance.job_id).update(comments_count=Coalesce(Subquery(visible), 0))
+
+
+def _set_hidden(user_id, job_id, hidden: bool) -> None:
+    for model, kind in ((PublicPhoto, "photo"), (PublicVideo, "video")):
+        if model.objects.filter(uploaded_by_id=user_id, source_job_id=job_id).exclude(
+                hidden=hidden).update(hidden=hidden):
+            feed.bump(kind)
+
+
+@receiver(post_save, sender=JobHide)
+def job_hidden(sender, instance, created, **kwargs):
+    if created:
+        _set_hidden(instance.user_id, instance.job_id, True)
+
+
+@receiver(post_delete, sender=JobHide)
+def job_unhidden(sender, instance, **kwargs):
+    _set_hidden(instance.user_id, instance.job_id, False)
+
+
+def _owner_hid(instance) -> bool:
+    return bool(
+        instance.uploaded_by_id and instance.source_job_id
+        and JobHide.objects.filter(user_id=instance.uploaded_by_id, job_id=instance.source_job_id).exists()
+    )
+
+
+@receiver(pre_save, sender=PublicPhoto)
+@receiver(pre_save, sender=PublicVideo)
+def publication_hidden_flag(sender, instance, update_fields=None, **kwargs):
+    """hidden для новой публикации и полного save()."""
+    if update_fields is None:
+        instance.hidden = _owner_hid(instance)
+
+
+@receiver(post_save, sender=PublicPhoto)
+@receiver(post_save, sender=PublicVideo)
+def publication_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None:
+        fields = set(update_fields)
+        if fields <= _COUNTER_FIELDS:
+            return
+        if {"uploaded_by", "source_job"} & fields:
+            instance.hidden = _owner_hid(instance)
+            sender.objects.filter(pk=instance.pk).update(hidden=instance.hidden)
+    feed.bump("photo" if sender is PublicPhoto else "video")
+
+
+@receiver(post_delete, sender=PublicPhoto)
+@receiver(post_delete, sender=PublicVideo)
+def publication_deleted(sender, instance, **kwargs):
+    feed.bump("photo" if sender is PublicPhoto else "video")
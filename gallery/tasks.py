@@ -0,0 +1,30 @@
+# gallery/tasks.py
+from __future__ import annotations
+
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from .services import trending, view_counter
+
+log = logging.getLogger(__name__)
+
+BACKGROUND_QUEUE = getattr(settings, "CELERY_QUEUE_BACKGROUND", "default")
+
+
+# ── Тренды: общий пересчёт рейтингов (Celery Beat) ───────────────────────────
+@shared_task(name="gallery.tasks.refresh_trending", queue=BACKGROUND_QUEUE, ignore_result=True)
+def refresh_trending() -> dict:
+    sizes = trending.refresh()
+    log.info("trending refreshed: %s", sizes)
+    return sizes
+
+
+# ── Просмотры: перенос буфера счётчиков в БД (Celery Beat) ───────────────────
+@shared_task(name="gallery.tasks.flush_view_counters", queue=BACKGROUND_QUEUE, ignore_result=True)
+def flush_view_counters() -> dict:
+    flushed = view_counter.flush_all()
+    if any(flushed.values()):
+        log.info("view counters flushed: %s", flushed)
+    return flushed
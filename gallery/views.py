@@ -1,18 +1,17 @@
 ﻿# gallery/views.py
 from __future__ import annotations
 
-from datetime import timedelta
 from typing import Any
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
+from ai_gallery.services import ratelimit
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import F, Value, Case, When, IntegerField, Count, Exists, OuterRef, Q
+from django.db.models import F, Value
 from django.db.models.functions import Greatest
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
@@ -24,6 +23,9 @@ from django.conf import settings
 
 from generate.models import GenerationJob
 from .forms import SharePhotoFromJobForm, PhotoCommentForm
+from .services import feed
+from .services import trending as trending_rank
+from .services import view_counter
 from .models import (
     PublicPhoto,
     Category,
@@ -194,10 +196,9 @@ def _job_has_file(job: GenerationJob) -> bool:
         return False
 
 
-def _mark_photo_viewed_once(_request: HttpRequest, photo_id: int) -> None:
-    """Инкремент счётчика просмотров (простая модель, без дедупликации)."""
-    PublicPhoto.objects.filter(pk=photo_id).update(
-        view_count=F("view_count") + 1)
+def _mark_photo_viewed_once(request: HttpRequest, photo_id: int) -> None:
+    """Просмотр в буфер счётчиков (gallery.services.view_counter), дедупликация — по сессии или gid."""
+    view_counter.hit("photo", photo_id, view_counter.viewer_key(request))
 
 
 # ───────────────────────── LIST / INDEX ─────────────────────────
@@ -428,7 +429,7 @@ def index(request: HttpRequest) -> HttpResponse:
         # Для гостей ищем по всем возможным идентификаторам
         from django.db.models import Q
 
-        skey = _ensure_session_key(request)
+        skey = request.session.session_key or ""
         gid = _guest_cookie_id(request) or ""
         fp = _get_fp_from_request(request) or _hard_fingerprint(request)
 
@@ -470,30 +471,9 @@ def index(request: HttpRequest) -> HttpResponse:
     categories = Category.objects.all()
     video_categories = VideoCategory.objects.all()
 
-    # ПУБЛИЧНЫЕ ФОТО
-    photos_qs = (
-        PublicPhoto.objects.filter(is_active=True)
-        .annotate(saves_count=Count("saves", distinct=True))
-        .select_related("uploaded_by", "category")
-        .order_by("order", "-created_at")
-    )
-
-    # ПУБЛИЧНЫЕ ВИДЕО
-    videos_qs = (
-        PublicVideo.objects.filter(is_active=True)
-        .annotate(saves_count=Count("saves", distinct=True))
-        .select_related("uploaded_by", "category")
-        .order_by("order", "-created_at")
-    )
-
     active_category = None
     if cat_slug:
         active_category = Category.objects.filter(slug=cat_slug).first()
-        if active_category:
-            if hasattr(PublicPhoto, "categories"):
-                photos_qs = photos_qs.filter(categories__slug=cat_slug)
-            else:
-                photos_qs = photos_qs.filter(category__slug=cat_slug)
 
     # Video category filtering (independent from photo category)
     active_video_category = None
@@ -509,82 +489,43 @@ def index(request: HttpRequest) -> HttpResponse:
                 # Keep slug in sync for templates / JS helpers
                 if not vcat_slug:
                     vcat_slug = active_video_category.slug or ""
-                videos_qs = videos_qs.filter(category=active_video_category)
     elif vcat_slug:
         active_video_category = VideoCategory.objects.filter(slug=vcat_slug).first()
-        if active_video_category:
-            videos_qs = videos_qs.filter(category__slug=vcat_slug)
-
-    # Hide publications linked to hidden source jobs (not visible to others)
-    try:
-        from .models import JobHide
-        # Determine relation name on PublicPhoto dynamically: source_job or job
-        pf_names = {f.name for f in PublicPhoto._meta.get_fields()}
-        photo_rel_id = "source_job_id" if "source_job" in pf_names else (
-            "job_id" if "job" in pf_names else None)
-        if photo_rel_id:
-            photos_qs = photos_qs.annotate(
-                hidden_by_owner=Exists(
-                    JobHide.objects.filter(user=OuterRef(
-                        "uploaded_by_id"), job_id=OuterRef(photo_rel_id))
-                )
-            )
-        videos_qs = videos_qs.annotate(
-            hidden_by_owner=Exists(
-                JobHide.objects.filter(user=OuterRef(
-                    "uploaded_by_id"), job_id=OuterRef("source_job_id"))
-            )
-        )
-        if request.user.is_authenticated:
-            if photo_rel_id:
-                photos_qs = photos_qs.filter(
-                    Q(hidden_by_owner=False) | Q(uploaded_by_id=request.user.id))
-            videos_qs = videos_qs.filter(
-                Q(hidden_by_owner=False) | Q(uploaded_by_id=request.user.id))
-        else:
-            if photo_rel_id:
-                photos_qs = photos_qs.filter(hidden_by_owner=False)
-            videos_qs = videos_qs.filter(hidden_by_owner=False)
-    except Exception:
-        pass
 
     # Instagram-like feed ordering for authenticated users:
     #  - first show posts from followings
-    #  - then recommendations (others), keeping overall recency/popularity order
-    if request.user.is_authenticated:
+    #  - then recommendations (others)
+    # Лента материализована (gallery.services.feed): скрытые владельцем публикации
+    # отсечены флагом hidden, saves_count — денормализованное поле, страницы по курсору.
+    viewer_id = request.user.id if request.user.is_authenticated else None
+    followed_ids: list[int] = []
+    if viewer_id:
         try:
             followed_ids = list(Follow.objects.filter(
                 follower=request.user).values_list("following_id", flat=True))
         except Exception:
             followed_ids = []
 
-        if followed_ids:
-            photos_qs = photos_qs.annotate(
-                feed_priority=Case(
-                    When(uploaded_by_id__in=followed_ids, then=Value(0)),
-                    default=Value(1),
-                    output_field=IntegerField(),
-                )
-            ).order_by("feed_priority", "-created_at", "-likes_count", "-view_count")
-
-            videos_qs = videos_qs.annotate(
-                feed_priority=Case(
-                    When(uploaded_by_id__in=followed_ids, then=Value(0)),
-                    default=Value(1),
-                    output_field=IntegerField(),
-                )
-            ).order_by("feed_priority", "-created_at", "-likes_count", "-view_count")
-
-    paginator = Paginator(photos_qs, 500)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
-
-    videos_paginator = Paginator(videos_qs, 500)
-    videos_page_obj = videos_paginator.get_page(request.GET.get("vpage") or 1)
+    photos_page = feed.page(
+        "photo",
+        cursor=request.GET.get("cursor") or "",
+        category_id=active_category.pk if active_category else None,
+        viewer_id=viewer_id,
+        followed_ids=followed_ids,
+    )
+    videos_page = feed.page(
+        "video",
+        cursor=request.GET.get("vcursor") or "",
+        category_id=active_video_category.pk if active_video_category else None,
+        viewer_id=viewer_id,
+        followed_ids=followed_ids,
+    )
+    public_photos = feed.load("photo", photos_page.ids)
+    public_videos = feed.load("video", videos_page.ids)
 
     # Определяем лайкнутые ФОТО на странице
     liked_photo_ids: set[int] = set()
-    page_photo_ids = list(page_obj.object_list.values_list(
-        "id", flat=True)) if page_obj.object_list else []
+    page_photo_ids = [p.pk for p in public_photos]
     if page_photo_ids:
         if request.user.is_authenticated:
             liked_photo_ids = set(
@@ -592,8 +533,8 @@ def index(request: HttpRequest) -> HttpResponse:
                     user=request.user, photo_id__in=page_photo_ids
                 ).values_list("photo_id", flat=True)
             )
-        else:
-            skey = _ensure_session_key(request)
+        elif request.session.session_key:
+            skey = request.session.session_key
             liked_photo_ids = set(
                 PhotoLike.objects.filter(
                     user__isnull=True, session_key=skey, photo_id__in=page_photo_ids
@@ -611,8 +552,7 @@ def index(request: HttpRequest) -> HttpResponse:
 
     # Определяем лайкнутые ВИДЕО на странице
     liked_video_ids: set[int] = set()
-    page_video_ids = list(videos_page_obj.object_list.values_list(
-        "id", flat=True)) if videos_page_obj.object_list else []
+    page_video_ids = [v.pk for v in public_videos]
     if page_video_ids:
         if request.user.is_authenticated:
             liked_video_ids = set(
@@ -620,8 +560,8 @@ def index(request: HttpRequest) -> HttpResponse:
                     user=request.user, video_id__in=page_video_ids
                 ).values_list("video_id", flat=True)
             )
-        else:
-            skey = _ensure_session_key(request)
+        elif request.session.session_key:
+            skey = request.session.session_key
             liked_video_ids = set(
                 VideoLike.objects.filter(
                     user__isnull=True, session_key=skey, video_id__in=page_video_ids
@@ -693,7 +633,7 @@ def index(request: HttpRequest) -> HttpResponse:
     else:
         # Для гостей ищем видео по идентификаторам через GenerationJob
         from django.db.models import Q
-        skey = _ensure_session_key(request)
+        skey = request.session.session_key or ""
         gid = _guest_cookie_id(request) or ""
         fp = _get_fp_from_request(request) or _hard_fingerprint(request)
 
@@ -749,16 +689,17 @@ def index(request: HttpRequest) -> HttpResponse:
             "video_categories": video_categories,
             "active_category": active_category,
             "active_video_category": active_video_category,
-            "public_photos": page_obj.object_list,
-            "page_obj": page_obj,
+            "public_photos": public_photos,
+            "next_cursor": photos_page.next_cursor,
             "liked_photo_ids": liked_photo_ids,
             "saved_photo_ids": saved_photo_ids,
-            "public_videos": videos_page_obj.object_list,
-            "videos_page_obj": videos_page_obj,
+            "public_videos": public_videos,
+            "videos_next_cursor": videos_page.next_cursor,
             "liked_video_ids": liked_video_ids,
             "saved_video_ids": saved_video_ids,
             "cat_slug": cat_slug,
             "vcat_slug": vcat_slug,
+            "videos_tab": bool(vcat_slug or request.GET.get("vcursor")),
             "pending_count": PublicPhoto.objects.filter(is_active=False).count()
             if request.user.is_staff else 0,
             "pending_videos_count": PublicVideo.objects.filter(is_active=False).count()
@@ -774,170 +715,22 @@ def trending(request: HttpRequest) -> HttpResponse:
       - by=views : по просмотрам (за всё время)
       - by=likes : по количеству лайков
       - by=new   : «самые залайканные за 10 дней»
+    Рейтинги общие для всех (gallery.services.trending, Celery Beat) —
+    здесь только объекты по id и лайки/сохранения текущего пользователя.
     """
-    mode = (request.GET.get("by") or "views").lower()
-    page_num = request.GET.get("page", 1)
-
-    user_key = f"u{request.user.id}" if request.user.is_authenticated else "anon"
-    cache_key = f"trending_{mode}_{page_num}_{user_key}"
-    cached_result = cache.get(cache_key)
-    if cached_result and not settings.DEBUG:
-        return cached_result
-
-    now = timezone.now()
-
-    base_qs = (
-        PublicPhoto.objects.filter(is_active=True)
-        .annotate(saves_count=Count("saves", distinct=True))
-        .select_related("category", "uploaded_by")
-        .only("id", "image", "title", "caption", "created_at", "view_count", "likes_count",
-              "category__name", "uploaded_by__username")
-    )
-    # Hide publications with hidden source jobs (not visible to others)
-    try:
-        from .models import JobHide
-        # Detect relation name dynamically on PublicPhoto
-        pf_names = {f.name for f in PublicPhoto._meta.get_fields()}
-        photo_rel_id = "source_job_id" if "source_job" in pf_names else (
-            "job_id" if "job" in pf_names else None)
-        if photo_rel_id:
-            base_qs = base_qs.annotate(
-                hidden_by_owner=Exists(
-                    JobHide.objects.filter(user=OuterRef(
-                        "uploaded_by_id"), job_id=OuterRef(photo_rel_id))
-                )
-            )
-            if request.user.is_authenticated:
-                base_qs = base_qs.filter(Q(hidden_by_owner=False) | Q(
-                    uploaded_by_id=request.user.id))
-            else:
-                base_qs = base_qs.filter(hidden_by_owner=False)
-    except Exception:
-        pass
+    mode = trending_rank.normalize_mode(request.GET.get("by"))
 
-    if mode == "likes":
-        photos_qs = base_qs.order_by(
-            "-likes_count", "-view_count", "-created_at")
-    elif mode == "new":
-        photos_qs = (
-            base_qs.filter(created_at__gte=now - timedelta(days=10))
-                   .order_by("-created_at", "-likes_count", "-view_count")
-        )
-    else:  # views
-        photos_qs = base_qs.order_by(
-            "-view_count", "-likes_count", "-created_at")
-
-    paginator = Paginator(photos_qs, 500)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
-
-    liked_photo_ids: set[int] = set()
-    page_photo_ids = list(page_obj.object_list.values_list(
-        "id", flat=True)) if page_obj.object_list else []
-    if page_photo_ids:
-        if request.user.is_authenticated:
-            liked_photo_ids = set(
-                PhotoLike.objects.filter(
-                    user=request.user, photo_id__in=page_photo_ids
-                ).values_list("photo_id", flat=True)
-            )
-        else:
-            skey = _ensure_session_key(request)
-            liked_photo_ids = set(
-                PhotoLike.objects.filter(
-                    user__isnull=True, session_key=skey, photo_id__in=page_photo_ids
-                ).values_list("photo_id", flat=True)
-            )
-    # Saved photos on page (for initial bookmark state)
-    saved_photo_ids: set[int] = set()
-    if page_photo_ids and request.user.is_authenticated:
-        saved_photo_ids = set(
-            PhotoSave.objects.filter(
-                user=request.user, photo_id__in=page_photo_ids)
-            .values_list("photo_id", flat=True)
-        )
+    photos = trending_rank.load_modes("photo")
+    videos = trending_rank.load_modes("video")
 
-    # Precompute all photo modes for in-place switching (no network on click)
-    photos_views_qs = base_qs.order_by("-view_count", "-likes_count", "-created_at")
-    photos_likes_qs = base_qs.order_by("-likes_count", "-view_count", "-created_at")
-    photos_new_qs = base_qs.filter(created_at__gte=now - timedelta(days=10)).order_by("-created_at", "-likes_count", "-view_count")
+    skey = "" if request.user.is_authenticated else (request.session.session_key or "")
+    liked_photo_ids, saved_photo_ids = trending_rank.viewer_state(
+        request.user, skey, "photo", (p.pk for lst in photos.values() for p in lst))
+    liked_video_ids, saved_video_ids = trending_rank.viewer_state(
+        request.user, skey, "video", (v.pk for lst in videos.values() for v in lst))
 
-    def _ids_for_photos(qs):
-        ids = list(qs.values_list("id", flat=True)[:500])
-        _liked = set()
-        _saved = set()
-        if ids:
-            if request.user.is_authenticated:
-                _liked = set(PhotoLike.objects.filter(user=request.user, photo_id__in=ids).values_list("photo_id", flat=True))
-                _saved = set(PhotoSave.objects.filter(user=request.user, photo_id__in=ids).values_list("photo_id", flat=True))
-            else:
-                skey2 = _ensure_session_key(request)
-                _liked = set(PhotoLike.objects.filter(user__isnull=True, session_key=skey2, photo_id__in=ids).values_list("photo_id", flat=True))
-        return ids, _liked, _saved
-
-    ids_v, liked_photo_ids_views, saved_photo_ids_views = _ids_for_photos(photos_views_qs)
-    ids_l, liked_photo_ids_likes, saved_photo_ids_likes = _ids_for_photos(photos_likes_qs)
-    ids_n, liked_photo_ids_new, saved_photo_ids_new = _ids_for_photos(photos_new_qs)
-
-    photos_views = list(photos_views_qs.filter(id__in=ids_v))
-    photos_likes = list(photos_likes_qs.filter(id__in=ids_l))
-    photos_new = list(photos_new_qs.filter(id__in=ids_n))
-
-    # Precompute all video modes for in-place switching
-    videos_base_qs = (
-        PublicVideo.objects.filter(is_active=True)
-        .annotate(saves_count=Count("saves", distinct=True))
-        .select_related("category", "uploaded_by")
-        .only(
-            "id",
-            "thumbnail",
-            "video_url",
-            "title",
-            "caption",
-            "created_at",
-            "view_count",
-            "likes_count",
-            "category__name",
-            "uploaded_by__username",
-        )
-    )
-    try:
-        from .models import JobHide
-        videos_base_qs = videos_base_qs.annotate(
-            hidden_by_owner=Exists(
-                JobHide.objects.filter(user=OuterRef("uploaded_by_id"), job_id=OuterRef("source_job_id"))
-            )
-        )
-        if request.user.is_authenticated:
-            videos_base_qs = videos_base_qs.filter(Q(hidden_by_owner=False) | Q(uploaded_by_id=request.user.id))
-        else:
-            videos_base_qs = videos_base_qs.filter(hidden_by_owner=False)
-    except Exception:
-        pass
-
-    videos_views_qs = videos_base_qs.order_by("-view_count", "-likes_count", "-created_at")
-    videos_likes_qs = videos_base_qs.order_by("-likes_count", "-view_count", "-created_at")
-    videos_new_qs = videos_base_qs.filter(created_at__gte=now - timedelta(days=10)).order_by("-created_at", "-likes_count", "-view_count")
-
-    def _ids_for_videos(qs):
-        ids = list(qs.values_list("id", flat=True)[:500])
-        _liked = set()
-        _saved = set()
-        if ids:
-            if request.user.is_authenticated:
-                _liked = set(VideoLike.objects.filter(user=request.user, video_id__in=ids).values_list("video_id", flat=True))
-                _saved = set(VideoSave.objects.filter(user=request.user, video_id__in=ids).values_list("video_id", flat=True))
-            else:
-                skey2 = _ensure_session_key(request)
-                _liked = set(VideoLike.objects.filter(user__isnull=True, session_key=skey2, video_id__in=ids).values_list("video_id", flat=True))
-        return ids, _liked, _saved
-
-    vids_v, liked_video_ids_views, saved_video_ids_views = _ids_for_videos(videos_views_qs)
-    vids_l, liked_video_ids_likes, saved_video_ids_likes = _ids_for_videos(videos_likes_qs)
-    vids_n, liked_video_ids_new, saved_video_ids_new = _ids_for_videos(videos_new_qs)
-
-    videos_views = list(videos_views_qs.filter(id__in=vids_v))
-    videos_likes = list(videos_likes_qs.filter(id__in=vids_l))
-    videos_new = list(videos_new_qs.filter(id__in=vids_n))
+    paginator = Paginator(photos[mode], trending_rank.PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get("page") or 1)
 
     return render(
         request,
@@ -952,26 +745,26 @@ def trending(request: HttpRequest) -> HttpResponse:
             "saved_photo_ids": saved_photo_ids,
 
             # Pre-rendered photos (all modes)
-            "photos_views": photos_views,
-            "photos_likes": photos_likes,
-            "photos_new": photos_new,
-            "liked_photo_ids_views": liked_photo_ids_views,
-            "liked_photo_ids_likes": liked_photo_ids_likes,
-            "liked_photo_ids_new": liked_photo_ids_new,
-            "saved_photo_ids_views": saved_photo_ids_views,
-            "saved_photo_ids_likes": saved_photo_ids_likes,
-            "saved_photo_ids_new": saved_photo_ids_new,
+            "photos_views": photos["views"],
+            "photos_likes": photos["likes"],
+            "photos_new": photos["new"],
+            "liked_photo_ids_views": liked_photo_ids,
+            "liked_photo_ids_likes": liked_photo_ids,
+            "liked_photo_ids_new": liked_photo_ids,
+            "saved_photo_ids_views": saved_photo_ids,
+            "saved_photo_ids_likes": saved_photo_ids,
+            "saved_photo_ids_new": saved_photo_ids,
 
             # Pre-rendered videos (all modes)
-            "videos_views": videos_views,
-            "videos_likes": videos_likes,
-            "videos_new": videos_new,
-            "liked_video_ids_views": liked_video_ids_views,
-            "liked_video_ids_likes": liked_video_ids_likes,
-            "liked_video_ids_new": liked_video_ids_new,
-            "saved_video_ids_views": saved_video_ids_views,
-            "saved_video_ids_likes": saved_video_ids_likes,
-            "saved_video_ids_new": saved_video_ids_new,
+            "videos_views": videos["views"],
+            "videos_likes": videos["likes"],
+            "videos_new": videos["new"],
+            "liked_video_ids_views": liked_video_ids,
+            "liked_video_ids_likes": liked_video_ids,
+            "liked_video_ids_new": liked_video_ids,
+            "saved_video_ids_views": saved_video_ids,
+            "saved_video_ids_likes": saved_video_ids,
+            "saved_video_ids_new": saved_video_ids,
         },
     )
 
@@ -982,71 +775,11 @@ def trending_snippet(request: HttpRequest) -> HttpResponse:
     Поддерживает параметры: by=views|likes|new.
     Выводим смешанную ленту (фото + видео) с тем же режимом сортировки.
     """
-    mode = (request.GET.get("by") or "likes").lower()
-    now = timezone.now()
-
-    # Photos base
-    photos_base_qs = (
-        PublicPhoto.objects.filter(is_active=True)
-        .annotate(saves_count=Count("saves", distinct=True))
-        .select_related("category", "uploaded_by")
-    )
-    # Hide hidden-by-owner photos
-    try:
-        from .models import JobHide
-        pf_names = {f.name for f in PublicPhoto._meta.get_fields()}
-        photo_rel_id = "source_job_id" if "source_job" in pf_names else (
-            "job_id" if "job" in pf_names else None)
-        if photo_rel_id:
-            photos_base_qs = photos_base_qs.annotate(
-                hidden_by_owner=Exists(
-                    JobHide.objects.filter(user=OuterRef("uploaded_by_id"), job_id=OuterRef(photo_rel_id))
-                )
-            )
-            if request.user.is_authenticated:
-                photos_base_qs = photos_base_qs.filter(Q(hidden_by_owner=False) | Q(uploaded_by_id=request.user.id))
-            else:
-                photos_base_qs = photos_base_qs.filter(hidden_by_owner=False)
-    except Exception:
-        pass
-
-    if mode == "likes":
-        photos_qs = photos_base_qs.order_by("-likes_count", "-view_count", "-created_at")
-    elif mode == "new":
-        photos_qs = photos_base_qs.filter(created_at__gte=now - timedelta(days=10)).order_by("-created_at", "-likes_count", "-view_count")
-    else:  # views
-        photos_qs = photos_base_qs.order_by("-view_count", "-likes_count", "-created_at")
-
-    # Videos base
-    videos_base_qs = (
-        PublicVideo.objects.filter(is_active=True)
-        .annotate(saves_count=Count("saves", distinct=True))
-        .select_related("category", "uploaded_by")
-    )
-    try:
-        from .models import JobHide
-        videos_base_qs = videos_base_qs.annotate(
-            hidden_by_owner=Exists(
-                JobHide.objects.filter(user=OuterRef("uploaded_by_id"), job_id=OuterRef("source_job_id"))
-            )
-        )
-        if request.user.is_authenticated:
-            videos_base_qs = videos_base_qs.filter(Q(hidden_by_owner=False) | Q(uploaded_by_id=request.user.id))
-        else:
-            videos_base_qs = videos_base_qs.filter(hidden_by_owner=False)
-    except Exception:
-        pass
-
-    if mode == "likes":
-        videos_qs = videos_base_qs.order_by("-likes_count", "-view_count", "-created_at")
-    elif mode == "new":
-        videos_qs = videos_base_qs.filter(created_at__gte=now - timedelta(days=10)).order_by("-created_at", "-likes_count", "-view_count")
-    else:
-        videos_qs = videos_base_qs.order_by("-view_count", "-likes_count", "-created_at")
+    mode = trending_rank.normalize_mode(request.GET.get("by"), default="likes")
 
     # Pick top items and mix
-    photos_list = list(photos_qs[:8])
-    videos_list = list(videos_qs[:8])
+    photos_list = trending_rank.load("photo", trending_rank.ranked_ids("photo", mode, 8))
+    videos_list = trending_rank.load("video", trending_rank.ranked_ids("video", mode, 8))
 
     def _mix_lists(a, b, limit=8):
         out = []
@@ -1065,31 +798,9 @@ def trending_snippet(request: HttpRequest) -> HttpResponse:
     trending_items = _mix_lists(photos_list, videos_list, 8)
 
     # Liked sets for current page items
-    liked_photo_ids: set[int] = set()
-    page_photo_ids = [p.id for p in photos_list]
-    if page_photo_ids:
-        if request.user.is_authenticated:
-            liked_photo_ids = set(
-                PhotoLike.objects.filter(user=request.user, photo_id__in=page_photo_ids).values_list("photo_id", flat=True)
-            )
-        else:
-            skey = _ensure_session_key(request)
-            liked_photo_ids = set(
-                PhotoLike.objects.filter(user__isnull=True, session_key=skey, photo_id__in=page_photo_ids).values_list("photo_id", flat=True)
-            )
-
-    liked_video_ids: set[int] = set()
-    page_video_ids = [v.id for v in videos_list]
-    if page_video_ids:
-        if request.user.is_authenticated:
-            liked_video_ids = set(
-                VideoLike.objects.filter(user=request.user, video_id__in=page_video_ids).values_list("video_id", flat=True)
-            )
-        else:
-            skey = _ensure_session_key(request)
-            liked_video_ids = set(
-                VideoLike.objects.filter(user__isnull=True, session_key=skey, video_id__in=page_video_ids).values_list("video_id", flat=True)
-            )
+    skey = "" if request.user.is_authenticated else (request.session.session_key or "")
+    liked_photo_ids, _ = trending_rank.viewer_state(request.user, skey, "photo", (p.id for p in photos_list))
+    liked_video_ids, _ = trending_rank.viewer_state(request.user, skey, "video", (v.id for v in videos_list))
 
     return render(
         request,
@@ -1130,14 +841,13 @@ def photo_detail(request: HttpRequest, pk: int) -> HttpResponse:
     except Exception:
         pass
 
-    # инкремент view_count
-    _ensure_session_key(request)
+    # инкремент view_count (буфер) + ещё не сброшенный прирост для показа
     _mark_photo_viewed_once(request, photo.pk)
     try:
-        photo.refresh_from_db(
-            fields=["view_count", "likes_count", "comments_count"])
+        photo.refresh_from_db(fields=["view_count", "likes_count", "comments_count"])
     except Exception:
         pass
+    view_counter.apply_pending("photo", [photo])
 
     # корневые комментарии
     comments = (
@@ -1152,8 +862,8 @@ def photo_detail(request: HttpRequest, pk: int) -> HttpResponse:
     if request.user.is_authenticated:
         liked = PhotoLike.objects.filter(
             user=request.user, photo=photo).exists()
-    else:
-        skey = _ensure_session_key(request)
+    elif request.session.session_key:
+        skey = request.session.session_key
         liked = PhotoLike.objects.filter(
             user__isnull=True, session_key=skey, photo=photo).exists()
 
@@ -1172,8 +882,8 @@ def photo_detail(request: HttpRequest, pk: int) -> HttpResponse:
                     user=request.user, comment_id__in=all_comment_ids
                 ).values_list("comment_id", flat=True)
             )
-        else:
-            skey = _ensure_session_key(request)
+        elif request.session.session_key:
+            skey = request.session.session_key
             liked_comment_ids = set(
                 CommentLike.objects.filter(
                     user__isnull=True, session_key=skey, comment_id__in=all_comment_ids
@@ -1227,8 +937,8 @@ def photo_detail(request: HttpRequest, pk: int) -> HttpResponse:
                     user=request.user, photo_id__in=related_photo_ids
                 ).values_list("photo_id", flat=True)
             )
-        else:
-            skey = _ensure_session_key(request)
+        elif request.session.session_key:
+            skey = request.session.session_key
             liked_photo_ids = set(
                 PhotoLike.objects.filter(
                     user__isnull=True, session_key=skey, photo_id__in=related_photo_ids
@@ -1264,12 +974,10 @@ def photo_like(request: HttpRequest, pk: int) -> HttpResponse:
     except PublicPhoto.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Photo not found"}, status=404)
 
-    # Rate limiting for likes
-    client_ip = request.META.get('REMOTE_ADDR', '')
-    rate_key = f"like_rate_{client_ip}_{pk}"
-    if cache.get(rate_key):
-        return JsonResponse({"ok": False, "error": "Too many requests"}, status=429)
-    cache.set(rate_key, True, 2)
+    # Rate limiting for likes (политика "like": пользователь или IP гостя, на одно фото)
+    decision = ratelimit.hit("like", request, scope=str(pk))
+    if not decision:
+        return ratelimit.too_many(decision)
 
     skey = _ensure_session_key(request)
 
@@ -1999,13 +1707,13 @@ def photo_detail_by_slug(request: HttpRequest, slug: str) -> HttpResponse:
     except Exception:
         pass
 
-    # increment views
-    _ensure_session_key(request)
+    # increment views (buffered) + pending delta for display
     _mark_photo_viewed_once(request, photo.pk)
     try:
         photo.refresh_from_db(fields=["view_count", "likes_count", "comments_count"])
     except Exception:
         pass
+    view_counter.apply_pending("photo", [photo])
 
     # root comments
     comments = (
@@ -2016,10 +1724,11 @@ def photo_detail_by_slug(request: HttpRequest, slug: str) -> HttpResponse:
     )
 
     # already liked
+    liked = False
     if request.user.is_authenticated:
         liked = PhotoLike.objects.filter(user=request.user, photo=photo).exists()
-    else:
-        skey = _ensure_session_key(request)
+    elif request.session.session_key:
+        skey = request.session.session_key
         liked = PhotoLike.objects.filter(user__isnull=True, session_key=skey, photo=photo).exists()
 
     # liked comment ids
@@ -2036,8 +1745,8 @@ def photo_detail_by_slug(request: HttpRequest, slug: str) -> HttpResponse:
                     user=request.user, comment_id__in=all_comment_ids
                 ).values_list("comment_id", flat=True)
             )
-        else:
-            skey = _ensure_session_key(request)
+        elif request.session.session_key:
+            skey = request.session.session_key
             liked_comment_ids = set(
                 CommentLike.objects.filter(
                     user__isnull=True, session_key=skey, comment_id__in=all_comment_ids
@@ -10,6 +10,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models import F, Value
 from django.db.models.functions import Greatest
@@ -19,6 +20,7 @@ from django.urls import reverse
 from django.utils.text import slugify
 from django.views.decorators.http import require_POST, require_http_methods
 
+from ai_gallery.services import media_download
 from generate.models import GenerationJob
 from .models import (
     PublicVideo,
@@ -27,11 +29,10 @@ from .models import (
     VideoCommentLike,
     Category,
     VideoSave,
-    PublicPhoto,
-    PhotoLike,
-    PhotoSave,
 )
 from .forms import PhotoCommentForm  # Переиспользуем ту же форму
+from .services import trending as trending_rank
+from .services import view_counter
 
 # Доп. импорты для прокси/стриминга и фоновой оптимизации
 import os
@@ -57,9 +58,9 @@ def _ensure_session_key(request: HttpRequest) -> str:
     return request.session.session_key
 
 
-def _mark_video_viewed_once(_request: HttpRequest, video_id: int) -> None:
-    """Инкремент счётчика просмотров видео."""
-    PublicVideo.objects.filter(pk=video_id).update(view_count=F("view_count") + 1)
+def _mark_video_viewed_once(request: HttpRequest, video_id: int) -> None:
+    """Просмотр видео в буфер счётчиков (gallery.services.view_counter)."""
+    view_counter.hit("video", video_id, view_counter.viewer_key(request))
 
 
 def _save_optimized_webp_bytes(data: bytes, subdir: str = "public_videos/thumbs", filename_base: str = "thumb") -> str:
@@ -102,165 +103,21 @@ def trending_videos(request: HttpRequest) -> HttpResponse:
       - by=views : по просмотрам (за всё время)
       - by=likes : по количеству лайков
       - by=new   : «самые новые за 10 дней» (с приоритетом по лайкам/просмотрам)
+    Рейтинги общие (gallery.services.trending), поверх — состояние пользователя.
     """
-    from datetime import timedelta
-    from django.utils import timezone
-    from django.core.paginator import Paginator
-    from django.db.models import Count, Exists, OuterRef, Q
-
-    mode = (request.GET.get("by") or "views").lower()
-
-    now = timezone.now()
-    base_qs = (
-        PublicVideo.objects.filter(is_active=True)
-        .annotate(
-            saves_count=Count("saves", distinct=True),
-        )
-        .select_related("category", "uploaded_by")
-        .only(
-            "id",
-            "thumbnail",
-            "video_url",
-            "title",
-            "caption",
-            "created_at",
-            "view_count",
-            "likes_count",
-            "category__name",
-            "uploaded_by__username",
-        )
-    )
-
-    # Hide publications linked to hidden source jobs (not visible to others)
-    from .models import JobHide
-    base_qs = base_qs.annotate(
-        hidden_by_owner=Exists(
-            JobHide.objects.filter(user=OuterRef("uploaded_by_id"), job_id=OuterRef("source_job_id"))
-        )
-    )
-    if request.user.is_authenticated:
-        base_qs = base_qs.filter(Q(hidden_by_owner=False) | Q(uploaded_by_id=request.user.id))
-    else:
-        base_qs = base_qs.filter(hidden_by_owner=False)
-
-    if mode == "likes":
-        videos_qs = base_qs.order_by("-likes_count", "-view_count", "-created_at")
-    elif mode == "new":
-        videos_qs = (
-            base_qs.filter(created_at__gte=now - timedelta(days=10))
-            .order_by("-created_at", "-likes_count", "-view_count")
-        )
-    else:  # views
-        videos_qs = base_qs.order_by("-view_count", "-likes_count", "-created_at")
-
-    paginator = Paginator(videos_qs, 500)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
-
-    # Лайкнутые видео на странице
-    liked_video_ids: set[int] = set()
-    page_video_ids = list(page_obj.object_list.values_list("id", flat=True)) if page_obj.object_list else []
-    if page_video_ids:
-        if request.user.is_authenticated:
-            liked_video_ids = set(
-                VideoLike.objects.filter(user=request.user, video_id__in=page_video_ids)
-                .values_list("video_id", flat=True)
-            )
-        else:
-            skey = _ensure_session_key(request)
-            liked_video_ids = set(
-                VideoLike.objects.filter(user__isnull=True, session_key=skey, video_id__in=page_video_ids)
-                .values_list("video_id", flat=True)
-            )
-
-    # Сохранённые видео (только для авторизованных)
-    saved_video_ids: set[int] = set()
-    if page_video_ids and request.user.is_authenticated:
-        saved_video_ids = set(
-            VideoSave.objects.filter(user=request.user, video_id__in=page_video_ids)
-            .values_list("video_id", flat=True)
-        )
-
-    # Precompute all photos modes for in-place switching on videos page (no network on click)
-    from django.utils import timezone
-    from datetime import timedelta
-    from django.db.models import Count, Exists, OuterRef, Q
+    mode = trending_rank.normalize_mode(request.GET.get("by"))
 
-    now = timezone.now()
+    photos = trending_rank.load_modes("photo")
+    videos = trending_rank.load_modes("video")
 
-    photos_base_qs = (
-        PublicPhoto.objects.filter(is_active=True)
-        .annotate(saves_count=Count("saves", distinct=True))
-        .select_related("category", "uploaded_by")
-        .only("id", "image", "title", "caption", "created_at", "view_count", "likes_count",
-              "category__name", "uploaded_by__username")
-    )
-    try:
-        from .models import JobHide
-        pf_names = {f.name for f in PublicPhoto._meta.get_fields()}
-        photo_rel_id = "source_job_id" if "source_job" in pf_names else ("job_id" if "job" in pf_names else None)
-        if photo_rel_id:
-            photos_base_qs = photos_base_qs.annotate(
-                hidden_by_owner=Exists(
-                    JobHide.objects.filter(user=OuterRef("uploaded_by_id"), job_id=OuterRef(photo_rel_id))
-                )
-            )
-            if request.user.is_authenticated:
-                photos_base_qs = photos_base_qs.filter(Q(hidden_by_owner=False) | Q(uploaded_by_id=request.user.id))
-            else:
-                photos_base_qs = photos_base_qs.filter(hidden_by_owner=False)
-    except Exception:
-        pass
-
-    photos_views_qs = photos_base_qs.order_by("-view_count", "-likes_count", "-created_at")
-    photos_likes_qs = photos_base_qs.order_by("-likes_count", "-view_count", "-created_at")
-    photos_new_qs = photos_base_qs.filter(created_at__gte=now - timedelta(days=10)).order_by("-created_at", "-likes_count", "-view_count")
+    skey = "" if request.user.is_authenticated else (request.session.session_key or "")
+    liked_photo_ids, saved_photo_ids = trending_rank.viewer_state(
+        request.user, skey, "photo", (p.pk for lst in photos.values() for p in lst))
+    liked_video_ids, saved_video_ids = trending_rank.viewer_state(
+        request.user, skey, "video", (v.pk for lst in videos.values() for v in lst))
 
-    def _ids_for_photos(qs):
-        ids = list(qs.values_list("id", flat=True)[:500])
-        _liked = set()
-        _saved = set()
-        if ids:
-            if request.user.is_authenticated:
-                _liked = set(PhotoLike.objects.filter(user=request.user, photo_id__in=ids).values_list("photo_id", flat=True))
-                _saved = set(PhotoSave.objects.filter(user=request.user, photo_id__in=ids).values_list("photo_id", flat=True))
-            else:
-                skey2 = _ensure_session_key(request)
-                _liked = set(PhotoLike.objects.filter(user__isnull=True, session_key=skey2, photo_id__in=ids).values_list("photo_id", flat=True))
-        return ids, _liked, _saved
-
-    p_ids_v, liked_photo_ids_views, saved_photo_ids_views = _ids_for_photos(photos_views_qs)
-    p_ids_l, liked_photo_ids_likes, saved_photo_ids_likes = _ids_for_photos(photos_likes_qs)
-    p_ids_n, liked_photo_ids_new, saved_photo_ids_new = _ids_for_photos(photos_new_qs)
-
-    photos_views = list(photos_views_qs.filter(id__in=p_ids_v))
-    photos_likes = list(photos_likes_qs.filter(id__in=p_ids_l))
-    photos_new = list(photos_new_qs.filter(id__in=p_ids_n))
-
-    # Precompute all video modes too (already have page_obj for current mode)
-    videos_views_qs = base_qs.order_by("-view_count", "-likes_count", "-created_at")
-    videos_likes_qs = base_qs.order_by("-likes_count", "-view_count", "-created_at")
-    videos_new_qs = base_qs.filter(created_at__gte=now - timedelta(days=10)).order_by("-created_at", "-likes_count", "-view_count")
-
-    def _ids_for_videos(qs):
-        ids = list(qs.values_list("id", flat=True)[:500])
-        _liked = set()
-        _saved = set()
-        if ids:
-            if request.user.is_authenticated:
-                _liked = set(VideoLike.objects.filter(user=request.user, video_id__in=ids).values_list("video_id", flat=True))
-                _saved = set(VideoSave.objects.filter(user=request.user, video_id__in=ids).values_list("video_id", flat=True))
-            else:
-                skey2 = _ensure_session_key(request)
-                _liked = set(VideoLike.objects.filter(user__isnull=True, session_key=skey2, video_id__in=ids).values_list("video_id", flat=True))
-        return ids, _liked, _saved
-
-    v_ids_v, liked_video_ids_views_all, saved_video_ids_views_all = _ids_for_videos(videos_views_qs)
-    v_ids_l, liked_video_ids_likes_all, saved_video_ids_likes_all = _ids_for_videos(videos_likes_qs)
-    v_ids_n, liked_video_ids_new_all, saved_video_ids_new_all = _ids_for_videos(videos_new_qs)
-
-    videos_views_all = list(videos_views_qs.filter(id__in=v_ids_v))
-    videos_likes_all = list(videos_likes_qs.filter(id__in=v_ids_l))
-    videos_new_all = list(videos_new_qs.filter(id__in=v_ids_n))
+    paginator = Paginator(videos[mode], trending_rank.PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get("page") or 1)
 
     return render(
         request,
@@ -275,26 +132,26 @@ def trending_videos(request: HttpRequest) -> HttpResponse:
             "saved_video_ids": saved_video_ids,
 
             # Pre-rendered photos (all modes)
-            "photos_views": photos_views,
-            "photos_likes": photos_likes,
-            "photos_new": photos_new,
-            "liked_photo_ids_views": liked_photo_ids_views,
-            "liked_photo_ids_likes": liked_photo_ids_likes,
-            "liked_photo_ids_new": liked_photo_ids_new,
-            "saved_photo_ids_views": saved_photo_ids_views,
-            "saved_photo_ids_likes": saved_photo_ids_likes,
-            "saved_photo_ids_new": saved_photo_ids_new,
+            "photos_views": photos["views"],
+            "photos_likes": photos["likes"],
+            "photos_new": photos["new"],
+            "liked_photo_ids_views": liked_photo_ids,
+            "liked_photo_ids_likes": liked_photo_ids,
+            "liked_photo_ids_new": liked_photo_ids,
+            "saved_photo_ids_views": saved_photo_ids,
+            "saved_photo_ids_likes": saved_photo_ids,
+            "saved_photo_ids_new": saved_photo_ids,
 
             # Pre-rendered videos (all modes)
-            "videos_views": videos_views_all,
-            "videos_likes": videos_likes_all,
-            "videos_new": videos_new_all,
-            "liked_video_ids_views": liked_video_ids_views_all,
-            "liked_video_ids_likes": liked_video_ids_likes_all,
-            "liked_video_ids_new": liked_video_ids_new_all,
-            "saved_video_ids_views": saved_video_ids_views_all,
-            "saved_video_ids_likes": saved_video_ids_likes_all,
-            "saved_video_ids_new": saved_video_ids_new_all,
+            "videos_views": videos["views"],
+            "videos_likes": videos["likes"],
+            "videos_new": videos["new"],
+            "liked_video_ids_views": liked_video_ids,
+            "liked_video_ids_likes": liked_video_ids,
+            "liked_video_ids_new": liked_video_ids,
+            "saved_video_ids_views": saved_video_ids,
+            "saved_video_ids_likes": saved_video_ids,
+            "saved_video_ids_new": saved_video_ids,
         },
     )
 
@@ -489,12 +346,8 @@ def _optimize_video_async(pk: int, src_url: str, dst_rel: str) -> None:
             opt_path = os.path.join(td, "opt.mp4")
 
             try:
-                with requests.get(src_url, stream=True, timeout=(5, 120)) as rr:
-                    rr.raise_for_status()
-                    with open(src_path, "wb") as fw:
-                        for chunk in rr.iter_content(chunk_size=256 * 1024):
-                            if chunk:
-                                fw.write(chunk)
+                with open(src_path, "wb") as fw:
+                    media_download.download_to_file(src_url, fw)
             except Exception:
                 # не удалось скачать — выходим
                 return
@@ -527,10 +380,7 @@ def _optimize_video_async(pk: int, src_url: str, dst_rel: str) -> None:
 
             # Сохраняем в storage потоково
             try:
-                with open(out_path, "rb") as fr:
-                    # По возможности — писать без загрузки в память
-                    # В FileSystemStorage можно сохранить напрямую через .save(name, file)
-                    default_storage.save(dst_rel, ContentFile(fr.read()))
+                media_download.save_file_to_storage(out_path, dst_rel)
             except Exception:
                 return
     finally:
@@ -629,12 +479,12 @@ def video_detail(request: HttpRequest, slug: str) -> HttpResponse:
         pass
 
     # Инкремент просмотров
-    _ensure_session_key(request)
     _mark_video_viewed_once(request, video.pk)
     try:
         video.refresh_from_db(fields=["view_count", "likes_count", "comments_count"])
     except Exception:
         pass
+    view_counter.apply_pending("video", [video])
 
     # Корневые комментарии
     comments = (
@@ -648,8 +498,8 @@ def video_detail(request: HttpRequest, slug: str) -> HttpResponse:
     liked = False
     if request.user.is_authenticated:
         liked = VideoLike.objects.filter(user=request.user, video=video).exists()
-    else:
-        skey = _ensure_session_key(request)
+    elif request.session.session_key:
+        skey = request.session.session_key
         liked = VideoLike.objects.filter(user__isnull=True, session_key=skey, video=video).exists()
 
     # Лайкнутые комментарии
@@ -667,8 +517,8 @@ def video_detail(request: HttpRequest, slug: str) -> HttpResponse:
                     user=request.user, comment_id__in=all_comment_ids
                 ).values_list("comment_id", flat=True)
             )
-        else:
-            skey = _ensure_session_key(request)
+        elif request.session.session_key:
+            skey = request.session.session_key
             liked_comment_ids = set(
                 VideoCommentLike.objects.filter(
                     user__isnull=True, session_key=skey, comment_id__in=all_comment_ids
@@ -718,8 +568,8 @@ def video_detail(request: HttpRequest, slug: str) -> HttpResponse:
                     user=request.user, video_id__in=related_video_ids
                 ).values_list("video_id", flat=True)
             )
-        else:
-            skey = _ensure_session_key(request)
+        elif request.session.session_key:
+            skey = request.session.session_key
             liked_video_ids = set(
                 VideoLike.objects.filter(
                     user__isnull=True, session_key=skey, video_id__in=related_video_ids
@@ -2,7 +2,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django import forms
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from .models import (
     GenerationJob,
@@ -16,8 +17,10 @@ from .models import (
     ShowcaseVideo,
     PromptCategory,
     CategoryPrompt,
+    PromptSubcategory,
     VideoModel,
     VideoPromptCategory,
+    VideoPromptSubcategory,
     VideoPrompt,
 )
 from .models_reference import ReferenceImage
@@ -26,6 +29,7 @@ from .models_video import VideoModelConfiguration
 from .models_aspect_ratio import AspectRatioQualityConfig, AspectRatioPreset
 from .forms_image_model import ImageModelConfigurationForm
 from .forms_video_model import VideoModelConfigurationForm
+from .services import guest_ledger, model_catalog, prompt_library
 
 @receiver(post_save, sender=ImageModelConfiguration)
 def save_image_model_aspect_ratio_configs(sender, instance, created, **kwargs):
@@ -80,13 +84,82 @@ def save_image_model_aspect_ratio_configs(sender, instance, created, **kwargs):
     else:
         print(f">>> [SIGNAL] No pending configs found")
 
+
+@receiver(post_save, sender=ImageModelConfiguration)
+@receiver(post_delete, sender=ImageModelConfiguration)
+@receiver(post_save, sender=VideoModelConfiguration)
+@receiver(post_delete, sender=VideoModelConfiguration)
+@receiver(post_save, sender=VideoModel)
+@receiver(post_delete, sender=VideoModel)
+@receiver(post_save, sender=AspectRatioQualityConfig)
+@receiver(post_delete, sender=AspectRatioQualityConfig)
+def invalidate_model_catalog(sender, **kwargs):
+    """Каталог моделей в памяти процессов перестроится при следующем обращении."""
+    model_catalog.invalidate()
+
+
+@receiver(post_save, sender=PromptCategory)
+@receiver(post_delete, sender=PromptCategory)
+@receiver(post_save, sender=PromptSubcategory)
+@receiver(post_delete, sender=PromptSubcategory)
+@receiver(post_save, sender=CategoryPrompt)
+@receiver(post_delete, sender=CategoryPrompt)
+def invalidate_prompt_library(sender, **kwargs):
+    """Админка и CRUD-эндпоинты промптов — новая версия кэша библиотеки."""
+    prompt_library.bump("image")
+
+
+@receiver(post_save, sender=VideoPromptCategory)
+@receiver(post_delete, sender=VideoPromptCategory)
+@receiver(post_save, sender=VideoPromptSubcategory)
+@receiver(post_delete, sender=VideoPromptSubcategory)
+@receiver(post_save, sender=VideoPrompt)
+@receiver(post_delete, sender=VideoPrompt)
+def invalidate_video_prompt_library(sender, **kwargs):
+    prompt_library.bump("video")
+
+_CATALOG_MODELS = (ImageModelConfiguration, VideoModelConfiguration, VideoModel, AspectRatioQualityConfig)
+_PROMPT_LIBRARY_MODELS = {
+    PromptCategory: "image", PromptSubcategory: "image", CategoryPrompt: "image",
+    VideoPromptCategory: "video", VideoPromptSubcategory: "video", VideoPrompt: "video",
+}
+
+
+def _after_bulk_update(model) -> None:
+    """queryset.update() не шлёт post_save — сбрасываем кэши, которые ведут приёмники выше."""
+    if model in _CATALOG_MODELS:
+        model_catalog.invalidate()
+    if model in _PROMPT_LIBRARY_MODELS:
+        prompt_library.bump(_PROMPT_LIBRARY_MODELS[model])
+
+
 @admin.action(description="Отметить как активное")
 def mark_active(modeladmin, request, queryset):
     queryset.update(is_active=True)
+    _after_bulk_update(queryset.model)
 
 @admin.action(description="Убрать активность")
 def mark_inactive(modeladmin, request, queryset):
     queryset.update(is_active=False)
+    _after_bulk_update(queryset.model)
+
+@admin.action(description="Заполнить английский промпт (DeepL)")
+def fill_prompt_en(modeladmin, request, queryset):
+    """Пустые prompt_en — пакетным переводом prompt_text (кэш + до 50 текстов за запрос)."""
+    from .services.translator import translate_many
+
+    items = [p for p in queryset.only("id", "prompt_text", "prompt_en") if not (p.prompt_en or "").strip()]
+    if not items:
+        modeladmin.message_user(request, "Английский промпт уже заполнен у всех выбранных.")
+        return
+    changed = []
+    for p, en in zip(items, translate_many([p.prompt_text for p in items])):
+        if en and en != p.prompt_text:
+            p.prompt_en = en
+            changed.append(p)
+    queryset.model.objects.bulk_update(changed, ["prompt_en"], batch_size=200)
+    _after_bulk_update(queryset.model)
+    modeladmin.message_user(request, f"Переведено: {len(changed)} из {len(items)}")
 
 # -- Подсказки ----------------------------------------------------
 class SuggestionInline(admin.StackedInline):
@@ -318,6 +391,13 @@ class FreeGrantAdmin(admin.ModelAdmin):
     def has_device(self, obj):
         return hasattr(obj, 'device_fingerprint') and obj.device_fingerprint is not None
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # ручная правка расхода мимо guest_ledger — иначе счётчик в кэше
+        # вернёт старое значение в left() и при следующем reconcile
+        if {"consumed", "total"} & set(form.changed_data):
+            transaction.on_commit(lambda: guest_ledger.store(obj))
+
 
 @admin.register(DeviceFingerprint)
 class DeviceFingerprintAdmin(admin.ModelAdmin):
@@ -357,7 +437,7 @@ class DeviceFingerprintAdmin(admin.ModelAdmin):
     @admin.display(description="Попытки сегодня")
     def grant_left(self, obj):
         if obj.free_grant:
-            left = obj.free_grant.left
+            left = guest_ledger.left(obj.free_grant)
             if left > 0:
                 return format_html('<span style="color:#10b981;font-weight:600">{}</span>', left)
             return format_html('<span style="color:#ef4444">0</span>')
@@ -495,7 +575,7 @@ class CategoryPromptAdmin(admin.ModelAdmin):
     list_filter = ("is_active", "category")
     search_fields = ("title", "prompt_text", "category__name")
     ordering = ("category__order", "order", "title")
-    actions = (mark_active, mark_inactive)
+    actions = (mark_active, mark_inactive, fill_prompt_en)
     autocomplete_fields = ("category",)
     readonly_fields = ("created_at",)
 
@@ -582,7 +662,7 @@ class VideoModelAdmin(admin.ModelAdmin):
             "fields": ("name", "model_id", "category", "description")
         }),
         ("Видимость", {
-            "fields": ("token_cost", "max_duration", "max_resolution")
+            "fields": ("token_cost", "max_duration", "max_resolution", "typical_duration_sec")
         }),
         ("Поддерживаемые типы референсных данных", {
             "fields": (
@@ -755,7 +835,7 @@ class VideoPromptAdmin(admin.ModelAdmin):
     list_filter = ("is_active", "category")
     search_fields = ("title", "prompt_text", "category__name")
     ordering = ("category__order", "order", "title")
-    actions = (mark_active, mark_inactive)
+    actions = (mark_active, mark_inactive, fill_prompt_en)
     autocomplete_fields = ("category",)
     readonly_fields = ("created_at",)
 
@@ -3,7 +3,7 @@ API endpoints для получения конфигураций соотнош
 """
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
-from .models_aspect_ratio import AspectRatioQualityConfig
+from .services import model_catalog
 
 
 @require_http_methods(["GET"])
@@ -18,37 +18,19 @@ def get_model_aspect_ratio_configs(request, model_type, model_id):
     Returns:
         JSON со структурой
     """
-    # Пробуем найти модель по model_id (строка) или по pk (число)
+    # Модели и их конфигурации — из каталога в памяти процесса, без запросов
+    catalog = model_catalog.get()
     try:
         # Сначала пробуем как числовой pk
         pk = int(model_id)
-        configs = AspectRatioQualityConfig.objects.filter(
-            model_type=model_type,
-            model_id=pk,
-            is_active=True
-        ).order_by('order', 'aspect_ratio', 'quality')
     except (ValueError, TypeError):
         # Если не число, значит это строковый model_id - нужно найти pk модели
-        if model_type == 'image':
-            from .models_image import ImageModelConfiguration
-            try:
-                model = ImageModelConfiguration.objects.get(model_id=model_id, is_active=True)
-                pk = model.pk
-            except ImageModelConfiguration.DoesNotExist:
-                return JsonResponse({'error': 'Model not found', 'aspect_ratios': [], 'count': 0}, status=404)
-        else:  # video
-            from .models_video import VideoModelConfiguration
-            try:
-                model = VideoModelConfiguration.objects.get(model_id=model_id, is_active=True)
-                pk = model.pk
-            except VideoModelConfiguration.DoesNotExist:
-                return JsonResponse({'error': 'Model not found', 'aspect_ratios': [], 'count': 0}, status=404)
+        model = catalog.model(model_type, model_id)
+        if model is None or not model.is_active:
+            return JsonResponse({'error': 'Model not found', 'aspect_ratios': [], 'count': 0}, status=404)
+        pk = model.pk
 
-        configs = AspectRatioQualityConfig.objects.filter(
-            model_type=model_type,
-            model_id=pk,
-            is_active=True
-        ).order_by('order', 'aspect_ratio', 'quality')
+    configs = catalog.aspect_ratios(model_type, pk)
 
     # Группируем по aspect_ratio
     result = {}
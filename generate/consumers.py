@@ -0,0 +1,69 @@
+"""
+WebSocket consumer for job progress (see generate.services.job_events)
+"""
+import json
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .services import job_events
+
+
+class JobStatusConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        """Подписка на job_<id>: нужен job-scoped токен из api_submit/api_status"""
+        try:
+            self.job_id = int(self.scope["url_route"]["kwargs"]["job_id"])
+        except (KeyError, TypeError, ValueError):
+            await self.close()
+            return
+
+        token = ""
+        try:
+            from urllib.parse import parse_qs
+            qs = parse_qs((self.scope.get("query_string") or b"").decode())
+            token = (qs.get("token") or [""])[0]
+        except Exception:
+            pass
+
+        if not job_events.check_token(token, self.job_id):
+            await self.close()
+            return
+
+        self.group_name = job_events.group_name(self.job_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        # Текущее состояние сразу — событие могло случиться до подписки
+        state = await self._current_state()
+        if state is not None:
+            await self.send(text_data=json.dumps({"type": "job_status", "job": state}))
+            if job_events.is_terminal(state):
+                await self.close()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        """Handle messages from WebSocket (ping/pong for keepalive)"""
+        try:
+            data = json.loads(text_data)
+            if data.get("type") == "ping":
+                await self.send(text_data=json.dumps({"type": "pong"}))
+        except Exception:
+            pass
+
+    async def job_status(self, event):
+        """Handle job status messages sent to the group"""
+        state = event["payload"]
+        await self.send(text_data=json.dumps({"type": "job_status", "job": state}))
+        if job_events.is_terminal(state):
+            await self.close()
+
+    @database_sync_to_async
+    def _current_state(self):
+        from .models import GenerationJob
+
+        job = GenerationJob.objects.filter(pk=self.job_id).first()
+        return job_events.payload(job) if job else None
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from generate.services import reaper
+
+
+class Command(BaseCommand):
+    help = "Убрать неподтверждённые и старые неопубликованные задачи (то же, что Beat-задача reap_jobs; для dev/cron без Celery)."
+
+    def handle(self, *args, **options):
+        for name, stats in reaper.run().items():
+            self.stdout.write(
+                f"{name}: rows={stats['rows']} files={stats['files']} bytes={stats['bytes']} "
+                f"chunks={stats['chunks']} done={stats['done']}"
+            )
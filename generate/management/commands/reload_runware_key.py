@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from ai_gallery.services import credentials
+
+
+class Command(BaseCommand):
+    help = "Перечитать RUNWARE_API_KEY из .env во всех веб-процессах и воркерах (без перезапуска)."
+
+    def handle(self, *args, **options):
+        version = credentials.request_reload()
+        key = credentials.get_runware_api_key()
+        if not key:
+            self.stderr.write(self.style.WARNING("RUNWARE_API_KEY не задан"))
+        masked = f"…{key[-4:]}" if len(key) >= 4 else "—"
+        self.stdout.write(self.style.SUCCESS(f"Reload requested (version={version}), current key {masked}"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generate', '0049_make_video_resolution_limits_optional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videomodel',
+            name='typical_duration_sec',
+            field=models.PositiveIntegerField(default=90, help_text='Используется планировщиком опроса статуса: чаще проверяем около этого времени', verbose_name='Типичное время генерации (сек)'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_job_counters(apps, schema_editor):
+    """likes_count / comments_count / saves_count для уже существующих задач."""
+    GenerationJob = apps.get_model("generate", "GenerationJob")
+
+    def counted(model_name, **extra):
+        Model = apps.get_model("gallery", model_name)
+        return Coalesce(Subquery(
+            Model.objects.filter(job=OuterRef("pk"), **extra)
+            .order_by()
+            .values("job")
+            .annotate(c=Count("pk"))
+            .values("c")
+        ), 0)
+
+    GenerationJob.objects.update(
+        likes_count=counted("Like"),
+        comments_count=counted("JobComment", is_visible=True),
+        saves_count=counted("JobSave"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generate', '0050_video_poll_schedule'),
+        ('gallery', '0032_feed_denorm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='saves_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_job_counters, reverse_code=migrations.RunPython.noop),
+    ]
@@ -51,6 +51,10 @@ log = logging.getLogger(__name__)
 # АНТИ-АБУЗ: Кластер + Идентификаторы
 # =============================================================================
 
+# как часто обновлять last_seen уже привязанного идентификатора
+IDENT_TOUCH_INTERVAL = timezone.timedelta(days=1)
+
+
 class AbuseCluster(models.Model):
     """
     Кластер «одного пользователя» — объединяет разные идентификаторы:
@@ -131,9 +135,9 @@ class AbuseCluster(models.Model):
         """
         Находит/создаёт кластер, опираясь на любой из переданных идентификаторов.
         Если найдено несколько разных кластеров — аккуратно склеиваем их в один.
-        Затем привязываем ВСЕ переданные идентификаторы к итоговому кластеру.
+        Затем привязываем к итоговому кластеру новые идентификаторы; уже привязанные
+        не переписываются (last_seen освежается не чаще IDENT_TOUCH_INTERVAL).
         """
-        ids = []
         probe = [
             ("fp", AbuseIdentifier.Kind.FP, fp),
             ("gid", AbuseIdentifier.Kind.GID, gid),
@@ -141,16 +145,20 @@ class AbuseCluster(models.Model):
             ("ua", AbuseIdentifier.Kind.UA, ua_hash),
             ("user", AbuseIdentifier.Kind.USER, str(user_id) if user_id else None),
         ]
+        wanted = [(kind, AbuseIdentifier.normalize(kind, val)) for _, kind, val in probe if val]
+
+        # все идентификаторы одним запросом; порядок кластеров — как в probe
+        found: dict[tuple, AbuseIdentifier] = {}
+        if wanted:
+            q = Q()
+            for kind, norm in wanted:
+                q |= Q(kind=kind, value=norm)
+            found = {(i.kind, i.value): i for i in AbuseIdentifier.objects.filter(q).select_related("cluster")}
         clusters: dict[int, AbuseCluster] = {}
-        for _, kind, val in probe:
-            if not val:
-                continue
-            ident = AbuseIdentifier.objects.filter(kind=kind, value=AbuseIdentifier.normalize(
-                kind, val)).select_related("cluster").first()
-            if ident:
-                ids.append(ident)
-                if ident.cluster_id:
-                    clusters[ident.cluster_id] = ident.cluster
+        for key in wanted:
+            ident = found.get(key)
+            if ident and ident.cluster_id:
+                clusters.setdefault(ident.cluster_id, ident.cluster)
 
         if clusters:
             base = next(iter(clusters.values()))
@@ -166,10 +174,17 @@ class AbuseCluster(models.Model):
                 guest_jobs_used=0,
             )
 
-        for _, kind, val in probe:
-            if not val:
+        now = timezone.now()
+        stale = []
+        for kind, norm in wanted:
+            ident = found.get((kind, norm))
+            if ident is not None and ident.cluster_id == cluster.pk:
+                if ident.last_seen and now - ident.last_seen > IDENT_TOUCH_INTERVAL:
+                    stale.append(ident.pk)
                 continue
-            AbuseIdentifier.attach(cluster=cluster, kind=kind, value=val)
+            AbuseIdentifier.attach(cluster=cluster, kind=kind, value=norm)
+        if stale:
+            AbuseIdentifier.objects.filter(pk__in=stale).update(last_seen=now)
 
         return cluster
 
@@ -307,7 +322,10 @@ class PromptCategory(models.Model):
 
     @property
     def active_prompts_count(self) -> int:
-        """Количество активных промптов в категории."""
+        """Количество активных промптов в категории (prompt_library.attach_counts — без запроса)."""
+        cached = getattr(self, "_active_prompts_count", None)
+        if cached is not None:
+            return cached
         return self.prompts.filter(is_active=True).count()
 
 
@@ -570,6 +588,9 @@ class VideoModel(models.Model):
         "Макс. длительность (сек)", default=8)
     max_resolution = models.CharField(
         "Макс. разрешение", max_length=20, default="1920x1080")
+    typical_duration_sec = models.PositiveIntegerField(
+        "Типичное время генерации (сек)", default=90,
+        help_text="Используется планировщиком опроса статуса: чаще проверяем около этого времени")
 
     # Поддерживаемые типы референсов (JSON: список строк из ReferenceType)
     supported_references = models.JSONField(
@@ -633,7 +654,10 @@ class VideoPromptCategory(models.Model):
 
     @property
     def active_prompts_count(self) -> int:
-        """Количество активных промптов в категории."""
+        """Количество активных промптов в категории (prompt_library.attach_counts — без запроса)."""
+        cached = getattr(self, "_active_prompts_count", None)
+        if cached is not None:
+            return cached
         return self.video_prompts.filter(is_active=True).count()
 
 
@@ -850,6 +874,11 @@ class GenerationJob(models.Model):
     is_public = models.BooleanField(default=False)
     is_trending = models.BooleanField(default=False)
 
+    # --- счётчики взаимодействий (поддерживаются сигналами gallery.signals) ---
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)  # только видимые
+    saves_count = models.PositiveIntegerField(default=0)
+
     # --- таймстемпы ---
     created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
@@ -868,6 +897,8 @@ class GenerationJob(models.Model):
     provider_status = models.CharField(max_length=32, blank=True, default="")
     provider_payload = models.JSONField(null=True, blank=True)
     last_polled_at = models.DateTimeField(null=True, blank=True)
+    # когда поллеру в следующий раз проверять задачу (адаптивный график для видео)
+    next_poll_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     class Meta:
         ordering = ("-created_at",)
@@ -1239,8 +1270,10 @@ class DeviceFingerprint(models.Model):
         if self.is_blocked:
             return False, "Устройство заблокировано за попытки обхода системы"
 
-        if self.free_grant and self.free_grant.left <= 0:
-            return False, "Токены уже использованы"
+        if self.free_grant:
+            from .services import guest_ledger
+            if guest_ledger.left(self.free_grant) <= 0:
+                return False, "Токены уже использованы"
 
         return True, ""
 
@@ -1373,12 +1406,16 @@ class FreeGrant(models.Model):
             return
 
         from dashboard.models import Wallet  # локальный импорт, чтобы не ловить циклы
+        from .services import guest_ledger
         with transaction.atomic():
             # Повторная проверка под блокировкой
             grant = FreeGrant.objects.select_for_update().get(pk=self.pk)
             if grant.user_id == user.id:
                 return  # Уже привязан
 
+            # расход, ещё не перенесённый из guest_ledger
+            grant.consumed = guest_ledger.used(grant)
+
             if transfer_left:
                 left = grant.left
                 if left > 0:
@@ -1390,6 +1427,7 @@ class FreeGrant(models.Model):
 
             grant.user = user
             grant.save(update_fields=["user", "consumed", "updated_at"])
+            transaction.on_commit(lambda: guest_ledger.store(grant))
 
             # Обновляем текущий объект
             self.user = user
@@ -0,0 +1,10 @@
+"""
+WebSocket routes of the generate app
+"""
+from django.urls import re_path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    re_path(r"^ws/jobs/(?P<job_id>\d+)/$", consumers.JobStatusConsumer.as_asgi()),
+]
@@ -14,6 +14,7 @@ from django.utils import timezone
 from django.db.models import Q
 
 from .models import FreeGrant, DeviceFingerprint, TokenGrantAttempt, AbuseCluster
+from .services import guest_ledger
 
 log = logging.getLogger(__name__)
 
@@ -21,17 +22,19 @@ log = logging.getLogger(__name__)
 def get_device_identifiers(request: HttpRequest) -> dict:
     """
     Извлечь все идентификаторы устройства из request.
-    Использует данные из DeviceFingerprintMiddleware.
+    Использует request.device из DeviceFingerprintMiddleware.
     Приоритет клиентскому fingerprint.
+    Обращение к session_key создаёт сессию гостя, если её ещё нет.
     """
+    device = getattr(request, 'device', None)  # None — middleware выключен
     return {
-        'fp': getattr(request, 'device_fp', ''),  # Основной FP (клиентский или fallback)
-        'client_fp': getattr(request, 'device_client_fp', ''),  # Клиентский FP
-        'server_fp': getattr(request, 'device_server_fp', ''),  # Серверный FP
-        'gid': getattr(request, 'device_gid', ''),
-        'ip_hash': getattr(request, 'device_ip_hash', ''),
-        'ua_hash': getattr(request, 'device_ua_hash', ''),
-        'session_key': getattr(request, 'device_session_key', ''),
+        'fp': getattr(device, 'fp', ''),  # Основной FP (клиентский или fallback)
+        'client_fp': getattr(device, 'client_fp', ''),  # Клиентский FP
+        'server_fp': getattr(device, 'server_fp', ''),  # Серверный FP
+        'gid': getattr(device, 'gid', ''),
+        'ip_hash': getattr(device, 'ip_hash', ''),
+        'ua_hash': getattr(device, 'ua_hash', ''),
+        'session_key': getattr(device, 'session_key', ''),
         'first_ip': _extract_ip(request),
     }
 
@@ -96,6 +99,9 @@ def ensure_guest_grant_with_security(request: HttpRequest) -> Tuple[Optional[Fre
     - UA_HASH не меняется в Tor Browser (один и тот же браузер)
     - Один грант на кластер UA_HASH (а не на каждый IP/FP)
     - IP и FP только для статистики и VPN-детекта
+
+    Разобранный набор идентификаторов запоминается (guest_ledger): повторный
+    заход того же браузера не трогает кластер и не пишет в БД.
     """
     ids = get_device_identifiers(request)
 
@@ -113,6 +119,16 @@ def ensure_guest_grant_with_security(request: HttpRequest) -> Tuple[Optional[Fre
         log.error("UA_HASH is missing - cannot track user")
         return None, None, "Ошибка идентификации браузера"
 
+    # ШАГ 0: этот набор идентификаторов уже разбирали — грант и устройство по pk
+    known = guest_ledger.remembered(ids)
+    if known is not None:
+        grant, device = known
+        if grant.is_bound_to_user:
+            guest_ledger.forget(ids)
+            log.warning(f"Grant {grant.pk} is bound to user")
+            return None, None, "Грант уже привязан к пользователю"
+        return grant, device, ""
+
     # ШАГ 1: КЛАСТЕР - главный механизм идентификации
     # Используем UA_HASH как основной идентификатор (стабилен в Tor)
     # FP и GID могут меняться (Tor очищает), но UA остаётся
@@ -138,16 +154,15 @@ def ensure_guest_grant_with_security(request: HttpRequest) -> Tuple[Optional[Fre
             log.warning(f"Grant {grant.pk} is bound to user, cluster {cluster.pk}")
             return None, None, "Грант уже привязан к пользователю"
 
-        # Обновляем метаданные гранта (актуализируем)
-        if fp and grant.fp != fp:
-            grant.fp = fp
-        if gid and grant.gid != gid:
-            grant.gid = gid
-        if ip_hash and grant.ip_hash != ip_hash:
-            grant.ip_hash = ip_hash
-        if ua_hash and grant.ua_hash != ua_hash:
-            grant.ua_hash = ua_hash
-        grant.save()
+        # Обновляем метаданные гранта (актуализируем).
+        # Только изменённые поля: consumed ведёт guest_ledger, его не перезаписываем.
+        changed = []
+        for field, value in (("fp", fp), ("gid", gid), ("ip_hash", ip_hash), ("ua_hash", ua_hash)):
+            if value and getattr(grant, field) != value:
+                setattr(grant, field, value)
+                changed.append(field)
+        if changed:
+            grant.save(update_fields=changed + ["updated_at"])
 
         log.info(f"Using existing grant {grant.pk} from cluster {cluster.pk}")
 
@@ -169,6 +184,7 @@ def ensure_guest_grant_with_security(request: HttpRequest) -> Tuple[Optional[Fre
         except Exception as e:
             log.error(f"Error updating device: {e}")
 
+        guest_ledger.remember(ids, grant, device)
         return grant, device, ""
 
     # ШАГ 3: Создаём устройство
@@ -235,6 +251,7 @@ def ensure_guest_grant_with_security(request: HttpRequest) -> Tuple[Optional[Fre
         )
 
         log.info(f"Created new grant {grant.pk} for cluster {cluster.pk}, device {device.pk}")
+        guest_ledger.remember(ids, grant, device)
         return grant, device, ""
 
     except Exception as e:
@@ -244,7 +261,6 @@ def ensure_guest_grant_with_security(request: HttpRequest) -> Tuple[Optional[Fre
 
 
 
-@transaction.atomic
 def check_and_spend_guest_tokens(
     request: HttpRequest,
     amount: int,
@@ -259,7 +275,7 @@ def check_and_spend_guest_tokens(
     ЖЕЛЕЗНАЯ ЛОГИКА:
     - Если нет токенов = НЕТ ГЕНЕРАЦИИ
     - Если устройство заблокировано = НЕТ ГЕНЕРАЦИИ
-    - Списание атомарное с блокировкой
+    - Списание атомарное (счётчик guest_ledger, без блокировки строки гранта)
     """
     if amount <= 0:
         return True, ""
@@ -277,23 +293,11 @@ def check_and_spend_guest_tokens(
     if not can_get:
         return False, reason
 
-    # Проверка наличия токенов
-    if grant.left < amount:
-        return False, f"Недостаточно токенов. Доступно: {grant.left}, требуется: {amount}"
-
-    # Атомарное списание с блокировкой
-    with transaction.atomic():
-        # Перезагружаем грант с блокировкой
-        locked_grant = FreeGrant.objects.select_for_update().get(pk=grant.pk)
-
-        # Повторная проверка после блокировки
-        if locked_grant.left < amount:
-            return False, f"Недостаточно токенов. Доступно: {locked_grant.left}, требуется: {amount}"
-
-        # Списываем токены
-        spent = locked_grant.spend(amount)
-        if spent != amount:
-            return False, f"Не удалось списать токены. Списано: {spent}, требовалось: {amount}"
+    # Атомарное списание: всё или ничего
+    spent = guest_ledger.spend(grant, amount)
+    if spent != amount:
+        left = guest_ledger.left(grant)
+        return False, f"Недостаточно токенов. Доступно: {left}, требуется: {amount}"
 
     log.info(f"Spent {amount} tokens from grant {grant.pk} for device {device.pk}")
     return True, ""
@@ -327,14 +331,15 @@ def get_guest_tokens_info(request: HttpRequest) -> dict:
             }
 
         can_get, reason = device.can_get_tokens()
+        left = guest_ledger.left(grant)
 
         return {
             'total': grant.total,
-            'consumed': grant.consumed,
-            'left': grant.left,
+            'consumed': guest_ledger.used(grant),
+            'left': left,
             'is_blocked': not can_get,
             'block_reason': reason,
-            'can_generate': can_get and grant.left > 0
+            'can_generate': can_get and left > 0
         }
     except Exception as e:
         log.error(f"Error getting guest tokens info: {e}")
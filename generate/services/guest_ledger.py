@@ -0,0 +1,237 @@
+"""
+Гостевые квоты (FreeGrant) без блокировок строк на горячем пути.
+
+1. Резолвер личности гостя. ensure_guest_grant_with_security (generate/security.py)
+   — это кластер (поиск идентификаторов, возможная склейка), сохранение гранта
+   и upsert DeviceFingerprint. Результат запоминается в общем кэше по набору
+   идентификаторов запроса (ua/fp/gid/ip/server_fp): повторный заход того же
+   браузера — два запроса по pk вместо всей цепочки. Новый идентификатор
+   (другой IP, сброшенный gid) — другой ключ и полный путь, где он и привяжется.
+   Запись живёт GUEST_RESOLVE_TTL.
+
+2. Учёт расхода. Израсходованное гранта — счётчик guest:used:{pk} в общем кэше
+   (засевается из FreeGrant.consumed); списание и возврат — атомарные incr/decr
+   без select_for_update. Изменённые гранты пишутся в журнал (caches.Journal,
+   общий с gallery.services.view_counter), generate.tasks.reconcile_guest_quota раз в
+   GUEST_LEDGER_FLUSH_INTERVAL переносит значения в FreeGrant.consumed. В кэше
+   лежит абсолютное значение, поэтому повторный перенос безопасен.
+
+Без общего кэша (GUEST_LEDGER=False — по умолчанию без REDIS_CACHE_URL) или при
+его сбое — прежний путь: строка гранта под select_for_update.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from ai_gallery.services import caches
+
+log = logging.getLogger(__name__)
+
+# счётчик должен пережить любой разумный перерыв в сбросе
+_USED_TTL = 30 * 24 * 60 * 60
+_LOG_TTL = 24 * 60 * 60
+
+def enabled() -> bool:
+    return bool(getattr(settings, "GUEST_LEDGER", False))
+
+
+def _cache():
+    return caches.get("default")
+
+
+def _used_key(pk: int) -> str:
+    return f"guest:used:{pk}"
+
+
+def _journal(cache) -> caches.Journal:
+    # guest:seq, guest:log:{n}, guest:cursor, guest:gap
+    return caches.Journal(cache, "guest:{part}", ttl=_LOG_TTL)
+
+
+# ── Резолвер ─────────────────────────────────────────────────────────────────
+
+
+def _who_key(ids: dict) -> str:
+    raw = "|".join(ids.get(k) or "" for k in ("ua_hash", "fp", "gid", "ip_hash", "server_fp"))
+    return "guest:who:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def remembered(ids: dict) -> Optional[Tuple[object, object]]:
+    """(FreeGrant, DeviceFingerprint) для уже разобранного набора идентификаторов или None."""
+    from generate.models import DeviceFingerprint, FreeGrant
+
+    try:
+        entry = _cache().get(_who_key(ids))
+    except Exception:
+        return None
+    if not entry:
+        return None
+    grant = FreeGrant.objects.filter(pk=entry["grant"]).first()
+    device = DeviceFingerprint.objects.filter(pk=entry["device"]).first()
+    if grant is None or device is None:
+        forget(ids)
+        return None
+    return grant, device
+
+
+def remember(ids: dict, grant, device) -> None:
+    if grant is None or device is None:
+        return
+    try:
+        _cache().set(_who_key(ids), {"grant": grant.pk, "device": device.pk},
+                     int(getattr(settings, "GUEST_RESOLVE_TTL", 600)))
+    except Exception as e:
+        log.warning("guest_ledger: cannot remember identity: %s", e)
+
+
+def forget(ids: dict) -> None:
+    try:
+        _cache().delete(_who_key(ids))
+    except Exception:
+        pass
+
+
+# ── Расход ───────────────────────────────────────────────────────────────────
+
+
+def used(grant) -> int:
+    """Израсходовано с учётом ещё не перенесённого в БД."""
+    if enabled():
+        try:
+            value = _cache().get(_used_key(grant.pk))
+        except Exception:
+            value = None
+        if value is not None:
+            return int(value)
+    return int(grant.consumed)
+
+
+def left(grant) -> int:
+    return max(int(grant.total) - used(grant), 0)
+
+
+def _spend_cached(grant, amount: int, partial: bool) -> Optional[int]:
+    """Списание счётчиком в кэше; None — кэш недоступен."""
+    cache = _cache()
+    key = _used_key(grant.pk)
+    try:
+        cache.add(key, int(grant.consumed), _USED_TTL)
+        value = cache.incr(key, amount)
+    except Exception as e:
+        log.warning("guest_ledger: incr %s failed: %s", key, e)
+        return None
+
+    over = value - int(grant.total)
+    if over <= 0:
+        taken = amount
+    elif partial and over < amount:
+        taken = amount - over
+    else:
+        taken = 0
+    if taken < amount:
+        try:
+            cache.decr(key, amount - taken)
+        except Exception as e:
+            # лишнее останется списанным — в пользу системы, не гостя
+            log.error("guest_ledger: cannot roll back %s: %s", key, e)
+    if taken:
+        _journal(cache).append(grant.pk)
+    return taken
+
+
+def _spend_db(pk: int, amount: int, partial: bool) -> int:
+    from generate.models import FreeGrant
+
+    with transaction.atomic():
+        g = FreeGrant.objects.select_for_update().get(pk=pk)
+        if g.is_bound_to_user:
+            return 0
+        if g.left < amount and not partial:
+            return 0
+        return g.spend(amount)
+
+
+def spend(grant, amount: int, *, partial: bool = False) -> int:
+    """
+    Списывает amount токенов гранта. → фактически списанное.
+    partial=False — всё или ничего (0 — не хватило); True — сколько есть,
+    как FreeGrant.spend.
+    """
+    amount = max(int(amount or 0), 0)
+    if amount == 0:
+        return 0
+    if grant.is_bound_to_user:
+        log.warning(f"Attempt to spend from bound grant {grant.pk}")
+        return 0
+    if enabled():
+        taken = _spend_cached(grant, amount, partial)
+        if taken is not None:
+            return taken
+    return _spend_db(grant.pk, amount, partial)
+
+
+def refund(grant, amount: int) -> None:
+    """Возвращает amount токенов гранту (не ниже нуля израсходованного)."""
+    from generate.models import FreeGrant
+
+    amount = max(int(amount or 0), 0)
+    if amount == 0:
+        return
+    if enabled():
+        cache = _cache()
+        key = _used_key(grant.pk)
+        try:
+            cache.add(key, int(grant.consumed), _USED_TTL)
+            value = cache.decr(key, amount)
+            if value < 0:
+                cache.incr(key, -value)
+            _journal(cache).append(grant.pk)
+            return
+        except Exception as e:
+            log.warning("guest_ledger: decr %s failed: %s", key, e)
+    FreeGrant.objects.filter(pk=grant.pk).update(consumed=Greatest(F("consumed") - amount, Value(0)))
+
+
+def store(grant) -> None:
+    """После прямой записи consumed в БД (привязка к пользователю, правка в админке) — то же значение в счётчик."""
+    if not enabled():
+        return
+    try:
+        _cache().set(_used_key(grant.pk), int(grant.consumed), _USED_TTL)
+    except Exception as e:
+        log.warning("guest_ledger: cannot store grant %s: %s", grant.pk, e)
+
+
+# ── Перенос в БД (Celery Beat) ───────────────────────────────────────────────
+
+
+def _apply(cache, ids: List[int]) -> int:
+    from generate.models import FreeGrant
+
+    raw = cache.get_many([_used_key(pk) for pk in ids])
+    values = {pk: int(raw[_used_key(pk)]) for pk in ids if _used_key(pk) in raw}
+    if not values:
+        return 0
+    whens = [When(pk=pk, then=Value(n)) for pk, n in values.items()]
+    return FreeGrant.objects.filter(pk__in=list(values)).update(
+        consumed=Case(*whens, default=F("consumed"), output_field=IntegerField())
+    )
+
+
+def reconcile() -> int:
+    """Переносит счётчики изменённых грантов в FreeGrant.consumed. → число грантов."""
+    if not enabled():
+        return 0
+    cache = _cache()
+    # ошибка БД — курсор не двигается, значения в кэше абсолютные: повторим целиком
+    return _journal(cache).drain(
+        lambda ids: _apply(cache, ids),
+        chunk=int(getattr(settings, "GUEST_LEDGER_FLUSH_CHUNK", 500)),
+    )
@@ -0,0 +1,95 @@
+"""
+Push-уведомления о ходе задачи генерации (WebSocket + SSE).
+
+Вместо опроса api_status клиент подписывается на группу job_<id>:
+  • ws/jobs/<id>/?token=…             — generate.consumers.JobStatusConsumer
+  • /generate/api/jobs/<id>/events?token=… — SSE-фоллбек (api_job_events)
+
+token — подписанный job-scoped токен (django.core.signing), его отдают
+api_submit/api_status владельцу задачи. Так гостям не нужна сессия/отпечаток
+на каждое соединение, а чужую задачу без токена не послушать.
+
+publish(job) вызывается из финализаций в generate/tasks.py и из webhook.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict
+
+from django.conf import settings
+from django.core import signing
+
+log = logging.getLogger(__name__)
+
+TOKEN_SALT = "generate.job-events"
+
+
+def group_name(job_id: int) -> str:
+    return f"job_{int(job_id)}"
+
+
+def make_token(job_id: int) -> str:
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(int(job_id)))
+
+
+def check_token(token: str, job_id: int) -> bool:
+    if not token:
+        return False
+    max_age = int(getattr(settings, "JOB_EVENTS_TOKEN_MAX_AGE", 60 * 60 * 24))
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return value == str(int(job_id))
+
+
+def payload(job) -> Dict[str, Any]:
+    """Состояние задачи в том же формате, что отдаёт api_status (+ видео-поля)."""
+    from generate.models import GenerationJob
+
+    data: Dict[str, Any] = {
+        "id": job.id,
+        "done": job.status == GenerationJob.Status.DONE,
+        "failed": job.status == GenerationJob.Status.FAILED,
+        "status": job.status,
+        "error": job.error or "",
+        "provider_status": getattr(job, "provider_status", "") or "",
+        "image": None,
+    }
+    if job.result_image:
+        try:
+            data["image"] = {"url": job.result_image.url}
+        except Exception:
+            data["image"] = None
+    if getattr(job, "generation_type", "") == "video" and job.result_video_url:
+        data["video_url"] = job.result_video_url
+    return data
+
+
+def is_terminal(data: Dict[str, Any]) -> bool:
+    return bool(data.get("done") or data.get("failed"))
+
+
+def publish(job) -> None:
+    """
+    Отправляет текущее состояние задачи подписчикам — после коммита транзакции,
+    чтобы клиент, перечитавший статус по событию, увидел уже сохранённые данные.
+    Ошибки слоя каналов не пробрасываются.
+    """
+    from django.db import transaction
+
+    job_id, data = job.id, payload(job)
+    transaction.on_commit(lambda: _send(job_id, data))
+
+
+def _send(job_id: int, data: Dict[str, Any]) -> None:
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        async_to_sync(layer.group_send)(group_name(job_id), {"type": "job.status", "payload": data})
+    except Exception as e:
+        log.warning("job_events: publish for job %s failed: %s", job_id, e)
@@ -0,0 +1,180 @@
+"""
+Каталог моделей генерации в памяти процесса.
+
+ImageModelConfiguration, VideoModelConfiguration, VideoModel и активные
+AspectRatioQualityConfig читаются одним проходом в неизменяемый снимок Catalog:
+поиск по model_id и pk — словарь, без запросов. Снимок перестраивается, если:
+  • изменилась версия в общем кэше (invalidate() после сохранения в админке —
+    см. приёмники в generate/admin.py); проверка не чаще MODEL_CATALOG_RECHECK_SEC;
+  • снимок старше MODEL_CATALOG_MAX_AGE (страховка, если общий кэш недоступен).
+
+Объекты моделей в снимке общие для всех потоков — только для чтения.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from ai_gallery.services import caches
+
+log = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = "catalog:models:version"
+
+
+@dataclass(frozen=True)
+class AspectRatioOption:
+    aspect_ratio: str
+    quality: str
+    width: int
+    height: int
+    is_default: bool
+
+
+@dataclass(frozen=True)
+class Catalog:
+    version: Optional[int]
+    images_by_pk: Mapping = field(default_factory=dict)
+    images_by_model_id: Mapping = field(default_factory=dict)
+    videos_by_pk: Mapping = field(default_factory=dict)
+    videos_by_model_id: Mapping = field(default_factory=dict)
+    video_models_by_model_id: Mapping = field(default_factory=dict)   # generate.models.VideoModel
+    aspect_ratios_by_model: Mapping = field(default_factory=dict)     # (model_type, pk) → options
+    names: Mapping = field(default_factory=dict)                      # model_id → отображаемое имя
+
+    def image(self, model_id: str):
+        return self.images_by_model_id.get((model_id or "").strip())
+
+    def video(self, model_id: str):
+        return self.videos_by_model_id.get((model_id or "").strip())
+
+    def model(self, model_type: str, model_id: str):
+        return self.image(model_id) if model_type == "image" else self.video(model_id)
+
+    def aspect_ratios(self, model_type: str, pk: int) -> Tuple[AspectRatioOption, ...]:
+        return self.aspect_ratios_by_model.get((model_type, pk), ())
+
+    def display_name(self, model_id: str) -> str:
+        """Название модели по model_id; пустая строка — модель неизвестна."""
+        return self.names.get((model_id or "").strip(), "")
+
+
+def _build(version: Optional[int]) -> Catalog:
+    from generate.models import VideoModel
+    from generate.models_aspect_ratio import AspectRatioQualityConfig
+    from generate.models_image import ImageModelConfiguration
+    from generate.models_video import VideoModelConfiguration
+
+    images = list(ImageModelConfiguration.objects.order_by("pk"))
+    videos = list(VideoModelConfiguration.objects.order_by("pk"))
+    legacy = list(VideoModel.objects.order_by("pk"))
+
+    # model_id у видео не уникален: активная конфигурация важнее, затем меньший pk
+    videos_by_model_id = {}
+    for v in sorted(videos, key=lambda v: (not v.is_active, v.pk)):
+        videos_by_model_id.setdefault(v.model_id, v)
+
+    ratios = {}
+    configs = AspectRatioQualityConfig.objects.filter(is_active=True).order_by(
+        "model_type", "model_id", "order", "aspect_ratio", "quality")
+    for c in configs:
+        ratios.setdefault((c.model_type, c.model_id), []).append(
+            AspectRatioOption(c.aspect_ratio, c.quality, c.width, c.height, c.is_default))
+
+    # приоритет имён как в generate_extras: конфигурация изображения, затем VideoModel
+    names = {}
+    for obj in legacy + images:
+        name = getattr(obj, "title", None) or getattr(obj, "name", None)
+        if name:
+            names[obj.model_id] = name
+
+    return Catalog(
+        version=version,
+        images_by_pk=MappingProxyType({m.pk: m for m in images}),
+        images_by_model_id=MappingProxyType({m.model_id: m for m in images}),
+        videos_by_pk=MappingProxyType({m.pk: m for m in videos}),
+        videos_by_model_id=MappingProxyType(videos_by_model_id),
+        video_models_by_model_id=MappingProxyType({m.model_id: m for m in legacy}),
+        aspect_ratios_by_model=MappingProxyType({k: tuple(v) for k, v in ratios.items()}),
+        names=MappingProxyType(names),
+    )
+
+
+_lock = threading.Lock()
+_state = {
+    "catalog": None,     # Optional[Catalog]
+    "built_at": 0.0,
+    "checked_at": 0.0,
+}
+
+
+def _shared_version() -> Optional[int]:
+    try:
+        return caches.provider().get(VERSION_CACHE_KEY)
+    except Exception:
+        return None
+
+
+def _load(version: Optional[int]) -> Catalog:
+    catalog = _build(version)
+    now = time.monotonic()
+    _state.update(catalog=catalog, built_at=now, checked_at=now)
+    return catalog
+
+
+def get() -> Catalog:
+    """Текущий снимок каталога."""
+    now = time.monotonic()
+    recheck = float(getattr(settings, "MODEL_CATALOG_RECHECK_SEC", 5))
+    catalog = _state["catalog"]
+    if catalog is not None and now - _state["checked_at"] < recheck:
+        return catalog
+
+    with _lock:
+        catalog = _state["catalog"]
+        if catalog is not None and time.monotonic() - _state["checked_at"] < recheck:
+            return catalog
+        version = _shared_version()
+        max_age = float(getattr(settings, "MODEL_CATALOG_MAX_AGE", 300))
+        if (catalog is None or version != catalog.version
+                or time.monotonic() - _state["built_at"] >= max_age):
+            return _load(version)
+        _state["checked_at"] = time.monotonic()
+        return catalog
+
+
+def invalidate() -> None:
+    """После коммита: новая версия в общем кэше, снимок процесса сбрасывается сразу."""
+    def _bump():
+        try:
+            caches.provider().set(VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+        except Exception as e:
+            log.warning("model_catalog: cannot bump version: %s", e)
+        _state["catalog"] = None
+
+    transaction.on_commit(_bump)
+
+
+# ── короткие обёртки для горячих мест ───────────────────────────────────────
+
+def image_config(model_id: str):
+    """ImageModelConfiguration по model_id (включая неактивные) или None."""
+    try:
+        return get().image(model_id)
+    except Exception as e:
+        log.warning("model_catalog: image_config(%s) failed: %s", model_id, e)
+        return None
+
+
+def display_name(model_id: str) -> str:
+    try:
+        return get().display_name(model_id)
+    except Exception:
+        return ""
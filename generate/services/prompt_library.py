@@ -0,0 +1,240 @@
+"""
+Библиотека промптов (категории → подкатегории → промпты) для публичных API.
+
+Ответы собираются один раз и лежат в caches.pages() уже сериализованными
+вместе с ETag; ключ включает версию библиотеки своего вида (image / video).
+Любое сохранение/удаление категории, подкатегории или промпта поднимает
+версию (приёмники в generate/admin.py) — старые ключи просто перестают читаться.
+
+Счётчики активных промптов — один GROUP BY на категорию (подкатегории) или на
+всю библиотеку (карточки категорий страницы генерации), а не COUNT на строку.
+
+respond() отдаёт закэшированное тело или 304, если клиент прислал тот же ETag.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from typing import Callable, Dict, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified
+
+from ai_gallery.services import caches
+
+log = logging.getLogger(__name__)
+
+
+def _models(kind: str):
+    """(категория, подкатегория, промпт) для вида библиотеки."""
+    from generate.models import (
+        CategoryPrompt, PromptCategory, PromptSubcategory,
+        VideoPrompt, VideoPromptCategory, VideoPromptSubcategory,
+    )
+
+    if kind == "video":
+        return VideoPromptCategory, VideoPromptSubcategory, VideoPrompt
+    return PromptCategory, PromptSubcategory, CategoryPrompt
+
+
+# ── Версия ───────────────────────────────────────────────────────────────────
+
+
+def _version_key(kind: str) -> str:
+    return f"prompts:ver:{kind}"
+
+
+def _version(kind: str) -> int:
+    try:
+        return int(caches.pages().get(_version_key(kind)) or 0)
+    except Exception:
+        return 0
+
+
+def bump(kind: str) -> None:
+    """После коммита инвалидирует все ответы библиотеки данного вида."""
+    def _bump():
+        try:
+            caches.pages().set(_version_key(kind), time.time_ns(), None)
+        except Exception as e:
+            log.warning("prompt_library.bump(%s) failed: %s", kind, e)
+
+    transaction.on_commit(_bump)
+
+
+# ── Кэш сериализованных ответов ─────────────────────────────────────────────
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "PROMPT_LIBRARY_TTL", 60 * 60))
+
+
+def _entry(status: int, data: dict) -> dict:
+    body = json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+    return {"status": status, "body": body, "etag": '"%s"' % hashlib.sha1(body).hexdigest()}
+
+
+def _cached(kind: str, name: str, obj_id: int, build: Callable[[], Tuple[int, dict]]) -> dict:
+    key = f"prompts:{kind}:{name}:{obj_id}:{_version(kind)}"
+    cache = caches.pages()
+    try:
+        entry = cache.get(key)
+    except Exception:
+        entry = None
+    if entry is None:
+        entry = _entry(*build())
+        try:
+            cache.set(key, entry, _ttl())
+        except Exception as e:
+            log.warning("prompt_library: cannot store %s: %s", key, e)
+    return entry
+
+
+def respond(request: HttpRequest, entry: dict) -> HttpResponse:
+    """JSON из кэша; 304 при совпадении If-None-Match."""
+    if entry["status"] == 200 and request.headers.get("If-None-Match") == entry["etag"]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry["body"], status=entry["status"], content_type="application/json")
+    response["ETag"] = entry["etag"]
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+# ── Счётчики ─────────────────────────────────────────────────────────────────
+
+
+def category_counts(kind: str) -> Dict[int, int]:
+    """{category_id: активных промптов} по всей библиотеке — один GROUP BY, кэшируется."""
+    key = f"prompts:{kind}:counts:{_version(kind)}"
+    cache = caches.pages()
+    try:
+        counts = cache.get(key)
+    except Exception:
+        counts = None
+    if counts is None:
+        _, _, Prompt = _models(kind)
+        counts = dict(
+            Prompt.objects.filter(is_active=True)
+            .order_by().values("category_id").annotate(n=Count("id")).values_list("category_id", "n")
+        )
+        try:
+            cache.set(key, counts, _ttl())
+        except Exception as e:
+            log.warning("prompt_library: cannot store %s: %s", key, e)
+    return counts
+
+
+def attach_counts(kind: str, categories) -> None:
+    """Подставляет active_prompts_count карточкам категорий без запроса на каждую."""
+    counts = category_counts(kind)
+    for c in categories:
+        c._active_prompts_count = counts.get(c.pk, 0)
+
+
+# ── Ответы API ───────────────────────────────────────────────────────────────
+
+
+def _subcategories(kind: str, category_id: int) -> Tuple[int, dict]:
+    Category, Subcategory, Prompt = _models(kind)
+    cat = Category.objects.filter(pk=category_id, is_active=True).only("id", "name").first()
+    if cat is None:
+        return 404, {"ok": False, "error": "category not found"}
+
+    counts = dict(
+        Prompt.objects.filter(category=cat, is_active=True, subcategory__isnull=False)
+        .order_by().values("subcategory_id").annotate(n=Count("id")).values_list("subcategory_id", "n")
+    )
+    subs = Subcategory.objects.filter(category=cat, is_active=True).order_by("order", "name")
+    data = [{
+        "id": sc.id,
+        "name": sc.name,
+        "slug": sc.slug,
+        "description": sc.description,
+        "order": sc.order,
+        "is_active": sc.is_active,
+        "prompts_count": counts.get(sc.id, 0),
+    } for sc in subs]
+    return 200, {"ok": True, "category": {"id": cat.id, "name": cat.name}, "subcategories": data}
+
+
+def subcategories(kind: str, category_id: int) -> dict:
+    return _cached(kind, "subcategories", category_id, lambda: _subcategories(kind, category_id))
+
+
+def _prompt_item(kind: str, p) -> dict:
+    item = {"id": p.id, "title": p.title, "prompt_text": p.prompt_text}
+    if kind == "video":
+        item["prompt_en"] = p.prompt_en
+    else:
+        item["prompt_en"] = p.get_prompt_for_generation()
+        item["prompt_en_raw"] = p.prompt_en
+    item["order"] = p.order
+    item["is_active"] = p.is_active
+    return item
+
+
+def _subcategory_prompts(kind: str, subcategory_id: int) -> Tuple[int, dict]:
+    _, Subcategory, Prompt = _models(kind)
+    sc = Subcategory.objects.filter(pk=subcategory_id, is_active=True).first()
+    if sc is None:
+        return 404, {"ok": False, "error": "subcategory not found"}
+    prompts = (
+        Prompt.objects
+        .filter(category_id=sc.category_id, subcategory=sc, is_active=True)
+        .order_by("order", "title")
+    )
+    return 200, {
+        "ok": True,
+        "subcategory": {"id": sc.id, "name": sc.name, "category_id": sc.category_id},
+        "prompts": [_prompt_item(kind, p) for p in prompts],
+    }
+
+
+def subcategory_prompts(kind: str, subcategory_id: int) -> dict:
+    return _cached(kind, "subcategory_prompts", subcategory_id,
+                   lambda: _subcategory_prompts(kind, subcategory_id))
+
+
+def _image_category_prompts(category_id: int) -> Tuple[int, dict]:
+    Category, _, Prompt = _models("image")
+    category = Category.objects.filter(id=category_id, is_active=True).first()
+    if category is None:
+        return 404, {}
+    prompts = Prompt.objects.filter(category=category, is_active=True).order_by("order", "title")
+    return 200, {
+        "category_name": category.name,
+        "category_description": category.description,
+        "prompts": [_prompt_item("image", p) for p in prompts],
+    }
+
+
+def _video_category_prompts(category_id: int) -> Tuple[int, dict]:
+    Category, _, Prompt = _models("video")
+    category = Category.objects.filter(id=category_id, is_active=True).first()
+    if category is None:
+        return 404, {"error": "Категория не найдена"}
+    prompts = Prompt.objects.filter(category=category, is_active=True).order_by("order", "title")
+    return 200, {
+        "category": {
+            "id": category.id,
+            "name": category.name,
+            "slug": category.slug,
+            "description": category.description,
+        },
+        "prompts": [
+            {"id": p.id, "title": p.title, "prompt_text": p.prompt_text, "prompt_en": p.prompt_en}
+            for p in prompts
+        ],
+    }
+
+
+def category_prompts(kind: str, category_id: int) -> dict:
+    """Промпты категории в формате, который уже ждёт фронтенд своего вида."""
+    build = _video_category_prompts if kind == "video" else _image_category_prompts
+    return _cached(kind, "category_prompts", category_id, lambda: build(category_id))
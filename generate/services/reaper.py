@@ -0,0 +1,184 @@
+"""
+Фоновая уборка задач генерации (Celery Beat, generate.tasks.reap_jobs).
+
+Заменяет синхронную чистку в _get_generation_context и поштучный
+delete_old_unpublished_jobs. Два набора «мусора»:
+
+    unpersisted — persisted=False старше REAPER_UNPERSISTED_HOURS
+                  (результат так и не сохранили в «Мои генерации»)
+    unpublished — старше REAPER_UNPUBLISHED_DAYS и без PublicPhoto/PublicVideo
+
+Проход идёт пачками по REAPER_CHUNK id в порядке возрастания: одна выборка
+полей с файлами, один DELETE на пачку, файлы удаляются пулом потоков уже после
+коммита. Курсор (последний id) хранится в caches.provider(), поэтому следующий
+запуск продолжает с того же места; когда набор исчерпан, курсор сбрасывается.
+Время одного запуска ограничено REAPER_TIME_BUDGET секундами.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from ai_gallery.services import caches, result_blobs
+
+log = logging.getLogger(__name__)
+
+SETS = ("unpersisted", "unpublished")
+
+
+@dataclass
+class ReapStats:
+    rows: int = 0
+    files: int = 0
+    bytes: int = 0
+    chunks: int = 0
+    done: bool = True
+
+
+def _cursor_key(name: str) -> str:
+    return f"reaper:cursor:{name}"
+
+
+def _queryset(name: str, now):
+    from generate.models import GenerationJob
+    from gallery.models import PublicPhoto, PublicVideo
+
+    if name == "unpersisted":
+        hours = int(getattr(settings, "REAPER_UNPERSISTED_HOURS", 24))
+        return GenerationJob.objects.filter(persisted=False, created_at__lt=now - timedelta(hours=hours))
+
+    days = int(getattr(settings, "REAPER_UNPUBLISHED_DAYS", 30))
+    return (
+        GenerationJob.objects.filter(created_at__lt=now - timedelta(days=days))
+        .exclude(Exists(PublicPhoto.objects.filter(source_job_id=OuterRef("pk"))))
+        .exclude(Exists(PublicVideo.objects.filter(source_job_id=OuterRef("pk"))))
+    )
+
+
+def _media_rel(url: str) -> Optional[str]:
+    """Путь в default_storage для URL под MEDIA_URL (локально сохранённое видео)."""
+    url = (url or "").strip()
+    if not url:
+        return None
+    media_url = str(getattr(settings, "MEDIA_URL", "/media/") or "/media/")
+    if url.startswith(media_url):
+        return url[len(media_url):].lstrip("/") or None
+    path = urlparse(url).path
+    if path and "/media/" in path:
+        return path.split("/media/", 1)[-1].lstrip("/") or None
+    return None
+
+
+def _delete_files(names: Iterable[str]) -> tuple[int, int]:
+    """Удаляет файлы пулом потоков. → (файлов, байт)."""
+    names = [n for n in dict.fromkeys(names) if n]
+    if not names:
+        return 0, 0
+
+    def _one(name: str) -> int:
+        try:
+            size = default_storage.size(name)
+        except Exception:
+            size = 0
+        try:
+            default_storage.delete(name)
+        except Exception as e:
+            log.warning("reaper: cannot delete %s: %s", name, e)
+            return -1
+        return size
+
+    workers = max(1, int(getattr(settings, "REAPER_DELETE_WORKERS", 8)))
+    with ThreadPoolExecutor(max_workers=min(workers, len(names)), thread_name_prefix="reaper") as pool:
+        sizes = [s for s in pool.map(_one, names) if s >= 0]
+    return len(sizes), sum(sizes)
+
+
+def _reap_chunk(name: str, after_id: int, now, chunk: int) -> tuple[List[int], int, int, int]:
+    """Одна пачка: → (просмотренные id, удалено строк, файлов, байт)."""
+    from generate.models import GenerationJob
+
+    rows = list(
+        _queryset(name, now).filter(pk__gt=after_id).order_by("pk")
+        .values_list("pk", "result_image", "video_source_image", "result_video_url")[:chunk]
+    )
+    if not rows:
+        return [], 0, 0, 0
+
+    ids = [r[0] for r in rows]
+    files: List[str] = []
+    for _pk, image, source, video_url in rows:
+        files += [image, source, _media_rel(video_url)]
+
+    try:
+        with transaction.atomic():
+            GenerationJob.objects.filter(pk__in=ids).delete()
+    except Exception as e:
+        # пачку пропускаем (курсор уйдёт дальше), файлы не трогаем
+        log.error("reaper[%s]: delete of ids %s..%s failed: %s", name, ids[0], ids[-1], e)
+        return ids, 0, 0, 0
+
+    result_blobs.delete_many(ids)
+    nfiles, nbytes = _delete_files(files)
+    return ids, len(ids), nfiles, nbytes
+
+
+def reap(name: str, *, now=None, budget: Optional[float] = None) -> ReapStats:
+    """Проход по одному набору с сохранённого курсора в пределах budget секунд."""
+    now = now or timezone.now()
+    budget = float(getattr(settings, "REAPER_TIME_BUDGET", 40)) if budget is None else budget
+    chunk = max(1, int(getattr(settings, "REAPER_CHUNK", 500)))
+    cache = caches.provider()
+    cursor = int(cache.get(_cursor_key(name)) or 0)
+    started = time.monotonic()
+    stats = ReapStats()
+
+    while True:
+        ids, nrows, nfiles, nbytes = _reap_chunk(name, cursor, now, chunk)
+        if not ids:
+            cursor = 0  # набор исчерпан — следующий запуск начнёт сначала
+            break
+        cursor = ids[-1]
+        stats.rows += nrows
+        stats.files += nfiles
+        stats.bytes += nbytes
+        stats.chunks += 1
+        if len(ids) < chunk:
+            cursor = 0
+            break
+        if time.monotonic() - started >= budget:
+            stats.done = False
+            break
+
+    cache.set(_cursor_key(name), cursor, None)
+    return stats
+
+
+def run(now=None) -> Dict[str, dict]:
+    """Все наборы по очереди; бюджет времени делится между ними."""
+    budget = float(getattr(settings, "REAPER_TIME_BUDGET", 40))
+    started = time.monotonic()
+    report: Dict[str, dict] = {}
+    for name in SETS:
+        left = max(1.0, budget - (time.monotonic() - started))
+        stats = reap(name, now=now, budget=left)
+        report[name] = asdict(stats)
+        log.info(
+            "reaper[%s]: rows=%d files=%d bytes=%d chunks=%d done=%s",
+            name, stats.rows, stats.files, stats.bytes, stats.chunks, stats.done,
+        )
+    try:
+        caches.provider().set("reaper:last", {"at": timezone.now().isoformat(), **report}, None)
+    except Exception:
+        pass
+    return report
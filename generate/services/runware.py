@@ -2,28 +2,30 @@
 
 import json
 import logging
-import os
 import uuid
 from typing import Optional, Tuple, Any, Dict, List
 
 import requests
 from django.conf import settings
-from dotenv import load_dotenv
+
+from ai_gallery.services import credentials, provider_http
 
 log = logging.getLogger(__name__)
 
 
 class RunwareError(Exception):
-    """Ошибки взаимодействия с Runware API."""
+    """Ошибки взаимодействия с Runware API. status — HTTP-код ответа, если он был."""
+
+    def __init__(self, message: str = "", status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
 
 
 def _get_model_config(model_id: str):
-    """Получает конфигурацию модели из БД или возвращает None"""
-    try:
-        from ..models_image import ImageModelConfiguration
-        return ImageModelConfiguration.objects.get(model_id=model_id)
-    except Exception:
-        return None
+    """Конфигурация модели из каталога (generate.services.model_catalog) или None"""
+    from . import model_catalog
+
+    return model_catalog.image_config(model_id)
 
 
 # ───────────────────────────────── helpers ───────────────────────────────── #
@@ -35,12 +37,11 @@ def _get_api_url() -> str:
 
 def _get_api_key() -> str:
     """
-    Динамически загружает API ключ из .env файла.
-    Это позволяет обновлять ключ без перезапуска сервера.
+    API ключ из кэша процесса.
+    Ключ перечитывается при изменении .env или по manage.py reload_runware_key,
+    поэтому его можно обновлять без перезапуска сервера.
     """
-    # Перезагружаем .env файл для получения актуального значения
-    load_dotenv(override=True)
-    key = os.getenv("RUNWARE_API_KEY", "")
+    key = credentials.get_runware_api_key()
     if not key:
         raise RunwareError("RUNWARE_API_KEY не задан")
     return key
@@ -90,27 +91,48 @@ def _normalize_ref_images(refs: Optional[List[Any]]) -> List[Any]:
     return out
 
 
-def _parse_response(resp: requests.Response) -> dict:
+def _max_tasks_per_request() -> int:
+    """Сколько задач Runware принимает в одном POST (массив задач)."""
+    return max(1, int(getattr(settings, "RUNWARE_MAX_TASKS_PER_REQUEST", 10)))
+
+
+def _parse_response(resp: requests.Response, *, allow_task_errors: bool = False) -> dict:
     txt = (resp.text or "")[:4000]
     status = resp.status_code
     if status == 401:
-        raise RunwareError("401 Unauthorized от Runware")
+        raise RunwareError("401 Unauthorized от Runware", status=status)
     try:
         resp.raise_for_status()
     except requests.HTTPError as e:
-        raise RunwareError(f"HTTP {status}: {txt}") from e
+        raise RunwareError(f"HTTP {status}: {txt}", status=status) from e
     try:
         data = resp.json()
     except Exception as e:
-        raise RunwareError(f"Некорректный JSON Runware: {txt}") from e
+        raise RunwareError(f"Некорректный JSON Runware: {txt}", status=status) from e
     if isinstance(data, dict) and data.get("errors"):
-        raise RunwareError(f"Runware error: {data.get('errors')}")
+        # В пакетном запросе ошибки относятся к отдельным taskUUID —
+        # разбирает вызывающий код, остальные задачи пакета валидны
+        # (в том числе когда data пуст, а ошибки есть у каждой задачи).
+        if not (allow_task_errors and (data.get("data") or _errors_by_task(data))):
+            raise RunwareError(f"Runware error: {data.get('errors')}", status=status)
     return data
 
 
-def _post(tasks: List[Dict[str, Any]], timeout: Tuple[int, int] = (10, 60), headers: Optional[dict] = None) -> dict:
-    """Отправка массива задач. timeout=(connect, read)."""
-    if not tasks or len(tasks) > 10:  # Ограничение на количество задач
+def _post(
+    tasks: List[Dict[str, Any]],
+    *,
+    endpoint: str = "default",
+    timeout: Optional[Tuple[int, int]] = None,
+    headers: Optional[dict] = None,
+    allow_task_errors: bool = False,
+) -> dict:
+    """
+    Отправка массива задач через общий пул соединений.
+    endpoint — тип запроса для таймаутов (см. provider_http.DEFAULT_TIMEOUTS);
+    timeout=(connect, read) переопределяет его явно.
+    """
+    # Ограничение на количество задач (+1 на возможную задачу authentication)
+    if not tasks or len(tasks) > _max_tasks_per_request() + 1:
         raise RunwareError("Invalid tasks count")
 
     # Валидация каждой задачи
@@ -129,10 +151,12 @@ def _post(tasks: List[Dict[str, Any]], timeout: Tuple[int, int] = (10, 60), head
     log.debug("Request payload: %s", json.dumps(tasks, indent=2)[:2000])
 
     try:
-        r = requests.post(url, json=tasks, headers=headers or _headers_with_bearer(), timeout=timeout)
+        r = provider_http.post(
+            url, json=tasks, headers=headers or _headers_with_bearer(), endpoint=endpoint, timeout=timeout
+        )
         log.debug("Response status: %s", r.status_code)
         log.debug("Response body: %s", r.text[:2000])
-        return _parse_response(r)
+        return _parse_response(r, allow_task_errors=allow_task_errors)
     except requests.exceptions.Timeout:
         raise RunwareError("Request timeout")
     except requests.exceptions.ConnectionError:
@@ -141,7 +165,7 @@ def _post(tasks: List[Dict[str, Any]], timeout: Tuple[int, int] = (10, 60), head
 
 # ───────────────────────────── public operations ─────────────────────────── #
 
-def submit_image_inference_async(
+def build_image_inference_task(
     *,
     prompt: str,
     model_id: str,
@@ -155,8 +179,8 @@ def submit_image_inference_async(
     reference_images: Optional[List[str]] = None,
     acceleration: Optional[str] = None,
     number_results: Optional[int] = None,
-) -> str:
-    """Отправляет задачу (deliveryMethod=async) и возвращает taskUUID."""
+) -> Dict[str, Any]:
+    """Собирает задачу imageInference (deliveryMethod=async) без отправки."""
     task_uuid = str(uuid.uuid4())
 
     # Валидация размера для Seedream (bytedance:5@0)
@@ -292,24 +316,70 @@ def submit_image_inference_async(
             # We skip adding them to avoid API errors
             log.warning(f"Model {model_id} does not support referenceImages parameter. Skipping {len(reference_images)} reference images.")
 
+    return task
+
+
+def _post_with_auth_fallback(tasks: List[Dict[str, Any]], *, endpoint: str, allow_task_errors: bool = False) -> dict:
+    """POST с Bearer; на 401 — повтор с задачей authentication в начале массива."""
     try:
-        # Log minimal task details for debugging referenceImages issue
-        try:
-            log.info(f"📤 ASYNC submit: model={model_id}, hasRef={bool(task.get('referenceImages'))}, nRef={len(task.get('referenceImages') or [])}")
-        except Exception:
-            pass
-        data = _post([task], timeout=(10, 15))
+        return _post(tasks, endpoint=endpoint, allow_task_errors=allow_task_errors)
     except RunwareError as e:
-        if "401" in str(e):
-            auth = {"taskType": "authentication", "apiKey": _get_api_key()}
-            data = _post([auth, task], timeout=(10, 15), headers={"Content-Type": "application/json"})
-        else:
+        if "401" not in str(e):
             raise
+        auth = {"taskType": "authentication", "apiKey": _get_api_key()}
+        return _post(
+            [auth, *tasks], endpoint=endpoint, allow_task_errors=allow_task_errors,
+            headers={"Content-Type": "application/json"},
+        )
+
+
+def submit_image_inference_async(**kwargs) -> str:
+    """Отправляет задачу (deliveryMethod=async) и возвращает taskUUID."""
+    task = build_image_inference_task(**kwargs)
+    # Log minimal task details for debugging referenceImages issue
+    try:
+        log.info(f"📤 ASYNC submit: model={kwargs.get('model_id')}, hasRef={bool(task.get('referenceImages'))}, nRef={len(task.get('referenceImages') or [])}")
+    except Exception:
+        pass
+    data = _post_with_auth_fallback([task], endpoint="submit_async")
 
     log.debug("Runware async submit: %s", json.dumps(data)[:800])
     arr = data.get("data") or []
     first = arr[0] if isinstance(arr, list) and arr else {}
-    return str(first.get("taskUUID") or task_uuid)
+    return str(first.get("taskUUID") or task["taskUUID"])
+
+
+def submit_image_inference_batch(tasks: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """
+    Пакетный async-сабмит нескольких задач (варианты одной заявки).
+    Задачи собираются build_image_inference_task; отправляются пачками
+    по RUNWARE_MAX_TASKS_PER_REQUEST. Возвращает {taskUUID: None | текст ошибки}.
+    Задач из пачки, которую отправить не удалось, в результате нет: принятые
+    пачки уже выполняются, повторно отправлять нужно только недостающие.
+    """
+    result: Dict[str, Optional[str]] = {}
+    size = _max_tasks_per_request()
+    for i in range(0, len(tasks), size):
+        chunk = tasks[i:i + size]
+        try:
+            data = _post_with_auth_fallback(chunk, endpoint="submit_async", allow_task_errors=True)
+        except RunwareError as e:
+            log.warning("Runware batch submit of %d tasks failed: %s", len(chunk), e)
+            continue
+        errors = _errors_by_task(data)
+        for t in chunk:
+            tu = t["taskUUID"]
+            result[tu] = errors.get(tu)
+    log.debug("Runware batch submit: %d tasks, %d rejected", len(result), sum(1 for v in result.values() if v))
+    return result
+
+
+def _errors_by_task(data: dict) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for err in (data.get("errors") or []) if isinstance(data, dict) else []:
+        if isinstance(err, dict) and err.get("taskUUID"):
+            out[str(err["taskUUID"])] = str(err.get("message") or err.get("code") or "provider error")
+    return out
 
 
 def submit_image_inference_sync(
@@ -453,7 +523,7 @@ def submit_image_inference_sync(
     except Exception:
         pass
 
-    data = _post([task], timeout=(15, 180))
+    data = _post([task], endpoint="submit")
     log.debug("Runware sync submit: %s", json.dumps(data)[:800])
 
     url = _extract_image_url(data)
@@ -468,28 +538,78 @@ def submit_image_inference_sync(
 def get_response(task_uuid: str) -> dict:
     """Запросить статус/результат async-задачи (сырой JSON)."""
     req = {"taskType": "getResponse", "taskUUID": str(task_uuid)}
+    data = _post_with_auth_fallback([req], endpoint="status")
+    log.debug("Runware getResponse(%s): %s", task_uuid, json.dumps(data)[:1200])
+    return data
+
+
+def get_responses(task_uuids: List[str]) -> Dict[str, dict]:
+    """
+    Статус нескольких async-задач: один getResponse-запрос на пачку
+    из RUNWARE_MAX_TASKS_PER_REQUEST taskUUID.
+
+    Возвращает {taskUUID: {"data": [...], "errors": [...]}} — тот же формат,
+    что у get_response(), поэтому результат можно отдать в parse_status_and_url().
+    Задачи, по которым провайдер ещё ничего не вернул, получают {"data": []}.
+
+    Сбои изолированы по пачкам: пачку, отклонённую целиком (4xx), повторяем
+    по одной задаче, и ошибку получает только отклонённый taskUUID
+    ({"data": [], "errors": [...]}); задачи пачки с временным сбоем
+    (таймаут, 5xx) в результат не попадают — их опросим в следующий раз.
+    """
+    out: Dict[str, dict] = {str(u): {"data": []} for u in task_uuids if u}
+    uuids = list(out)
+    size = _max_tasks_per_request()
+    for i in range(0, len(uuids), size):
+        _get_responses_chunk(uuids[i:i + size], out)
+    log.debug("Runware getResponse batch: %d tasks", len(out))
+    return out
+
+
+def _rejected(e: RunwareError) -> bool:
+    """Провайдер отклонил сам запрос (4xx, ошибка в теле), а не временный сбой."""
+    return e.status is not None and e.status < 500 and e.status != 401
+
+
+def _get_responses_chunk(chunk: List[str], out: Dict[str, dict]) -> None:
+    reqs = [{"taskType": "getResponse", "taskUUID": u} for u in chunk]
     try:
-        data = _post([req], timeout=(10, 20))
+        data = _post_with_auth_fallback(reqs, endpoint="status", allow_task_errors=True)
     except RunwareError as e:
-        if "401" in str(e):
-            auth = {"taskType": "authentication", "apiKey": _get_api_key()}
-            data = _post([auth, req], timeout=(10, 20), headers={"Content-Type": "application/json"})
+        if not _rejected(e):
+            log.warning("Runware getResponse for %d tasks failed: %s", len(chunk), e)
+            for tu in chunk:
+                out.pop(tu, None)
+        elif len(chunk) > 1:
+            # одна «битая» задача не должна останавливать опрос остальных
+            for tu in chunk:
+                _get_responses_chunk([tu], out)
         else:
-            raise
-    log.debug("Runware getResponse(%s): %s", task_uuid, json.dumps(data)[:1200])
-    return data
+            out[chunk[0]]["errors"] = [{"taskUUID": chunk[0], "message": str(e)[:300]}]
+        return
+    for item in data.get("data") or []:
+        tu = str((item or {}).get("taskUUID") or "") if isinstance(item, dict) else ""
+        if tu in out:
+            out[tu]["data"].append(item)
+    for err in data.get("errors") or []:
+        tu = str((err or {}).get("taskUUID") or "") if isinstance(err, dict) else ""
+        if tu in out:
+            out[tu].setdefault("errors", []).append(err)
 
 
 def parse_status_and_url(data: dict) -> Tuple[str, Optional[str]]:
     """
     Унифицированный парсинг:
       - success/done + imageURL → ('success', url)
-      - явные ошибки → ('failed', None)
+      - явные ошибки → ('failed', None); «ещё не готово» (см. is_pending_error) — не ошибка
       - иначе → ('running', None)
     """
+    from ai_gallery.services.runware_client import is_pending_error
+
     if not isinstance(data, dict):
         return "running", None
-    if data.get("errors"):
+    errors = data.get("errors")
+    if errors and not all(is_pending_error(e) for e in (errors if isinstance(errors, list) else [errors])):
         return "failed", None
 
     arr = data.get("data")
@@ -1,129 +1,281 @@
 """
 Сервис перевода промтов с использованием DeepL API
+
+Промпты часто повторяются (библиотека промптов, витрина), поэтому перевод
+кэшируется по хэшу нормализованного текста (пробелы схлопнуты, NFC):
+L1 в памяти процесса → общий кэш (TRANSLATION_CACHE_TTL) → DeepL.
+
+  • запросы идут через общий пул соединений provider_http (сессия "deepl");
+  • одинаковые промпты «в полёте» схлопываются: в процессе — ожидание
+    того же Future, между процессами — короткий лок в общем кэше, остальные
+    ждут результат до TRANSLATION_COALESCE_WAIT секунд;
+  • translate_many() переводит пачку одним запросом (до 50 текстов — лимит DeepL),
+    для массовых операций в админке.
 """
+from __future__ import annotations
+
+import hashlib
 import logging
-import requests
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional
+
 from django.conf import settings
-from typing import Optional
+
+from ai_gallery.services import caches, provider_http
 
 logger = logging.getLogger(__name__)
 
+DEEPL_BATCH = 50
+
+# Слова, которые в английском промпте почти не встречаются: служебные слова и
+# частая «промптовая» лексика французского, испанского, итальянского, немецкого,
+# португальского и голландского. Неоднозначные для английского (a, an, in, on,
+# as, am, van, die, met, man, wit, mare, noir, chat, strand, rot...) исключены.
+_FOREIGN_WORDS = frozenset("""
+    le la les du des et est dans pour avec sur une beau belle mer soleil coucher
+    chien noire blanc blanche plage femme homme fille garçon ville nuit forêt rouge yeux cheveux
+    el los las del en por para con una unos unas sobre entre hermoso hermosa atardecer mar
+    gato perro negro negra blanco blanca playa mujer hombre chica chico ciudad noche bosque
+    roja rojo azul verde ojos pelo largo
+    il lo gli della dello delle degli sul sulla nella nel uno bel bella tramonto gatto cane
+    nero nera bianco bianca spiaggia donna uomo ragazza ragazzo città notte bosco rosso rossa
+    occhi capelli lungo
+    der das und auf mit ein eine einem einer im schön sonnenuntergang meer katze hund
+    schwarz schwarze weiß weiss frau mädchen junge stadt nacht wald rote augen haare
+    os dos das em uma belo pôr sol cachorro preto preta praia mulher homem menina menino
+    cidade noite floresta vermelho olhos cabelo
+    het een op voor mooie zonsondergang boven zee kat hond zwart vrouw meisje jongen ogen
+""".split())
+# Английские служебные слова и частая лексика промптов: без них одиночные
+# «иностранные» слова не считаются признаком английского текста.
+_ENGLISH_WORDS = frozenset("""
+    the a an of with and in on at by for from to into under over near behind while
+    wearing holding is are his her their its this that very style portrait photo
+    high detailed realistic lighting background
+""".split())
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def _cache_key(text: str) -> str:
+    return "translate:en:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "TRANSLATION_CACHE_TTL", 30 * 24 * 60 * 60))
+
 
 class DeepLTranslator:
     """Класс для перевода текста с использованием DeepL API"""
-    
+
     def __init__(self):
         self.api_key = getattr(settings, 'DEEPL_API_KEY', '')
         self.api_url = "https://api-free.deepl.com/v2/translate"  # Free API URL
         self.pro_api_url = "https://api.deepl.com/v2/translate"  # Pro API URL
-        
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
     def is_english(self, text: str) -> bool:
-        """Проверяет, является ли текст английским языком"""
+        """
+        Проверяет, является ли текст английским языком.
+        Буква вне ASCII (кириллица, диакритика) — не английский; иначе сравниваем
+        число слов-маркеров других языков с числом английских служебных слов:
+        «gato negro en la playa» (маркеры есть, английских нет) — переводим,
+        «portrait of Belle in a garden» — нет.
+        """
         if not text:
             return True
-            
-        # Список распространенных не-английских слов и символов
-        non_english_indicators = [
-            # Французский
-            'é', 'è', 'ê', 'à', 'ç', 'ù', 'û', 'î', 'ï', 'â', 'ô', 'ë', 'ü', 'ä', 'ö',
-            'le', 'la', 'les', 'de', 'du', 'des', 'et', 'est', 'dans', 'pour', 'avec',
-            'beau', 'belle', 'mer', 'soleil', 'coucher', 'sur',
-            # Испанский
-            'ñ', 'á', 'í', 'ó', 'ú', 'ü', '¿', '¡',
-            'el', 'la', 'los', 'las', 'de', 'del', 'y', 'en', 'por', 'con', 'para',
-            'hermoso', 'hermosa', 'atardecer', 'mar',
-            # Итальянский
-            'gli', 'del', 'della', 'sul', 'bel', 'bella',
-            'tramonto', 'mare',
-            # Немецкий
-            'ß', 'ä', 'ö', 'ü',
-            'der', 'die', 'das', 'und', 'in', 'an', 'auf', 'mit',
-            'schön', 'sonnenuntergang', 'meer',
-            # Португальский
-            'ão', 'õ', 'á', 'â', 'ê', 'ô',
-            'o', 'a', 'os', 'as', 'de', 'do', 'da', 'dos', 'das', 'em',
-            'belo', 'pôr', 'sol',
-            # Голландский
-            'de', 'het', 'een', 'van', 'in', 'op', 'met', 'voor',
-            'mooie', 'zonsondergang', 'boven', 'zee',
-            # Русский
-            'а', 'б', 'в', 'г', 'д', 'е', 'ё', 'ж', 'з', 'и', 'й', 'к', 'л', 'м', 'н', 'о', 'п', 'р', 'с', 'т', 'у', 'ф', 'х', 'ц', 'ч', 'ш', 'щ', 'ъ', 'ы', 'ь', 'э', 'ю', 'я',
-            'красивый', 'закат', 'над', 'морем',
-        ]
-        
-        text_lower = text.lower()
-        
-        # Проверяем на наличие не-английских символов
-        for indicator in non_english_indicators:
-            if indicator in text_lower:
-                return False
-        
-        # Проверяем на наличие символов вне базового английского алфавита
-        allowed_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,!?-:;()[]{}"\'')
-        text_chars = set(text[:100])
-        non_english_chars = text_chars - allowed_chars
-        if non_english_chars:
+        if not text.isascii() and any(ch.isalpha() and not ch.isascii() for ch in text):
             return False
-            
-        # Если дошли сюда, считаем что это английский
-        return True
-    
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            return True
+        foreign = sum(1 for w in words if w in _FOREIGN_WORDS)
+        if not foreign:
+            return True
+        english = sum(1 for w in words if w in _ENGLISH_WORDS)
+        return foreign < english
+
+    # ── DeepL ────────────────────────────────────────────────────────────────
+
+    def _endpoint(self) -> str:
+        # ключи бесплатного тарифа оканчиваются на ":fx"
+        return self.api_url if self.api_key.endswith(":fx") else self.pro_api_url
+
+    def _request(self, texts: List[str]) -> List[str]:
+        """Один запрос к DeepL на пачку текстов. Исключение — при любой ошибке."""
+        response = provider_http.post(
+            self._endpoint(),
+            data=[("text", t) for t in texts] + [("target_lang", "EN")],
+            headers={"Authorization": f"DeepL-Auth-Key {self.api_key}"},
+            endpoint="translate",
+            session="deepl",
+        )
+        response.raise_for_status()
+        result = response.json()
+        translations = result.get("translations") or []
+        if len(translations) != len(texts):
+            raise ValueError(f"Некорректный ответ от DeepL API: {result}")
+        return [t["text"] for t in translations]
+
+    # ── Кэш ──────────────────────────────────────────────────────────────────
+
+    def _cached(self, key: str) -> Optional[str]:
+        value = caches.local().get(key)
+        if value is not None:
+            return value
+        try:
+            value = caches.get("default").get(key)
+        except Exception:
+            value = None
+        if value is not None:
+            caches.local().set(key, value)
+        return value
+
+    def _store(self, items: Dict[str, str]) -> None:
+        if not items:
+            return
+        caches.local().set_many(items)
+        try:
+            caches.get("default").set_many(items, _ttl())
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить перевод в кэш: {e}")
+
+    def _wait_shared(self, key: str) -> Optional[str]:
+        """Перевод этого текста уже делает другой процесс — ждём его результат."""
+        deadline = time.monotonic() + float(getattr(settings, "TRANSLATION_COALESCE_WAIT", 3))
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            value = self._cached(key)
+            if value is not None:
+                return value
+        return None
+
+    def _translate_one(self, text: str, key: str) -> str:
+        lock_key = key + ":lock"
+        try:
+            owner = caches.provider().add(lock_key, 1, 30)
+        except Exception:
+            owner = True
+        if not owner:
+            value = self._wait_shared(key)
+            if value is not None:
+                return value
+        try:
+            translated = self._request([text])[0]
+            self._store({key: translated})
+            logger.info(f"Текст переведен: '{text[:50]}...' -> '{translated[:50]}...' ")
+            return translated
+        except Exception as e:
+            logger.error(f"Ошибка перевода текста: {e}")
+            return text
+        finally:
+            if owner:
+                try:
+                    caches.provider().delete(lock_key)
+                except Exception:
+                    pass
+
+    # ── Публичное API ───────────────────────────────────────────────────────
+
     def translate_to_english(self, text: str) -> Optional[str]:
         """
-        Переводит текст на английский язык
-        Возвращает None в случае ошибки
+        Переводит текст на английский язык.
+        При ошибке возвращает исходный текст (он же — если перевод не нужен).
         """
-        logger.info(f"Начинаем перевод текста: '{text[:50]}...'")
-        
         if not text or not text.strip():
-            logger.warning("Пустой текст для перевода")
             return text
-            
-        # Если текст уже на английском, возвращаем как есть
         if self.is_english(text):
-            logger.info("Текст уже на английском, перевод не требуется")
             return text
-            
-        logger.info(f"API ключ настроен: {'Да' if self.api_key else 'Нет'}")
         if not self.api_key:
             logger.warning("DeepL API key не настроен")
             return text
-            
-        try:
-            # Определяем URL API в зависимости от ключа
-            api_url = self.pro_api_url if self.api_key.startswith(':fx') else self.api_url
-            logger.info(f"Используем API URL: {api_url}")
-            
-            payload = {
-                'auth_key': self.api_key,
-                'text': text,
-                'target_lang': 'EN'
-            }
-            
-            logger.info(f"Отправляем запрос к DeepL API...")
-            response = requests.post(api_url, data=payload, timeout=10)
-            logger.info(f"Статус ответа: {response.status_code}")
-            
-            response.raise_for_status()
-            
-            result = response.json()
-            logger.debug(f"Ответ API: {result}")
-            
-            if 'translations' in result and len(result['translations']) > 0:
-                translated_text = result['translations'][0]['text']
-                logger.info(f"Текст переведен: '{text[:50]}...' -> '{translated_text[:50]}...' ")
-                return translated_text
-            else:
-                logger.error(f"Некорректный ответ от DeepL API: {result}")
+
+        norm = normalize(text)
+        key = _cache_key(norm)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            try:
+                return future.result(timeout=float(getattr(settings, "TRANSLATION_COALESCE_WAIT", 3)) + 30)
+            except Exception:
                 return text
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка запроса к DeepL API: {e}")
-            return text
-        except Exception as e:
-            logger.error(f"Ошибка перевода текста: {e}")
-            return text
-    
+
+        try:
+            result = self._translate_one(norm, key)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def translate_many(self, texts: Iterable[str]) -> List[str]:
+        """
+        Переводит список текстов (порядок сохраняется): кэш одним get_many,
+        промахи — пачками до DEEPL_BATCH текстов в запросе.
+        При ошибке пачки её тексты возвращаются без перевода.
+        """
+        texts = list(texts)
+        out: List[str] = list(texts)
+        pending: Dict[str, List[int]] = {}   # ключ кэша → позиции
+        norms: Dict[str, str] = {}
+        for i, text in enumerate(texts):
+            if not text or not text.strip() or self.is_english(text):
+                continue
+            norm = normalize(text)
+            key = _cache_key(norm)
+            pending.setdefault(key, []).append(i)
+            norms[key] = norm
+        if not pending:
+            return out
+
+        found: Dict[str, str] = {}
+        try:
+            found = caches.get("default").get_many(list(pending))
+        except Exception:
+            pass
+        for key, value in found.items():
+            for i in pending.pop(key):
+                out[i] = value
+
+        if pending and not self.api_key:
+            logger.warning("DeepL API key не настроен")
+            return out
+
+        keys = list(pending)
+        for start in range(0, len(keys), DEEPL_BATCH):
+            chunk = keys[start:start + DEEPL_BATCH]
+            try:
+                translated = self._request([norms[k] for k in chunk])
+            except Exception as e:
+                logger.error(f"Ошибка пакетного перевода ({len(chunk)} текстов): {e}")
+                continue
+            stored = dict(zip(chunk, translated))
+            self._store(stored)
+            for key, value in stored.items():
+                for i in pending[key]:
+                    out[i] = value
+        return out
+
     def translate_prompt(self, prompt: str) -> str:
         """
         Переводит промпт на английский язык
@@ -131,20 +283,23 @@ class DeepLTranslator:
         """
         if not prompt:
             return prompt
-            
+
         translated = self.translate_to_english(prompt)
         return translated if translated is not None else prompt
 
 
 # Глобальный экземпляр переводчика
 _translator_instance = None
+_instance_lock = threading.Lock()
 
 
 def get_translator() -> DeepLTranslator:
     """Возвращает экземпляр переводчика (singleton)"""
     global _translator_instance
     if _translator_instance is None:
-        _translator_instance = DeepLTranslator()
+        with _instance_lock:
+            if _translator_instance is None:
+                _translator_instance = DeepLTranslator()
     return _translator_instance
 
 
@@ -155,3 +310,8 @@ def translate_prompt_if_needed(prompt: str) -> str:
     """
     translator = get_translator()
     return translator.translate_prompt(prompt)
+
+
+def translate_many(texts: Iterable[str]) -> List[str]:
+    """Пакетный перевод (массовые операции в админке)."""
+    return get_translator().translate_many(texts)
@@ -0,0 +1,223 @@
+"""
+Планировщик опроса статуса видео-задач Runware.
+
+Вместо цикла sleep + HTTP внутри воркера (минуты на одно видео) у каждой
+задачи есть время следующей проверки — GenerationJob.next_poll_at.
+График адаптивный и зависит от VideoModel.typical_duration_sec:
+
+    0 … 0.5·T      — не дёргаем провайдера (webhook обычно приходит раньше)
+    0.5·T … 1.5·T  — часто, шаг ~T/10
+    > 1.5·T        — реже, с нарастающей паузой до VIDEO_POLL_MAX_INTERVAL
+
+В продакшене очередь — индекс по next_poll_at, её разбирает poll_runware_batch
+(Celery Beat) пачками по RUNWARE_MAX_TASKS_PER_REQUEST. Без Celery (DEV/eager)
+ту же роль выполняет LocalScheduler: куча по времени проверки и несколько потоков.
+
+LocalScheduler — только для разработки: куча живёт в памяти процесса. Источник
+истины — те же поля next_poll_at/provider_task_uuid в БД, поэтому после
+перезапуска он поднимает незавершённые задачи оттуда (recover), а в продакшене
+(USE_CELERY и настоящий брокер) не используется вовсе. Несколько процессов
+(воркеры gunicorn) восстанавливают одни и те же задачи, поэтому опрашивает
+задачу только владелец аренды video_poll:owner:{pk} в caches.provider() —
+между процессами это работает при общем кэше (REDIS_CACHE_URL).
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from ai_gallery.services import caches
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TYPICAL_SEC = 90
+
+
+def _min_interval() -> int:
+    return int(getattr(settings, "RUNWARE_POLL_MIN_INTERVAL", 5))
+
+
+def _max_interval() -> int:
+    return int(getattr(settings, "VIDEO_POLL_MAX_INTERVAL", 60))
+
+
+def typical_duration(job) -> int:
+    vm = getattr(job, "video_model", None)
+    return int(getattr(vm, "typical_duration_sec", 0) or DEFAULT_TYPICAL_SEC)
+
+
+def next_delay(job, now=None) -> int:
+    """Через сколько секунд снова проверить задачу."""
+    now = now or timezone.now()
+    age = max(0.0, (now - job.created_at).total_seconds())
+    typical = typical_duration(job)
+
+    if age < typical * 0.5:
+        delay = typical * 0.5 - age
+    elif age < typical * 1.5:
+        delay = typical / 10
+    else:
+        delay = _min_interval() + (age - typical * 1.5) / 4
+    return int(min(_max_interval(), max(_min_interval(), delay)))
+
+
+def uses_local() -> bool:
+    """Опрос без Celery: USE_CELERY выключен или брокер memory:// (DEV/eager)."""
+    broker_url = getattr(settings, "CELERY_BROKER_URL", "memory://") or "memory://"
+    return not getattr(settings, "USE_CELERY", False) or broker_url.startswith("memory")
+
+
+def schedule_next(job, now=None) -> None:
+    """Отмечает опрос и назначает следующую проверку."""
+    now = now or timezone.now()
+    job.last_polled_at = now
+    job.next_poll_at = now + timedelta(seconds=next_delay(job, now))
+    job.save(update_fields=["last_polled_at", "next_poll_at"])
+
+
+# ── Локальный планировщик (режим без Celery) ─────────────────────────────────
+
+
+class LocalScheduler:
+    """
+    Куча (время проверки, job_id) + один поток-диспетчер. Готовые к проверке
+    задачи собираются в пачку и отдаются пулу из VIDEO_POLL_WORKERS потоков:
+    один getResponse на пачку, ни одного sleep в потоке запроса.
+
+    Только для DEV: очередь в памяти, после рестарта восстанавливается из БД.
+    Задачу опрашивает только владелец аренды (_own); чужие откладываются
+    на VIDEO_POLL_MAX_INTERVAL и перехватываются, если аренда владельца истекла.
+    """
+
+    def __init__(self, workers: int = 2):
+        self._token = uuid.uuid4().hex
+        self._heap: list[tuple[float, int]] = []
+        self._queued: set[int] = set()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="video-poll")
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(self, job_id: int, delay: float = 0.0) -> None:
+        with self._cond:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+            heapq.heappush(self._heap, (time.monotonic() + delay, job_id))
+            self._ensure_thread()
+            self._cond.notify()
+
+    def recover(self) -> int:
+        """Ставит в очередь незавершённые видео-задачи из БД (после перезапуска процесса)."""
+        from generate.models import GenerationJob
+
+        now = timezone.now()
+        pending = (
+            GenerationJob.objects
+            .filter(generation_type="video",
+                    status__in=(GenerationJob.Status.PENDING, GenerationJob.Status.RUNNING))
+            .exclude(provider_task_uuid__isnull=True)
+            .exclude(provider_task_uuid="")
+            .exclude(provider_status="downloading")
+            .values_list("pk", "next_poll_at")
+        )
+        count = 0
+        for job_id, next_poll_at in pending:
+            delay = (next_poll_at - now).total_seconds() if next_poll_at else 0.0
+            self.enqueue(job_id, max(0.0, delay))
+            count += 1
+        if count:
+            log.info("video_poll: recovered %d pending video jobs", count)
+        return count
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="video-poll-dispatch", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        batch_size = int(getattr(settings, "RUNWARE_MAX_TASKS_PER_REQUEST", 10))
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                when, _ = self._heap[0]
+                wait = when - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(timeout=wait)
+                    continue
+                due: list[int] = []
+                while self._heap and self._heap[0][0] <= time.monotonic() and len(due) < batch_size:
+                    _, job_id = heapq.heappop(self._heap)
+                    self._queued.discard(job_id)
+                    due.append(job_id)
+            self._pool.submit(self._check, due)
+
+    def _check(self, job_ids: list[int]) -> None:
+        from generate.models import GenerationJob
+        from generate.tasks import _track_video_jobs
+
+        owned = [pk for pk in job_ids if self._own(pk)]
+        for job_id in set(job_ids) - set(owned):
+            # задачу опрашивает другой процесс — проверим аренду позже
+            self.enqueue(job_id, _max_interval())
+        if not owned:
+            return
+        job_ids = owned
+
+        close_old_connections()
+        try:
+            jobs = list(
+                GenerationJob.objects.filter(pk__in=job_ids).select_related("video_model", "user"))
+            for job in _track_video_jobs(jobs):
+                delay = (job.next_poll_at - timezone.now()).total_seconds() if job.next_poll_at else _min_interval()
+                self.enqueue(job.pk, max(0.0, delay))
+        except Exception as e:
+            log.error("video_poll: local check of %s failed: %s", job_ids, e, exc_info=True)
+            for job_id in job_ids:
+                self.enqueue(job_id, _max_interval())
+        finally:
+            close_old_connections()
+
+    def _own(self, job_id: int) -> bool:
+        """Берёт или продлевает аренду опроса задачи; False — она у другого процесса."""
+        cache = caches.provider()
+        key = f"video_poll:owner:{job_id}"
+        ttl = _max_interval() * 3
+        try:
+            if cache.add(key, self._token, ttl):
+                return True
+            if cache.get(key) != self._token:
+                return False
+            cache.touch(key, ttl)
+            return True
+        except Exception:
+            # кэш недоступен — опрашиваем сами, дубль лучше пропуска
+            return True
+
+
+_local: Optional[LocalScheduler] = None
+_local_lock = threading.Lock()
+
+
+def local_scheduler() -> LocalScheduler:
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                scheduler = LocalScheduler(int(getattr(settings, "VIDEO_POLL_WORKERS", 2)))
+                try:
+                    scheduler.recover()
+                except Exception as e:
+                    log.warning("video_poll: recovery of pending jobs failed: %s", e)
+                _local = scheduler
+    return _local
@@ -2,24 +2,23 @@
 
 import io
 import logging
-import os
 import time
+from datetime import timedelta
 from typing import Optional
 
 import requests
 from celery import shared_task
 from django.conf import settings
-from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
-from dotenv import load_dotenv
 
 from dashboard.models import Wallet
 from .models import GenerationJob
-from .models_image import ImageModelConfiguration
+from .services import guest_ledger, job_events, model_catalog, reaper, video_poll
+from ai_gallery.services import caches, credentials, media_download, provider_http, result_blobs
 from ai_gallery.services.runware_client import _extract_video_url as _rw_extract_video_url
 
 try:
@@ -33,6 +32,7 @@ log = logging.getLogger(__name__)
 # ── Константы ────────────────────────────────────────────────────────────────
 CACHE_TTL = 60 * 60 * 24 * 30  # 30 дней
 RUNWARE_QUEUE = getattr(settings, "CELERY_QUEUE_SUBMIT", "runware_submit")
+BACKGROUND_QUEUE = getattr(settings, "CELERY_QUEUE_BACKGROUND", "default")
 FIRST_POLL_DELAY = int(getattr(settings, "RUNWARE_FIRST_POLL_DELAY", 5))
 STUCK_TIMEOUT_SEC = int(getattr(settings, "RUNWARE_STUCK_TIMEOUT_SEC", 90))
 FALLBACK_WIDTH = int(getattr(settings, "RUNWARE_FALLBACK_WIDTH", 768))
@@ -41,15 +41,14 @@ FALLBACK_HEIGHT = int(getattr(settings, "RUNWARE_FALLBACK_HEIGHT", 768))
 DEMO_IF_UNAUTHORIZED = bool(
     getattr(settings, "RUNWARE_DEMO_IF_UNAUTHORIZED", True))
 
-# ── Ключи для кэша ───────────────────────────────────────────────────────────
+# Пакетный поллинг: один getResponse на пачку задач вместо цепочки per-job тасков
+BATCH_POLLING = bool(getattr(settings, "RUNWARE_BATCH_POLLING", True))
+POLL_BATCH_MAX_JOBS = int(getattr(settings, "RUNWARE_POLL_BATCH_MAX_JOBS", 200))
+POLL_MIN_INTERVAL = int(getattr(settings, "RUNWARE_POLL_MIN_INTERVAL", 5))
+VIDEO_POLL_TIMEOUT_SEC = int(getattr(settings, "RUNWARE_VIDEO_POLL_TIMEOUT_SEC", 15 * 60))
+FACE_RETOUCH_MODEL = "runware:108@22"
 
-
-def _img_key(job_id: int) -> str:
-    return f"genimg:{job_id}"
-
-
-def _img_url_key(job_id: int) -> str:
-    return f"genimgurl:{job_id}"
+# Байты результатов — в ai_gallery.services.result_blobs (диск + указатель в кэше)
 
 # ── Безопасные сеттеры ───────────────────────────────────────────────────────
 
@@ -67,12 +66,10 @@ def _safe_fields(obj, fields: list[str]) -> list[str]:
 
 def _get_api_key() -> str:
     """
-    Динамически загружает API ключ из .env файла.
-    Это позволяет обновлять ключ без перезапуска сервера.
+    API ключ из кэша процесса.
+    Ключ перечитывается при изменении .env, поэтому его можно обновлять без перезапуска сервера.
     """
-    load_dotenv(override=True)
-    key = os.getenv("RUNWARE_API_KEY", "")
-    return key
+    return credentials.get_runware_api_key()
 
 
 def _auth_headers() -> dict:
@@ -93,11 +90,9 @@ def _submit_sync_direct(prompt: str, model_id: str, *, width: int, height: int)
     api = getattr(settings, "RUNWARE_API_URL",
                   "https://api.runware.ai/v1").rstrip("/")
 
-    # Получаем конфигурацию модели из БД
-    model_config = None
-    try:
-        model_config = ImageModelConfiguration.objects.get(model_id=model_id)
-    except ImageModelConfiguration.DoesNotExist:
+    # Конфигурация модели — из каталога в памяти процесса
+    model_config = model_catalog.image_config(model_id)
+    if model_config is None:
         log.warning(f"Model config not found for {model_id}, using defaults")
 
     payload = {
@@ -120,8 +115,8 @@ def _submit_sync_direct(prompt: str, model_id: str, *, width: int, height: int)
             "cfg_scale": 3.1,
         })
 
-    r = requests.post(f"{api}/images/generate", json=payload,
-                      headers=_auth_headers(), timeout=60)
+    r = provider_http.post(f"{api}/images/generate", json=payload,
+                           headers=_auth_headers(), endpoint="submit")
     if r.status_code == 401:
         raise requests.HTTPError("401 Unauthorized from Runware")
     r.raise_for_status()
@@ -139,7 +134,8 @@ def _submit_sync_direct(prompt: str, model_id: str, *, width: int, height: int)
 
 def _finalize_job_with_bytes(job: GenerationJob, content: bytes, ext: str = "png") -> None:
     """Финализируем задачу готовыми байтами изображения."""
-    cache.set(_img_key(job.pk), content, timeout=CACHE_TTL)
+    result_blobs.put(job.pk, content, "image/png" if ext == "png" else "image/jpeg",
+                     timeout=CACHE_TTL)
     job.result_image.save(
         f"generated/{job.pk}.{ext}", ContentFile(content), save=False)
     job.status = GenerationJob.Status.DONE
@@ -147,124 +143,140 @@ def _finalize_job_with_bytes(job: GenerationJob, content: bytes, ext: str = "png
     _safe_set(job, "provider_status", "success")
     job.save(update_fields=_safe_fields(
         job, ["status", "error", "result_image", "provider_status"]))
+    job_events.publish(job)
+
+
+# ── Финализация видео (общая для poll/sync/batch) ────────────────────────────
+def _charge_video_tokens(job: GenerationJob) -> int:
+    """Списывает стоимость видео, если она ещё не списана. Возвращает итоговую стоимость."""
+    from .models import FreeGrant
+
+    # Защита от двойного списания: проверяем tokens_spent
+    if int(job.tokens_spent or 0) > 0:
+        log.info(f"Video job {job.pk}: tokens already charged ({job.tokens_spent}), skipping")
+        return int(job.tokens_spent)
+
+    token_cost = job.video_model.token_cost if job.video_model else 20
+    with transaction.atomic():
+        if job.user and not job.user.is_staff:
+            wallet = Wallet.objects.select_for_update().get(user=job.user)
+            wallet.balance -= token_cost
+            wallet.save()
+        elif not job.user:
+            # Гость
+            grant = FreeGrant.objects.filter(
+                Q(gid=job.guest_gid) | Q(fp=job.guest_fp),
+                user__isnull=True
+            ).first()
+            if grant:
+                guest_ledger.spend(grant, token_cost, partial=True)
+    return token_cost
+
+
+def _finalize_video_job(job: GenerationJob, video_url: str) -> None:
+    """Скачивает видео, списывает токены (однократно) и переводит задачу в DONE."""
+
+    # Скачиваем и сохраняем видео локально
+    _download_and_save_video(job, video_url)
+    token_cost = _charge_video_tokens(job)
+
+    # Обновляем job (если локальное сохранение прошло — используем его URL)
+    job.result_video_url = job.result_video_url or video_url
+    job.status = GenerationJob.Status.DONE
+    job.tokens_spent = token_cost
+    job.video_cached_until = timezone.now() + timedelta(hours=24)
+    job.save()
+    job_events.publish(job)
 
 
-# ── Синхронный polling для видео (без Celery worker) ──────────────────────────
-def _sync_poll_video_until_done(job_id: int, task_uuid: str, max_attempts: int = 120, delay_seconds: int = 1) -> None:
+def _apply_video_status(job: GenerationJob, status_data: dict) -> str:
     """
-    Синхронный polling статуса видео в цикле (для режима без Celery worker).
-    Используется когда CELERY_TASK_ALWAYS_EAGER=True или USE_CELERY=False.
+    Применяет ответ check_video_status к задаче.
+    Возвращает 'done' | 'failed' | 'processing'.
     """
-    from ai_gallery.services.runware_client import check_video_status
-
-    for attempt in range(1, max_attempts + 1):
-        try:
-            job = GenerationJob.objects.get(pk=job_id)
-
-            if job.status in (GenerationJob.Status.DONE, GenerationJob.Status.FAILED):
-                return
-
-            time.sleep(delay_seconds)
-
-            status_data = check_video_status(task_uuid)
-            log.info(f"Video poll attempt {attempt}/{max_attempts} for job {job_id}: {status_data}")
-
-            raw = status_data or {}
-            data_val = raw.get('data')
-            item = None
-
-            if isinstance(data_val, list) and data_val:
-                item = data_val[0]
-            elif isinstance(data_val, dict):
-                item = data_val
-            else:
-                item = raw
+    raw = status_data or {}
+    data_val = raw.get('data')
+    item = None
+
+    if isinstance(data_val, list) and data_val:
+        item = data_val[0]
+    elif isinstance(data_val, dict):
+        item = data_val
+    else:
+        item = raw
 
-            status_val = (item or {}).get('status') or raw.get('status') or (item or {}).get('state')
+    status_val = (item or {}).get('status') or raw.get('status') or (item or {}).get('state')
 
-            video_url = (
-                (item or {}).get('videoURL')
-                or raw.get('videoURL')
-                or ((item or {}).get('output') or {}).get('videoURL')
-            )
+    # Пытаемся вытащить URL видео из типичных полей
+    video_url = (
+        (item or {}).get('videoURL')
+        or raw.get('videoURL')
+        or ((item or {}).get('output') or {}).get('videoURL')
+    )
 
-            if not video_url:
-                try:
-                    video_url = _rw_extract_video_url(item or {}) or _rw_extract_video_url(raw or {})
-                except Exception:
-                    video_url = None
+    # Фоллбек: используем общий парсер Runware (_extract_video_url), чтобы поддержать outputs/videos массивы
+    if not video_url:
+        try:
+            # сначала пытаемся на элементе, затем на всём ответе
+            video_url = _rw_extract_video_url(item or {}) or _rw_extract_video_url(raw or {})
+        except Exception:
+            video_url = None
 
-            if str(status_val).lower() in {'completed', 'done', 'finished', 'success', 'succeeded'} and video_url:
-                log.info(f"Video job {job_id} completed! URL: {video_url}")
+    # Успех! (учитываем больше вариантов статусов Runware)
+    if str(status_val).lower() in {'completed', 'done', 'finished', 'success', 'succeeded'} and video_url:
+        log.info(f"Video job {job.pk} completed! URL: {video_url}")
 
-                _download_and_save_video(job, video_url)
+        # Проверяем, не обработан ли job уже webhook'ом (защита от дублирования)
+        job.refresh_from_db()
+        if job.status == GenerationJob.Status.DONE:
+            log.info(f"Video job {job.pk} already finalized by webhook, skipping poll finalization")
+            return 'done'
 
-                from dashboard.models import Wallet
-                from .models import FreeGrant
+        _finalize_video_job(job, video_url)
+        return 'done'
 
-                token_cost = job.video_model.token_cost if job.video_model else 20
-
-                # Защита от двойного списания: проверяем tokens_spent
-                if int(job.tokens_spent or 0) <= 0:
-                    with transaction.atomic():
-                        if job.user and not job.user.is_staff:
-                            wallet = Wallet.objects.select_for_update().get(user=job.user)
-                            wallet.balance -= token_cost
-                            wallet.save()
-                        elif not job.user:
-                            grant = FreeGrant.objects.filter(
-                                Q(gid=job.guest_gid) | Q(fp=job.guest_fp),
-                                user__isnull=True
-                            ).select_for_update().first()
-                            if grant:
-                                grant.spend(token_cost)
-                else:
-                    log.info(f"Video job {job_id}: tokens already charged ({job.tokens_spent}), skipping")
-                    token_cost = job.tokens_spent  # Используем уже списанное значение
-
-                job.result_video_url = job.result_video_url or video_url
-                job.status = GenerationJob.Status.DONE
-                job.tokens_spent = token_cost
-                from datetime import timedelta
-                job.video_cached_until = timezone.now() + timedelta(hours=24)
-                job.save()
-                return
+    # Провал
+    if str(status_val).lower() in {'failed', 'error'}:
+        _fail_job(job, raw.get('error') or (item or {}).get('error') or 'Video generation failed', fields=None)
+        return 'failed'
 
-            if str(status_val).lower() in {'failed', 'error'}:
-                job.status = GenerationJob.Status.FAILED
-                job.error = raw.get('error') or (item or {}).get('error') or 'Video generation failed'
-                job.save()
-                _refund_if_needed(job)
-                return
+    return 'processing'
 
-            log.info(f"Video job {job_id} still processing (attempt {attempt}/{max_attempts})")
 
-        except GenerationJob.DoesNotExist:
-            log.error(f"Video job {job_id} not found during sync polling")
-            return
-        except Exception as e:
-            log.error(f"Error in sync polling for job {job_id}, attempt {attempt}: {e}", exc_info=True)
-            if attempt >= max_attempts:
-                try:
-                    job = GenerationJob.objects.get(pk=job_id)
-                    job.status = GenerationJob.Status.FAILED
-                    job.error = f"Sync polling failed: {str(e)}"
-                    job.save()
-                    _refund_if_needed(job)
-                except Exception:
-                    pass
-                return
+# ── Синхронный polling для видео (без Celery worker) ──────────────────────────
+def _track_video_jobs(jobs: list[GenerationJob]) -> list[GenerationJob]:
+    """
+    Один getResponse на пачку видео-задач. Завершённые финализирует, просроченные
+    (VIDEO_POLL_TIMEOUT_SEC) переводит в FAILED с рефандом, остальным назначает
+    следующую проверку (video_poll.schedule_next). Возвращает задачи, которые ещё в работе.
+    """
+    from ai_gallery.services.runware_client import check_video_statuses
 
+    jobs = [j for j in jobs if j.status not in (GenerationJob.Status.DONE, GenerationJob.Status.FAILED)]
+    if not jobs:
+        return []
     try:
-        job = GenerationJob.objects.get(pk=job_id)
-        job.status = GenerationJob.Status.FAILED
-        job.error = "Video generation timed out"
-        job.save()
-        _refund_if_needed(job)
-    except Exception:
-        pass
+        statuses = check_video_statuses([j.provider_task_uuid for j in jobs])
+    except Exception as e:
+        log.warning("Video status batch of %d jobs failed: %s", len(jobs), e)
+        statuses = {}
 
-    log.error(f"Video job {job_id} timed out after {max_attempts} attempts")
+    now = timezone.now()
+    pending: list[GenerationJob] = []
+    for job in jobs:
+        status_data = statuses.get(str(job.provider_task_uuid))
+        try:
+            if status_data is not None and _apply_video_status(job, status_data) != 'processing':
+                continue
+            if (now - job.created_at).total_seconds() >= VIDEO_POLL_TIMEOUT_SEC:
+                log.error(f"Video job {job.pk} timed out")
+                _fail_job(job, "Video generation timed out", fields=None)
+                continue
+            video_poll.schedule_next(job, now)
+            pending.append(job)
+        except Exception as e:
+            log.error(f"Error tracking video job {job.pk}: {e}", exc_info=True)
+    return pending
 
 
 # ── Video Generation Async ────────────────────────────────────────────────────
@@ -382,17 +394,21 @@ def process_video_generation_async(
             if task_uuid:
                 job.provider_task_uuid = task_uuid
                 job.provider_status = 'queued'
+                # первая проверка — по графику модели (webhook обычно успевает раньше)
+                job.next_poll_at = timezone.now() + timedelta(seconds=video_poll.next_delay(job))
                 job.save(update_fields=[
-                         'provider_task_uuid', 'provider_status'])
+                         'provider_task_uuid', 'provider_status', 'next_poll_at'])
 
                 log.info(
                     f"Video job {job_id} queued with taskUUID={task_uuid}, starting polling")
 
                 # Определяем режим: если USE_CELERY=True и брокер НЕ memory — используем async
-                use_celery = getattr(settings, 'USE_CELERY', False)
-                broker_url = getattr(settings, 'CELERY_BROKER_URL', 'memory://')
+                local = video_poll.uses_local()
 
-                if use_celery and not broker_url.startswith('memory'):
+                if not local and BATCH_POLLING:
+                    # Задачу подхватит пакетный поллер (poll_runware_batch, Celery Beat)
+                    log.info(f"Video job {job_id}: tracked by batch poller")
+                elif not local:
                     # Асинхронный режим — отправляем polling задачу в очередь
                     # Webhook — основной механизм, polling — только backup
                     # Начинаем через 30 сек, т.к. webhook обычно приходит быстрее
@@ -403,9 +419,10 @@ def process_video_generation_async(
                         queue=RUNWARE_QUEUE
                     )
                 else:
-                    # Синхронный режим — выполняем polling прямо здесь
-                    log.info(f"Video job {job_id}: running sync polling (Celery disabled or memory broker)")
-                    _sync_poll_video_until_done(job_id, task_uuid, max_attempts=60, delay_seconds=10)
+                    # Без Celery — локальный планировщик в фоне, запрос не блокируется
+                    log.info(f"Video job {job_id}: tracked by local poll scheduler (Celery disabled or memory broker)")
+                    video_poll.local_scheduler().enqueue(
+                        job_id, (job.next_poll_at - timezone.now()).total_seconds())
             else:
                 raise RunwareVideoError("No taskUUID in async response")
 
@@ -414,60 +431,19 @@ def process_video_generation_async(
             log.info(
                 f"Video job {job_id} completed synchronously, URL: {result}")
 
-            # Скачиваем и сохраняем видео локально
-            _download_and_save_video(job, result)
-
-            # Списываем токены
-            from dashboard.models import Wallet
-            from generate.models import FreeGrant
-
-            token_cost = job.video_model.token_cost if job.video_model else 20
-
-            # Защита от двойного списания: проверяем tokens_spent
-            if int(job.tokens_spent or 0) <= 0:
-                with transaction.atomic():
-                    if job.user and not job.user.is_staff:
-                        wallet = Wallet.objects.select_for_update().get(user=job.user)
-                        wallet.balance -= token_cost
-                        wallet.save()
-                    elif not job.user:
-                        # Гость
-                        grant = FreeGrant.objects.filter(
-                            Q(gid=job.guest_gid) | Q(fp=job.guest_fp),
-                            user__isnull=True
-                        ).select_for_update().first()
-                        if grant:
-                            grant.spend(token_cost)
-            else:
-                log.info(f"Video job {job_id}: tokens already charged ({job.tokens_spent}), skipping sync deduction")
-                token_cost = job.tokens_spent
-
-            # Обновляем job (если локальное сохранение прошло — используем его URL)
-            job.result_video_url = job.result_video_url or result
-            job.status = GenerationJob.Status.DONE
-            job.tokens_spent = token_cost
-            from datetime import timedelta
-            from django.utils import timezone
-            job.video_cached_until = timezone.now() + timedelta(hours=24)
-            job.save()
+            _finalize_video_job(job, result)
         else:
             raise RunwareVideoError(
                 f"Unexpected result format: {type(result)}")
 
     except RunwareVideoError as e:
         log.error(f"Video generation error for job {job_id}: {e}")
-        job.status = GenerationJob.Status.FAILED
-        job.error = str(e)
-        job.save(update_fields=['status', 'error'])
-        _refund_if_needed(job)
+        _fail_job(job, str(e))
 
     except Exception as e:
         log.error(
             f"Unexpected error in video generation for job {job_id}: {e}", exc_info=True)
-        job.status = GenerationJob.Status.FAILED
-        job.error = f"Внутренняя ошибка: {str(e)}"
-        job.save(update_fields=['status', 'error'])
-        _refund_if_needed(job)
+        _fail_job(job, f"Внутренняя ошибка: {str(e)}")
 
 
 # ── Video Polling ─────────────────────────────────────────────────────────────
@@ -482,7 +458,7 @@ def process_video_generation_async(
 def poll_video_result(self, job_id: int, attempt: int = 1) -> None:
     """
     Polling статуса видео от Runware.
-    Запускается автоматически после video_submit.
+    Запускается автоматически после video_submit (если пакетный поллинг выключен).
     """
     try:
         job = GenerationJob.objects.get(pk=job_id)
@@ -506,96 +482,7 @@ def poll_video_result(self, job_id: int, attempt: int = 1) -> None:
         log.info(
             f"Video poll attempt {attempt} for job {job_id}: {status_data}")
 
-        # Парсим ответ
-        raw = status_data or {}
-        data_val = raw.get('data')
-        item = None
-
-        if isinstance(data_val, list) and data_val:
-            item = data_val[0]
-        elif isinstance(data_val, dict):
-            item = data_val
-        else:
-            item = raw
-
-        status_val = (item or {}).get('status') or raw.get(
-            'status') or (item or {}).get('state')
-
-        # Пытаемся вытащить URL видео из типичных полей
-        video_url = (
-            (item or {}).get('videoURL')
-            or raw.get('videoURL')
-            or ((item or {}).get('output') or {}).get('videoURL')
-        )
-
-        # Фоллбек: используем общий парсер Runware (_extract_video_url), чтобы поддержать outputs/videos массивы
-        if not video_url:
-            try:
-                # сначала пытаемся на элементе, затем на всём ответе
-                video_url = _rw_extract_video_url(item or {}) or _rw_extract_video_url(raw or {})
-            except Exception:
-                video_url = None
-
-        # Успех! (учитываем больше вариантов статусов Runware)
-        if str(status_val).lower() in {'completed', 'done', 'finished', 'success', 'succeeded'} and video_url:
-            log.info(f"Video job {job_id} completed! URL: {video_url}")
-
-            # Проверяем, не обработан ли job уже webhook'ом (защита от дублирования)
-            job.refresh_from_db()
-            if job.status == GenerationJob.Status.DONE:
-                log.info(f"Video job {job_id} already finalized by webhook, skipping poll finalization")
-                return
-
-            # Скачиваем и сохраняем видео локально
-            _download_and_save_video(job, video_url)
-
-            # Списываем токены только если они ещё не были списаны
-            token_cost = job.video_model.token_cost if job.video_model else 20
-
-            # Защита от двойного списания: проверяем tokens_spent
-            if job.tokens_spent == 0:
-                from dashboard.models import Wallet
-                from .models import FreeGrant
-
-                with transaction.atomic():
-                    if job.user and not job.user.is_staff:
-                        wallet = Wallet.objects.select_for_update().get(user=job.user)
-                        wallet.balance -= token_cost
-                        wallet.save()
-                    elif not job.user:
-                        # Гость
-                        grant = FreeGrant.objects.filter(
-                            Q(gid=job.guest_gid) | Q(fp=job.guest_fp),
-                            user__isnull=True
-                        ).select_for_update().first()
-                        if grant:
-                            grant.spend(token_cost)
-
-                log.info(f"Video job {job_id}: charged {token_cost} tokens via polling")
-            else:
-                log.info(f"Video job {job_id}: tokens already charged ({job.tokens_spent}), skipping")
-                token_cost = job.tokens_spent  # Используем уже списанное значение
-
-            # Обновляем job (если локальное сохранение прошло — используем его URL)
-            job.result_video_url = job.result_video_url or video_url
-            job.status = GenerationJob.Status.DONE
-            job.tokens_spent = token_cost
-            from datetime import timedelta
-            from django.utils import timezone
-            job.video_cached_until = timezone.now() + timedelta(hours=24)
-            job.save()
-
-            return
-
-        # Провал
-        if str(status_val).lower() in {'failed', 'error'}:
-            job.status = GenerationJob.Status.FAILED
-            job.error = raw.get('error') or (item or {}).get(
-                'error') or 'Video generation failed'
-            job.save()
-
-            # Рефанд токенов
-            _refund_if_needed(job)
+        if _apply_video_status(job, status_data) != 'processing':
             return
 
         # Всё ещё обрабатывается
@@ -605,10 +492,7 @@ def poll_video_result(self, job_id: int, attempt: int = 1) -> None:
         # Webhook должен обработать результат раньше, polling — fallback
         if attempt >= 30:
             log.error(f"Video job {job_id} timed out after {attempt} attempts")
-            job.status = GenerationJob.Status.FAILED
-            job.error = "Video generation timed out"
-            job.save()
-            _refund_if_needed(job)
+            _fail_job(job, "Video generation timed out", fields=None)
             return
 
         # Exponential backoff: 15s, 20s, 25s, 30s... (max 60s)
@@ -622,6 +506,7 @@ def poll_video_result(self, job_id: int, attempt: int = 1) -> None:
             queue=RUNWARE_QUEUE
         )
 
+
     except Exception as e:
         log.error(f"Error polling video job {job_id}: {e}", exc_info=True)
 
@@ -636,10 +521,7 @@ def poll_video_result(self, job_id: int, attempt: int = 1) -> None:
 
         # Таймаут или продолжаем?
         if attempt >= 30:
-            job.status = GenerationJob.Status.FAILED
-            job.error = f"Polling failed: {str(e)}"
-            job.save()
-            _refund_if_needed(job)
+            _fail_job(job, f"Polling failed: {str(e)}", fields=None)
         else:
             # Retry с exponential backoff
             delay = min(60, 10 + (attempt * 5))
@@ -712,58 +594,41 @@ def _download_and_save_video(job: GenerationJob, video_url: str) -> Optional[str
     try:
         log.info(f"Job {job.pk}: Downloading video from {video_url}")
 
-        headers = {
-            "User-Agent": "AI-Gallery/1.0",
-            "Accept": "video/*,*/*;q=0.8"
-        }
-
-        # Скачиваем видео с повторными попытками
-        video_content = None
-        for attempt in range(3):
-            try:
-                r = requests.get(video_url, timeout=300, headers=headers, allow_redirects=True, stream=True)
-                r.raise_for_status()
+        # Сохраняем видео локально в persist/videos/%Y/%m/ — потоково, без сборки файла в памяти
+        now = timezone.now()
+        rel_path = f"persist/videos/{now:%Y/%m}/job_{job.pk}.mp4"
+        result = media_download.download_to_storage(video_url, rel_path)
 
-                # Скачиваем по частям для больших файлов
-                content = b''
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        content += chunk
-
-                video_content = content
-                break
-            except Exception as e:
-                log.warning(f"Job {job.pk}: Download attempt {attempt + 1}/3 failed: {e}")
-                if attempt == 2:
-                    raise
-                time.sleep(1.5 * (attempt + 1))
-
-        if video_content:
-            # Сохраняем видео локально в persist/videos/%Y/%m/
-            try:
-                now = timezone.now()
-            except Exception:
-                from django.utils import timezone as _tz
-                now = _tz.now()
-            rel_path = f"persist/videos/{now:%Y/%m}/job_{job.pk}.mp4"
-            default_storage.save(rel_path, ContentFile(video_content))
-            persisted_url = default_storage.url(rel_path)
-            # Обновим job на локальный URL
-            try:
-                job.result_video_url = persisted_url
-                job.save(update_fields=["result_video_url"])
-            except Exception:
-                pass
-            log.info(f"Job {job.pk}: Video saved locally ({len(video_content)} bytes) -> {persisted_url}")
-            return persisted_url
-        else:
-            log.error(f"Job {job.pk}: Failed to download video content")
-            return None
+        # Обновим job на локальный URL
+        try:
+            job.result_video_url = result.url
+            job.save(update_fields=["result_video_url"])
+        except Exception:
+            pass
+        log.info(f"Job {job.pk}: Video saved locally ({result.size} bytes, sha256={result.sha256}) -> {result.url}")
+        return result.url
 
     except Exception as e:
+        # Не прерываем выполнение - URL всё равно сохранён
         log.error(f"Job {job.pk}: Error downloading/saving video: {e}")
         return None
-        # Не прерываем выполнение - URL всё равно сохранён
+
+
+def _fail_job(job: GenerationJob, error: str, *, fields=(), refund: bool = True) -> None:
+    """
+    Переводит задачу в FAILED и сообщает подписчикам (job_events); по умолчанию
+    возвращает списанные токены. fields — что сохранить помимо status/error,
+    None — полный save().
+    """
+    job.status = GenerationJob.Status.FAILED
+    job.error = error
+    if fields is None:
+        job.save()
+    else:
+        job.save(update_fields=_safe_fields(job, ["status", "error", *fields]))
+    job_events.publish(job)
+    if refund:
+        _refund_if_needed(job)
 
 
 def _refund_if_needed(job: GenerationJob) -> None:
@@ -798,8 +663,7 @@ def _refund_if_needed(job: GenerationJob) -> None:
                     grant = FreeGrant.objects.filter(
                         grant_q, user__isnull=True).first()
                     if grant:
-                        grant.consumed = max(0, int(grant.consumed) - spent)
-                        grant.save(update_fields=["consumed"])
+                        guest_ledger.refund(grant, spent)
                         log.info(
                             f"Refunded {spent} tokens to FreeGrant {grant.pk}")
                     else:
@@ -810,6 +674,48 @@ def _refund_if_needed(job: GenerationJob) -> None:
         log.exception("Refund failed for job %s (user %s, spent=%s): %s",
                       job.pk, job.user_id, spent, e)
 
+
+def _image_dimensions(job: GenerationJob, mid: str) -> tuple[int, int]:
+    """Размеры изображения: из job.video_resolution (aspect ratio) или дефолты модели."""
+    w = 1024
+    h = 1024
+
+    # Попытка извлечь width и height из video_resolution (используется для хранения aspect ratio размеров)
+    if job.video_resolution and 'x' in job.video_resolution.lower():
+        try:
+            parts = job.video_resolution.lower().split('x')
+            if len(parts) == 2:
+                w = int(parts[0].strip())
+                h = int(parts[1].strip())
+                log.info(f"Using custom dimensions from job.video_resolution: {w}x{h}")
+        except (ValueError, AttributeError) as e:
+            log.warning(f"Failed to parse video_resolution '{job.video_resolution}': {e}")
+            # Fallback to model defaults
+            if mid == "bfl:2@2":
+                w = 2048
+                h = 2048
+            elif mid == "bytedance:5@0":
+                w = 1024
+                h = 1024
+    else:
+        # No custom resolution - use model defaults
+        if mid == "bfl:2@2":
+            w = 2048
+            h = 2048
+        elif mid == "bytedance:5@0":
+            w = 1024
+            h = 1024
+    return w, h
+
+
+def _webhook_url() -> Optional[str]:
+    base = (getattr(settings, "PUBLIC_BASE_URL", "") or "").rstrip("/")
+    token = getattr(settings, "RUNWARE_WEBHOOK_TOKEN", "")
+    # URL БЕЗ trailing slash - иначе Django делает 301 редирект
+    return f"{base}/generate/api/runware/webhook?token={token}" if (
+        base and token) else None
+
+
 # ── Сабмит ────────────────────────────────────────────────────────────────────
 
 
@@ -835,9 +741,7 @@ def run_generation_async(self, job_id: int) -> None:
 
     # Валидация промпта на предмет потенциально опасного контента
     if not job.prompt or len(job.prompt) > 2000:
-        job.status = GenerationJob.Status.FAILED
-        job.error = "Invalid prompt"
-        job.save(update_fields=["status", "error"])
+        _fail_job(job, "Invalid prompt", refund=False)
         return
 
     job.status = GenerationJob.Status.RUNNING
@@ -845,6 +749,7 @@ def run_generation_async(self, job_id: int) -> None:
     _safe_set(job, "provider_status", "starting")
     job.save(update_fields=_safe_fields(
         job, ["status", "error", "provider_status"]))
+    job_events.publish(job)
 
     model_id = job.model_id or getattr(
         settings, "RUNWARE_DEFAULT_MODEL", "runware:101@1")
@@ -856,39 +761,10 @@ def run_generation_async(self, job_id: int) -> None:
         mid = (model_id or "").strip().lower()
 
     # Per-model resolution mapping
-    w = 1024
-    h = 1024
-
-    # Попытка извлечь width и height из video_resolution (используется для хранения aspect ratio размеров)
-    if job.video_resolution and 'x' in job.video_resolution.lower():
-        try:
-            parts = job.video_resolution.lower().split('x')
-            if len(parts) == 2:
-                w = int(parts[0].strip())
-                h = int(parts[1].strip())
-                log.info(f"Using custom dimensions from job.video_resolution: {w}x{h}")
-        except (ValueError, AttributeError) as e:
-            log.warning(f"Failed to parse video_resolution '{job.video_resolution}': {e}")
-            # Fallback to model defaults
-            if mid == "bfl:2@2":
-                w = 2048
-                h = 2048
-            elif mid == "bytedance:5@0":
-                w = 1024
-                h = 1024
-    else:
-        # No custom resolution - use model defaults
-        if mid == "bfl:2@2":
-            w = 2048
-            h = 2048
-        elif mid == "bytedance:5@0":
-            w = 1024
-            h = 1024
+    w, h = _image_dimensions(job, mid)
 
     # Определяем режим: если USE_CELERY=True и брокер НЕ memory — используем async
-    use_celery = getattr(settings, 'USE_CELERY', False)
-    broker_url = getattr(settings, 'CELERY_BROKER_URL', 'memory://')
-    force_sync = not (use_celery and not broker_url.startswith('memory'))
+    force_sync = video_poll.uses_local()
 
     # ========================================================================
     # LOAD REFERENCE IMAGES FIRST (for ALL models except Face Retouch)
@@ -1007,7 +883,7 @@ def run_generation_async(self, job_id: int) -> None:
                 if not retouch_refs and retouch_ref:
                     try:
                         # fetch bytes and upload
-                        r = requests.get(retouch_ref, timeout=20)
+                        r = provider_http.get(retouch_ref, endpoint="download", timeout=20)
                         if r.ok and r.content:
                             from ai_gallery.services.runware_client import _upload_image_to_runware, runware_image_url
                             img_uuid = _upload_image_to_runware(r.content)
@@ -1052,11 +928,7 @@ def run_generation_async(self, job_id: int) -> None:
                 if mid == "runware:108@22":
                     # Require at least one valid reference image (prefer UUID)
                     if not retouch_refs:
-                        job.status = GenerationJob.Status.FAILED
-                        job.error = "Для Face Retouch требуется фото (reference image). Не удалось загрузить изображение в провайдер."
-                        job.save(update_fields=_safe_fields(
-                            job, ["status", "error"]))
-                        _refund_if_needed(job)
+                        _fail_job(job, "Для Face Retouch требуется фото (reference image). Не удалось загрузить изображение в провайдер.")
                         return
                     url = rw.submit_image_inference_sync(
                         prompt=job.prompt,
@@ -1103,29 +975,18 @@ def run_generation_async(self, job_id: int) -> None:
                 log.error(
                     "Direct sync fallback failed for job %s: %s", job.pk, e2)
 
-            job.status = GenerationJob.Status.FAILED
-            job.error = (f"sync failed: {msg}")[:300]
-            job.save(update_fields=_safe_fields(job, ["status", "error"]))
-            _refund_if_needed(job)
+            _fail_job(job, (f"sync failed: {msg}")[:300])
             return
 
     # === ASYNC режим (webhook + polling) ======================================
     try:
-        base = (getattr(settings, "PUBLIC_BASE_URL", "") or "").rstrip("/")
-        token = getattr(settings, "RUNWARE_WEBHOOK_TOKEN", "")
-        # URL БЕЗ trailing slash - иначе Django делает 301 редирект
-        webhook = f"{base}/generate/api/runware/webhook?token={token}" if (
-            base and token) else None
+        webhook = _webhook_url()
 
         if rw is not None:
             if mid == "runware:108@22":
                 # Require at least one valid reference image (prefer UUID)
                 if not retouch_refs:
-                    job.status = GenerationJob.Status.FAILED
-                    job.error = "Для Face Retouch требуется фото (reference image). Не удалось загрузить изображение в провайдер."
-                    job.save(update_fields=_safe_fields(
-                        job, ["status", "error"]))
-                    _refund_if_needed(job)
+                    _fail_job(job, "Для Face Retouch требуется фото (reference image). Не удалось загрузить изображение в провайдер.")
                     return
                 task_uuid = rw.submit_image_inference_async(
                     prompt=job.prompt,
@@ -1159,8 +1020,10 @@ def run_generation_async(self, job_id: int) -> None:
         job.save(update_fields=_safe_fields(
             job, ["provider_task_uuid", "provider_status"]))
 
-        poll_runware_result.apply_async(
-            args=[job.id, 1], countdown=FIRST_POLL_DELAY, queue=RUNWARE_QUEUE)
+        # При пакетном поллинге задачу подхватит poll_runware_batch
+        if not BATCH_POLLING:
+            poll_runware_result.apply_async(
+                args=[job.id, 1], countdown=FIRST_POLL_DELAY, queue=RUNWARE_QUEUE)
 
     except Exception as e:
         msg = str(e)
@@ -1181,10 +1044,7 @@ def run_generation_async(self, job_id: int) -> None:
             log.error(
                 "Async submit failed and direct sync fallback failed for job %s: %s", job.pk, e2)
 
-        job.status = GenerationJob.Status.FAILED
-        job.error = (f"submit failed: {msg}")[:300]
-        job.save(update_fields=_safe_fields(job, ["status", "error"]))
-        _refund_if_needed(job)
+        _fail_job(job, (f"submit failed: {msg}")[:300])
 
 # ── Poll + fallback ───────────────────────────────────────────────────────────
 
@@ -1209,6 +1069,23 @@ def poll_runware_result(self, job_id: int, attempt: int = 1) -> None:
         return
 
     data = rw.get_response(provider_uuid)
+    status = _apply_image_response(job, data)
+    if status is None:
+        return
+
+    # «зависло» → принудительный sync-fallback/DEMO
+    if _is_stuck(job, status):
+        _image_stuck_fallback(job)
+        return
+
+    _reschedule_poll(job, attempt)
+
+
+def _apply_image_response(job: GenerationJob, data: dict) -> Optional[str]:
+    """
+    Применяет ответ getResponse к задаче-изображению.
+    None — задача завершена (DONE/FAILED), иначе — текущий статус провайдера.
+    """
     status, url = rw.parse_status_and_url(data)
 
     _safe_set(job, "provider_status", status)
@@ -1218,55 +1095,51 @@ def poll_runware_result(self, job_id: int, attempt: int = 1) -> None:
     # успех
     if (status in ("success", "done") and url) or (url and not status):
         _finalize_job_with_url(job, url)
-        return
+        return None
 
     # провал
     if status in ("failed", "error"):
-        job.status = GenerationJob.Status.FAILED
-        job.error = (str(data)[:300]) if data else "provider error"
-        job.save(update_fields=_safe_fields(job, [
-            "status", "error", "provider_status", "provider_payload", "last_polled_at"
-        ]))
-        _refund_if_needed(job)
-        return
+        _fail_job(job, (str(data)[:300]) if data else "provider error",
+                  fields=["provider_status", "provider_payload", "last_polled_at"])
+        return None
 
     # ещё обрабатывается
     job.save(update_fields=_safe_fields(
         job, ["provider_status", "provider_payload", "last_polled_at"]))
+    return status
 
-    # «зависло» → принудительный sync-fallback/DEMO
-    if hasattr(rw, "is_processing") and rw.is_processing(status):
-        age_sec = (timezone.now() - job.created_at).total_seconds()
-        if age_sec >= STUCK_TIMEOUT_SEC:
-            try:
-                log.warning(
-                    "Job %s stuck for %.1fs → sync fallback", job.pk, age_sec)
-                if rw is not None:
-                    fallback_url = rw.submit_image_inference_sync(
-                        prompt=job.prompt,
-                        model_id=job.model_id or getattr(
-                            settings, "RUNWARE_DEFAULT_MODEL", "runware:101@1"),
-                        width=FALLBACK_WIDTH, height=FALLBACK_HEIGHT,
-                        steps=33, cfg_scale=3.1, scheduler=None,
-                    )
-                    _finalize_job_with_url(job, fallback_url)
-                else:
-                    _demo_render(job, width=FALLBACK_WIDTH,
-                                 height=FALLBACK_HEIGHT)
-                return
-            except Exception as e:
-                msg = str(e)
-                if (("401" in msg) or ("Unauthorized" in msg)) and DEMO_IF_UNAUTHORIZED:
-                    _demo_render(job, width=FALLBACK_WIDTH,
-                                 height=FALLBACK_HEIGHT)
-                    return
-                job.status = GenerationJob.Status.FAILED
-                job.error = (f"Provider stuck; fallback failed: {msg}")[:300]
-                job.save(update_fields=_safe_fields(job, ["status", "error"]))
-                _refund_if_needed(job)
-                return
 
-    _reschedule_poll(job, attempt)
+def _is_stuck(job: GenerationJob, status: str) -> bool:
+    if not (hasattr(rw, "is_processing") and rw.is_processing(status)):
+        return False
+    return (timezone.now() - job.created_at).total_seconds() >= STUCK_TIMEOUT_SEC
+
+
+def _image_stuck_fallback(job: GenerationJob) -> None:
+    """Задача зависла у провайдера → sync-сабмит с дефолтными размерами или DEMO."""
+    try:
+        age_sec = (timezone.now() - job.created_at).total_seconds()
+        log.warning(
+            "Job %s stuck for %.1fs → sync fallback", job.pk, age_sec)
+        if rw is not None:
+            fallback_url = rw.submit_image_inference_sync(
+                prompt=job.prompt,
+                model_id=job.model_id or getattr(
+                    settings, "RUNWARE_DEFAULT_MODEL", "runware:101@1"),
+                width=FALLBACK_WIDTH, height=FALLBACK_HEIGHT,
+                steps=33, cfg_scale=3.1, scheduler=None,
+            )
+            _finalize_job_with_url(job, fallback_url)
+        else:
+            _demo_render(job, width=FALLBACK_WIDTH,
+                         height=FALLBACK_HEIGHT)
+    except Exception as e:
+        msg = str(e)
+        if (("401" in msg) or ("Unauthorized" in msg)) and DEMO_IF_UNAUTHORIZED:
+            _demo_render(job, width=FALLBACK_WIDTH,
+                         height=FALLBACK_HEIGHT)
+            return
+        _fail_job(job, (f"Provider stuck; fallback failed: {msg}")[:300])
 
 
 def _reschedule_poll(job: GenerationJob, attempt: int) -> None:
@@ -1275,6 +1148,217 @@ def _reschedule_poll(job: GenerationJob, attempt: int) -> None:
     poll_runware_result.apply_async(
         args=[job.id, attempt + 1], countdown=next_in, queue=RUNWARE_QUEUE)
 
+
+@shared_task(
+    name="generate.tasks.image_stuck_fallback_async",
+    queue=RUNWARE_QUEUE,
+    soft_time_limit=200,
+    time_limit=240,
+)
+def image_stuck_fallback_async(job_id: int) -> None:
+    """Sync-fallback для зависшей задачи — отдельно, чтобы не блокировать пакетный поллер."""
+    try:
+        job = GenerationJob.objects.get(pk=job_id)
+    except GenerationJob.DoesNotExist:
+        return
+    if job.status in (GenerationJob.Status.DONE, GenerationJob.Status.FAILED):
+        return
+    _image_stuck_fallback(job)
+
+
+# ── Пакетный поллинг (Celery Beat) ────────────────────────────────────────────
+
+
+@shared_task(
+    name="generate.tasks.poll_runware_batch",
+    queue=RUNWARE_QUEUE,
+    soft_time_limit=50,
+    time_limit=60,
+    ignore_result=True,
+)
+def poll_runware_batch() -> dict:
+    """
+    Один проход по всем активным задачам провайдера: getResponse пачками
+    (RUNWARE_MAX_TASKS_PER_REQUEST taskUUID на запрос) вместо отдельной
+    цепочки poll-тасков на каждую задачу. Webhook остаётся основным каналом.
+    При RUNWARE_BATCH_POLLING=False задачи опрашивают per-job цепочки — Beat-запуск пропускаем.
+    """
+    if not BATCH_POLLING:
+        return {"skipped": True}
+    lock_key = "runware:poll_batch:lock"
+    if not caches.provider().add(lock_key, 1, timeout=60):
+        return {"skipped": True}
+    try:
+        return _poll_runware_batch_once()
+    finally:
+        caches.provider().delete(lock_key)
+
+
+def _poll_runware_batch_once() -> dict:
+    from django.db.models import F
+
+    now = timezone.now()
+    threshold = now - timedelta(seconds=POLL_MIN_INTERVAL)
+    jobs = list(
+        GenerationJob.objects
+        .filter(status__in=(GenerationJob.Status.PENDING, GenerationJob.Status.RUNNING))
+        .exclude(provider_task_uuid__isnull=True)
+        .exclude(provider_task_uuid="")
+        # webhook уже скачивает результат — не дублируем
+        .exclude(provider_status="downloading")
+        # видео — по адаптивному графику next_poll_at, изображения — не чаще POLL_MIN_INTERVAL
+        .filter(
+            Q(next_poll_at__lte=now)
+            | Q(next_poll_at__isnull=True) & (Q(last_polled_at__isnull=True) | Q(last_polled_at__lt=threshold))
+        )
+        .select_related("video_model", "user")
+        .order_by(F("last_polled_at").asc(nulls_first=True), "pk")[:POLL_BATCH_MAX_JOBS]
+    )
+    stats = {"images": 0, "videos": 0, "finished": 0}
+    if not jobs:
+        return stats
+
+    images = [j for j in jobs if j.generation_type != "video"]
+    videos = [j for j in jobs if j.generation_type == "video"]
+
+    if images and rw is not None:
+        stats["images"] = len(images)
+        try:
+            responses = rw.get_responses([j.provider_task_uuid for j in images])
+        except Exception as e:
+            log.warning("poll_runware_batch: images getResponse failed: %s", e)
+            responses = {}
+        skipped: list[int] = []
+        for job in images:
+            data = responses.get(str(job.provider_task_uuid))
+            if data is None:
+                skipped.append(job.pk)
+                continue
+            try:
+                status = _apply_image_response(job, data)
+                if status is None:
+                    stats["finished"] += 1
+                elif _is_stuck(job, status) and caches.provider().add(
+                        f"runware:fallback:{job.pk}", 1, timeout=STUCK_TIMEOUT_SEC * 4):
+                    image_stuck_fallback_async.apply_async(
+                        args=[job.pk], queue=RUNWARE_QUEUE)
+            except Exception as e:
+                log.error("poll_runware_batch: image job %s: %s", job.pk, e, exc_info=True)
+        if skipped:
+            # без ответа (временный сбой пачки) — в конец очереди, чтобы не вытеснять остальных
+            GenerationJob.objects.filter(pk__in=skipped).update(last_polled_at=now)
+
+    if videos:
+        stats["videos"] = len(videos)
+        pending = _track_video_jobs(videos)
+        stats["finished"] += len(videos) - len(pending)
+
+    return stats
+
+
+# ── Пакетный сабмит вариантов ─────────────────────────────────────────────────
+
+
+def _needs_single_submit(job: GenerationJob) -> bool:
+    """Face Retouch и задачи с референсами требуют загрузок — идут через run_generation_async."""
+    from .models import ReferenceImage
+
+    mid = (job.model_id or "").strip().lower()
+    if mid == FACE_RETOUCH_MODEL:
+        return True
+    return ReferenceImage.objects.filter(job=job).exists()
+
+
+@shared_task(
+    name="generate.tasks.run_generation_batch_async",
+    queue=RUNWARE_QUEUE,
+    soft_time_limit=90,
+    time_limit=120,
+)
+def run_generation_batch_async(job_ids: list[int]) -> None:
+    """
+    Сабмит нескольких задач одним запросом к Runware (варианты number_results).
+    Задачи, которым нужны загрузки референсов, и любые сбои пакета
+    уходят в обычный run_generation_async по одной; в режиме без брокера
+    (force_sync) — все задачи, там сабмит синхронный.
+    """
+    if video_poll.uses_local():
+        for job_id in job_ids:
+            run_generation_async.apply_async(args=[job_id], queue=RUNWARE_QUEUE)
+        return
+
+    single: list[int] = []
+    batch: list[GenerationJob] = []
+    tasks: list[dict] = []
+
+    with transaction.atomic():
+        jobs = (GenerationJob.objects.select_for_update()
+                .filter(pk__in=job_ids, status=GenerationJob.Status.PENDING)
+                .order_by("pk"))
+        for job in jobs:
+            if rw is None or _needs_single_submit(job) or not job.prompt or len(job.prompt) > 2000:
+                single.append(job.pk)
+                continue
+            model_id = job.model_id or getattr(
+                settings, "RUNWARE_DEFAULT_MODEL", "runware:101@1")
+            w, h = _image_dimensions(job, model_id.strip().lower())
+            try:
+                task = rw.build_image_inference_task(
+                    prompt=job.prompt,
+                    model_id=model_id,
+                    width=w, height=h, steps=33, cfg_scale=3.1,
+                    scheduler=None,
+                    webhook_url=_webhook_url(),
+                )
+            except Exception:
+                # Ошибку валидации (например, размеры Seedream) оформит обычный путь
+                single.append(job.pk)
+                continue
+            tasks.append(task)
+            job.status = GenerationJob.Status.RUNNING
+            job.error = ""
+            _safe_set(job, "provider_status", "starting")
+            job.save(update_fields=_safe_fields(
+                job, ["status", "error", "provider_status"]))
+            batch.append(job)
+
+    for job in batch:
+        job_events.publish(job)
+
+    if batch:
+        try:
+            results = rw.submit_image_inference_batch(tasks)
+        except Exception as e:
+            log.warning("Batch submit of %d jobs failed (%s) → per-job submit", len(batch), e)
+            results = {}
+
+        # не отправленные (сбой их пачки) — по одной через run_generation_async;
+        # задачи принятых пачек повторно не отправляем
+        unsent = [j.pk for j, t in zip(batch, tasks) if t["taskUUID"] not in results]
+        if unsent:
+            GenerationJob.objects.filter(pk__in=unsent).update(
+                status=GenerationJob.Status.PENDING)
+            single.extend(unsent)
+
+        for job, task in zip(batch, tasks):
+            task_uuid = task["taskUUID"]
+            if task_uuid not in results:
+                continue
+            error = results.get(task_uuid)
+            if error:
+                _fail_job(job, (f"submit failed: {error}")[:300])
+                continue
+            _safe_set(job, "provider_task_uuid", task_uuid)
+            _safe_set(job, "provider_status", "queued")
+            job.save(update_fields=_safe_fields(
+                job, ["provider_task_uuid", "provider_status"]))
+            if not BATCH_POLLING:
+                poll_runware_result.apply_async(
+                    args=[job.pk, 1], countdown=FIRST_POLL_DELAY, queue=RUNWARE_QUEUE)
+
+    for job_id in single:
+        run_generation_async.apply_async(args=[job_id], queue=RUNWARE_QUEUE)
+
 # ── Финализация по внешнему URL ───────────────────────────────────────────────
 
 
@@ -1285,9 +1369,7 @@ def _finalize_job_with_url(job: GenerationJob, image_url: str) -> None:
 
     # Валидация URL для предотвращения SSRF атак
     if not image_url or not image_url.startswith(('https://', 'http://')):
-        job.status = GenerationJob.Status.FAILED
-        job.error = "Invalid image URL"
-        job.save(update_fields=["status", "error"])
+        _fail_job(job, "Invalid image URL", refund=False)
         return
 
     # Проверка на локальные/приватные адреса
@@ -1298,14 +1380,10 @@ def _finalize_job_with_url(job: GenerationJob, image_url: str) -> None:
            parsed.hostname.startswith('192.168.') or \
            parsed.hostname.startswith('10.') or \
            parsed.hostname.startswith('172.'):
-            job.status = GenerationJob.Status.FAILED
-            job.error = "Invalid image URL"
-            job.save(update_fields=["status", "error"])
+            _fail_job(job, "Invalid image URL", refund=False)
             return
     except Exception:
-        job.status = GenerationJob.Status.FAILED
-        job.error = "Invalid image URL"
-        job.save(update_fields=["status", "error"])
+        _fail_job(job, "Invalid image URL", refund=False)
         return
 
     timeout = int(getattr(settings, "RUNWARE_DOWNLOAD_TIMEOUT", 300))
@@ -1317,8 +1395,8 @@ def _finalize_job_with_url(job: GenerationJob, image_url: str) -> None:
 
     for attempt in range(3):
         try:
-            r = requests.get(image_url, timeout=timeout,
-                             headers=headers, allow_redirects=True)
+            r = provider_http.get(image_url, endpoint="download", timeout=timeout,
+                                  headers=headers, allow_redirects=True)
             if r.status_code >= 500:
                 raise requests.HTTPError(f"{r.status_code} Server Error")
             r.raise_for_status()
@@ -1329,11 +1407,11 @@ def _finalize_job_with_url(job: GenerationJob, image_url: str) -> None:
             time.sleep(1.2 * (attempt + 1))
 
     if content is not None:
-        cache.set(_img_key(job.pk), content, timeout=CACHE_TTL)
+        result_blobs.put(job.pk, content, "image/jpeg", timeout=CACHE_TTL)
         job.result_image.save(
             f"generated/{job.pk}.jpg", ContentFile(content), save=False)
     else:
-        cache.set(_img_url_key(job.pk), image_url, timeout=CACHE_TTL)
+        result_blobs.set_url(job.pk, image_url, timeout=CACHE_TTL)
         log.warning(
             "Job %s: download failed, serving external URL instead. err=%s", job.pk, last_err)
 
@@ -1342,66 +1420,30 @@ def _finalize_job_with_url(job: GenerationJob, image_url: str) -> None:
     _safe_set(job, "provider_status", "success")
     job.save(update_fields=_safe_fields(
         job, ["status", "error", "result_image", "provider_status"]))
+    job_events.publish(job)
 
 
-# ── Автоудаление неопубликованных работ старше 30 дней ───────────────────────
-@shared_task(queue="default")
-def delete_old_unpublished_jobs():
-    """
-    Удаляет GenerationJob старше 30 дней, которые не опубликованы в галерею.
-    Публикованные работы (имеющие связь с PublicPhoto или PublicVideo) НЕ удаляются.
-    """
-    from datetime import timedelta
-    from django.apps import apps
-
-    cutoff_date = timezone.now() - timedelta(days=30)
-
-    # Получаем модели
-    PublicPhoto = apps.get_model('gallery', 'PublicPhoto')
-    PublicVideo = apps.get_model('gallery', 'PublicVideo')
-
-    # Находим все работы старше 30 дней
-    old_jobs = GenerationJob.objects.filter(
-        created_at__lt=cutoff_date
-    )
-
-    # Исключаем опубликованные (у которых есть связь с PublicPhoto или PublicVideo)
-    published_photo_job_ids = PublicPhoto.objects.filter(
-        source_job__isnull=False
-    ).values_list('source_job_id', flat=True)
-
-    published_video_job_ids = PublicVideo.objects.filter(
-        source_job__isnull=False
-    ).values_list('source_job_id', flat=True)
+# ── Уборка задач: неподтверждённые (24 ч) и неопубликованные (30 дней) ────────
+@shared_task(name="generate.tasks.reap_jobs", queue=BACKGROUND_QUEUE, ignore_result=True,
+             soft_time_limit=120, time_limit=150)
+def reap_jobs() -> dict:
+    """Пачками удаляет мусорные задачи и их файлы (см. generate.services.reaper)."""
+    return reaper.run()
 
-    # Объединяем ID опубликованных работ
-    published_job_ids = set(published_photo_job_ids) | set(published_video_job_ids)
 
-    # Фильтруем только неопубликованные
-    jobs_to_delete = old_jobs.exclude(pk__in=published_job_ids)
-
-    deleted_count = 0
-    for job in jobs_to_delete:
-        try:
-            # Удаляем файлы из storage
-            if job.result_image:
-                try:
-                    default_storage.delete(job.result_image.name)
-                except Exception as e:
-                    log.warning(f"Failed to delete image for job {job.pk}: {e}")
-
-            if job.video_source_image:
-                try:
-                    default_storage.delete(job.video_source_image.name)
-                except Exception as e:
-                    log.warning(f"Failed to delete video source image for job {job.pk}: {e}")
-
-            # Удаляем запись из БД
-            job.delete()
-            deleted_count += 1
+@shared_task(name="generate.tasks.reconcile_guest_quota", queue=BACKGROUND_QUEUE, ignore_result=True)
+def reconcile_guest_quota() -> int:
+    """Переносит счётчики расхода гостевых грантов в FreeGrant.consumed (guest_ledger)."""
+    n = guest_ledger.reconcile()
+    if n:
+        log.info("guest quota reconciled: %s grants", n)
+    return n
 
-        except Exception as e:
-            log.error(f"Failed to delete job {job.pk}: {e}")
 
-    log.info(f"Deleted {deleted_count} old unpublished generation jobs")
-    return deleted_count
+@shared_task(queue=BACKGROUND_QUEUE)
+def delete_old_unpublished_jobs():
+    """
+    Совместимость со старой записью расписания: теперь это проход reaper по
+    набору «unpublished» (старше REAPER_UNPUBLISHED_DAYS, не опубликованы в галерею).
+    """
+    return reaper.reap("unpublished").rows
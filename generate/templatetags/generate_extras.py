@@ -123,18 +123,13 @@ def safe_slugify(value):
 
 # ===== Model display helpers =====
 from typing import Any
-try:
-    # Import lazily-safe; Django will load this templatetag after apps are ready
-    from generate.models import VideoModel  # type: ignore
-except Exception:  # pragma: no cover
-    VideoModel = None  # type: ignore
 
 
 def _lookup_model_name_by_id(model_id: str) -> str:
     """
-    Resolve site-friendly model name in priority:
-      1) ImageModelConfiguration table by model_id (title or name)
-      2) VideoModel table by model_id (title or name)
+    Resolve site-friendly model name in priority (1-2 from generate.services.model_catalog):
+      1) ImageModelConfiguration by model_id (title or name)
+      2) VideoModel by model_id (title or name)
       3) Hard-coded overrides (popular image/video ids used in UI)
       4) Raw model_id
     """
@@ -142,33 +137,12 @@ def _lookup_model_name_by_id(model_id: str) -> str:
     if not mid:
         return ""
 
-    # 1) Check ImageModelConfiguration first
+    # 1-2) Каталог моделей в памяти процесса (ImageModelConfiguration, затем VideoModel)
     try:
-        from generate.models_image import ImageModelConfiguration
-        img_model = ImageModelConfiguration.objects.filter(model_id=mid).first()
-        if img_model:
-            # Prefer title over name
-            title = getattr(img_model, "title", None)
-            if title:
-                return _canonicalize_name(title)
-            name = getattr(img_model, "name", None)
-            if name:
-                return _canonicalize_name(name)
-    except Exception:
-        pass
-
-    # 2) Check VideoModel
-    try:
-        if VideoModel is not None:
-            vm = VideoModel.objects.filter(model_id=mid).first()
-            if vm:
-                # Prefer title over name
-                title = getattr(vm, "title", None)
-                if title:
-                    return _canonicalize_name(title)
-                name = getattr(vm, "name", None)
-                if name:
-                    return _canonicalize_name(name)
+        from generate.services import model_catalog
+        name = model_catalog.display_name(mid)
+        if name:
+            return _canonicalize_name(name)
     except Exception:
         pass
 
@@ -44,6 +44,7 @@ urlpatterns = [
     # ── API генерации изображений
     path("api/submit", views_api.api_submit, name="api_submit"),
     path("api/status/<int:job_id>", views_api.api_status, name="api_status"),
+    path("api/jobs/<int:job_id>/events", views_api.api_job_events, name="api_job_events"),
     path("api/job/<int:pk>/persist", views_api.job_persist, name="api_job_persist"),
     path("api/last-pending", views_api.api_last_pending, name="api_last_pending"),
     path("api/completed-jobs", views_api.api_completed_jobs, name="api_completed_jobs"),
@@ -12,7 +12,6 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.db import connection, transaction, utils as db_utils
 from django.db.models import Q, F, Value
@@ -30,6 +29,7 @@ from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.text import slugify
 from django.views.decorators.http import require_http_methods, require_POST
 
+from ai_gallery.services import result_blobs, sendfile
 from dashboard.models import Wallet
 from gallery.models import Like, JobComment, JobCommentLike, JobSave, Image as GalleryImage
 from .models_image import ImageModelConfiguration
@@ -41,6 +41,7 @@ from .models import (
     ShowcaseCategory,
     ShowcaseImage,
 )
+from .services import guest_ledger
 
 log = logging.getLogger(__name__)
 
@@ -318,66 +319,6 @@ def _claim_guest_jobs_for_user(request: HttpRequest) -> None:
         pass
 
 
-def _image_cache_key(job_id: int) -> str:
-    return f"genimg:{job_id}"
-
-
-def _image_url_cache_key(job_id: int) -> str:
-    return f"genimgurl:{job_id}"
-
-# Opportunistic cleanup: remove non-persisted jobs older than 24h
-# This keeps only "saved to My Jobs" items; others are auto-pruned.
-from django.utils import timezone as _tz  # local alias to avoid clashes
-from datetime import timedelta as _td
-
-def _cleanup_unpersisted_jobs(limit: int = 100) -> None:
-    try:
-        cutoff = _tz.now() - _td(hours=24)
-        qs = GenerationJob.objects.filter(persisted=False, created_at__lt=cutoff).order_by("id")[:limit]
-        ids = list(qs.values_list("id", flat=True))
-        for job in qs:
-            # Remove stored files and caches (same as delete flow)
-            # 1) Image file (if any)
-            try:
-                if getattr(job, "result_image", None) and job.result_image.name:
-                    job.result_image.delete(save=False)
-            except Exception:
-                pass
-            # 2) Video file (if any persisted under MEDIA_URL)
-            try:
-                from django.conf import settings as _s
-                from django.core.files.storage import default_storage as _ds
-                from urllib.parse import urlparse as _u
-                vurl = (getattr(job, "result_video_url", "") or "").strip()
-                if vurl:
-                    media_url = str(getattr(_s, "MEDIA_URL", "/media/") or "/media/")
-                    rel = None
-                    if vurl.startswith(media_url):
-                        rel = vurl[len(media_url):].lstrip("/")
-                    else:
-                        parsed = _u(vurl)
-                        if parsed.path and "/media/" in parsed.path:
-                            rel = parsed.path.split("/media/", 1)[-1].lstrip("/")
-                    if rel:
-                        try:
-                            _ds.delete(rel)
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-            # 3) Cache keys
-            try:
-                cache.delete(_image_cache_key(job.pk))
-                cache.delete(_image_url_cache_key(job.pk))
-            except Exception:
-                pass
-        if ids:
-            GenerationJob.objects.filter(id__in=ids).delete()
-    except Exception:
-        # never break page render on cleanup errors
-        pass
-
-
 def _default_back_url(request: HttpRequest) -> str:
     for name in ("dashboard:my_jobs", "gallery:index"):
         try:
@@ -490,13 +431,13 @@ def _merge_grant_to_wallet_once(request: HttpRequest, wallet: Wallet) -> None:
                 return
 
             # Проверяем, что у гранта есть токены для переноса
-            if grant.left <= 0:
+            if guest_ledger.left(grant) <= 0:
                 request.session[session_key] = True
                 request.session.modified = True
                 return
 
             # Логируем операцию для диагностики
-            log.info(f"Merging grant {grant.pk} (left={grant.left}) to user {wallet.user_id}")
+            log.info(f"Merging grant {grant.pk} (left={guest_ledger.left(grant)}) to user {wallet.user_id}")
 
             # bind_to_user умеет аккуратно переносить остаток
             grant.bind_to_user(wallet.user, transfer_left=True)
@@ -518,12 +459,6 @@ def _get_generation_context(request: HttpRequest) -> dict:
     is_staff = request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser)
     price = 0 if (FREE_FOR_STAFF and is_staff) else TOKEN_COST
 
-    # Auto-cleanup: drop non-persisted jobs older than 24h (only for new logic)
-    try:
-        _cleanup_unpersisted_jobs()
-    except Exception:
-        pass
-
     # если пользователь уже вошёл — «подцепим» его прошлые гостевые задачи
     if request.user.is_authenticated:
         _claim_guest_jobs_for_user(request)
@@ -539,19 +474,23 @@ def _get_generation_context(request: HttpRequest) -> dict:
     )
 
     # Категории промптов с изображениями и пагинацией (для изображений)
+    # active_prompts_count на карточках — из счётчиков prompt_library (один GROUP BY в кэше)
     from .models import PromptCategory, VideoPromptCategory, ShowcaseVideo
-    prompt_categories_queryset = PromptCategory.objects.filter(is_active=True).prefetch_related("prompts").order_by("order", "name")
+    from .services import prompt_library
+    prompt_categories_queryset = PromptCategory.objects.filter(is_active=True).order_by("order", "name")
     prompt_categories_paginator = Paginator(prompt_categories_queryset, 24)  # 24 категории на странице
     prompt_page_number = request.GET.get('prompt_page', 1)
     prompt_page_obj = prompt_categories_paginator.get_page(prompt_page_number)
     prompt_categories: List[PromptCategory] = list(prompt_page_obj.object_list)
+    prompt_library.attach_counts("image", prompt_categories)
 
     # Категории промптов для ВИДЕО (отдельные)
-    video_prompt_categories_queryset = VideoPromptCategory.objects.filter(is_active=True).prefetch_related("video_prompts").order_by("order", "name")
+    video_prompt_categories_queryset = VideoPromptCategory.objects.filter(is_active=True).order_by("order", "name")
     video_prompt_categories_paginator = Paginator(video_prompt_categories_queryset, 24)
     video_prompt_page_number = request.GET.get('video_prompt_page', 1)
     video_prompt_page_obj = video_prompt_categories_paginator.get_page(video_prompt_page_number)
     video_prompt_categories: List[VideoPromptCategory] = list(video_prompt_page_obj.object_list)
+    prompt_library.attach_counts("video", video_prompt_categories)
 
     showcase_categories: List[ShowcaseCategory] = list(
         ShowcaseCategory.objects.filter(is_active=True).order_by("order", "name")
@@ -612,9 +551,9 @@ def _get_generation_context(request: HttpRequest) -> dict:
                     guest_tokens = 0
                     guest_gens_left = 0
                 else:
-                    # у модели часто есть свойство/поле left; на всякий — считаем безопасно
+                    # остаток с учётом ещё не перенесённого в БД расхода (guest_ledger)
                     try:
-                        guest_tokens = int(getattr(grant, "left", max(grant.total - grant.consumed, 0)))
+                        guest_tokens = guest_ledger.left(grant)
                     except Exception:
                         guest_tokens = 0
                     guest_gens_cap = int(getattr(cluster, "jobs_left", 3))
@@ -622,7 +561,7 @@ def _get_generation_context(request: HttpRequest) -> dict:
             except Exception:
                 # Если кластер не найден (новый пользователь), показываем токены из гранта
                 try:
-                    guest_tokens = int(getattr(grant, "left", max(grant.total - grant.consumed, 0)))
+                    guest_tokens = guest_ledger.left(grant)
                 except Exception:
                     guest_tokens = 0
                 guest_gens_cap = 3
@@ -745,7 +684,7 @@ def job_detail(request: HttpRequest, pk: int, slug: str) -> HttpResponse:
     job_liked = False
     if request.user.is_authenticated:
         job_liked = Like.objects.filter(user=request.user, job=job).exists()
-    job_like_count = Like.objects.filter(job=job).count()
+    job_like_count = job.likes_count
 
     liked_comment_ids = set()
     all_ids = []
@@ -962,59 +901,85 @@ def job_image(request: HttpRequest, pk: int, slug: str) -> HttpResponse:
     if not _viewer_allowed_on_job(request, job):
         return HttpResponseForbidden("Forbidden")
 
+    # ETag/Last-Modified — из метаданных (stat / sha в result_blobs): 304 без чтения файла.
+    # Тело отдаёт nginx (SENDFILE_BACKEND=nginx, X-Accel-Redirect) или FileResponse с Range.
+
     # 1) результат из файла
     if job.result_image and job.result_image.name:
+        name = job.result_image.name
+        ctype = "image/png" if name.lower().endswith(".png") else "image/jpeg"
         try:
-            name = job.result_image.name.lower()
-            ctype = "image/png" if name.endswith(".png") else "image/jpeg"
-            content = job.result_image.open("rb").read()
-            etag = hashlib.sha1(content).hexdigest()
-            if_none = request.META.get("HTTP_IF_NONE_MATCH")
-            if if_none and if_none.strip('"') == etag:
-                return HttpResponse(status=304)
-            resp = HttpResponse(content, content_type=ctype)
-            resp["ETag"] = f"\"{etag}\""
-            resp["Cache-Control"] = "public, max-age=31536000, immutable"
-            return resp
-        except Exception:
-            pass
+            path = job.result_image.path
+        except NotImplementedError:
+            path = None
+        validators = sendfile.stat_validators(path) if path else None
+        if validators:
+            etag, mtime, size = validators
+            try:
+                return sendfile.not_modified(request, etag, mtime) or sendfile.serve_file(
+                    request, path, accel_uri=sendfile.media_accel_uri(name), content_type=ctype,
+                    etag=etag, last_modified=mtime, size=size)
+            except FileNotFoundError:
+                # файл удалён между stat и open — пробуем остальные источники
+                pass
+        if not path:
+            # удалённое хранилище: пусть байты отдаёт оно само
+            try:
+                return redirect(job.result_image.url)
+            except Exception:
+                pass
 
-    # 2) из кэша байтов
-    content = cache.get(_image_cache_key(job.pk))
-    content_type = "image/jpeg" if content else None
+    # 2) из хранилища результатов
+    located = result_blobs.locate(job.pk)
+    if located:
+        blob_path, meta = located
+        etag = f'"{meta["sha"]}"'
+        cached = sendfile.not_modified(request, etag, None)
+        if cached:
+            return cached
+        try:
+            size = int(meta.get("size") or blob_path.stat().st_size)
+        except OSError:
+            size = 0
+        if size:
+            try:
+                return sendfile.serve_file(
+                    request, str(blob_path), accel_uri=sendfile.blob_accel_uri(result_blobs.relpath(meta["sha"])),
+                    content_type=meta.get("ctype") or "image/jpeg", etag=etag, last_modified=None, size=size)
+            except FileNotFoundError:
+                # блоб вытеснен между locate и open — как если бы его не было
+                pass
 
     # 2.1) внешний URL
-    if not content:
-        ext_url = cache.get(_image_url_cache_key(job.pk))
-        if ext_url:
-            return redirect(str(ext_url))
+    ext_url = result_blobs.get_url(job.pk)
+    if ext_url:
+        return redirect(str(ext_url))
 
     # 3) плейсхолдер
-    if not content:
+    try:
+        text = (job.prompt or "Pixera").strip()[:24]
+        img = Image.new("RGB", (512, 512), (18, 18, 22))
+        draw = ImageDraw.Draw(img)
         try:
-            text = (job.prompt or "Pixera").strip()[:24]
-            img = Image.new("RGB", (512, 512), (18, 18, 22))
-            draw = ImageDraw.Draw(img)
-            try:
-                font = ImageFont.truetype("arial.ttf", 28)
-            except Exception:
-                font = ImageFont.load_default()
-            bbox = draw.textbbox((0, 0), text, font=font)
-            tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            w, h = img.size
-            draw.text(((w - tw) // 2, (h - th) // 2), text, fill=(220, 220, 220), font=font)
-            buf = io.BytesIO()
-            img.save(buf, format="PNG")
-            content = buf.getvalue()
-            content_type = "image/png"
-            cache.set(_image_cache_key(job.pk), content, timeout=60 * 60 * 24 * 7)
+            font = ImageFont.truetype("arial.ttf", 28)
         except Exception:
-            content = (
-                b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01"
-                b"\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\x0bIDATx\x9cc\x00\x01"
-                b"\x00\x00\x05\x00\x01\r\n-\xb4\x00\x00\x00\x00IEND\xaeB`\x82"
-            )
-            content_type = "image/png"
+            font = ImageFont.load_default()
+        bbox = draw.textbbox((0, 0), text, font=font)
+        tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        w, h = img.size
+        draw.text(((w - tw) // 2, (h - th) // 2), text, fill=(220, 220, 220), font=font)
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        content = buf.getvalue()
+        content_type = "image/png"
+        result_blobs.put(job.pk, content, content_type, timeout=60 * 60 * 24 * 7)
+    except Exception:
+        content = (
+            b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01"
+            b"\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\x0bIDATx\x9cc\x00\x01"
+            b"\x00\x00\x05\x00\x01\r\n-\xb4\x00\x00\x00\x00IEND\xaeB`\x82"
+        )
+        content_type = "image/png"
 
     etag = hashlib.sha1(content).hexdigest()
     if_none = request.META.get("HTTP_IF_NONE_MATCH")
@@ -1080,8 +1045,7 @@ def job_delete(request, pk: int):
     except Exception:
         pass
     try:
-        cache.delete(_image_cache_key(job.pk))
-        cache.delete(_image_url_cache_key(job.pk))
+        result_blobs.delete(job.pk)
     except Exception:
         pass
 
@@ -1145,7 +1109,8 @@ def job_like_toggle(request: HttpRequest, pk: int) -> JsonResponse:
             Like.objects.create(user=request.user, job=job)
             liked = True
 
-    count = Like.objects.filter(job=job).count()
+    job.refresh_from_db(fields=["likes_count"])
+    count = job.likes_count
     # Notify owner about job like
     try:
         from dashboard.models import Notification
@@ -1276,7 +1241,8 @@ def job_save_toggle(request: HttpRequest, pk: int) -> JsonResponse:
             JobSave.objects.create(user=request.user, job=job)
             saved = True
 
-    count = JobSave.objects.filter(job=job).count()
+    job.refresh_from_db(fields=["saves_count"])
+    count = job.saves_count
     return JsonResponse({"ok": True, "saved": saved, "count": count})
 
 
@@ -1464,28 +1430,11 @@ def prompts_page(request: HttpRequest) -> HttpResponse:
     })
 
 
-def category_prompts_api(request: HttpRequest, category_id: int) -> JsonResponse:
-    """API для получения промптов категории"""
-    from .models import PromptCategory
+def category_prompts_api(request: HttpRequest, category_id: int) -> HttpResponse:
+    """API для получения промптов категории (кэш + ETag, см. services/prompt_library.py)"""
+    from .services import prompt_library
 
-    category = get_object_or_404(PromptCategory, id=category_id, is_active=True)
-    prompts = category.prompts.filter(is_active=True).order_by('order', 'title')
-
-    prompts_data = [
-        {
-            'id': p.id,
-            'title': p.title,
-            'prompt_text': p.prompt_text,
-            'prompt_en': p.get_prompt_for_generation(),  # Профессиональный английский промпт (для использования)
-            'prompt_en_raw': p.prompt_en,                # Оригинальное значение для редактирования
-            'order': p.order,
-            'is_active': p.is_active,
-        }
-        for p in prompts
-    ]
-
-    return JsonResponse({
-        'category_name': category.name,
-        'category_description': category.description,
-        'prompts': prompts_data,
-    })
+    entry = prompt_library.category_prompts("image", category_id)
+    if entry["status"] == 404:
+        raise Http404("PromptCategory not found")
+    return prompt_library.respond(request, entry)
@@ -22,7 +22,6 @@ from django.shortcuts import get_object_or_404
 from django.urls import NoReverseMatch, reverse
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from django.core.cache import cache
 from django.utils import timezone
 import io
 from PIL import Image
@@ -33,12 +32,14 @@ from django.utils.text import slugify
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
+from ai_gallery.services import result_blobs
 from dashboard.models import Wallet
 from .models import FreeGrant, GenerationJob, Suggestion, SuggestionCategory, AbuseCluster, ReferenceImage
-from .tasks import run_generation_async  # submit в очередь
+from .tasks import run_generation_async, run_generation_batch_async  # submit в очередь
 
 # утилиты из views (не дублируем)
 from .views import _ensure_session_key, _tariffs_url
+from .services import guest_ledger, job_events
 from .services.translator import translate_prompt_if_needed
 
 # Celery/Kombu исключения для graceful-fallback
@@ -205,7 +206,7 @@ def api_submit(request: HttpRequest) -> JsonResponse:
     • Staff (если FREE_FOR_STAFF=True) — cost=0 (без списаний).
     • Авторизованные — атомарно списываем из Wallet (select_for_update).
     • Гости — СНАЧАЛА списываем «1 обработку» из AbuseCluster (жёсткий лимит),
-      затем атомарно увеличиваем consumed у FreeGrant (select_for_update).
+      затем атомарно списываем токены гранта (generate.services.guest_ledger).
 
     При нехватке средств — {"redirect": "<тарифы>"}.
     """
@@ -418,13 +419,9 @@ def api_submit(request: HttpRequest) -> JsonResponse:
         if cost <= 0:
             cost = _token_cost()
 
-        with transaction.atomic():
-            g = FreeGrant.objects.select_for_update().get(pk=grant.pk)
-            left = max(0, int(g.total) - int(g.consumed))
-            if left < cost:
-                return JsonResponse({"redirect": _tariffs_url()})
-            g.consumed = int(g.consumed) + cost
-            g.save(update_fields=["consumed"])
+        # атомарный счётчик guest_ledger — без блокировки строки гранта
+        if guest_ledger.spend(grant, cost) != cost:
+            return JsonResponse({"redirect": _tariffs_url()})
 
         # Создаем несколько задач согласно number_results
         created_jobs = []
@@ -475,7 +472,18 @@ def api_submit(request: HttpRequest) -> JsonResponse:
 
     # Публикуем все задачи в очередь Celery (или выполняем синхронно — см. helper)
     queue_name = getattr(settings, "CELERY_QUEUE_SUBMIT", "runware_submit")
-    for created_job in created_jobs:
+    eager = getattr(settings, "CELERY_TASK_ALWAYS_EAGER", False) or settings.DEBUG
+    if len(created_jobs) > 1 and not eager:
+        # Варианты одной заявки — одним запросом к провайдеру
+        try:
+            run_generation_batch_async.apply_async(
+                args=[[j.id for j in created_jobs]], queue=queue_name)
+        except (KombuOperationalError, CeleryOperationalError, ConnectionRefusedError):
+            return JsonResponse({"ok": False, "error": "queue-unavailable"}, status=503)
+        created_jobs_to_enqueue = []
+    else:
+        created_jobs_to_enqueue = created_jobs
+    for created_job in created_jobs_to_enqueue:
         try:
             _enqueue_or_run_sync(
                 run_generation_async,
@@ -494,14 +502,16 @@ def api_submit(request: HttpRequest) -> JsonResponse:
                 return _err(f"local-run-failed: {e}", 500)
 
     # Возвращаем ID всех созданных задач для фронтенда
+    # events_token(s) — подписка на ws/jobs/<id>/ или SSE вместо опроса api_status
     if len(created_jobs) > 1:
         return JsonResponse({
             "id": created_jobs[0].id,
-            "job_ids": [j.id for j in created_jobs]
+            "job_ids": [j.id for j in created_jobs],
+            "events_tokens": {str(j.id): job_events.make_token(j.id) for j in created_jobs},
         })
     else:
         # Обратная совместимость - один результат
-        return JsonResponse({"id": job.id})
+        return JsonResponse({"id": job.id, "events_token": job_events.make_token(job.id)})
 
 
 # =============================================================================
@@ -546,9 +556,77 @@ def api_status(request: HttpRequest, job_id: int) -> JsonResponse:
             resp["image"] = None
     else:
         resp["image"] = None
+    if not (resp["done"] or resp["failed"]):
+        # Подписка на push вместо дальнейшего опроса (WebSocket/SSE)
+        resp["events_token"] = job_events.make_token(job.id)
     return JsonResponse(resp)
 
 
+async def api_job_events(request: HttpRequest, job_id: int) -> HttpResponse:
+    """
+    SSE-фоллбек к ws/jobs/<id>/: поток событий job_status до завершения задачи.
+    Доступ — по job-scoped токену (events_token из api_submit/api_status).
+    Требует ASGI: под WSGI асинхронный поток буферизуется целиком.
+    """
+    import asyncio
+    from asgiref.sync import sync_to_async
+    from channels.layers import get_channel_layer
+    from django.http import StreamingHttpResponse
+
+    if not job_events.check_token(request.GET.get("token", ""), job_id):
+        return JsonResponse({"ok": False, "error": "not found"}, status=404)
+
+    max_seconds = int(getattr(settings, "JOB_EVENTS_SSE_MAX_SECONDS", 300))
+    layer = get_channel_layer()
+
+    def _event(data: Dict[str, Any]) -> str:
+        return f"event: job_status\ndata: {json.dumps(data)}\n\n"
+
+    @sync_to_async
+    def _current():
+        job = GenerationJob.objects.filter(pk=job_id).first()
+        return job_events.payload(job) if job else None
+
+    async def stream():
+        channel = None
+        group = job_events.group_name(job_id)
+        try:
+            if layer is not None:
+                channel = await layer.new_channel()
+                await layer.group_add(group, channel)
+
+            # Подписка до чтения состояния — событие между ними не потеряется
+            state = await _current()
+            if state is None:
+                return
+            yield _event(state)
+            if job_events.is_terminal(state) or channel is None:
+                return
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + max_seconds
+            while loop.time() < deadline:
+                try:
+                    message = await asyncio.wait_for(layer.receive(channel), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                data = message.get("payload") or {}
+                yield _event(data)
+                if job_events.is_terminal(data):
+                    return
+            # клиент переподключится (EventSource делает это сам)
+            yield "retry: 3000\n\n"
+        finally:
+            if channel is not None:
+                await layer.group_discard(group, channel)
+
+    resp = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
 @require_POST
 def job_persist(request: HttpRequest, pk: int) -> JsonResponse:
     """
@@ -628,18 +706,18 @@ def job_persist(request: HttpRequest, pk: int) -> JsonResponse:
                         src_bytes = f.read()
                 except Exception:
                     src_bytes = None
-            # Try in-memory cache as fallback (see tasks._img_key)
+            # Try result blob store as fallback (see ai_gallery.services.result_blobs)
             if src_bytes is None:
                 try:
-                    cached = cache.get(f"genimg:{job.pk}")
-                    if isinstance(cached, (bytes, bytearray)):
-                        src_bytes = bytes(cached)
+                    blob = result_blobs.get(job.pk)
+                    if blob:
+                        src_bytes = blob[0]
                 except Exception:
                     src_bytes = None
             # As a last resort try external cached-url then download
             if src_bytes is None:
                 try:
-                    cached_url = cache.get(f"genimgurl:{job.pk}")
+                    cached_url = result_blobs.get_url(job.pk)
                     if cached_url:
                         r = requests.get(cached_url, timeout=20)
                         if r.ok and r.content:
@@ -908,14 +986,12 @@ def runware_webhook(request: HttpRequest) -> HttpResponse:
     error_statuses = ("failed", "error", "cancelled", "timeout")
     if status in error_statuses:
         logger.error(f"Webhook: job {job.pk} failed with status={status}")
-        job.status = GenerationJob.Status.FAILED
-        job.error = (item.get("error") or item.get("message") or f"Generation failed: {status}")[:500]
         job.provider_status = status
         job.provider_payload = item
-        job.save(update_fields=["status", "error", "provider_status", "provider_payload"])
 
-        from .tasks import _refund_if_needed
-        _refund_if_needed(job)
+        from .tasks import _fail_job
+        _fail_job(job, (item.get("error") or item.get("message") or f"Generation failed: {status}")[:500],
+                  fields=["provider_status", "provider_payload"])
         return HttpResponse("ok failed")
 
     # Неизвестный статус — логируем, но не меняем job
@@ -935,7 +1011,7 @@ def _finalize_video_job_from_webhook(job: GenerationJob, video_url: str) -> None
     from django.db.models import Q
     from dashboard.models import Wallet
     from .models import FreeGrant
-    from .tasks import _download_and_save_video, _refund_if_needed
+    from .tasks import _download_and_save_video, _fail_job
 
     logger = logging.getLogger(__name__)
 
@@ -995,9 +1071,9 @@ def _finalize_video_job_from_webhook(job: GenerationJob, video_url: str) -> None
                     grant = FreeGrant.objects.filter(
                         Q(gid=job.guest_gid) | Q(fp=job.guest_fp),
                         user__isnull=True
-                    ).select_for_update().first()
+                    ).first()
                     if grant:
-                        grant.spend(token_cost)
+                        guest_ledger.spend(grant, token_cost, partial=True)
                         logger.info(f"Webhook: charged {token_cost} tokens from FreeGrant {grant.pk}")
             else:
                 logger.info(f"Webhook: job {job.pk} tokens already charged ({job.tokens_spent}), skipping deduction")
@@ -1010,15 +1086,13 @@ def _finalize_video_job_from_webhook(job: GenerationJob, video_url: str) -> None
             job.provider_status = "success"
             job.video_cached_until = timezone.now() + timedelta(hours=24)
             job.save()
+            job_events.publish(job)
 
         logger.info(f"Webhook: video job {job.pk} finalized successfully")
 
     except Exception as e:
         logger.error(f"Webhook: error finalizing video job {job.pk}: {e}", exc_info=True)
-        job.status = GenerationJob.Status.FAILED
-        job.error = f"Webhook processing error: {str(e)}"[:500]
-        job.save(update_fields=["status", "error"])
-        _refund_if_needed(job)
+        _fail_job(job, f"Webhook processing error: {str(e)}"[:500])
 
 
 # =============================================================================
@@ -1160,7 +1234,7 @@ def guest_balance(request: HttpRequest) -> JsonResponse:
     # (анти-абуз идентификаторы сохраняем в другом месте; здесь показываем только баланс)
 
     # Рассчитываем количество обработок из токенов
-    tokens_left = int(grant.left)
+    tokens_left = guest_ledger.left(grant)
     cost = _token_cost()
     gens_left = (tokens_left // cost) if cost > 0 else 0
 
@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db import transaction
-from django.http import HttpRequest, JsonResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.utils.text import slugify
 from django.views.decorators.http import require_POST, require_GET
 
 from .models import PromptCategory, CategoryPrompt, PromptSubcategory
+from .services import prompt_library
 
 
 def _b(val, default: bool = False) -> bool:
@@ -446,63 +447,17 @@ def sc_delete(request: HttpRequest, pk: int) -> JsonResponse:
 # ===========================
 
 @require_GET
-def category_subcategories_api(request: HttpRequest, category_id: int) -> JsonResponse:
+def category_subcategories_api(request: HttpRequest, category_id: int) -> HttpResponse:
     """
     Вернуть список подкатегорий выбранной категории с количеством активных промптов.
+    Ответ кэшируется целиком (generate.services.prompt_library), ETag → 304.
     """
-    try:
-        cat = PromptCategory.objects.get(pk=category_id, is_active=True)
-    except PromptCategory.DoesNotExist:
-        return JsonResponse({"ok": False, "error": "category not found"}, status=404)
-
-    subs = (
-        PromptSubcategory.objects
-        .filter(category=cat, is_active=True)
-        .order_by("order", "name")
-    )
-    data = []
-    for sc in subs:
-        cnt = CategoryPrompt.objects.filter(category=cat, subcategory=sc, is_active=True).count()
-        data.append({
-            "id": sc.id,
-            "name": sc.name,
-            "slug": sc.slug,
-            "description": sc.description,
-            "order": sc.order,
-            "is_active": sc.is_active,
-            "prompts_count": cnt,
-        })
-
-    return JsonResponse({"ok": True, "category": {"id": cat.id, "name": cat.name}, "subcategories": data})
+    return prompt_library.respond(request, prompt_library.subcategories("image", category_id))
 
 
 @require_GET
-def subcategory_prompts_api(request: HttpRequest, subcategory_id: int) -> JsonResponse:
+def subcategory_prompts_api(request: HttpRequest, subcategory_id: int) -> HttpResponse:
     """
-    Вернуть промпты конкретной подкатегории.
+    Вернуть промпты конкретной подкатегории (кэш + ETag, см. prompt_library).
     """
-    try:
-        sc = PromptSubcategory.objects.select_related("category").get(pk=subcategory_id, is_active=True)
-    except PromptSubcategory.DoesNotExist:
-        return JsonResponse({"ok": False, "error": "subcategory not found"}, status=404)
-
-    prompts = (
-        CategoryPrompt.objects
-        .filter(category=sc.category, subcategory=sc, is_active=True)
-        .order_by("order", "title")
-    )
-    items = [{
-        "id": p.id,
-        "title": p.title,
-        "prompt_text": p.prompt_text,
-        "prompt_en": p.get_prompt_for_generation(),
-        "prompt_en_raw": p.prompt_en,
-        "order": p.order,
-        "is_active": p.is_active,
-    } for p in prompts]
-
-    return JsonResponse({
-        "ok": True,
-        "subcategory": {"id": sc.id, "name": sc.name, "category_id": sc.category_id},
-        "prompts": items
-    })
+    return prompt_library.respond(request, prompt_library.subcategory_prompts("image", subcategory_id))
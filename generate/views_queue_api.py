@@ -9,9 +9,9 @@ from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.db.models import Q
 from django.core.files.storage import default_storage
-from django.core.cache import cache
 from django.conf import settings
 
+from ai_gallery.services import result_blobs
 from .models import GenerationJob
 
 
@@ -89,8 +89,7 @@ def _hard_delete_job(job: GenerationJob) -> None:
 
     # Purge caches used by job image endpoint
     try:
-        cache.delete(f"genimg:{job.pk}")
-        cache.delete(f"genimgurl:{job.pk}")
+        result_blobs.delete(job.pk)
     except Exception:
         pass
 
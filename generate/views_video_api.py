@@ -28,8 +28,9 @@ from ai_gallery.services.runware_client import (
 )
 from dashboard.models import Wallet
 from gallery.models import Image as GalleryImage
-from generate.models import GenerationJob, VideoModel, FreeGrant, VideoPromptCategory
+from generate.models import GenerationJob, VideoModel, FreeGrant
 from generate.utils.image_processor import process_image_for_video, get_optimal_video_dimensions
+from generate.services import guest_ledger, job_events, prompt_library, video_poll
 from generate.services.translator import translate_prompt_if_needed
 
 logger = logging.getLogger(__name__)
@@ -121,33 +122,9 @@ def _extract_video_url_from_payload(payload: dict) -> str | None:
 
 @require_http_methods(["GET"])
 def video_category_prompts_api(request, category_id):
-    """API для получения промптов видео категории."""
+    """API для получения промптов видео категории (кэш + ETag, см. prompt_library)."""
     try:
-        category = VideoPromptCategory.objects.get(id=category_id, is_active=True)
-        prompts = category.video_prompts.filter(is_active=True).order_by('order', 'title')
-
-        data = {
-            'category': {
-                'id': category.id,
-                'name': category.name,
-                'slug': category.slug,
-                'description': category.description,
-            },
-            'prompts': [
-                {
-                    'id': p.id,
-                    'title': p.title,
-                    'prompt_text': p.prompt_text,
-                    'prompt_en': p.prompt_en,
-                }
-                for p in prompts
-            ]
-        }
-
-        return JsonResponse(data)
-
-    except VideoPromptCategory.DoesNotExist:
-        return JsonResponse({'error': 'Категория не найдена'}, status=404)
+        return prompt_library.respond(request, prompt_library.category_prompts("video", category_id))
     except Exception as e:
         logger.error(f"Ошибка при получении промптов видео: {e}")
         return JsonResponse({'error': 'Внутренняя ошибка'}, status=500)
@@ -405,7 +382,7 @@ def video_submit(request):
                         'error': error or 'Ошибка получения токенов'
                     }, status=403)
 
-                if grant.left < total_token_cost:
+                if guest_ledger.left(grant) < total_token_cost:
                     return JsonResponse({
                         'success': False,
                         'error': f'Недостаточно токенов. Требуется: {total_token_cost} TOK'
@@ -775,9 +752,9 @@ def video_status(request, job_id):
                                 grant = FreeGrant.objects.filter(
                                     Q(gid=job.guest_gid) | Q(fp=job.guest_fp),
                                     user__isnull=True
-                                ).select_for_update().first()
+                                ).first()
                                 if grant:
-                                    grant.spend(token_cost)
+                                    guest_ledger.spend(grant, token_cost, partial=True)
                             job.tokens_spent = token_cost
 
                         if not job.result_video_url:
@@ -810,6 +787,14 @@ def video_status(request, job_id):
         # except Exception as e:
         #     logger.error(...)
 
+        # DEV без Celery: после рестарта процесса локальный планировщик пуст —
+        # первый же запрос статуса поднимает его и восстанавливает задачи из БД
+        if video_poll.uses_local() and job.provider_task_uuid:
+            try:
+                video_poll.local_scheduler()
+            except Exception as e:
+                logger.warning(f"[video_status] local poll scheduler unavailable: {e}")
+
         progress = None
         try:
             if hasattr(job, 'provider_payload') and isinstance(job.provider_payload, dict):
@@ -832,7 +817,9 @@ def video_status(request, job_id):
             'success': True,
             'status': 'processing',
             'message': 'Видео генерируется...',
-            'progress': progress
+            'progress': progress,
+            # подписка на push (ws/jobs/<id>/ или SSE) вместо дальнейшего опроса
+            'events_token': job_events.make_token(job.id),
         })
 
     except GenerationJob.DoesNotExist:
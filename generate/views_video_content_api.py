@@ -17,6 +17,7 @@ from django.utils import timezone
 from django.core.files import File
 
 from .models import VideoPromptCategory, VideoPrompt, ShowcaseVideo, VideoPromptSubcategory
+from .services import prompt_library
 
 def _b(val, default=True) -> bool:
     if val is None:
@@ -276,54 +277,14 @@ def get_category_prompts(request, category_id):
 
 @require_http_methods(["GET"])
 def video_category_subcategories_api(request, category_id: int):
-    """List subcategories for a given video category with active prompts count."""
-    try:
-        cat = VideoPromptCategory.objects.get(pk=category_id, is_active=True)
-    except VideoPromptCategory.DoesNotExist:
-        return JsonResponse({"ok": False, "error": "category not found"}, status=404)
-
-    subs = (
-        VideoPromptSubcategory.objects
-        .filter(category=cat, is_active=True)
-        .order_by("order", "name")
-    )
-    out = []
-    for sc in subs:
-        cnt = VideoPrompt.objects.filter(category=cat, subcategory=sc, is_active=True).count()
-        out.append({
-            "id": sc.id,
-            "name": sc.name,
-            "slug": sc.slug,
-            "description": sc.description,
-            "order": sc.order,
-            "is_active": sc.is_active,
-            "prompts_count": cnt,
-        })
-    return JsonResponse({"ok": True, "category": {"id": cat.id, "name": cat.name}, "subcategories": out})
+    """List subcategories for a given video category with active prompts count (cached, ETag)."""
+    return prompt_library.respond(request, prompt_library.subcategories("video", category_id))
 
 
 @require_http_methods(["GET"])
 def video_subcategory_prompts_api(request, subcategory_id: int):
-    """Return prompts for a given video subcategory."""
-    try:
-        sc = VideoPromptSubcategory.objects.select_related("category").get(pk=subcategory_id, is_active=True)
-    except VideoPromptSubcategory.DoesNotExist:
-        return JsonResponse({"ok": False, "error": "subcategory not found"}, status=404)
-
-    prompts = (
-        VideoPrompt.objects
-        .filter(category=sc.category, subcategory=sc, is_active=True)
-        .order_by("order", "title")
-    )
-    items = [{
-        "id": p.id,
-        "title": p.title,
-        "prompt_text": p.prompt_text,
-        "prompt_en": p.prompt_en,
-        "order": p.order,
-        "is_active": p.is_active,
-    } for p in prompts]
-    return JsonResponse({"ok": True, "subcategory": {"id": sc.id, "name": sc.name, "category_id": sc.category_id}, "prompts": items})
+    """Return prompts for a given video subcategory (cached, ETag)."""
+    return prompt_library.respond(request, prompt_library.subcategory_prompts("video", subcategory_id))
 
 
 @staff_member_required
@@ -12,6 +12,7 @@ from django.core.paginator import Paginator
 
 from .models_video import VideoModelConfiguration
 from .forms_video_model import VideoModelConfigurationForm, VideoModelQuickEditForm
+from .services import model_catalog
 
 
 @staff_member_required
@@ -257,7 +258,10 @@ def video_model_bulk_action(request):
         messages.success(request, f'Снята отметка премиум: {count}')
     else:
         messages.error(request, 'Неизвестное действие.')
+        return redirect('generate:video_models_list')
 
+    # update() не шлёт сигналов — сбрасываем каталог моделей явно
+    model_catalog.invalidate()
     return redirect('generate:video_models_list')
 
 
@@ -1,16 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
 from pages.models import SiteSettings
 
 
+def _load_settings():
+    try:
+        return SiteSettings.get_settings()
+    except Exception:
+        return None
+
+
 def site_settings(request):
     """
-    Context processor для настроек сайта
+    Context processor для настроек сайта (лениво: грузятся при первом обращении из шаблона)
     """
-    try:
-        settings = SiteSettings.get_settings()
-        return {
-            'site_settings': settings,
-        }
-    except Exception:
-        return {
-            'site_settings': None,
-        }
+    return {
+        'site_settings': SimpleLazyObject(_load_settings),
+    }
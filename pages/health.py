@@ -22,3 +22,21 @@ class HealthCheckView(View):
                 "status": "unhealthy",
                 "error": str(e)
             }, status=503)
+
+
+class RateLimitStatsView(View):
+    """Счётчики rate limiter по политикам (allowed/denied) для мониторинга"""
+
+    def get(self, request):
+        import hmac
+        from django.conf import settings
+        from ai_gallery.services import ratelimit
+
+        token = getattr(settings, "METRICS_TOKEN", "")
+        sent = request.headers.get("X-Metrics-Token", "")
+        allowed = (token and hmac.compare_digest(sent, token)) or (
+            request.user.is_authenticated and request.user.is_staff
+        )
+        if not allowed:
+            return JsonResponse({"error": "forbidden"}, status=403)
+        return JsonResponse({"ratelimit": ratelimit.stats()})
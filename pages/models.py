@@ -1,5 +1,5 @@
 ﻿from django.db import models
-from django.core.cache import cache
+from ai_gallery.services import caches
 
 
 class SiteSettings(models.Model):
@@ -53,18 +53,17 @@ class SiteSettings(models.Model):
             existing.save()
             return existing
 
-        # Очищаем кэш при сохранении
-        cache.delete('site_settings')
         super().save(*args, **kwargs)
+        # Очищаем кэш после сохранения (иначе параллельный запрос закэширует старую версию)
+        caches.delete_tiered('site_settings')
 
     @classmethod
     def get_settings(cls):
         """
         Получить настройки с кэшированием
         """
-        settings = cache.get('site_settings')
-        if settings is None:
-            settings, created = cls.objects.get_or_create(
+        def _load():
+            obj, _created = cls.objects.get_or_create(
                 pk=1,
                 defaults={
                     'age_gate_enabled': True,
@@ -73,6 +72,8 @@ class SiteSettings(models.Model):
                     'site_maintenance': False,
                 }
             )
-            cache.set('site_settings', settings, 60 * 60)  # кэшируем на час
-        return settings
+            return obj
+
+        # L1 в процессе (несколько секунд) + общий кэш на час
+        return caches.get_tiered('site_settings', _load, timeout=60 * 60)
 
@@ -985,15 +985,25 @@
 
   function escapeHtml(s) { const d = document.createElement('div'); d.textContent = s ?? ''; return d.innerHTML; }
 
-  // Polling
+  // Polling (fallback). При активной push-подписке (JobEvents) статус
+  // перечитывается по событию, а таймер — лишь редкая страховка.
+  const PUSH_FALLBACK_DELAY = 30000;
+  const pollTimers = new Map();
+  function schedulePoll(jobId, tile, attempts, delay) {
+    const key = String(jobId);
+    clearTimeout(pollTimers.get(key));
+    pollTimers.set(key, setTimeout(()=>pollStatusInline(jobId, tile, attempts), delay));
+  }
+
   async function pollStatusInline(jobId, tile, attempts = 0) {
     const maxAttempts = 120;
     const delayBase = document.hidden ? 2000 : 1000;
     if (jobId) addOrUpdateEntry(jobId, { status: 'pending' });
+    clearTimeout(pollTimers.get(String(jobId)));
 
     if (attempts >= maxAttempts) {
       if (tile) setTileProgress(tile, 98, 'Почти готово…');
-      setTimeout(()=>pollStatusInline(jobId, tile, attempts+1), 2000);
+      schedulePoll(jobId, tile, attempts+1, 2000);
       return;
     }
 
@@ -1039,10 +1049,12 @@
           ? Math.min(98, j.progress)
           : Math.min(98, (attempts / maxAttempts) * 100);
         if (tile) setTileProgress(tile, p, 'Генерация изображения…');
-        setTimeout(()=>pollStatusInline(jobId, tile, attempts+1), delayBase);
+        const pushed = !!(j.events_token && window.JobEvents &&
+          window.JobEvents.subscribe(jobId, j.events_token, () => pollStatusInline(jobId, tile, attempts+1)));
+        schedulePoll(jobId, tile, attempts+1, pushed ? PUSH_FALLBACK_DELAY : delayBase);
       }
     } catch (e) {
-      setTimeout(()=>pollStatusInline(jobId, tile, attempts+1), 1000);
+      schedulePoll(jobId, tile, attempts+1, 1000);
     }
   }
 
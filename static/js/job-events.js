@@ -0,0 +1,80 @@
+/**
+ * Job progress push (WebSocket → SSE fallback)
+ * - JobEvents.subscribe(jobId, token, onState) → true, если подписка активна
+ * - token — events_token из api_submit / api_status / video status
+ * - onState(job) вызывается на каждое событие; после done/failed соединение закрывается
+ * - Если ни WebSocket, ни EventSource недоступны — вызывающий код продолжает опрос
+ */
+(function() {
+  if (window.JobEvents) return;
+
+  const subs = new Map(); // jobId -> { ws, es, done }
+
+  function isTerminal(job) { return !!(job && (job.done || job.failed)); }
+
+  function finish(jobId) {
+    const s = subs.get(jobId);
+    if (!s) return;
+    s.done = true;
+    try { s.ws && s.ws.close(); } catch(_) {}
+    try { s.es && s.es.close(); } catch(_) {}
+  }
+
+  function handle(jobId, job, onState) {
+    try { onState(job); } catch(_) {}
+    if (isTerminal(job)) finish(jobId);
+  }
+
+  function openSSE(jobId, token, onState) {
+    if (!window.EventSource) return false;
+    const s = subs.get(jobId);
+    const url = `/generate/api/jobs/${encodeURIComponent(jobId)}/events?token=${encodeURIComponent(token)}`;
+    const es = new EventSource(url);
+    s.es = es;
+    es.addEventListener('job_status', (ev) => {
+      let job = null;
+      try { job = JSON.parse(ev.data); } catch(_) { return; }
+      handle(jobId, job, onState);
+    });
+    es.onerror = () => {
+      // EventSource переподключается сам; после завершения — закрываем
+      if (s.done) { try { es.close(); } catch(_) {} }
+    };
+    return true;
+  }
+
+  function subscribe(jobId, token, onState) {
+    jobId = String(jobId || '');
+    if (!jobId || !token || typeof onState !== 'function') return false;
+    const existing = subs.get(jobId);
+    if (existing && !existing.done) return true;
+
+    const s = { ws: null, es: null, done: false };
+    subs.set(jobId, s);
+
+    if (!window.WebSocket) return openSSE(jobId, token, onState);
+
+    const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    let opened = false;
+    try {
+      const ws = new WebSocket(`${proto}://${window.location.host}/ws/jobs/${encodeURIComponent(jobId)}/?token=${encodeURIComponent(token)}`);
+      s.ws = ws;
+      ws.onopen = () => { opened = true; };
+      ws.onmessage = (ev) => {
+        let msg = null;
+        try { msg = JSON.parse(ev.data); } catch(_) { return; }
+        if (msg && msg.type === 'job_status') handle(jobId, msg.job, onState);
+      };
+      ws.onclose = () => {
+        // WebSocket недоступен (прокси/WSGI) или оборвался до завершения → SSE
+        if (!s.done && !s.es) openSSE(jobId, token, onState);
+        if (!opened && !s.es) subs.delete(jobId);
+      };
+    } catch(_) {
+      return openSSE(jobId, token, onState);
+    }
+    return true;
+  }
+
+  window.JobEvents = { subscribe, unsubscribe: finish };
+})();
@@ -3060,6 +3060,20 @@ html[data-theme="light"] .vmodel-nav-btn{background:rgba(0,0,0,.5);border-color:
    * Polling статуса генерации (inline в плитке)
    * Webhook обрабатывает большинство случаев — polling только как резервный механизм
    */
+  /**
+   * Один таймер опроса на задачу: push-событие (JobEvents) перезапускает опрос сразу,
+   * а при активной подписке таймер — лишь редкая страховка (30 с)
+   */
+  scheduleVideoPoll(key, fn, delay) {
+    this._pollTimers = this._pollTimers || new Map();
+    clearTimeout(this._pollTimers.get(key));
+    this._pollTimers.set(key, setTimeout(fn, delay));
+  }
+
+  subscribeVideoEvents(jobId, token, fn) {
+    return !!(token && window.JobEvents && window.JobEvents.subscribe(jobId, token, fn));
+  }
+
   async pollVideoStatusInline(jobId, tile, attempts = 0) {
     const maxAttempts = 60; // ~5 минут при 5-секундном интервале
     // Оптимизированный polling: 3 секунды первые 20 попыток, затем 5 секунд
@@ -3070,7 +3084,7 @@ html[data-theme="light"] .vmodel-nav-btn{background:rgba(0,0,0,.5);border-color:
 
     if (attempts >= maxAttempts) {
       if (tile) this.setTileProgress(tile, 98, 'Почти готово…');
-      setTimeout(() => this.pollVideoStatusInline(jobId, tile, attempts + 1), 10000);
+      this.scheduleVideoPoll(`inline:${jobId}`, () => this.pollVideoStatusInline(jobId, tile, attempts + 1), 10000);
       return;
     }
 
@@ -3131,10 +3145,12 @@ html[data-theme="light"] .vmodel-nav-btn{background:rgba(0,0,0,.5);border-color:
           ? Math.min(98, data.progress)
           : Math.min(98, (attempts / maxAttempts) * 100);
         if (tile) this.setTileProgress(tile, p, 'Генерация видео…');
-        setTimeout(() => this.pollVideoStatusInline(jobId, tile, attempts + 1), delay);
+        const next = () => this.pollVideoStatusInline(jobId, tile, attempts + 1);
+        const pushed = this.subscribeVideoEvents(jobId, data.events_token, next);
+        this.scheduleVideoPoll(`inline:${jobId}`, next, pushed ? 30000 : delay);
       }
     } catch (error) {
-      setTimeout(() => this.pollVideoStatusInline(jobId, tile, attempts + 1), delay);
+      this.scheduleVideoPoll(`inline:${jobId}`, () => this.pollVideoStatusInline(jobId, tile, attempts + 1), delay);
     }
   }
 
@@ -3149,7 +3165,7 @@ html[data-theme="light"] .vmodel-nav-btn{background:rgba(0,0,0,.5);border-color:
     if (attempts >= maxAttempts) {
       // Продолжаем проверять еще дольше, но реже
       this.updateLoader('Почти готово...', 98);
-      setTimeout(() => this.pollVideoStatus(jobId, attempts + 1), 10000);
+      this.scheduleVideoPoll(`loader:${jobId}`, () => this.pollVideoStatus(jobId, attempts + 1), 10000);
       return;
     }
 
@@ -3177,12 +3193,14 @@ html[data-theme="light"] .vmodel-nav-btn{background:rgba(0,0,0,.5);border-color:
           : Math.min(98, (attempts / maxAttempts) * 100);
         this.updateLoader('Генерация видео...', p);
 
-        // Продолжаем polling с оптимизированным интервалом
-        setTimeout(() => this.pollVideoStatus(jobId, attempts + 1), delay);
+        // Продолжаем polling с оптимизированным интервалом (при push-подписке — редко)
+        const next = () => this.pollVideoStatus(jobId, attempts + 1);
+        const pushed = this.subscribeVideoEvents(jobId, data.events_token, next);
+        this.scheduleVideoPoll(`loader:${jobId}`, next, pushed ? 30000 : delay);
       }
     } catch (error) {
       // Продолжаем попытки при ошибке сети
-      setTimeout(() => this.pollVideoStatus(jobId, attempts + 1), delay);
+      this.scheduleVideoPoll(`loader:${jobId}`, () => this.pollVideoStatus(jobId, attempts + 1), delay);
     }
   }
 